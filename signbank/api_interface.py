@@ -16,7 +16,6 @@ from guardian.shortcuts import get_objects_for_user, get_user_perms
 
 from signbank.settings.server_specific import (WRITABLE_FOLDER, API_VIDEO_ARCHIVES, VIDEOS_TO_IMPORT_FOLDER, TMP_DIR,
                                                GLOSS_IMAGE_DIRECTORY,
-                                               DEBUG_VIDEOS, PREFIX_URL, URL,
                                                DEFAULT_DATASET_PK, MODELTRANSLATION_LANGUAGES)
 from signbank.settings.base import SUPPORTED_CITATION_IMAGE_EXTENSIONS
 
@@ -25,8 +24,9 @@ from signbank.tools import get_two_letter_dir, api_fields, add_gloss_update_to_r
 from signbank.api_token import put_api_user_in_request
 from signbank.abstract_machine import get_interface_language_api, retrieve_language_code_from_header
 from signbank.zip_interface import (check_subfolders_for_unzipping_ids, get_filenames, check_subfolders_for_unzipping,
-                                    import_video_file, remove_video_file_from_import_videos, unzip_video_files_ids,
-                                    unzip_video_files)
+                                    remove_video_file_from_import_videos, unzip_video_files_ids, unzip_video_files)
+from signbank.video.zip_ingestion import (read_zip_video_members, import_zipped_videos, import_folder_members,
+                                          import_folder_videos)
 import zipfile
 
 
@@ -506,85 +506,39 @@ def upload_zipped_videos_archive(request, datasetid):
                          "unzippedvideos": unzipped_files}, status=200, safe=False)
 
 
-def import_video_to_gloss(request, video_file_path):
-    # request is included as a parameter to add to the GlossVideoHistory in the called functions
-
-    import_video_data = dict()
-    filename = os.path.basename(video_file_path)
-    file_folder_path = os.path.dirname(video_file_path)
-    path_units = file_folder_path.split('/')
-    if len(path_units) > 1:
-        useid = False
-        language_3_code = path_units[-1]
-        dataset_acronym = path_units[-2]
-        json_path_key = dataset_acronym + '/' + language_3_code + '/' + filename
-        (filename_without_extension, extension) = os.path.splitext(filename)
-        gloss = Gloss.objects.filter(lemma__dataset__acronym=dataset_acronym, archived=False,
-                                     annotationidglosstranslation__language__language_code_3char=language_3_code,
-                                     annotationidglosstranslation__text__exact=filename_without_extension).first()
-    else:
-        useid = True
-        dataset_acronym = path_units[-1]
-        json_path_key = dataset_acronym + '/' + filename
-        (filename_without_extension, extension) = os.path.splitext(filename)
-        gloss = Gloss.objects.filter(id=int(filename_without_extension), archived=False).first()
-
-    import_video_data[json_path_key] = dict()
-
-    if not gloss:
-        errors_deleting = remove_video_file_from_import_videos(video_file_path)
-        if errors_deleting and DEBUG_VIDEOS:
-            print('import_video_to_gloss: ', errors_deleting)
-        import_video_data[json_path_key]["gloss"] = ''
-        import_video_data[json_path_key]["videofile"] = filename
-        import_video_data[json_path_key]["errors"] = f"Gloss not found for {filename_without_extension}."
-        import_video_data[json_path_key]["Video"] = ''
-        import_video_data[json_path_key]["importstatus"] = 'Failed'
-        return import_video_data
-
-    status, errors = import_video_file(request, gloss, video_file_path, useid=useid)
-    if status == 'Success':
-        video_path = gloss.get_video_url()
-        import_video_data[json_path_key]["Video"] = URL + PREFIX_URL + '/dictionary/protected_media/' + video_path
-    else:
-        import_video_data[json_path_key]["Video"] = ''
-    import_video_data[json_path_key]["gloss"] = str(gloss.id)
-    import_video_data[json_path_key]["videofile"] = filename
-    import_video_data[json_path_key]["importstatus"] = status
-    import_video_data[json_path_key]["errors"] = errors
-
-    return import_video_data
+@csrf_exempt
+@put_api_user_in_request
+def import_zipped_videos_json(request, datasetid):
+    # the videos of the zip archive are imported into the glosses, the progress is streamed as a line of json per video
 
+    interface_language_code = request.headers.get('Accept-Language', 'en')
+    if interface_language_code not in MODELTRANSLATION_LANGUAGES:
+        interface_language_code = 'en'
+    activate(interface_language_code)
 
-class VideoImporter:
-    """An object that implements just the write method of the file-like
-    interface. This is based on an example in the Django 4.2 documentation
-    """
-    line = 0
-
-    def write(self, request, value):
-        """Write the value by returning it, instead of storing in a buffer."""
-        if value == "start":
-            value_json = "{ \"imported_videos\": ["
-        elif value == "finish":
-            value_json = "]}"
-        else:
-            video_data = import_video_to_gloss(request, value)
-            if self.line > 1:
-                value_json = "," + json.dumps(video_data)
-            else:
-                value_json = json.dumps(video_data)
-        self.line += 1
-        return value_json
+    # check if the user can manage this dataset
+    dataset, errors, status = check_api_dataset_manager_permissions(request, datasetid)
+    if not dataset:
+        return JsonResponse(errors, status=status)
 
+    value_dict = get_dataset_zipfile_value_dict(request)
 
-# json.dumps( {key: val} {key: val}, separators=('}', ':'))
-def json_start():
-    return ["start"]
+    file_key = gettext("File")
+    if file_key not in value_dict.keys():
+        return JsonResponse({"error": gettext("Error processing the zip file.")}, status=400)
 
+    zip_path = value_dict[file_key].name
+    members = read_zip_video_members(dataset, zip_path)
+    if members is None:
+        remove_video_file_from_import_videos(zip_path)
+        return JsonResponse({"error": gettext("Upload zip archive: The file is not a zip file.")}, status=400)
+    if not members:
+        remove_video_file_from_import_videos(zip_path)
+        return JsonResponse({"error": gettext("The zip archive has the wrong structure. It should be: {acronym}/GLOSSID.mp4").format(acronym=dataset.acronym)}, status=400)
 
-def json_finish():
-    return ["finish"]
+    return StreamingHttpResponse(
+        (json.dumps(progress) + '\n' for progress in import_zipped_videos(request.user, dataset, zip_path, members)),
+        content_type="application/x-ndjson")
 
 
 @csrf_exempt
@@ -615,12 +569,18 @@ def upload_videos_to_glosses(request, datasetid):
     if group_manager not in groups_of_user:
         return JsonResponse({"error": gettext('You must be in group Dataset Manager to import gloss videos.')}, status=400)
 
-    video_file_paths_with_ids = uploaded_video_filepaths(dataset, useid=True)
-    video_file_paths_with_annotations = uploaded_video_filepaths(dataset, useid=False)
+    members = import_folder_members(dataset, uploaded_video_filepaths(dataset, useid=True),
+                                    uploaded_video_filepaths(dataset, useid=False))
+
+    def imported_videos_json():
+        yield "{ \"imported_videos\": ["
+        for line, result in enumerate(import_folder_videos(request.user, dataset, members)):
+            video_data = {result.pop('path'): result}
+            yield ("," if line else "") + json.dumps(video_data)
+        yield "]}"
 
-    pseudo_buffer = VideoImporter()
     return StreamingHttpResponse(
-        (pseudo_buffer.write(request, vg) for vg in json_start() + video_file_paths_with_ids + video_file_paths_with_annotations + json_finish()),
+        imported_videos_json(),
         content_type="application/json",
         headers={"Content-Disposition": 'attachment; filename='+'glosses.json'},
     )
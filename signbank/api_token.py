@@ -1,12 +1,23 @@
 
+import atexit
+import copy
 import hashlib
 import secrets
 import string
-
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DatabaseError
+from django.db.models import F
 from django.http import HttpRequest, JsonResponse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from signbank.dictionary.models import SignbankAPIToken
+from signbank.dictionary.models import SignbankAPIToken, data_version, bump_data_version
 
 
 def generate_auth_token(length=16):
@@ -26,6 +37,99 @@ class APIAuthException(Exception):
     pass
 
 
+# the users of recently used tokens are kept in the process and in the cache if it is shared by all processes,
+# under the version of the tokens in the database, which is changed when a token or a user changes
+API_TOKENS_VERSION = 'api_tokens'
+API_TOKEN_CACHE_TIMEOUT = 10 * 60
+API_TOKEN_LRU_SIZE = 1000
+# the usage of the tokens is written to the database at most once per this many seconds
+API_TOKEN_USAGE_FLUSH_INTERVAL = 60
+
+_api_token_lock = threading.Lock()
+# token id -> [number of uses, last used]
+_api_token_usage = {}
+_api_token_usage_flushed = time.time()
+# hashed token -> (version, time it was looked up, (token id, user)), the least recently used is removed first
+_api_token_lru = OrderedDict()
+
+
+def api_token_cache_key(version, hashed_token):
+    return 'api_token_user_' + str(version) + '_' + hashed_token
+
+
+def api_token_cache_is_shared():
+    """The local memory cache is kept per process, it is not used next to the tokens kept in the process"""
+    # django.core.cache.cache is a proxy, the backend is that of caches['default']
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def invalidate_api_tokens():
+    """Called when a token or a user changes, all processes look up the tokens again"""
+    bump_data_version(API_TOKENS_VERSION)
+
+
+def lookup_api_token(hashed_token):
+    """Return (token id, user) of a hashed token, or None if there is no such token.
+    A recently used token costs one query, on the version of the tokens"""
+    version = data_version(API_TOKENS_VERSION)
+    with _api_token_lock:
+        kept = _api_token_lru.get(hashed_token)
+        if kept is not None and kept[0] == version and time.time() - kept[1] < API_TOKEN_CACHE_TIMEOUT:
+            _api_token_lru.move_to_end(hashed_token)
+            return kept[2]
+
+    shared_cache = api_token_cache_is_shared()
+    found = cache.get(api_token_cache_key(version, hashed_token)) if shared_cache else None
+    if found is None:
+        signbank_token = SignbankAPIToken.objects.select_related('signbank_user').filter(
+            api_token=hashed_token).first()
+        if not signbank_token:
+            return None
+        found = (signbank_token.id, signbank_token.signbank_user)
+        if shared_cache:
+            cache.set(api_token_cache_key(version, hashed_token), found, API_TOKEN_CACHE_TIMEOUT)
+
+    with _api_token_lock:
+        _api_token_lru[hashed_token] = (version, time.time(), found)
+        _api_token_lru.move_to_end(hashed_token)
+        while len(_api_token_lru) > API_TOKEN_LRU_SIZE:
+            _api_token_lru.popitem(last=False)
+    return found
+
+
+def record_api_token_usage(token_id):
+    """Count a use of the token, the counts are written to the database periodically"""
+    with _api_token_lock:
+        usage = _api_token_usage.setdefault(token_id, [0, None])
+        usage[0] += 1
+        usage[1] = timezone.now()
+        flush = time.time() - _api_token_usage_flushed > API_TOKEN_USAGE_FLUSH_INTERVAL
+    if flush:
+        flush_api_token_usage()
+
+
+def flush_api_token_usage():
+    """Write the buffered usage of the tokens to the database"""
+    global _api_token_usage, _api_token_usage_flushed
+    with _api_token_lock:
+        usage_per_token, _api_token_usage = _api_token_usage, {}
+        _api_token_usage_flushed = time.time()
+    for token_id, (count, last_used) in usage_per_token.items():
+        # update does not send post_save, the cached token is kept
+        SignbankAPIToken.objects.filter(id=token_id).update(usage_count=F('usage_count') + count,
+                                                            last_used=last_used)
+
+
+def flush_api_token_usage_at_exit():
+    try:
+        flush_api_token_usage()
+    except DatabaseError:
+        pass
+
+
+atexit.register(flush_api_token_usage_at_exit)
+
+
 def get_api_user(request):
     """
     Return a user if there is a correct API token in the request.
@@ -44,11 +148,14 @@ def get_api_user(request):
         raise APIAuthException(_("No Authorization token found"))
 
     hashed_token = hash_token(auth_token)
-    signbank_token = SignbankAPIToken.objects.filter(api_token=hashed_token).first()
-    if not signbank_token:
+    found = lookup_api_token(hashed_token)
+    if not found:
         raise APIAuthException(_("Your Authorization Token does not match anything."))
 
-    return signbank_token.signbank_user
+    token_id, user = found
+    record_api_token_usage(token_id)
+    # the permissions cached on the user by the request must not be kept in the token cache
+    return copy.copy(user)
 
 
 def put_api_user_in_request(func):
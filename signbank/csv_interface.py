@@ -1,8 +1,10 @@
 import re
 import csv
 import datetime as DT
+from itertools import islice
 
 from django.db import models
+from django.db.models import Prefetch, QuerySet, prefetch_related_objects
 from django.utils.timezone import get_current_timezone
 from django.utils.translation import override, activate, gettext
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
@@ -15,22 +17,25 @@ from signbank.settings.server_specific import (LANGUAGES, LEFT_DOUBLE_QUOTE_PATT
                                                HANDEDNESS_ARTICULATION_FIELDS, HANDSHAPE_ETYMOLOGY_FIELDS)
 from signbank.dictionary.models import (Dataset, Gloss,
                                         Handshape, DerivationHistory, Keyword, SemanticField, GlossRevision,
-                                        ExampleSentence, Translation, FieldChoice,
+                                        ExampleSentence, Translation, FieldChoice, Definition,
                                         Sense, GlossSense, SenseTranslation, ExampleSentenceTranslation)
 from signbank.dictionary.consistency_senses import check_consistency_senses
 from signbank.dictionary.update_senses_mapping import add_sense_to_revision_history
 
 from tagging.models import Tag, TaggedItem
 
+# the number of objects of a CSV export that are fetched from the database at a time
+CSV_EXPORT_CHUNK_SIZE = 500
 
-def add_sentence_to_revision_history(request, gloss, old_value, new_value):
+
+def add_sentence_to_revision_history(user, gloss, old_value, new_value):
     # add update sentence to revision history, indicated by both old and new values
     sentence_label = 'Sentence'
     revision = GlossRevision(old_value=old_value,
                              new_value=new_value,
                              field_name=sentence_label,
                              gloss=gloss,
-                             user=request.user,
+                             user=user,
                              time=DT.datetime.now(tz=get_current_timezone()))
     revision.save()
 
@@ -100,6 +105,11 @@ def sense_examplesentences_for_language(gloss, language):
                 continue
         gloss_senses[order] = sense
 
+    return sense_examplesentences_display(gloss_senses, language)
+
+
+def sense_examplesentences_display(gloss_senses, language):
+    # the related objects are iterated with all() so prefetched example sentences are used
     activate(LANGUAGES[0][0])
     sentences_display_list = []
     for order in gloss_senses.keys():
@@ -107,7 +117,9 @@ def sense_examplesentences_for_language(gloss, language):
         example_sentences = sense.exampleSentences.all()
         list_of_sentences = []
         for examplesentence in example_sentences:
-            examplesentence_translations = examplesentence.examplesentencetranslation_set.filter(language=language)
+            examplesentence_translations = [examplesentence_translation for examplesentence_translation
+                                            in examplesentence.examplesentencetranslation_set.all()
+                                            if examplesentence_translation.language_id == language.id]
             for sentence in examplesentence_translations:
                 sentence_type_display = examplesentence.sentenceType.name if examplesentence.sentenceType else '-'
                 sentence_tuple = (str(examplesentence.id), sentence_type_display, str(examplesentence.negative), sentence.text)
@@ -412,10 +424,10 @@ def csv_update_sentences(request, gloss, language, new_sentences_string, update=
         sentence_translation.text = sentence_dict['sentence_text']
         sentence_translation.save()
     new_example_sentence = str(examplesentence)
-    add_sentence_to_revision_history(request, gloss, old_example_sentence, new_example_sentence)
+    add_sentence_to_revision_history(request.user, gloss, old_example_sentence, new_example_sentence)
 
 
-def csv_create_sentence(request, gloss, dataset_languages, sentence_to_create, create=False):
+def csv_create_sentence(user, gloss, dataset_languages, sentence_to_create, create=False):
     """CSV Import Update the senses field"""
     if DEBUG_CSV:
         print('call to csv_create_sentence: ', gloss, str(gloss.id), sentence_to_create)
@@ -462,7 +474,7 @@ def csv_create_sentence(request, gloss, dataset_languages, sentence_to_create, c
         sentence_translation.save()
 
     new_example_sentence = str(examplesentence)
-    add_sentence_to_revision_history(request, gloss, "", new_example_sentence)
+    add_sentence_to_revision_history(user, gloss, "", new_example_sentence)
 
 
 def sense_translations_for_language(gloss, language):
@@ -488,19 +500,25 @@ def sense_translations_for_language(gloss, language):
             print(gloss, str(gloss.id), order, sense)
         gloss_senses[order] = sense
 
+    return sense_translations_display(gloss, gloss_senses, language)
+
+
+def sense_translations_display(gloss, gloss_senses, language):
+    # the related objects are iterated with all() so prefetched sense translations are used
     translations_per_language = []
     for order, sense in gloss_senses.items():
-        sensetranslations = sense.senseTranslations.filter(language=language)
-        if not sensetranslations.count():
+        sensetranslations = sorted([sensetranslation for sensetranslation in sense.senseTranslations.all()
+                                    if sensetranslation.language_id == language.id], key=lambda st: st.pk)
+        if not sensetranslations:
             if DEBUG_CSV:
                 print('No sensetranslation object for ', gloss, ' ( ', str(gloss.id), ') ', language)
             continue
-        elif sensetranslations.count() > 1:
+        elif len(sensetranslations) > 1:
             if DEBUG_CSV:
                 print('Multiple sensetranslation objects for ', gloss, ' ( ', str(gloss.id), ') ', sensetranslations)
-        sensetranslation = sensetranslations.first()
+        sensetranslation = sensetranslations[0]
         keywords_list = []
-        translations = sensetranslation.translations.all().order_by('index')
+        translations = sorted(sensetranslation.translations.all(), key=lambda t: t.index)
         for translation in translations:
             keywords_list.append(translation.translation.text)
         if keywords_list:
@@ -516,6 +534,20 @@ def sense_translations_for_language(gloss, language):
     return sense_translations
 
 
+def gloss_senses_for_csv(gloss):
+    """The senses of the gloss by order, using the prefetched gloss senses of a CSV export"""
+    glosssenses = sorted(gloss.glosssense_set.all(), key=lambda gs: gs.order)
+    orders = [gs.order for gs in glosssenses]
+    if len(orders) != len(set(orders)):
+        # duplicate senses without translations are removed, as sense_translations_for_language does
+        check_consistency_senses(gloss, delete_empty=True)
+        glosssenses = GlossSense.objects.filter(gloss=gloss).order_by('order')
+    gloss_senses = dict()
+    for gs in glosssenses:
+        gloss_senses[gs.order] = gs.sense
+    return gloss_senses
+
+
 def update_senses_parse(new_senses_string):
     """CSV Import Update check the parsing of the senses field"""
 
@@ -709,6 +741,52 @@ def required_csv_columns(dataset_languages, create_or_update='create_gloss'):
     return required_columns, language_fields, optional_columns
 
 
+def objects_in_chunks(query_set, prefetch_lookups=(), chunk_size=CSV_EXPORT_CHUNK_SIZE):
+    """Generate lists of at most chunk_size objects of a query set or list, with the related objects prefetched
+    The query set is not evaluated as a whole, so only one chunk of objects is in memory at a time"""
+    if isinstance(query_set, QuerySet):
+        objects = query_set.iterator(chunk_size=chunk_size)
+    else:
+        objects = iter(query_set)
+    while True:
+        chunk = list(islice(objects, chunk_size))
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, *prefetch_lookups)
+        yield chunk
+
+
+def related_field_lookups(fields):
+    # the choice list, handshape and many to many fields of the exported columns
+    return [f.name for f in fields if isinstance(f, (models.ForeignKey, models.ManyToManyField))]
+
+
+def gloss_csv_prefetches(fields):
+    return related_field_lookups(fields) + [
+        'lemma__dataset__default_language', 'lemma__lemmaidglosstranslation_set', 'annotationidglosstranslation_set',
+        'dialect__signlanguage', Prefetch('definition_set', queryset=Definition.objects.select_related('role')),
+        Prefetch('glosssense_set', queryset=GlossSense.objects.select_related('sense').order_by('order')),
+        'glosssense_set__sense__senseTranslations__translations__translation',
+        'glosssense_set__sense__exampleSentences__sentenceType',
+        'glosssense_set__sense__exampleSentences__examplesentencetranslation_set']
+
+
+def first_translation_text(translations, language):
+    # the translations are iterated so prefetched translations are used, the first one has the lowest pk
+    translations_of_language = [translation for translation in translations if translation.language_id == language.id]
+    if not translations_of_language:
+        return ""
+    return min(translations_of_language, key=lambda translation: translation.pk).text
+
+
+def tag_names_of_objects(object_ids):
+    """Dictionary of object id to the names of its tags, as shown in the CSV export"""
+    tag_names = {}
+    for tagged_item in TaggedItem.objects.filter(object_id__in=object_ids).select_related('tag'):
+        tag_names.setdefault(tagged_item.object_id, []).append(str(tagged_item.tag).replace('_', ' '))
+    return tag_names
+
+
 def csv_header_row_glosslist(dataset_languages):
 
     fieldnames = FIELDS['main'] + FIELDS['phonology'] + FIELDS['semantics'] + FIELDS['frequency'] + ['inWeb', 'isNew']
@@ -738,34 +816,29 @@ def csv_header_row_glosslist(dataset_languages):
     return header
 
 
-def csv_gloss_to_row(gloss, dataset_languages, fields):
+def csv_gloss_to_row(gloss, dataset_languages, fields, tag_names_of_gloss=None):
 
     row = [str(gloss.pk), gloss.lemma.dataset.acronym]
     for language in dataset_languages:
-        lemmaidglosstranslations = gloss.lemma.lemmaidglosstranslation_set.filter(language=language)
-        if lemmaidglosstranslations.count() > 0:
-            # get rid of any invisible characters at the end such as \t
-            lemmatranslation = lemmaidglosstranslations.first().text.strip()
-            row.append(lemmatranslation)
-        else:
-            row.append("")
+        lemmatranslation = first_translation_text(gloss.lemma.lemmaidglosstranslation_set.all(), language)
+        # get rid of any invisible characters at the end such as \t
+        row.append(lemmatranslation.strip())
     for language in dataset_languages:
-        annotationidglosstranslations = gloss.annotationidglosstranslation_set.filter(language=language)
-        if annotationidglosstranslations.count() > 0:
-            # get rid of any invisible characters at the end such as \t
-            annotation = annotationidglosstranslations.first().text.strip()
-            row.append(annotation)
-        else:
-            row.append("")
+        annotation = first_translation_text(gloss.annotationidglosstranslation_set.all(), language)
+        # get rid of any invisible characters at the end such as \t
+        row.append(annotation.strip())
+
+    gloss_senses = gloss_senses_for_csv(gloss)
 
     # Put senses (keywords) per language in a cell
     for language in dataset_languages:
-        gloss_senses_of_language = sense_translations_for_language(gloss, language)
+        gloss_senses_of_language = sense_translations_display(gloss, gloss_senses, language) if gloss_senses else ""
         row.append(gloss_senses_of_language)
 
     # Put example sentences per language in a cell
     for language in dataset_languages:
-        gloss_example_sentences_of_language = sense_examplesentences_for_language(gloss, language)
+        gloss_example_sentences_of_language = sense_examplesentences_display(gloss_senses, language) \
+            if gloss_senses else ""
         row.append(gloss_example_sentences_of_language)
 
     for f in fields:
@@ -841,12 +914,8 @@ def csv_gloss_to_row(gloss, dataset_languages, fields):
     row.append(relations_categories)
 
     # export tags
-    tags_of_gloss = TaggedItem.objects.filter(object_id=gloss.id)
-    tag_names_of_gloss = []
-    for t_obj in tags_of_gloss:
-        tag_id = t_obj.tag_id
-        tag_name = Tag.objects.get(id=tag_id)
-        tag_names_of_gloss += [str(tag_name).replace('_', ' ')]
+    if tag_names_of_gloss is None:
+        tag_names_of_gloss = tag_names_of_objects([gloss.id]).get(gloss.id, [])
 
     tag_names = ", ".join(tag_names_of_gloss)
     row.append(tag_names)
@@ -879,6 +948,14 @@ def csv_gloss_to_row(gloss, dataset_languages, fields):
     return safe_row
 
 
+def csv_gloss_rows(query_set, dataset_languages, fields):
+    """Generate the CSV rows of the glosses, the related objects are fetched per chunk of glosses"""
+    for glosses in objects_in_chunks(query_set, gloss_csv_prefetches(fields)):
+        tag_names = tag_names_of_objects([gloss.id for gloss in glosses])
+        for gloss in glosses:
+            yield csv_gloss_to_row(gloss, dataset_languages, fields, tag_names.get(gloss.id, []))
+
+
 def csv_header_row_morphemelist(dataset_languages, fields):
 
     lang_attr_name = 'name_' + DEFAULT_KEYWORDS_LANGUAGE['language_code_2char']
@@ -903,15 +980,12 @@ def csv_morpheme_to_row(gloss, dataset_languages, fields):
     row = [str(gloss.pk)]
 
     for language in dataset_languages:
-        annotationidglosstranslations = gloss.annotationidglosstranslation_set.filter(language=language)
-        if annotationidglosstranslations.count() > 0:
-            row.append(annotationidglosstranslations.first().text)
-        else:
-            row.append("")
+        row.append(first_translation_text(gloss.annotationidglosstranslation_set.all(), language))
 
     # get keywords
     for language in dataset_languages:
-        keywords = [t.translation.text for t in gloss.translation_set.filter(language=language).order_by('index')]
+        keywords = [t.translation.text for t in sorted(gloss.translation_set.all(), key=lambda t: t.index)
+                    if t.language_id == language.id]
         row.append(", ".join(keywords))
 
     for f in fields:
@@ -950,6 +1024,16 @@ def csv_morpheme_to_row(gloss, dataset_languages, fields):
     return safe_row
 
 
+def csv_morpheme_rows(query_set, dataset_languages, fields):
+    """Generate the CSV rows of the morphemes, the related objects are fetched per chunk of morphemes"""
+    prefetch_lookups = related_field_lookups(fields) + ['annotationidglosstranslation_set',
+                                                        'translation_set__translation',
+                                                        'glosses_containing__parent_gloss__wordClass']
+    for morphemes in objects_in_chunks(query_set, prefetch_lookups):
+        for morpheme in morphemes:
+            yield csv_morpheme_to_row(morpheme, dataset_languages, fields)
+
+
 def csv_header_row_handshapelist(fields):
 
     activate(LANGUAGES[0][0])
@@ -999,6 +1083,13 @@ def csv_handshape_to_row(handshape, fields):
     return safe_row
 
 
+def csv_handshape_rows(query_set, fields):
+    """Generate the CSV rows of the handshapes, the field choices are fetched per chunk of handshapes"""
+    for handshapes in objects_in_chunks(query_set, related_field_lookups(fields)):
+        for handshape in handshapes:
+            yield csv_handshape_to_row(handshape, fields)
+
+
 def csv_header_row_lemmalist(dataset_languages):
 
     lang_attr_name = 'name_' + DEFAULT_KEYWORDS_LANGUAGE['language_code_2char']
@@ -1014,11 +1105,7 @@ def csv_header_row_lemmalist(dataset_languages):
 def csv_lemma_to_row(lemma, dataset_languages):
     row = [str(lemma.pk), lemma.dataset.acronym]
     for language in dataset_languages:
-        lemmaidglosstranslations = lemma.lemmaidglosstranslation_set.filter(language=language)
-        if lemmaidglosstranslations.count() > 0:
-            row.append(lemmaidglosstranslations.first().text)
-        else:
-            row.append("")
+        row.append(first_translation_text(lemma.lemmaidglosstranslation_set.all(), language))
     row.append(str(lemma.num_gloss))
     # Make it safe for weird chars
     safe_row = []
@@ -1030,13 +1117,36 @@ def csv_lemma_to_row(lemma, dataset_languages):
     return safe_row
 
 
-def minimalpairs_focusgloss(gloss_id, language_code):
+def csv_lemma_rows(query_set, dataset_languages):
+    """Generate the CSV rows of the lemmas, the translations are fetched per chunk of lemmas"""
+    for lemmas in objects_in_chunks(query_set, ['dataset', 'lemmaidglosstranslation_set']):
+        for lemma in lemmas:
+            yield csv_lemma_to_row(lemma, dataset_languages)
+
+
+def annotation_text_for_language(gloss, language_code):
+    # iterate over all the annotations so prefetched annotations are used
+    annotations = gloss.annotationidglosstranslation_set.all()
+    for annotation in annotations:
+        if annotation.language.language_code_2char == language_code:
+            return annotation.text
+    for annotation in annotations:
+        if annotation.language.language_code_3char == 'eng':
+            return annotation.text
+    return ""
+
+
+def minimalpairs_focusgloss(gloss_id, language_code, minimalpairs_index=None):
 
     activate(language_code)
 
     this_gloss = Gloss.objects.get(id=gloss_id)
 
-    minimalpairs_objects = this_gloss.minimal_pairs_dict()
+    if minimalpairs_index is not None:
+        # the index of the dataset is shared by all the focus glosses of the export
+        minimalpairs_objects = minimalpairs_index.minimal_pairs_dict(this_gloss)
+    else:
+        minimalpairs_objects = this_gloss.minimal_pairs_dict()
 
     result = []
     for minimalpairs_object, minimal_pairs_dict in minimalpairs_objects.items():
@@ -1088,16 +1198,7 @@ def minimalpairs_focusgloss(gloss_id, language_code):
             other_gloss_dict['other_gloss_value'] = other_gloss_value
             other_gloss_dict['field_kind'] = field_kind
 
-        translation = ""
-        translations = minimalpairs_object.annotationidglosstranslation_set.filter(language__language_code_2char=language_code)
-        if translations.count() > 0:
-            translation = translations.first().text
-        else:
-            translations = minimalpairs_object.annotationidglosstranslation_set.filter(language__language_code_3char='eng')
-            if translations.count() > 0:
-                translation = translations.first().text
-
-        other_gloss_dict['other_gloss_idgloss'] = translation
+        other_gloss_dict['other_gloss_idgloss'] = annotation_text_for_language(minimalpairs_object, language_code)
         result.append(other_gloss_dict)
     return result
 
@@ -1114,18 +1215,19 @@ def csv_header_row_minimalpairslist():
     return header
 
 
-def csv_focusgloss_to_minimalpairs(focusgloss, dataset, language_code, csv_rows):
+def csv_focusgloss_to_minimalpairs(focusgloss, dataset, language_code, csv_rows, minimalpairs_index=None):
 
     focus_gloss_columns = [dataset.acronym]
 
-    translations_gloss = focusgloss.annotationidglosstranslation_set.filter(
-        language__language_code_2char=language_code)
-    translation_focus_gloss = translations_gloss.first().text if translations_gloss.count() > 0 else ""
+    translations_gloss = sorted([translation for translation in focusgloss.annotationidglosstranslation_set.all()
+                                 if translation.language.language_code_2char == language_code],
+                                key=lambda translation: translation.pk)
+    translation_focus_gloss = translations_gloss[0].text if translations_gloss else ""
 
     focus_gloss_columns.append(translation_focus_gloss)
     focus_gloss_columns.append(str(focusgloss.pk))
 
-    minimal_pairs = minimalpairs_focusgloss(focusgloss.pk, language_code)
+    minimal_pairs = minimalpairs_focusgloss(focusgloss.pk, language_code, minimalpairs_index)
 
     if minimal_pairs:
         for mpd in minimal_pairs:
@@ -1152,6 +1254,13 @@ def csv_focusgloss_to_minimalpairs(focusgloss, dataset, language_code, csv_rows)
     return csv_rows
 
 
+def csv_minimalpairs_rows(query_set, dataset, language_code, minimalpairs_index=None):
+    """Generate the CSV rows of the minimal pairs of the focus glosses, per chunk of focus glosses"""
+    for focusglosses in objects_in_chunks(query_set, ['annotationidglosstranslation_set__language']):
+        for focusgloss in focusglosses:
+            yield from csv_focusgloss_to_minimalpairs(focusgloss, dataset, language_code, [], minimalpairs_index)
+
+
 def normalize_boolean(gloss_field, new_boolean, original_boolean):
     # return 'True', 'False', 'None' depending on field type
     # original value returned if there is no match
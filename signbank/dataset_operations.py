@@ -12,6 +12,7 @@ from signbank.video.models import (GlossVideo, GlossVideoNME, GlossVideoPerspect
 from signbank.video.convertvideo import video_file_type_extension
 from signbank.video.operations import (filename_matches_backup_video, flattened_video_path)
 from signbank.tools import get_two_letter_dir, get_checksum_for_path
+from signbank.video.inventory import media_files_of_dataset, media_file_paths
 
 
 def video_type(glossvideo):
@@ -287,9 +288,14 @@ def gloss_video_filename_check(dataset):
         folder_pattern = GLOSS_VIDEO_DIRECTORY + os.sep + dataset.acronym + os.sep + two_letter_dir
         folder_not_in_filename = [gv for gv in glossvideos if folder_pattern not in str(gv.videofile)]
         if folder_not_in_filename:
-            list_videos = [(gv.version, str(gv.videofile), path_exists(str(gv.videofile))) for gv in folder_not_in_filename]
+            list_videos = [(gv.version, str(gv.videofile)) for gv in folder_not_in_filename]
             wrong_folder.append((gloss, list_videos))
 
+    # whether the files exist is looked up in the media inventory at once
+    existing_paths = media_file_paths(path for gloss, list_videos in wrong_folder for version, path in list_videos)
+    wrong_folder = [(gloss, [(version, path, path in existing_paths) for version, path in list_videos])
+                    for gloss, list_videos in wrong_folder]
+
     results['glosses_with_weird_filenames'] = glosses_with_weird_filenames
     results['non_mp4_videos'] = non_mp4_videos
     results['wrong_folder'] = wrong_folder
@@ -298,36 +304,31 @@ def gloss_video_filename_check(dataset):
 
 
 def find_unlinked_video_files(dataset, linked_file_names):
-    """Return list of file_names that are not found in file list of db"""
-
-    dataset_folder = str(os.path.join(WRITABLE_FOLDER, GLOSS_VIDEO_DIRECTORY, dataset.acronym))
+    """Return list of file_names that are not found in file list of db
+    The files of the dataset are taken from the media inventory, see signbank.video.inventory"""
 
+    linked_file_names = set(linked_file_names)
     unlinked_video_filenames = []
 
-    for subdir, dirs, files in os.walk(dataset_folder):
-        for file in files:
-            filename_string = str(file)
-            if filename_string in ['.DS_Store'] or filename_string.endswith('.icloud'):
-                # Signbank is running on macOS
-                # this is a macOS icons file or an iCloud sync file, ignore it
-                continue
-            if filename_string.endswith('.bak') or re.search(r"\.bak\d+$", filename_string):
-                # ignore backup files since they aren't viewable as protected media
-                continue
-            filename, ext = os.path.splitext(file)
-            filename_without_extension = str(filename)
-            # ignore small and subclass videos
-            if (filename_without_extension.endswith('_small')
-                    or filename_without_extension.endswith('_left')
-                    or filename_without_extension.endswith('_right')
-                    or filename_without_extension.endswith('_center')
-                    or re.search(r"_nme_\d+$", filename_without_extension)):
-                continue
-            two_char_folder = os.path.basename(subdir)
-            # obtain a relative path using os.path.join
-            relative_path = str(os.path.join(GLOSS_VIDEO_DIRECTORY, dataset.acronym, two_char_folder, file))
-            if relative_path not in linked_file_names:
-                unlinked_video_filenames.append(relative_path)
+    for relative_path in media_files_of_dataset(dataset).order_by('path').values_list('path', flat=True):
+        filename_string = os.path.basename(relative_path)
+        if filename_string in ['.DS_Store'] or filename_string.endswith('.icloud'):
+            # Signbank is running on macOS
+            # this is a macOS icons file or an iCloud sync file, ignore it
+            continue
+        if filename_string.endswith('.bak') or re.search(r"\.bak\d+$", filename_string):
+            # ignore backup files since they aren't viewable as protected media
+            continue
+        filename_without_extension, ext = os.path.splitext(filename_string)
+        # ignore small and subclass videos
+        if (filename_without_extension.endswith('_small')
+                or filename_without_extension.endswith('_left')
+                or filename_without_extension.endswith('_right')
+                or filename_without_extension.endswith('_center')
+                or re.search(r"_nme_\d+$", filename_without_extension)):
+            continue
+        if relative_path not in linked_file_names:
+            unlinked_video_filenames.append(relative_path)
 
     return unlinked_video_filenames
 
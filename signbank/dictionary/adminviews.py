@@ -6,6 +6,7 @@ import re
 import mimetypes
 import datetime as DT
 from datetime import timedelta
+from collections import defaultdict
 
 from django.core.files.base import File
 from django.views.generic.list import ListView
@@ -14,15 +15,14 @@ from django.core.paginator import Paginator
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 from django.db.models import F, ExpressionWrapper, IntegerField
 from django.db.models import OuterRef, Subquery
-from django.db.models.query import QuerySet
-from django.db.models.functions import Concat
-from django.db.models import Q, Count, CharField, Value as V, Prefetch
+from django.db.models.functions import Concat, Coalesce, NullIf
+from django.db.models import Q, Count, CharField, Value as V, Prefetch, Case, When
 from django.db.models.fields import BooleanField
 from django.http import (HttpResponse, HttpResponseRedirect, HttpResponseForbidden,
                          QueryDict, JsonResponse, StreamingHttpResponse, Http404, HttpResponseBadRequest)
 from django.urls import reverse_lazy, reverse
 from django.core.exceptions import PermissionDenied, ObjectDoesNotExist, MultipleObjectsReturned, ValidationError
-from django.utils.translation import override, gettext, gettext_lazy as _, activate
+from django.utils.translation import override, gettext, gettext_lazy as _, activate, get_language
 from django.utils import html
 from django.db import models
 from django.db.transaction import atomic
@@ -31,6 +31,7 @@ from django.contrib import messages
 from django.contrib.sites.models import Site
 from django.contrib.auth.models import User, Group
 from django.utils.safestring import mark_safe
+from django.utils.encoding import escape_uri_path
 from django.utils.timezone import get_current_timezone
 from django.core.mail import send_mail
 
@@ -38,8 +39,10 @@ from guardian.core import ObjectPermissionChecker
 from guardian.shortcuts import get_objects_for_user, assign_perm, remove_perm
 
 from tagging.models import Tag, TaggedItem
+from django.contrib.contenttypes.models import ContentType
 from urllib.parse import urlencode
 
+from signbank.settings.base import SUPPORTED_CITATION_IMAGE_EXTENSIONS
 from signbank.settings.server_specific import (URL, PREFIX_URL, LANGUAGE_CODE, LANGUAGES_LANGUAGE_CODE_3CHAR,
                                                DEFAULT_KEYWORDS_LANGUAGE, SPEED_UP_RETRIEVING_ALL_SIGNS,
                                                RECENTLY_ADDED_SIGNS_PERIOD, DEFAULT_FROM_EMAIL,
@@ -58,7 +61,8 @@ from signbank.video.forms import VideoUploadForObjectForm
 from signbank.video.convertvideo import get_folder_name, extension_on_filename, detect_video_file_extension
 from signbank.video.models import (GlossVideo, find_dangling_video_files, delete_glossvideo_objects_and_files,
                                    renumber_backup_videos, remove_backup_videos, remove_duplicate_videos,
-                                   weedout_duplicate_backup_videos, flipped_backup_filename)
+                                   weedout_duplicate_backup_videos, flipped_backup_filename,
+                                   get_gloss_path_to_video_file_on_disk)
 from signbank.communication.models import generate_communication
 from signbank.dictionary.models import (Dataset, UserProfile, AffiliatedUser, AffiliatedGloss,
                                         Language, Dialect, Gloss, Morpheme, GlossSense, Sense, GLOSS_FIELDS_UPDATES, PHONOLOGY_FIELDS_UPDATES,
@@ -68,7 +72,7 @@ from signbank.dictionary.models import (Dataset, UserProfile, AffiliatedUser, Af
                                         SenseTranslation, SearchHistory, SemanticField,
                                         DerivationHistory, BlendMorphology, MorphologyDefinition, SimultaneousMorphologyDefinition,
                                         FieldChoice, FieldChoiceForeignKey, get_default_language_id, fieldname_to_kind,
-                                        CATEGORY_MODELS_MAPPING, ExampleSentence, PhonologicalVariation)
+                                        CATEGORY_MODELS_MAPPING, ExampleSentence, PhonologicalVariation, Relation)
 from signbank.dictionary.translate_choice_list import (machine_value_to_translated_human_value,
                                                        choicelist_queryset_to_translated_dict,
                                                        choicelist_queryset_to_machine_value_dict,
@@ -89,14 +93,16 @@ from signbank.dictionary.forms import (AnnotatedSentenceSearchForm, GlossSearchF
                                        GlossForeignRelationForm, OtherMediaUpdateForm,
                                        check_language_fields_annotatedsentence, GlossProvenanceForm, check_sortOrder_handshapes)
 from signbank.tools import (write_ecv_file_for_dataset, find_duplicate_lemmas,
-                            construct_scrollbar, get_dataset_languages, get_datasets_with_public_glosses,
+                            construct_scrollbar, store_search_results, get_search_results, get_search_result_ids,
+                            keep_search_results_of_type, search_results_window, SEARCH_RESULTS_WINDOW,
+                            get_dataset_languages, get_datasets_with_public_glosses,
                             searchform_panels, map_search_results_to_gloss_list,
                             get_interface_language_and_default_language_codes, get_default_annotationidglosstranslation,
                             get_page_parameters_for_listview, filter_page_values, add_gloss_update_to_revision_history,)
-from signbank.csv_interface import (csv_gloss_to_row, csv_header_row_glosslist, csv_header_row_morphemelist,
-                                    csv_morpheme_to_row, csv_header_row_handshapelist, csv_handshape_to_row,
-                                    csv_header_row_lemmalist, csv_lemma_to_row,
-                                    csv_header_row_minimalpairslist, csv_focusgloss_to_minimalpairs)
+from signbank.csv_interface import (csv_gloss_rows, csv_header_row_glosslist, csv_header_row_morphemelist,
+                                    csv_morpheme_rows, csv_header_row_handshapelist, csv_handshape_rows,
+                                    csv_header_row_lemmalist, csv_lemma_rows,
+                                    csv_header_row_minimalpairslist, csv_minimalpairs_rows, first_translation_text)
 from signbank.dictionary.consistency_senses import consistent_senses, check_consistency_senses, \
     reorder_sensetranslations, reorder_senses
 from signbank.query_parameters import (convert_query_parameters_to_filter, pretty_print_query_fields,
@@ -122,6 +128,7 @@ from signbank.dictionary.frequency_display import (collect_speaker_age_data, col
                                                    collect_variants_age_sex_raw_percentage)
 from signbank.dictionary.senses_display import (senses_per_language, senses_per_language_list,
                                                 sensetranslations_per_language_dict,
+                                                sensetranslations_per_language_dict_prefetched,
                                                 senses_translations_per_language_list,
                                                 senses_sentences_per_language_list)
 from signbank.dictionary.context_data import (get_context_data_for_list_view, get_context_data_for_gloss_search_form,
@@ -137,12 +144,14 @@ from signbank.dictionary.related_objects import (morpheme_is_related_to, gloss_i
                                                  okay_to_move_gloss, same_translation_languages, okay_to_move_glosses,
                                                  transitive_related_objects)
 from signbank.manage_videos import listing_uploaded_videos
+from signbank.video.inventory import dataset_media_summary
 from signbank.zip_interface import uploaded_zip_archives
 from signbank.relation_tools import ensure_synonym_transitivity
 from signbank.dataset_operations import (get_primary_videos_for_gloss, get_perspective_videos_for_gloss,
                                          get_nme_videos_for_gloss, get_wrong_videos_for_gloss,
                                          get_backup_videos_for_gloss)
 from signbank.dictionary.display_functions import show_fields_rows
+from signbank.dictionary.phonology_signatures import MinimalPairsIndex, homonym_groups
 
 
 def order_annotatedsentence_queryset_by_sort_order(get, qs, queryset_language_codes):
@@ -251,28 +260,31 @@ def order_queryset_by_sort_order(get, qs, queryset_language_codes):
     Its value is changed by clicking the up/down buttons in the second row of the search result table
     """
 
-    # Helper: order a queryset on field [sOrder], which is a number from a list of tuples named [sListName]
-    def order_queryset_by_tuple_list(qs, sOrder, sListName, bReversed):
-        """Order a queryset on field [sOrder], which is a number from a list of tuples named [sListName]"""
+    # Helper: order a queryset on the name of the choice list or handshape field [sOrder]
+    def order_queryset_by_choice_name(qs, sOrder, bReversed):
+        """Order a queryset on the translated name of the choice of field [sOrder], in the database
+        Unset choices and the machine value 0 and 1 choices are put at the end of an ascending order"""
 
-        # Get a list of tuples for this sort-order
-        tpList = list(FieldChoice.objects.filter(field=sListName).values_list('machine_value', 'name'))
-        # Determine sort order: ascending is default
         if sOrder[0:1] == '-':
             # A starting '-' sign means: descending order
             sOrder = sOrder[1:]
-        def lambda_sort_tuple(x, bReversed):
-            # Order by the string-values in the tuple list
-            getattr_sOrder = getattr(x, sOrder)
-            if getattr_sOrder is None:
-                # if the field is not set, use the machine value 0 choice
-                return True, dict(tpList)[0]
-            elif getattr_sOrder.machine_value in [0, 1]:
-                return True, dict(tpList)[getattr_sOrder.machine_value]
-            else:
-                return bReversed, dict(tpList)[getattr(x, sOrder).machine_value]
-
-        return sorted(qs, key=lambda x: lambda_sort_tuple(x, bReversed), reverse=bReversed)
+        choice_model = qs.model._meta.get_field(sOrder).related_model
+        name_languagecode = 'name_' + get_language().replace('-', '_')
+        choice_name = Coalesce(NullIf(F(sOrder + '__' + name_languagecode), V('')), F(sOrder + '__name'))
+        # if the field is not set, use the name of the machine value 0 choice
+        unset_choices = choice_model.objects.filter(machine_value=0)
+        if choice_model == FieldChoice:
+            unset_choices = unset_choices.filter(field=qs.model._meta.get_field(sOrder).field_choice_category)
+        unset_name = Subquery(unset_choices.annotate(
+            unset_name=Coalesce(NullIf(F(name_languagecode), V('')), F('name'))).values('unset_name')[:1])
+        qs = qs.annotate(
+            sort_choice_unset=Case(When(Q(**{sOrder + '__isnull': True}) | Q(**{sOrder + '__machine_value__in': [0, 1]}),
+                                        then=V(True)),
+                                   default=V(bReversed), output_field=BooleanField()),
+            sort_choice_name=Coalesce(choice_name, unset_name))
+        if bReversed:
+            return qs.order_by('-sort_choice_unset', '-sort_choice_name', '-id')
+        return qs.order_by('sort_choice_unset', 'sort_choice_name', 'id')
 
     def order_queryset_by_annotationidglosstranslation(qs, sOrder):
         language_code_2char = sOrder[-2:]
@@ -326,15 +338,10 @@ def order_queryset_by_sort_order(get, qs, queryset_language_codes):
     # The ordering method depends on the kind of field:
     # (1) text fields are ordered straightforwardly
     # (2) fields made from a choice_list need special treatment
-    if sOrder.endswith('handedness'):
-        bText = False
-        ordered = order_queryset_by_tuple_list(qs, sOrder, "Handedness", bReversed)
-    elif sOrder.endswith('domhndsh') or sOrder.endswith('subhndsh'):
+    if sOrder.endswith('handedness') or sOrder.endswith('domhndsh') or sOrder.endswith('subhndsh') \
+            or sOrder.endswith('locprim'):
         bText = False
-        ordered = order_queryset_by_tuple_list(qs, sOrder, "Handshape", bReversed)
-    elif sOrder.endswith('locprim'):
-        bText = False
-        ordered = order_queryset_by_tuple_list(qs, sOrder, "Location", bReversed)
+        ordered = order_queryset_by_choice_name(qs, sOrder, bReversed)
     elif sOrder.startswith("annotationidglosstranslation_order_") or sOrder.startswith("-annotationidglosstranslation_order_"):
         ordered = order_queryset_by_annotationidglosstranslation(qs, sOrder)
     elif sOrder.startswith("lemmaidglosstranslation_order_") or sOrder.startswith("-lemmaidglosstranslation_order_"):
@@ -345,22 +352,22 @@ def order_queryset_by_sort_order(get, qs, queryset_language_codes):
         # Use straightforward ordering on field [sOrder]
         if default_sort_order:
             lang_attr_name = DEFAULT_KEYWORDS_LANGUAGE['language_code_2char']
-            sort_language = 'annotationidglosstranslation__language__language_code_2char'
             if len(queryset_language_codes) == 0:
                 ordered = qs
             else:
                 if lang_attr_name not in queryset_language_codes:
                     lang_attr_name = queryset_language_codes[0]
 
-                qs_empty = qs.filter(**{sOrder+'__isnull': True})
-                qs_letters = qs.filter(**{sOrder+'__regex': r'^[a-zA-Z]', sort_language: lang_attr_name})
-                qs_special = qs.filter(**{sOrder+'__regex': r'^[^a-zA-Z]', sort_language: lang_attr_name})
-
-                # sort_key = sOrder
-                # # Using the order_by here results in duplicating the objects!
-                ordered = list(qs_letters) #.order_by(sort_key))
-                ordered += list(qs_special) #.order_by(sort_key))
-                ordered += list(qs_empty)
+                # annotations that start with a letter come first, then those starting with symbols,
+                # then glosses without an annotation in the sort language
+                # the annotation is a subquery, so the glosses are not duplicated by a join
+                sort_annotation = AnnotationIdglossTranslation.objects.filter(
+                    gloss=OuterRef('pk'), language__language_code_2char=lang_attr_name).order_by('id')
+                ordered = qs.annotate(sort_annotation_text=Subquery(sort_annotation.values('text')[:1])).annotate(
+                    sort_annotation_group=Case(When(sort_annotation_text__regex=r'^[a-zA-Z]', then=V(0)),
+                                               When(sort_annotation_text__isnull=False, then=V(1)),
+                                               default=V(2), output_field=IntegerField())
+                ).order_by('sort_annotation_group', 'sort_annotation_text', 'id')
         else:
             ordered = qs
     if bReversed and bText:
@@ -404,6 +411,24 @@ class Echo:
         return value
 
 
+def csv_streaming_response(header, rows, filename):
+    """Stream a CSV file, the rows are generated while the response is being sent"""
+    # this is based on an example in the Django 4.2 documentation
+    pseudo_buffer = Echo()
+    new_writer = csv.writer(pseudo_buffer)
+
+    def csv_lines():
+        yield new_writer.writerow(header).encode('utf-8')
+        for row in rows:
+            yield new_writer.writerow(row).encode('utf-8')
+
+    return StreamingHttpResponse(
+        csv_lines(),
+        content_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="' + filename + '"'},
+    )
+
+
 class AnnotatedSentenceListView(ListView):
     model = AnnotatedSentence
     template_name = 'dictionary/admin_annotatedsentence_list.html'
@@ -661,7 +686,7 @@ class GlossListView(ListView):
             # this is GlossListView, show a scrollbar for Glosses from a previous search
             self.search_type = 'sign'
         items = construct_scrollbar(list_of_objects, self.search_type, lang_attr_name)
-        self.request.session['search_results'] = items
+        store_search_results(self.request, items)
 
         if 'paginate_by' in self.request.GET:
             context['paginate_by'] = int(self.request.GET.get('paginate_by'))
@@ -763,28 +788,15 @@ class GlossListView(ListView):
         dataset_languages = get_dataset_languages(selected_datasets)
 
         header = csv_header_row_glosslist(dataset_languages)
-        csv_rows = [header]
 
         if self.object_list:
             query_set = self.object_list
         else:
             query_set = self.get_queryset()
 
-        if isinstance(query_set, QuerySet):
-            query_set = list(query_set)
-
-        for gloss in query_set:
-            safe_row = csv_gloss_to_row(gloss, dataset_languages, fields)
-            csv_rows.append(safe_row)
-
-        # this is based on an example in the Django 4.2 documentation
-        pseudo_buffer = Echo()
-        new_writer = csv.writer(pseudo_buffer)
-        return StreamingHttpResponse(
-            (new_writer.writerow(row) for row in csv_rows),
-            content_type="text/csv",
-            headers={"Content-Disposition": 'attachment; filename="dictionary-export.csv"'},
-        )
+        # the rows are generated from chunks of the query set while the response is streamed
+        return csv_streaming_response(header, csv_gloss_rows(query_set, dataset_languages, fields),
+                                      "dictionary-export.csv")
 
     def get_queryset(self):
         get = self.request.GET
@@ -1029,7 +1041,7 @@ class SenseListView(ListView):
             lang_attr_name = default_language_code
 
         items = construct_scrollbar(self.object_list, context['search_type'], lang_attr_name)
-        self.request.session['search_results'] = items
+        store_search_results(self.request, items)
 
         if 'paginate_by' in self.request.GET:
             context['paginate_by'] = int(self.request.GET.get('paginate_by'))
@@ -1250,13 +1262,7 @@ class GlossDetailView(DetailView):
         return self.render_to_response(context)
 
     def get_context_data(self, **kwargs):
-        if 'search_results' in self.request.session.keys():
-            search_results = self.request.session['search_results']
-        else:
-            search_results = []
-        if search_results and len(search_results) > 0:
-            if self.request.session['search_results'][0]['href_type'] not in ['gloss', 'morpheme', 'sense', 'annotatedsentence']:
-                self.request.session['search_results'] = []
+        keep_search_results_of_type(self.request, ['gloss', 'morpheme', 'sense', 'annotatedsentence'])
         if 'search_type' in self.request.session.keys():
             if self.request.session['search_type'] not in ['sign', 'sense', 'morpheme', 'annotatedsentence',
                                                            'sign_or_morpheme', 'sign_handshape']:
@@ -1827,13 +1833,7 @@ class GlossVideosView(DetailView):
         return self.render_to_response(context)
 
     def get_context_data(self, **kwargs):
-        if 'search_results' in self.request.session.keys():
-            search_results = self.request.session['search_results']
-        else:
-            search_results = []
-        if search_results and len(search_results) > 0:
-            if self.request.session['search_results'][0]['href_type'] not in ['gloss', 'morpheme', 'annotatedsentence']:
-                self.request.session['search_results'] = []
+        keep_search_results_of_type(self.request, ['gloss', 'morpheme', 'annotatedsentence'])
         if 'search_type' in self.request.session.keys():
             if self.request.session['search_type'] not in ['sign', 'morpheme', 'annotatedsentence',
                                                            'sign_or_morpheme', 'sign_handshape']:
@@ -2242,7 +2242,7 @@ class MorphemeListView(ListView):
             lang_attr_name = default_language_code
 
         items = construct_scrollbar(self.object_list, self.search_type, lang_attr_name)
-        self.request.session['search_results'] = items
+        store_search_results(self.request, items)
 
         if 'paginate_by' in self.request.GET:
             context['paginate_by'] = int(self.request.GET.get('paginate_by'))
@@ -2376,29 +2376,14 @@ class MorphemeListView(ListView):
         dataset_languages = get_dataset_languages(selected_datasets)
 
         header = csv_header_row_morphemelist(dataset_languages, fields)
-        csv_rows = [header]
 
         if self.object_list:
             query_set = self.object_list
         else:
             query_set = self.get_queryset()
 
-        if isinstance(query_set, QuerySet):
-            query_set = list(query_set)
-
-        for morpheme in query_set:
-
-            safe_row = csv_morpheme_to_row(morpheme, dataset_languages, fields)
-            csv_rows.append(safe_row)
-
-        # this is based on an example in the Django 4.2 documentation
-        pseudo_buffer = Echo()
-        new_writer = csv.writer(pseudo_buffer)
-        return StreamingHttpResponse(
-            (new_writer.writerow(row) for row in csv_rows),
-            content_type="text/csv",
-            headers={"Content-Disposition": 'attachment; filename="dictionary-morph-export.csv"'},
-        )
+        return csv_streaming_response(header, csv_morpheme_rows(query_set, dataset_languages, fields),
+                                      "dictionary-morph-export.csv")
 
 
 class HandshapeDetailView(DetailView):
@@ -2505,13 +2490,10 @@ class HandshapeDetailView(DetailView):
             self.request.session['search_type'] = self.search_type
 
         # Check the type of the current search results
-        if 'search_results' in self.request.session.keys():
-            if self.request.session['search_results'] and len(self.request.session['search_results']) > 0:
-                if self.request.session['search_results'][0]['href_type'] in ['gloss', 'morpheme', 'annotatedsentence']:
-                    # if the previous search does not match the search type
-                    self.request.session['search_results'] = []
+        # if the previous search does not match the search type
+        keep_search_results_of_type(self.request, ['handshape'])
 
-        if 'search_results' not in self.request.session.keys() or not self.request.session['search_results']:
+        if not get_search_results(self.request):
             # there are no handshapes in the scrollbar, put some there
 
             qs = Handshape.objects.filter(machine_value__gt=1).order_by('machine_value')
@@ -2528,7 +2510,7 @@ class HandshapeDetailView(DetailView):
                 lang_attr_name = default_language_code
 
             items = construct_scrollbar(qs, self.search_type, lang_attr_name)
-            self.request.session['search_results'] = items
+            store_search_results(self.request, items)
 
         context['SHOW_DATASET_INTERFACE_OPTIONS'] = SHOW_DATASET_INTERFACE_OPTIONS
         context['USE_REGULAR_EXPRESSIONS'] = USE_REGULAR_EXPRESSIONS
@@ -2698,6 +2680,7 @@ class DerivationHistoryListView(ListView):
 class HomonymListView(ListView):
     model = Gloss
     template_name = 'dictionary/admin_homonyms_list.html'
+    same_phonology_groups = dict()
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
@@ -2719,14 +2702,15 @@ class HomonymListView(ListView):
         context['SHOW_DATASET_INTERFACE_OPTIONS'] = SHOW_DATASET_INTERFACE_OPTIONS
         context['USE_REGULAR_EXPRESSIONS'] = USE_REGULAR_EXPRESSIONS
 
-        handedness_filter = 'handedness__name__in'
-        strong_hand_filter = 'domhndsh__name__in'
-        empty_value = ['-', 'N/A']
-
-        # this is used to set up the ajax calls, one per each focus gloss in the table
-        context['ids_of_all_glosses'] = [g.id for g in Gloss.none_morpheme_objects().select_related('lemma').filter(
-            lemma__dataset__in=selected_datasets).exclude(
-            (Q(**{handedness_filter: empty_value}))).exclude((Q(**{strong_hand_filter: empty_value})))]
+        # the glosses with the same phonology are looked up per homonym group, in one query for the whole page
+        grouped_gloss_ids = [gloss_id for gloss_ids in self.same_phonology_groups.values() for gloss_id in gloss_ids]
+        grouped_glosses = Gloss.objects.select_related('lemma').in_bulk(grouped_gloss_ids)
+        same_phonology = dict()
+        for gloss_ids in self.same_phonology_groups.values():
+            for gloss_id in gloss_ids:
+                same_phonology[gloss_id] = [grouped_glosses[other_gloss_id] for other_gloss_id in gloss_ids
+                                            if other_gloss_id != gloss_id and other_gloss_id in grouped_glosses]
+        context['same_phonology'] = same_phonology
 
         return context
 
@@ -2742,7 +2726,18 @@ class HomonymListView(ListView):
             lemma__dataset__in=selected_datasets).exclude(
             (Q(**{handedness_filter: empty_value}))).exclude((Q(**{strong_hand_filter: empty_value})))
 
-        return glosses_with_phonology
+        # only show glosses that have the same phonology as another gloss or that have saved homonym relations
+        self.same_phonology_groups = dict()
+        for dataset in selected_datasets:
+            self.same_phonology_groups.update(homonym_groups(dataset))
+        grouped_gloss_ids = [gloss_id for gloss_ids in self.same_phonology_groups.values() for gloss_id in gloss_ids]
+
+        homonym = FieldChoice.query('RelationRole', "Homonym")
+        glosses_with_saved_homonyms = Relation.objects.filter(role_fk__in=homonym,
+                                                              source__lemma__dataset__in=selected_datasets
+                                                              ).values('source_id')
+
+        return glosses_with_phonology.filter(Q(id__in=grouped_gloss_ids) | Q(id__in=glosses_with_saved_homonyms))
 
 
 class MinimalPairsListView(ListView):
@@ -2859,24 +2854,15 @@ class MinimalPairsListView(ListView):
         else:
             query_set = self.get_queryset()
 
-        if isinstance(query_set, QuerySet):
-            query_set = list(query_set)
-
         header = csv_header_row_minimalpairslist()
-        csv_rows = [header]
-
-        for focusgloss in query_set:
-            # multiple rows are generated for each gloss, hence the csv_rows is passed as a state variable
-            csv_rows = csv_focusgloss_to_minimalpairs(focusgloss, dataset, language_code, csv_rows)
-
-        # this is based on an example in the Django 4.2 documentation
-        pseudo_buffer = Echo()
-        new_writer = csv.writer(pseudo_buffer)
-        return StreamingHttpResponse(
-            (new_writer.writerow(row) for row in csv_rows),
-            content_type="text/csv",
-            headers={"Content-Disposition": 'attachment; filename="dictionary-export-minimalpairs.csv"'},
-        )
+
+        # the minimal pairs of all the focus glosses are looked up in one index of the dataset
+        minimalpairs_index = MinimalPairsIndex(dataset)
+
+        # multiple rows are generated for each focus gloss
+        return csv_streaming_response(header,
+                                      csv_minimalpairs_rows(query_set, dataset, language_code, minimalpairs_index),
+                                      "dictionary-export-minimalpairs.csv")
 
     def get_queryset(self):
 
@@ -2979,13 +2965,8 @@ class QueryListView(ListView):
         context['USE_REGULAR_EXPRESSIONS'] = USE_REGULAR_EXPRESSIONS
         context['GLOSS_LIST_DISPLAY_FIELDS'] = GLOSS_LIST_DISPLAY_FIELDS
 
-        if 'search_results' in self.request.session.keys():
-            search_results = self.request.session['search_results']
-        else:
-            search_results = []
-        if search_results and len(search_results) > 0:
-            if self.request.session['search_results'][0]['href_type'] not in ['gloss', 'morpheme', 'annotatedsentence']:
-                self.request.session['search_results'] = []
+        keep_search_results_of_type(self.request, ['gloss', 'morpheme', 'annotatedsentence'])
+        search_results = get_search_results(self.request)
         if 'search_type' in self.request.session.keys():
             if self.request.session['search_type'] not in ['sign', 'morpheme', 'annotatedsentence',
                                                            'sign_or_morpheme', 'sign_handshape', 'sense']:
@@ -3044,13 +3025,8 @@ class QueryListView(ListView):
 
     def get_queryset(self):
 
-        if 'search_results' in self.request.session.keys():
-            search_results = self.request.session['search_results']
-        else:
-            search_results = []
-        if search_results and len(search_results) > 0:
-            if self.request.session['search_results'][0]['href_type'] not in ['gloss', 'morpheme', 'annotatedsentence']:
-                self.request.session['search_results'] = []
+        keep_search_results_of_type(self.request, ['gloss', 'morpheme', 'annotatedsentence'])
+        search_results = get_search_results(self.request)
         if 'search_type' in self.request.session.keys():
             if self.request.session['search_type'] not in ['sign', 'morpheme', 'annotatedsentence',
                                                            'sign_or_morpheme', 'sign_handshape', 'sense']:
@@ -3125,13 +3101,7 @@ class SearchHistoryView(ListView):
 
     def get_queryset(self):
 
-        if 'search_results' in self.request.session.keys():
-            search_results = self.request.session['search_results']
-        else:
-            search_results = []
-        if search_results and len(search_results) > 0:
-            if self.request.session['search_results'][0]['href_type'] not in ['gloss', 'morpheme', 'sense', 'annotatedsentence']:
-                self.request.session['search_results'] = []
+        keep_search_results_of_type(self.request, ['gloss', 'morpheme', 'sense', 'annotatedsentence'])
         if 'search_type' in self.request.session.keys():
             if self.request.session['search_type'] not in ['sign', 'morpheme', 'annotatedsentence',
                                                            'sign_or_morpheme', 'sign_handshape', 'sense']:
@@ -3362,13 +3332,7 @@ class GlossFrequencyView(DetailView):
         # Call the base implementation first to get a context
         context = super(GlossFrequencyView, self).get_context_data(**kwargs)
 
-        if 'search_results' in self.request.session.keys():
-            search_results = self.request.session['search_results']
-        else:
-            search_results = []
-        if search_results and len(search_results) > 0:
-            if self.request.session['search_results'][0]['href_type'] not in ['gloss', 'morpheme', 'annotatedsentence']:
-                self.request.session['search_results'] = []
+        keep_search_results_of_type(self.request, ['gloss', 'morpheme', 'annotatedsentence'])
         if 'search_type' in self.request.session.keys():
             if self.request.session['search_type'] not in ['sign', 'morpheme', 'annotatedsentence',
                                                            'sign_or_morpheme', 'sign_handshape']:
@@ -3692,7 +3656,7 @@ class HandshapeListView(ListView):
             lang_attr_name = default_language_code
 
         items = construct_scrollbar(list_of_objects, self.search_type, lang_attr_name)
-        self.request.session['search_results'] = items
+        store_search_results(self.request, items)
 
         context['SHOW_DATASET_INTERFACE_OPTIONS'] = SHOW_DATASET_INTERFACE_OPTIONS
         context['USE_REGULAR_EXPRESSIONS'] = USE_REGULAR_EXPRESSIONS
@@ -3730,10 +3694,7 @@ class HandshapeListView(ListView):
         else:
             query_set = self.get_queryset()
 
-        if isinstance(query_set, QuerySet):
-            query_set = list(query_set)
-
-        if query_set and self.request.session['search_type'] == 'sign_handshape':
+        if self.request.session['search_type'] == 'sign_handshape':
             filename = "dictionary-export-handshapes-signs.csv"
 
             fieldnames = FIELDS['main'] + FIELDS['phonology'] + FIELDS['semantics'] + FIELDS['frequency'] + ['inWeb',
@@ -3743,33 +3704,17 @@ class HandshapeListView(ListView):
             selected_datasets = get_selected_datasets(self.request)
             dataset_languages = get_dataset_languages(selected_datasets)
 
-            header = csv_header_row_glosslist(dataset_languages, fields)
-            csv_rows = [header]
-
-            for gloss in query_set:
-                safe_row = csv_gloss_to_row(gloss, dataset_languages, fields)
-                csv_rows.append(safe_row)
+            header = csv_header_row_glosslist(dataset_languages)
+            csv_rows = csv_gloss_rows(query_set, dataset_languages, fields)
         else:
             filename = "dictionary-export-handshapes.csv"
 
             fields = [Handshape.get_field(fieldname) for fieldname in HANDSHAPE_RESULT_FIELDS]
 
             header = csv_header_row_handshapelist(fields)
+            csv_rows = csv_handshape_rows(query_set, fields)
 
-            csv_rows = [header]
-            for handshape in query_set:
-
-                safe_row = csv_handshape_to_row(handshape, fields)
-                csv_rows.append(safe_row)
-
-        # this is based on an example in the Django 4.2 documentation
-        pseudo_buffer = Echo()
-        new_writer = csv.writer(pseudo_buffer)
-        return StreamingHttpResponse(
-            (new_writer.writerow(row) for row in csv_rows),
-            content_type="text/csv",
-            headers={"Content-Disposition": 'attachment; filename='+filename},
-        )
+        return csv_streaming_response(header, csv_rows, filename)
 
     def get_queryset(self):
 
@@ -4733,6 +4678,8 @@ class DatasetMediaView(DetailView):
         uploaded_video_files = listing_uploaded_videos(dataset)
         context['uploaded_video_files'] = uploaded_video_files
 
+        context['media_inventory'] = dataset_media_summary(dataset)
+
         zipped_archives = uploaded_zip_archives(dataset)
         context['zipped_archives'] = zipped_archives
 
@@ -5350,14 +5297,7 @@ class MorphemeDetailView(DetailView):
 
     def get_context_data(self, **kwargs):
 
-        if 'search_results' in self.request.session.keys():
-            search_results = self.request.session['search_results']
-        else:
-            search_results = []
-
-        if search_results and len(search_results) > 0:
-            if self.request.session['search_results'][0]['href_type'] not in ['morpheme', 'gloss', 'annotatedsentence']:
-                self.request.session['search_results'] = []
+        keep_search_results_of_type(self.request, ['morpheme', 'gloss', 'annotatedsentence'])
         if 'search_type' in self.request.session.keys():
             if self.request.session['search_type'] not in ['morpheme', 'annotatedsentence', 'sign_or_morpheme']:
                 # user has not queried morphemes
@@ -5679,45 +5619,45 @@ class RecentGlossListView(ListView):
             # creationDate__range=[recently_added_signs_since_date, DT.datetime.now(tz=get_current_timezone())])
         recent_glosses = recent_glosses.order_by(ordering)
         items = construct_scrollbar(recent_glosses, 'sign', lang_attr_name)
-        self.request.session['search_results'] = items
+        store_search_results(self.request, items)
         self.request.session['search_type'] = 'sign'
         self.request.session.modified = True
 
         return recent_glosses
 
 
+def search_results_window_response(request, search_types):
+    """Returns a JSON window of the previous search stored in sessions, around the active item or from start"""
+    search_results = get_search_results(request)
+    if not search_results or request.session.get('search_type') not in search_types:
+        return JsonResponse({'start': 0, 'count': 0, 'items': []})
+    start = int(request.GET['start']) if request.GET.get('start', '').isdigit() else None
+    size = min(int(request.GET['size']), SEARCH_RESULTS_WINDOW) if request.GET.get('size', '').isdigit() \
+        else SEARCH_RESULTS_WINDOW
+    return JsonResponse(search_results_window(search_results, active_id=request.GET.get('active', ''),
+                                              start=start, size=size))
+
+
 def gloss_ajax_search_results(request):
     """Returns a JSON list of glosses that match the previous search stored in sessions"""
-    if 'search_type' in request.session.keys() and 'search_results' in request.session.keys() \
-            and request.session['search_type'] in ['sign', 'morpheme', 'annotatedsentence',
-                                                   'sign_or_morpheme', 'sign_handshape', 'sense']:
-        return JsonResponse(request.session['search_results'], safe=False)
-    else:
-        return JsonResponse([], safe=False)
+    return search_results_window_response(request, ['sign', 'morpheme', 'annotatedsentence',
+                                                    'sign_or_morpheme', 'sign_handshape', 'sense'])
+
 
 def handshape_ajax_search_results(request):
     """Returns a JSON list of handshapes that match the previous search stored in sessions"""
-    if 'search_type' in request.session.keys() and 'search_results' in request.session.keys() \
-            and request.session['search_type'] == 'handshape':
-        return JsonResponse(request.session['search_results'], safe=False)
-    else:
-        return JsonResponse([], safe=False)
+    return search_results_window_response(request, ['handshape'])
+
 
 def lemma_ajax_search_results(request):
     """Returns a JSON list of lemmas that match the previous search stored in sessions"""
-    if 'search_type' in request.session.keys() and 'search_results' in request.session.keys() \
-            and request.session['search_type'] == 'lemma':
-        return JsonResponse(request.session['search_results'], safe=False)
-    else:
-        return JsonResponse([], safe=False)
+    return search_results_window_response(request, ['lemma'])
+
 
 def annotatedsentence_ajax_search_results(request):
     """Returns a JSON list of glosses that match the previous search stored in sessions"""
-    if 'search_type' in request.session.keys() and 'search_results' in request.session.keys() \
-            and request.session['search_type'] in ['annotatedsentence']:
-        return JsonResponse(request.session['search_results'], safe=False)
-    else:
-        return JsonResponse([], safe=False)
+    return search_results_window_response(request, ['annotatedsentence'])
+
 
 def gloss_ajax_complete(request, datasetid, prefix):
     """Return a list of glosses matching the search term
@@ -6020,8 +5960,14 @@ def minimalpairs_ajax_complete(request, gloss_id, gloss_detail=False):
                                         'minimal_pairs_dict': result})
 
 
-def glosslist_ajax_complete(request, gloss_id):
+GLOSS_ROW_DISPLAY_METHOD_FIELDS = ['semField', 'derivHist', 'dialect',
+                                   'definitionRole', 'hasothermedia', 'hasComponentOfType',
+                                   'mrpType', 'isablend', 'ispartofablend', 'morpheme', 'relation',
+                                   'hasRelationToForeignSign', 'relationToForeignSign']
+
 
+def glosslist_row_display_fields(request):
+    # the query list page sends its own display fields
     display_fields = GLOSS_LIST_DISPLAY_FIELDS
     query_fields_parameters = []
 
@@ -6029,27 +5975,13 @@ def glosslist_ajax_complete(request, gloss_id):
         if 'query' in request.GET and 'display_fields' in request.GET and 'query_fields_parameters' in request.GET:
             display_fields = json.loads(request.GET['display_fields'])
             query_fields_parameters = json.loads(request.GET['query_fields_parameters'])
+    return display_fields, query_fields_parameters
 
-    this_gloss = Gloss.objects.get(id=gloss_id, archived=False)
-    default_language = this_gloss.lemma.dataset.default_language.language_code_2char
-    activate(default_language)
-    # TO DO could use the following method to generate the column values
-    # but the domain of that method is the column header
-    # gloss_data = this_gloss.get_fields_dict(display_fields, default_language)
-    # list_gloss_data = list(gloss_data)
-    # print(list_gloss_data)
-
-    selected_datasets = get_selected_datasets(request)
-    dataset_languages = get_dataset_languages(selected_datasets)
-
-    sensetranslations_per_language = sensetranslations_per_language_dict(this_gloss)
 
+def glosslist_row_column_values(this_gloss, display_fields, relation_roles, default_language):
     column_values = []
     for fieldname in display_fields:
-        if fieldname in ['semField', 'derivHist', 'dialect',
-                         'definitionRole', 'hasothermedia', 'hasComponentOfType',
-                         'mrpType', 'isablend', 'ispartofablend', 'morpheme', 'relation',
-                         'hasRelationToForeignSign', 'relationToForeignSign']:
+        if fieldname in GLOSS_ROW_DISPLAY_METHOD_FIELDS:
             display_method = 'get_' + fieldname + '_display'
             field_value = getattr(this_gloss, display_method)()
             column_values.append((fieldname, field_value))
@@ -6058,12 +5990,9 @@ def glosslist_ajax_complete(request, gloss_id):
             column_values.append((fieldname, field_value.name if field_value else '-'))
         elif fieldname == 'hasRelation':
             # this field has a list of roles as a parameter
-            if query_fields_parameters:
-                fields_parameters = [FieldChoice.objects.get(field='RelationRole', machine_value=int(roleid)) for roleid
-                                     in query_fields_parameters[0]]
-                # query_fields_parameters ends up being a list of list for this field
+            if relation_roles is not None:
                 relations_of_type = [r for r in this_gloss.get_relations()
-                                     if r.role_fk in fields_parameters]
+                                     if r.role_fk in relation_roles]
                 relations = ", ".join([r.target.annotation_idgloss(default_language) for r in relations_of_type])
                 column_values.append((fieldname, relations))
         elif fieldname not in Gloss.get_field_names():
@@ -6080,20 +6009,119 @@ def glosslist_ajax_complete(request, gloss_id):
                 column_values.append((fieldname, human_value))
             else:
                 column_values.append((fieldname, '-'))
+    return column_values
+
+
+def glosslist_row_media_urls(this_gloss, glossvideo):
+    """The image and video urls of a gloss row, as get_image_url and get_video_url, from its primary gloss video"""
+    if not glossvideo:
+        # a video file without a GlossVideo object is found by the lemma of the gloss
+        lemma_translations = this_gloss.lemma.lemmaidglosstranslation_set.all()
+        idgloss = first_translation_text(lemma_translations, this_gloss.lemma.dataset.default_language) \
+            or (lemma_translations[0].text if lemma_translations else str(this_gloss.id))
+        video_path = get_gloss_path_to_video_file_on_disk(this_gloss, idgloss)
+        image_path = ''
+    else:
+        video_path = str(glossvideo.videofile)
+        videofile_path_without_extension = os.path.splitext(video_path)[0]
+        image_path = ''
+        for extension in SUPPORTED_CITATION_IMAGE_EXTENSIONS:
+            imagefile_path = videofile_path_without_extension.replace("glossvideo", "glossimage") + extension
+            if os.path.exists(os.path.join(WRITABLE_FOLDER, imagefile_path)):
+                image_path = imagefile_path
+                break
+    if video_path:
+        filepath = os.path.join(WRITABLE_FOLDER, video_path)
+        if not os.path.exists(filepath) or not detect_video_file_extension(filepath):
+            video_path = ''
+    return (escape_uri_path(image_path) if image_path else '',
+            escape_uri_path(video_path) if video_path else '')
+
+
+def glosslist_rows(glosses, dataset_languages, display_fields, query_fields_parameters):
+    """The context of the gloss_row.html rows of the glosses, the related objects are fetched in one pass"""
+    relation_roles = None
+    if 'hasRelation' in display_fields and query_fields_parameters:
+        # query_fields_parameters ends up being a list of list for this field
+        relation_roles = list(FieldChoice.objects.filter(
+            field='RelationRole', machine_value__in=[int(roleid) for roleid in query_fields_parameters[0]]))
+
+    related_fields = [fieldname for fieldname in display_fields if fieldname in Gloss.get_field_names()
+                      and Gloss.get_field(fieldname).is_relation and not Gloss.get_field(fieldname).many_to_many]
+    glosses = glosses.select_related('lemma__dataset__default_language', 'lemma__dataset__signlanguage',
+                                     'morpheme', *related_fields).prefetch_related(
+        'annotationidglosstranslation_set', 'lemma__lemmaidglosstranslation_set',
+        'lemma__dataset__translation_languages', 'glosssense_set__sense__senseTranslations__translations__translation')
+    glosses = list(glosses)
+
+    # in the case of multiple version 0 objects the first is used, as in Gloss.get_video_path
+    primary_glossvideos = dict()
+    for glossvideo in GlossVideo.objects.filter(gloss__in=glosses, glossvideonme=None, glossvideoperspective=None,
+                                                version=0).order_by('-pk'):
+        primary_glossvideos[glossvideo.gloss_id] = glossvideo
+
+    # the tags of morphemes belong to the morpheme object
+    content_types = ContentType.objects.get_for_models(Gloss, Morpheme)
+    tags_of_objects = defaultdict(list)
+    for tagged_item in TaggedItem.objects.filter(object_id__in=[gloss.id for gloss in glosses],
+                                                 content_type__in=content_types.values()).select_related('tag'):
+        tags_of_objects[(tagged_item.content_type_id, tagged_item.object_id)].append(tagged_item.tag)
+
+    rows = []
+    for this_gloss in glosses:
+        default_language = this_gloss.lemma.dataset.default_language.language_code_2char
+        with override(default_language):
+            column_values = glosslist_row_column_values(this_gloss, display_fields, relation_roles, default_language)
+        tags_model = Morpheme if this_gloss.is_morpheme() else Gloss
+        image_url, video_url = glosslist_row_media_urls(this_gloss, primary_glossvideos.get(this_gloss.id))
+        rows.append({'focus_gloss': this_gloss,
+                     'annotations': [(language, first_translation_text(this_gloss.annotationidglosstranslation_set.all(),
+                                                                       language))
+                                     for language in dataset_languages],
+                     'lemmas': [(language, first_translation_text(this_gloss.lemma.lemmaidglosstranslation_set.all(),
+                                                                  language))
+                                for language in dataset_languages],
+                     'image_url': image_url,
+                     'video_url': video_url,
+                     'tags': sorted(tags_of_objects[(content_types[tags_model].id, this_gloss.id)],
+                                    key=lambda tag: tag.name),
+                     'sensetranslations_per_language': sensetranslations_per_language_dict_prefetched(this_gloss),
+                     'column_values': column_values})
+    return rows
+
+
+def render_glosslist_rows(request, glosses):
+    display_fields, query_fields_parameters = glosslist_row_display_fields(request)
+    selected_datasets = get_selected_datasets(request)
+    dataset_languages = get_dataset_languages(selected_datasets)
 
-    return render(request, 'dictionary/gloss_row.html',
-                  {'focus_gloss': this_gloss,
+    return render(request, 'dictionary/gloss_rows.html',
+                  {'rows': glosslist_rows(glosses, dataset_languages, display_fields, query_fields_parameters),
                    'dataset_languages': dataset_languages,
                    'selected_datasets': selected_datasets,
                    'width_senses_columns': len(dataset_languages),
                    'width_gloss_columns': len(dataset_languages),
                    'width_lemma_columns': len(dataset_languages),
-                   'sensetranslations_per_language': sensetranslations_per_language,
-                   'column_values': column_values,
                    'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
                    'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
 
 
+def glosslist_ajax_complete(request, gloss_id):
+
+    this_gloss = Gloss.objects.get(id=gloss_id, archived=False)
+    return render_glosslist_rows(request, Gloss.objects.filter(id=this_gloss.id))
+
+
+def glosslist_rows_ajax(request):
+    """Render the rows of all the glosses of a result page at once, in the order of the gloss_ids parameter"""
+
+    gloss_ids = [int(gloss_id) for gloss_id in request.GET.get('gloss_ids', '').split(',') if gloss_id.isdigit()]
+    glosses = Gloss.objects.filter(id__in=gloss_ids, archived=False).order_by(
+        Case(*[When(id=gloss_id, then=V(position)) for position, gloss_id in enumerate(gloss_ids)],
+             output_field=IntegerField()))
+    return render_glosslist_rows(request, glosses)
+
+
 def glosslistheader_ajax(request):
 
     display_fields = GLOSS_LIST_DISPLAY_FIELDS
@@ -6453,7 +6481,7 @@ class LemmaListView(ListView):
             lang_attr_name = default_language_code
 
         items = construct_scrollbar(results, self.search_type, lang_attr_name)
-        self.request.session['search_results'] = items
+        store_search_results(self.request, items)
 
         context['page_get_parameters'] = self.page_get_parameters
         return context
@@ -6473,21 +6501,10 @@ class LemmaListView(ListView):
         dataset_languages = get_dataset_languages(selected_datasets)
 
         header = csv_header_row_lemmalist(dataset_languages)
-        csv_rows = [header]
 
         queryset = self.get_queryset()
-        for lemma in queryset:
-            safe_row = csv_lemma_to_row(lemma, dataset_languages)
-            csv_rows.append(safe_row)
-
-        # this is based on an example in the Django 4.2 documentation
-        pseudo_buffer = Echo()
-        new_writer = csv.writer(pseudo_buffer)
-        return StreamingHttpResponse(
-            (new_writer.writerow(row) for row in csv_rows),
-            content_type="text/csv",
-            headers={"Content-Disposition": 'attachment; filename="dictionary-export-lemmas.csv"'},
-        )
+        return csv_streaming_response(header, csv_lemma_rows(queryset, dataset_languages),
+                                      "dictionary-export-lemmas.csv")
 
     def post(self, request, *args, **kwargs):
         # this method deletes lemmas in the query that have no glosses
@@ -6671,13 +6688,7 @@ class LemmaUpdateView(UpdateView):
     def get_context_data(self, **kwargs):
         context = super(LemmaUpdateView, self).get_context_data(**kwargs)
 
-        if 'search_results' in self.request.session.keys():
-            search_results = self.request.session['search_results']
-        else:
-            search_results = []
-        if search_results and len(search_results) > 0:
-            if not self.request.session['search_results'][0]['href_type'] == 'lemma/update':
-                self.request.session['search_results'] = []
+        keep_search_results_of_type(self.request, ['lemma/update'])
         if 'search_type' in self.request.session.keys():
             if not self.request.session['search_type'] == 'lemma':
                 # search_type is 'handshape'
@@ -6897,12 +6908,8 @@ class KeywordListView(ListView):
             # the query set is a list of tuples (gloss, keyword_translations, senses_groups)
             return []
 
-        if 'search_results' in self.request.session.keys():
-            search_results = self.request.session['search_results']
-            if len(search_results) > 0:
-                if search_results[0]['href_type'] not in ['gloss']:
-                    search_results = []
-        else:
+        search_results = get_search_results(self.request)
+        if search_results and search_results['href_type'] not in ['gloss']:
             search_results = []
 
         (objects_on_page, object_list) = map_search_results_to_gloss_list(search_results)
@@ -6947,7 +6954,7 @@ class KeywordListView(ListView):
             lang_attr_name = default_language_code
 
         items = construct_scrollbar(glosses_of_datasets, self.search_type, lang_attr_name)
-        self.request.session['search_results'] = items
+        store_search_results(self.request, items)
 
         self.request.session['query_parameters'] = json.dumps(self.query_parameters)
         self.request.session['search_type'] = self.search_type
@@ -7190,17 +7197,15 @@ class BatchEditView(ListView):
             messages.add_message(self.request, messages.ERROR, feedback_message)
             return Gloss.objects.none()
 
-        if 'search_results' in self.request.session.keys():
-            search_results = self.request.session['search_results']
-            if len(search_results) > 0:
-                first_search_result = search_results[0]
-                first_gloss = Gloss.objects.filter(id__in=[first_search_result['id']]).first()
-                if first_search_result['href_type'] not in ['gloss']:
-                    search_results = []
+        search_results = get_search_results(self.request)
+        if search_results:
+            if search_results['href_type'] not in ['gloss']:
+                search_results = []
+            else:
+                first_gloss_id = get_search_result_ids(search_results)[:1]
+                first_gloss = Gloss.objects.filter(id__in=first_gloss_id).first()
                 if not first_gloss or first_gloss.lemma.dataset not in selected_datasets:
                     search_results = []
-        else:
-            search_results = []
 
         (objects_on_page, object_list) = map_search_results_to_gloss_list(search_results)
 
@@ -7243,7 +7248,7 @@ class BatchEditView(ListView):
             lang_attr_name = default_language_code
 
         items = construct_scrollbar(glosses_of_dataset, self.search_type, lang_attr_name)
-        self.request.session['search_results'] = items
+        store_search_results(self.request, items)
 
         self.request.session['query_parameters'] = json.dumps(self.query_parameters)
         self.request.session.modified = True
@@ -7328,7 +7333,7 @@ class ToggleListView(ListView):
             lang_attr_name = default_language_code
 
         items = construct_scrollbar(list_of_objects, self.search_type, lang_attr_name)
-        self.request.session['search_results'] = items
+        store_search_results(self.request, items)
         context['page_get_parameters'] = self.page_get_parameters
         return context
 
@@ -7458,11 +7463,8 @@ class AnnotatedSentenceDetailView(DetailView):
             self.request.session['search_type'] = self.search_type
 
         # Check the type of the current search results
-        if 'search_results' in self.request.session.keys():
-            if self.request.session['search_results'] and len(self.request.session['search_results']) > 0:
-                if self.request.session['search_results'][0]['href_type'] not in ['annotatedsentence']:
-                    # if the previous search does not match the search type
-                    self.request.session['search_results'] = []
+        # if the previous search does not match the search type
+        keep_search_results_of_type(self.request, ['annotatedsentence'])
 
         context['SHOW_DATASET_INTERFACE_OPTIONS'] = SHOW_DATASET_INTERFACE_OPTIONS
         context['USE_REGULAR_EXPRESSIONS'] = USE_REGULAR_EXPRESSIONS
@@ -7549,7 +7551,7 @@ class AnnotatedGlossListView(ListView):
         context['annotatedglosscount'] = len(list(set(list_of_sentence_ids)))
 
         items = construct_scrollbar(self.object_list, self.search_type, lang_attr_name)
-        self.request.session['search_results'] = items
+        store_search_results(self.request, items)
 
         context['page_get_parameters'] = self.page_get_parameters
 
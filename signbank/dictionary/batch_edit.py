@@ -127,22 +127,6 @@ def get_gloss_language_fields(gloss):
     return language_fields_dict
 
 
-def update_scroll_bar(request, glossid, annotation):
-
-    if 'search_results' not in request.session.keys():
-        return
-
-    search_results = request.session['search_results']
-
-    for item in search_results:
-        if item['id'] == glossid:
-            item['data_label'] = annotation
-    request.session['search_results'] = search_results
-    request.session.modified = True
-
-    return
-
-
 def update_lemma_translation(gloss, language_code_2char, new_value):
     language = Language.objects.get(language_code_2char=language_code_2char)
     try:
@@ -344,8 +328,8 @@ def batch_edit_update_gloss(request, gloss):
     result['glossid'] = str(gloss.id)
     if default_annotation_field in fields_to_update.keys():
         annotation = fields_to_update[default_annotation_field]
+        # the search result bar looks up the changed annotation when it is shown
         result['default_annotation'] = annotation
-        update_scroll_bar(request, gloss.id, annotation)
     else:
         result['default_annotation'] = language_fields_dict[default_annotation_field]
     result['errors'] = []
@@ -30,16 +30,20 @@ def get_web_search(request):
 
 def get_selected_datasets(request):
     """
-    Get the selected datasets
+    Get the selected datasets, these are looked up once per request
     """
+    if hasattr(request, '_selected_datasets'):
+        return request._selected_datasets
     if not request.user.is_authenticated and 'selected_datasets' in request.session.keys():
-        return Dataset.objects.filter(acronym__in=request.session['selected_datasets'])
-    selected_datasets = get_selected_datasets_for_user(request.user)
-    selected_datasets_acronyms = [ds.acronym for ds in selected_datasets]
-    dataset_acronyms_in_session = request.session.get('selected_datasets', [])
-    if not dataset_acronyms_in_session or selected_datasets_acronyms != dataset_acronyms_in_session:
-        request.session['selected_datasets'] = selected_datasets_acronyms
-        request.session.modified = True
+        selected_datasets = Dataset.objects.filter(acronym__in=request.session['selected_datasets'])
+    else:
+        selected_datasets = get_selected_datasets_for_user(request.user)
+        selected_datasets_acronyms = [ds.acronym for ds in selected_datasets]
+        dataset_acronyms_in_session = request.session.get('selected_datasets', [])
+        if not dataset_acronyms_in_session or selected_datasets_acronyms != dataset_acronyms_in_session:
+            request.session['selected_datasets'] = selected_datasets_acronyms
+            request.session.modified = True
+    request._selected_datasets = selected_datasets
     return selected_datasets
 
 
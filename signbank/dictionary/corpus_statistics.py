@@ -0,0 +1,120 @@
+"""The corpus frequencies of the glosses of a dataset as columns.
+
+The GlossFrequency objects of a dataset are loaded with their speakers in one query into NumPy arrays,
+sorted on gloss. The frequency views take the rows of a gloss as a slice of the arrays
+and count the regions, sexes and ages of the speakers with grouped operations.
+The tables are kept in the process until the version of the corpus statistics in the database changes.
+"""
+
+import threading
+
+import numpy as np
+
+from signbank.dictionary.models import GlossFrequency, data_version, bump_data_version
+
+CORPUS_STATISTICS_VERSION = 'corpus_statistics'
+
+# two extra categories are used that are not currently displayed in the frequency table
+SEX_CATEGORIES = ['Female', 'Male', 'Other']
+AGE_CATEGORIES = ['< 25', '25 - 35', '36 - 65', '> 65', 'Unknown Age']
+
+_tables_lock = threading.Lock()
+# dataset id -> (version, table)
+_tables = dict()
+
+
+def corpus_statistics_version():
+    return data_version(CORPUS_STATISTICS_VERSION)
+
+
+def invalidate_corpus_statistics():
+    bump_data_version(CORPUS_STATISTICS_VERSION)
+
+
+class GlossFrequencyTable:
+    """The GlossFrequency objects of a set of glosses with the location, sex and age of their speakers"""
+
+    def __init__(self, glossfrequencies):
+        rows = list(glossfrequencies.order_by('gloss_id').values_list(
+            'gloss_id', 'speaker_id', 'frequency', 'speaker__location', 'speaker__gender', 'speaker__age'))
+        self.gloss_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.speaker_ids = np.array([row[1] for row in rows], dtype=np.int64)
+        self.frequencies = np.array([row[2] for row in rows], dtype=np.int64)
+        # the regions are kept as indices in the sorted list of regions
+        self.regions = sorted(set(row[3] for row in rows))
+        region_index = dict((region, index) for index, region in enumerate(self.regions))
+        self.region_codes = np.array([region_index[row[3]] for row in rows], dtype=np.int64)
+        # 0 is female, 1 is male and 2 is other, the indices of SEX_CATEGORIES
+        self.sex_codes = np.array([{'f': 0, 'm': 1}.get(row[4], 2) for row in rows], dtype=np.int64)
+        self.ages = np.array([row[5] if row[5] is not None else -1 for row in rows], dtype=np.int64)
+
+    @classmethod
+    def of_dataset(cls, dataset):
+        version = corpus_statistics_version()
+        with _tables_lock:
+            found = _tables.get(dataset.id)
+        if found and found[0] == version:
+            return found[1]
+        table = cls(GlossFrequency.objects.filter(gloss__lemma__dataset=dataset))
+        with _tables_lock:
+            _tables[dataset.id] = (version, table)
+        return table
+
+    @classmethod
+    def of_gloss(cls, gloss):
+        """The table of the dataset of the gloss, or of only the gloss if it has no dataset"""
+        if gloss.lemma is not None and gloss.lemma.dataset is not None:
+            return cls.of_dataset(gloss.lemma.dataset)
+        return cls(GlossFrequency.objects.filter(gloss=gloss))
+
+    def rows_of_gloss(self, gloss_id):
+        start, end = np.searchsorted(self.gloss_ids, [gloss_id, gloss_id + 1])
+        return slice(int(start), int(end))
+
+    def number_of_rows(self, gloss_id):
+        rows = self.rows_of_gloss(gloss_id)
+        return rows.stop - rows.start
+
+    def speakers_of_gloss(self, gloss_id):
+        """The row indices of the distinct speakers of the gloss"""
+        rows = self.rows_of_gloss(gloss_id)
+        _, first_rows = np.unique(self.speaker_ids[rows], return_index=True)
+        return first_rows + rows.start
+
+    def occurrences_and_signers_per_region(self, gloss_id, frequency_regions):
+        """Lists of the number of occurrences and of distinct signers of the gloss in each of the regions"""
+        rows = self.rows_of_gloss(gloss_id)
+        region_codes = self.region_codes[rows]
+        occurrences = np.bincount(region_codes, weights=self.frequencies[rows], minlength=len(self.regions))
+        # the distinct (region, speaker) pairs of the gloss, encoded as one number
+        speaker_span = int(self.speaker_ids.max(initial=0)) + 1
+        region_speakers = np.unique(region_codes * speaker_span + self.speaker_ids[rows])
+        signers = np.bincount(region_speakers // speaker_span, minlength=len(self.regions))
+        region_index = dict((region, index) for index, region in enumerate(self.regions))
+        occurrences_per_region, signers_per_region = [], []
+        for region in frequency_regions:
+            index = region_index.get(region)
+            occurrences_per_region.append(int(occurrences[index]) if index is not None else 0)
+            signers_per_region.append(int(signers[index]) if index is not None else 0)
+        return occurrences_per_region, signers_per_region
+
+    def speaker_data(self, gloss_id):
+        """The number of distinct speakers of the gloss per sex and age category"""
+        speaker_rows = self.speakers_of_gloss(gloss_id)
+        sex_counts = np.bincount(self.sex_codes[speaker_rows], minlength=len(SEX_CATEGORIES))
+        ages = self.ages[speaker_rows]
+        age_codes = np.select([ages < 0, ages < 25, ages <= 35, ages <= 65], [4, 0, 1, 2], default=3)
+        age_counts = np.bincount(age_codes, minlength=len(AGE_CATEGORIES))
+        speaker_data = dict()
+        for index, category in enumerate(SEX_CATEGORIES):
+            speaker_data[category] = int(sex_counts[index])
+        for index, category in enumerate(AGE_CATEGORIES):
+            speaker_data[category] = int(age_counts[index])
+        speaker_data['Total'] = len(speaker_rows)
+        return speaker_data
+
+    def speaker_age_data(self, gloss_id):
+        """Map the ages, as strings for javascript, to the number of distinct speakers of that age"""
+        speaker_rows = self.speakers_of_gloss(gloss_id)
+        ages, counts = np.unique(self.ages[speaker_rows], return_counts=True)
+        return dict((str(age), int(count)) for age, count in zip(ages, counts))
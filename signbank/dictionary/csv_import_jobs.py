@@ -0,0 +1,968 @@
+"""Check the rows of uploaded CSV files and apply the confirmed rows in the background.
+
+The import views write the uploaded file to disk, check its header and start a CSVImportJob.
+A worker thread reads the file line by line and checks the rows in chunks of CSV_IMPORT_CHUNK_SIZE rows,
+as the views did before. After each chunk the results so far, the proposed changes, the new glosses
+and the errors per row, are saved next to the file, with the number of rows that are done.
+When the check is done, the import view shows the results for confirmation as before.
+The confirmed rows are saved next to the file and the job is queued again for its apply phase,
+which applies the rows in chunks of the same size. Each chunk is applied in a transaction together with
+the number of rows that are done, so a stopped job does not apply a row twice.
+The saved results are JSON, the datasets in them are saved as their id.
+
+A job that failed or was left when the server stopped continues after the last saved chunk
+when it is run again by the run_csv_import_jobs command. A job is only claimed when it is queued,
+so that command queues the running jobs that made no progress for CSV_IMPORT_STALE_AFTER again.
+"""
+
+import abc
+import codecs
+import csv
+import datetime as DT
+import json
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import guardian.shortcuts
+from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext, override, get_language
+
+from signbank.settings.server_specific import (WRITABLE_FOLDER, LANGUAGE_CODE, DEFAULT_LANGUAGE_HEADER_COLUMN, FIELDS,
+                                               CSV_IMPORT_FOLDER, CSV_IMPORT_WORKERS, CSV_IMPORT_CHUNK_SIZE)
+from signbank.dictionary.models import (CSVImportJob, Dataset, Gloss, LemmaIdgloss, LemmaIdglossTranslation,
+                                        AnnotationIdglossTranslation, AffiliatedUser, AffiliatedGloss, Language)
+from signbank.dictionary.csv_update_lookups import GlossUpdateLookups
+from signbank.tools import (create_gloss_from_valuedict, compare_valuedict_to_gloss, compare_valuedict_to_lemma,
+                            create_sentence_from_valuedict, get_dataset_languages)
+from signbank.csv_interface import csv_create_sentence
+
+STATE_APPENDIX = '.state'
+# the confirmed rows and the errors of applying them
+APPLY_STATE_APPENDIX = '.apply'
+# a running job that made no progress for this long was left when the server stopped
+CSV_IMPORT_STALE_AFTER = DT.timedelta(minutes=30)
+# the keys of the JSON objects that stand for a dataset and a set in the saved state
+STATE_DATASET_KEY = '__dataset__'
+STATE_SET_KEY = '__set__'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def csv_import_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=CSV_IMPORT_WORKERS, thread_name_prefix='csv-import-job')
+        return _executor
+
+
+def stage_csv_upload(uploaded_file, encoding):
+    """Write the uploaded file to the import folder, returns its path relative to WRITABLE_FOLDER.
+    Raises UnicodeDecodeError, and removes the file, if it is not in the encoding"""
+    os.makedirs(os.path.join(WRITABLE_FOLDER, CSV_IMPORT_FOLDER), exist_ok=True)
+    csv_file = os.path.join(CSV_IMPORT_FOLDER, uuid.uuid4().hex + '.csv')
+    path = os.path.join(WRITABLE_FOLDER, csv_file)
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        with open(path, 'wb') as staged_file:
+            for chunk in uploaded_file.chunks():
+                decoder.decode(chunk)
+                staged_file.write(chunk)
+            decoder.decode(b'', final=True)
+    except UnicodeError:
+        os.remove(path)
+        raise
+    return csv_file
+
+
+def remove_csv_upload(csv_file):
+    for path in [csv_file, csv_file + STATE_APPENDIX, csv_file + APPLY_STATE_APPENDIX]:
+        path = os.path.join(WRITABLE_FOLDER, path)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def csv_file_lines(csv_file, encoding, start=0):
+    """The lines of the file that are not empty, as the csv text split on any combination of new line characters.
+    The first start lines are skipped"""
+    number = 0
+    with open(os.path.join(WRITABLE_FOLDER, csv_file), encoding=encoding, newline='') as opened_file:
+        for line in opened_file:
+            for part in re.split('[\r\n]+', line):
+                if not part:
+                    continue
+                if number >= start:
+                    yield part
+                number += 1
+
+
+def read_csv_head(csv_file, encoding, number_of_lines=3):
+    """The first lines of the file, the header is looked for in these. An empty file has one empty line"""
+    return list(islice(csv_file_lines(csv_file, encoding), number_of_lines)) or ['']
+
+
+def csv_import_parameters(encoding, delimiter, csv_header, csv_head, csv_body, datasets, **options):
+    """The parameters of a job, csv_body is what is left of the first lines of the file after the header"""
+    return dict(options, encoding=encoding, delimiter=delimiter, header=csv_header,
+                header_lines=len(csv_head) - len(csv_body), datasets=[dataset.id for dataset in datasets],
+                interface_language=get_language())
+
+
+def start_csv_import_job(user, kind, csv_file, parameters):
+    job = CSVImportJob.objects.create(kind=kind, user=user, csv_file=csv_file, parameters=json.dumps(parameters))
+    # the worker can only find the job after the transaction of the request is committed
+    transaction.on_commit(lambda: csv_import_executor().submit(run_csv_import_job_in_worker, job.id))
+    return job
+
+
+def confirmed_rows(post_data):
+    """The [row, values] of the confirmed rows posted by the import template, whose fields are named row.field"""
+    rows = dict()
+    for key, value in post_data.items():
+        try:
+            row, fieldname = key.split('.')
+        except ValueError:
+            # when the database token csrfmiddlewaretoken is passed, there is no dot
+            continue
+        rows.setdefault(row, dict())[fieldname] = value
+    return [[row, values] for row, values in rows.items()]
+
+
+def start_csv_apply_job(user, kind, job, post_data, datasets):
+    """Queue the apply phase of the job that checked the rows, or of a new job if the rows were posted without one.
+    A job that is still checking its rows or is already applying them is returned as it is"""
+    if job is not None and (job.phase == CSVImportJob.APPLY or job.status != CSVImportJob.DONE):
+        return job
+    if job is None:
+        os.makedirs(os.path.join(WRITABLE_FOLDER, CSV_IMPORT_FOLDER), exist_ok=True)
+        job = CSVImportJob.objects.create(kind=kind, user=user,
+                                          csv_file=os.path.join(CSV_IMPORT_FOLDER, uuid.uuid4().hex + '.csv'),
+                                          parameters=json.dumps({'datasets': [dataset.id for dataset in datasets],
+                                                                 'interface_language': get_language()}))
+    rows = confirmed_rows(post_data)
+    save_state(job, {'rows': rows, 'error': []}, APPLY_STATE_APPENDIX)
+    job.phase, job.status, job.message = CSVImportJob.APPLY, CSVImportJob.QUEUED, ''
+    job.rows_total, job.rows_done, job.number_of_errors = len(rows), 0, 0
+    job.started, job.progressed, job.finished = None, None, None
+    job.save(update_fields=['phase', 'status', 'message', 'rows_total', 'rows_done', 'number_of_errors',
+                            'started', 'progressed', 'finished'])
+    transaction.on_commit(lambda: csv_import_executor().submit(run_csv_import_job_in_worker, job.id))
+    return job
+
+
+def run_csv_import_job_in_worker(job_id):
+    try:
+        run_csv_import_job(job_id)
+    finally:
+        # the worker thread has its own database connection
+        connection.close()
+
+
+def value_dict_of_row(csv_header, values, columns_to_skip=()):
+    value_dict = {}
+    for nv, value in enumerate(values):
+        if nv >= len(csv_header):
+            # it's here to avoid needing an exception on the subscript [nv]
+            continue
+        elif csv_header[nv] in columns_to_skip:
+            continue
+        value_dict[csv_header[nv]] = value
+    return value_dict
+
+
+class CSVRowCheck(abc.ABC):
+    """The check of the rows of one kind of import. check_row returns False if the rest of the file is not checked"""
+
+    def __init__(self, job, parameters):
+        self.user = job.user
+        self.parameters = parameters
+        self.csv_header = parameters['header']
+        user_datasets = guardian.shortcuts.get_objects_for_user(self.user, 'change_dataset', Dataset)
+        self.user_datasets_names = [dataset.acronym for dataset in user_datasets]
+        self.selected_datasets = list(Dataset.objects.filter(id__in=parameters['datasets']))
+        self.selected_dataset_acronyms = [dataset.acronym for dataset in self.selected_datasets]
+
+    def initial_state(self):
+        return {'changes': [], 'error': [], 'creation': [], 'gloss_already_exists': [],
+                'seen_datasets': [], 'seen_dataset_names': [], 'rows_done': 0, 'stopped': False}
+
+    def check_chunk(self, state, rows):
+        for nl, values in rows:
+            if not self.check_row(state, nl, values):
+                state['stopped'] = True
+                return
+
+    @abc.abstractmethod
+    def check_row(self, state, nl, values):
+        pass
+
+
+class CreateGlossesCheck(CSVRowCheck):
+
+    def initial_state(self):
+        state = super().initial_state()
+        state.update({'earlier_creation_same_csv': {}, 'earlier_creation_annotationidgloss': {},
+                      'earlier_creation_lemmaidgloss': {}})
+        return state
+
+    def check_row(self, state, nl, values):
+        error = state['error']
+        seen_datasets = state['seen_datasets']
+        seen_dataset_names = state['seen_dataset_names']
+        value_dict = value_dict_of_row(self.csv_header, values)
+
+        # 'Dataset' in value_dict keys, checked above
+        dataset_name = value_dict['Dataset'].strip()
+
+        if dataset_name not in self.selected_dataset_acronyms:
+            e3 = gettext("Row {row}: Dataset {acronym} is not selected.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
+            error.append(e3)
+            return False
+        if dataset_name not in self.user_datasets_names:
+            e3 = gettext("Row {row}: You are not allowed to change dataset {acronym}.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
+            error.append(e3)
+            return False
+        # Check whether the user may change the dataset of the current row
+        if dataset_name not in seen_dataset_names:
+            if seen_datasets:
+                # already seen a dataset
+                # this is a different dataset
+                e3 = gettext("Row {row}: A different dataset is mentioned.").format(row=str(nl+2))
+                e4 = gettext('You can only create glosses for one dataset at a time.')
+                e5 = gettext('To create glosses in multiple datasets, use a separate CSV file for each dataset.')
+                error.append(e3)
+                error.append(e4)
+                error.append(e5)
+                return False
+
+            # only process a dataset_name once for the csv file being imported
+            # catch possible empty values for dataset, primarily for pretty printing error message
+            if dataset_name in ['', None, 0, 'NULL']:
+                e_dataset_empty = gettext('Row {row}: The Dataset is missing.').format(row=str(nl+2))
+                error.append(e_dataset_empty)
+                return False
+            try:
+                dataset = Dataset.objects.get(acronym=dataset_name)
+            except ObjectDoesNotExist:
+                # An error message should be returned here, the dataset does not exist
+                e_dataset_not_found = gettext("Row {row}: Dataset {acronym} does not exist.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
+                error.append(e_dataset_not_found)
+                return False
+            seen_datasets.append(dataset)
+            seen_dataset_names.append(dataset_name)
+
+        empty_lemma_translation = False
+        # The Lemma ID Gloss may already exist.
+        # store the lemma translations for the current row in dict lemmaidglosstranslations
+        # for those translations, look up existing lemmas with (one of) those translations
+        lemmaidglosstranslations = {}
+        existing_lemmas = {}
+        existing_lemmas_list = []
+        new_lemmas = {}
+        contextual_error_messages_lemmaidglosstranslations = []
+        annotationidglosstranslations = {}
+        dataset = seen_datasets[0]
+        translation_languages = dataset.translation_languages.all()
+
+        # check annotation translations
+        for language in translation_languages:
+            language_name = getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English'])
+            annotationidglosstranslation_text = value_dict["Annotation ID Gloss (%s)" % language_name]
+            annotationidglosstranslations[language] = annotationidglosstranslation_text
+
+            annotationtranslation_for_this_text_language = AnnotationIdglossTranslation.objects.filter(
+                gloss__lemma__dataset=dataset, language=language, text__exact=annotationidglosstranslation_text)
+
+            if annotationtranslation_for_this_text_language:
+                error_string = gettext("Row {row}: contains an already existing Annotation ID Gloss for {language}: {annotation}").format(row=str(nl+2), language=language_name, annotation=annotationidglosstranslation_text)
+                error.append(error_string)
+
+        # check lemma translations
+        for language in translation_languages:
+            language_name = getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English'])
+            column_name = "Lemma ID Gloss (%s)" % language_name
+            lemmaidglosstranslation_text = value_dict[column_name].strip()
+            # also stores empty values
+            lemmaidglosstranslations[language] = lemmaidglosstranslation_text
+
+            lemmatranslation_for_this_text_language = LemmaIdglossTranslation.objects.filter(
+                lemma__dataset=dataset, language=language, text__exact=lemmaidglosstranslation_text)
+            if lemmatranslation_for_this_text_language:
+                one_lemma = lemmatranslation_for_this_text_language[0].lemma
+                existing_lemmas[language.language_code_2char] = one_lemma
+                if one_lemma not in existing_lemmas_list:
+                    existing_lemmas_list.append(one_lemma)
+                    help = gettext("Row {row}: Existing Lemma ID Gloss ({language}): {lemmatext}").format(row=str(nl+2), language=language_name, lemmatext=lemmaidglosstranslation_text)
+                    contextual_error_messages_lemmaidglosstranslations.append(help)
+            elif not lemmaidglosstranslation_text:
+                # lemma translation is empty, determine if existing lemma is also empty for this language
+                if existing_lemmas_list:
+                    lemmatranslation_for_this_text_language = LemmaIdglossTranslation.objects.filter(
+                        lemma__dataset=dataset, lemma=existing_lemmas_list[0],
+                        language=language)
+                    if lemmatranslation_for_this_text_language:
+                        help = gettext("Row {row}: Lemma ID Gloss ({language}): is empty.").format(row=str(nl + 2), language=language_name)
+                        contextual_error_messages_lemmaidglosstranslations.append(help)
+                        empty_lemma_translation = True
+                else:
+                    empty_lemma_translation = True
+            else:
+                new_lemmas[language.language_code_2char] = lemmaidglosstranslation_text
+                help = gettext("Row {row}: New Lemma ID Gloss ({language}): {lemmatext}").format(row=str(nl+2), language=language_name, lemmatext=lemmaidglosstranslation_text)
+                contextual_error_messages_lemmaidglosstranslations.append(help)
+
+        if len(existing_lemmas_list) > 0:
+            if len(existing_lemmas_list) > 1:
+                e1 = gettext('Row {row}: The Lemma translations refer to different lemmas.').format(row=str(nl+2))
+                error.append(e1)
+            elif empty_lemma_translation:
+                e1 = gettext('Row {row}: Exactly one lemma matches, but one of the translations in the csv is empty.').format(row=str(nl+2))
+                error.append(e1)
+            if len(new_lemmas.keys()) and len(existing_lemmas.keys()):
+                e1 = gettext('Row {row}: Combination of existing and new lemma translations.').format(row=str(nl+2))
+                error.append(e1)
+        elif not len(new_lemmas.keys()):
+            e1 = gettext('Row {row}: No lemma translations provided.').format(row=str(nl + 2))
+            error.append(e1)
+
+        if error:
+            # these are feedback errors, don't bother comparing the new gloss to existing values, we already found an error
+            return True
+
+        # put creation of value_dict for the new gloss inside an exception to catch any unexpected errors
+        # errors are kept track of as user feedback, but the code needs to be safe
+        try:
+            (new_gloss, already_exists, error_create, state['earlier_creation_same_csv'],
+             state['earlier_creation_annotationidgloss'], state['earlier_creation_lemmaidgloss']) \
+                = create_gloss_from_valuedict(value_dict, dataset, nl, state['earlier_creation_same_csv'],
+                                              state['earlier_creation_annotationidgloss'],
+                                              state['earlier_creation_lemmaidgloss'])
+        except (KeyError, ValueError):
+            print('import csv create: got this far in processing loop before exception in row ', str(nl+2))
+            return False
+        if len(error_create):
+            errors_found_string = '\n'.join(error_create)
+            error.append(errors_found_string)
+        else:
+            state['creation'] += new_gloss
+        # whether or not glosses mentioned in the csv file already exist is accummulated in gloss_already_exists
+        # one version of the template also shows these with the errors, so the user might remove extra data from the csv to reduce its size
+        state['gloss_already_exists'] += already_exists
+        return True
+
+
+class UpdateGlossesCheck(CSVRowCheck):
+
+    def __init__(self, job, parameters):
+        super().__init__(job, parameters)
+        # this is needed in case the user has exported the csv first and not removed the frequency columns
+        gloss_fields = [Gloss.get_field(fname) for fname in Gloss.get_field_names()]
+        with override(LANGUAGE_CODE):
+            self.columns_to_skip = [str(field.verbose_name) for field in gloss_fields
+                                    if field.name in FIELDS['frequency']]
+
+    def initial_state(self):
+        state = super().initial_state()
+        state.update({'earlier_updates_same_csv': set(), 'earlier_updates_lemmaidgloss': {}})
+        return state
+
+    def check_chunk(self, state, rows):
+        # the glosses of the rows of the chunk and the values they are compared with are looked up at once
+        signbank_id_column = self.csv_header.index('Signbank ID')
+        self.lookups = GlossUpdateLookups([int(values[signbank_id_column]) for nl, values in rows
+                                           if len(values) > signbank_id_column
+                                           and values[signbank_id_column].strip().isdigit()])
+        super().check_chunk(state, rows)
+
+    def check_row(self, state, nl, values):
+        error = state['error']
+        seen_datasets = state['seen_datasets']
+        seen_dataset_names = state['seen_dataset_names']
+        lookups = self.lookups
+        value_dict = value_dict_of_row(self.csv_header, values, self.columns_to_skip)
+
+        # 'Signbank ID' in value_dict keys, checked above
+        try:
+            pk = int(value_dict['Signbank ID'])
+        except (ValueError, KeyError):
+            # the ID is not a number
+            e = gettext('Row {row}: Signbank ID must be numerical: {glossid}').format(row=str(nl+2), glossid=str(value_dict['Signbank ID']))
+            error.append(e)
+            return False
+
+        # 'Dataset' in value_dict keys, checked above
+        dataset_name = value_dict['Dataset'].strip()
+
+        if dataset_name not in seen_dataset_names:
+            # catch possible empty values for dataset, primarily for pretty printing error message
+            if dataset_name in ['', None, 0, 'NULL']:
+                e_dataset_empty = gettext('Row {row}: The Dataset is missing.').format(row=str(nl + 2))
+                error.append(e_dataset_empty)
+                return False
+            try:
+                dataset = Dataset.objects.get(acronym=dataset_name)
+            except ObjectDoesNotExist:
+                # The dataset does not exist
+                e_dataset_not_found = gettext("Row {row}: Dataset {acronym} does not exist.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
+                error.append(e_dataset_not_found)
+                return False
+            if dataset_name not in self.user_datasets_names:
+                # Check whether the user may change the dataset of the current row
+                e3 = gettext("Row {row}: You are not allowed to change dataset {acronym}.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
+                error.append(e3)
+                return False
+            if dataset not in self.selected_datasets:
+                e3 = gettext("Row {row}: Dataset {acronym} is not selected.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
+                error.append(e3)
+                return False
+            seen_datasets.append(dataset)
+            seen_dataset_names.append(dataset_name)
+        dataset = seen_datasets[seen_dataset_names.index(dataset_name)]
+
+        # The Lemma ID Gloss may already exist.
+        lemmaidglosstranslations = {}
+        for language in lookups.dataset_languages(dataset):
+            language_name = getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English'])
+            column_name = "Lemma ID Gloss (%s)" % language_name
+            if column_name in value_dict:
+                lemma_idgloss_value = value_dict[column_name].strip()
+                # also stores empty values
+                lemmaidglosstranslations[language] = lemma_idgloss_value
+        # updating glosses
+        gloss = lookups.glosses.get(pk)
+        if gloss is None:
+            e = gettext("Row {row}: Could not find gloss for Signbank ID {glossid}.").format(row=str(nl+2), glossid=str(pk))
+            error.append(e)
+            return True
+
+        if gloss.lemma.dataset != dataset:
+            e1 = gettext('Row {row}: The Dataset column ({acronym}) does not correspond to that of the Signbank ID ({glossid})').format(row=str(nl+2), acronym=dataset.acronym, glossid=str(pk))
+            error.append(e1)
+            # ignore the rest of the row
+            return True
+        # dataset is the same
+
+        # If there are changes in the LemmaIdglossTranslation, the changes should refer to another LemmaIdgloss
+        current_lemmaidglosstranslations = {}
+        for language in lookups.dataset_languages(gloss.lemma.dataset):
+            current_lemmaidglosstranslations[language] = lookups.lemma_translation(gloss, language)
+        if lemmaidglosstranslations \
+                and current_lemmaidglosstranslations != lemmaidglosstranslations:
+            help = gettext("Row {row}: Attempt to update Lemma translations for Signbank ID {glossid}. Use Import CSV Lemma Update instead.").format(row=str(nl+2), glossid=str(pk))
+            error.append(help)
+            return True
+
+        try:
+            (changes_found, errors_found, state['earlier_updates_same_csv'], state['earlier_updates_lemmaidgloss']) = \
+                compare_valuedict_to_gloss(value_dict, gloss.id, self.user_datasets_names, nl,
+                                           state['earlier_updates_same_csv'], state['earlier_updates_lemmaidgloss'],
+                                           self.parameters['notes_toggle'], self.parameters['notes_assign_toggle'],
+                                           self.parameters['semfield_toggle'], self.parameters['semfield_assign_toggle'],
+                                           self.parameters['tags_toggle'], lookups=lookups)
+            state['changes'] += changes_found
+
+            if errors_found:
+                errors_found_string = '\n'.join(errors_found)
+                error.append(errors_found_string)
+
+        except KeyError as e:
+            error.append(str(e))
+        return True
+
+
+class UpdateLemmasCheck(CSVRowCheck):
+
+    def initial_state(self):
+        state = super().initial_state()
+        state.update({'earlier_updates_same_csv': [], 'earlier_updates_lemmaidgloss': {}})
+        return state
+
+    def check_row(self, state, nl, values):
+        error = state['error']
+        # the selected dataset, which the user may change
+        dataset = self.selected_datasets[0]
+        value_dict = value_dict_of_row(self.csv_header, values)
+
+        if 'Lemma ID' in value_dict.keys():
+            # make sure it is numerical
+            try:
+                int(value_dict['Lemma ID'])
+            except ValueError:
+                e = gettext('Row {row}: Lemma ID must be numerical: {lemmaid}').format(row=str(nl+2), lemmaid=str(value_dict['Lemma ID']))
+                error.append(e)
+                return False
+        if 'Signbank ID' in value_dict.keys():
+            # make sure it is numerical
+            try:
+                int(value_dict['Signbank ID'])
+            except ValueError:
+                e = gettext('Row {row}: Signbank ID must be numerical: {glossid}').format(row=str(nl+2), glossid=str(value_dict['Signbank ID']))
+                error.append(e)
+                return False
+
+        dataset_name = value_dict['Dataset'].strip()
+
+        # catch possible empty values for dataset, primarily for pretty printing error message
+        if dataset_name == '' or dataset_name is None or dataset_name == 0 or dataset_name == 'NULL':
+            e_dataset_empty = gettext('Row {row}: The Dataset is missing.').format(row=str(nl+2))
+            error.append(e_dataset_empty)
+            return False
+        if dataset_name != dataset.acronym:
+            # seen more than one dataset
+            e3 = gettext('Row {row}: Dataset not in selected datasets: {dataset}').format(row=str(nl+2), dataset=dataset_name)
+            error.append(e3)
+            return False
+
+        # The Lemma ID Gloss may already exist.
+        lemmaidglosstranslations = {}
+        for language in dataset.translation_languages.all():
+            language_name = getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English'])
+            column_name = "Lemma ID Gloss (%s)" % language_name
+            if column_name in value_dict:
+                lemma_idgloss_value = value_dict[column_name]
+                # also stores empty values
+                lemmaidglosstranslations[language] = lemma_idgloss_value
+
+        lemma = None
+        # updating lemmas, propose changes (make dict)
+        if 'Lemma ID' in value_dict.keys():
+            lemmaid = value_dict['Lemma ID']
+            try:
+                lemma = LemmaIdgloss.objects.select_related().get(pk=int(lemmaid))
+            except ObjectDoesNotExist:
+                e = gettext('Row {row}: Could not find lemma for Lemma ID {lemmaid}').format(row=str(nl+2), lemmaid=lemmaid)
+                error.append(e)
+                return True
+        elif 'Signbank ID' in value_dict.keys():
+            glossid = value_dict['Signbank ID']
+            try:
+                gloss = Gloss.objects.select_related().get(pk=int(glossid), archived=False)
+                lemma = gloss.lemma
+                value_dict['Lemma ID'] = str(lemma.pk)
+            except ObjectDoesNotExist:
+                e = gettext('Row {row}: Could not find lemma for Signbank ID {glossid}').format(row=str(nl+2), glossid=glossid)
+                error.append(e)
+                return True
+        if not lemma:
+            e = gettext('Row {row}: Could not identify lemma.').format(row=str(nl+2))
+            error.append(e)
+            return True
+        if lemma.dataset.acronym != dataset_name:
+            e1 = gettext('Row {row}: The Dataset column ({acronym}) does not correspond to that of the Lemma ID ({lemmaid})').format(row=str(nl+2), acronym=dataset.acronym, lemmaid=str(lemma.pk))
+            error.append(e1)
+            # ignore the rest of the row
+            return True
+        # dataset is the same
+
+        # If there are changes in the LemmaIdglossTranslation, the changes should refer to another LemmaIdgloss
+        current_lemmaidglosstranslations = {}
+        for language in lemma.dataset.translation_languages.all():
+            try:
+                lemma_translation = LemmaIdglossTranslation.objects.get(language=language, lemma=lemma)
+                current_lemmaidglosstranslations[language] = lemma_translation.text
+            except (KeyError, IndexError, ValueError, ObjectDoesNotExist, MultipleObjectsReturned):
+                current_lemmaidglosstranslations[language] = ''
+
+        try:
+            (changes_found, errors_found, state['earlier_updates_same_csv'], state['earlier_updates_lemmaidgloss']) = \
+                compare_valuedict_to_lemma(value_dict, lemma.id, self.user_datasets_names, nl,
+                                           lemmaidglosstranslations, current_lemmaidglosstranslations,
+                                           state['earlier_updates_same_csv'], state['earlier_updates_lemmaidgloss'])
+            state['changes'] += changes_found
+
+            if len(errors_found):
+                # more than one error found
+                errors_found_string = '\n'.join(errors_found)
+                error.append(errors_found_string)
+
+        except KeyError as e:
+            error.append(str(e))
+        return True
+
+
+class CreateSentencesCheck(CreateGlossesCheck):
+
+    def check_row(self, state, nl, values):
+        error = state['error']
+        seen_datasets = state['seen_datasets']
+        seen_dataset_names = state['seen_dataset_names']
+        value_dict = value_dict_of_row(self.csv_header, values)
+
+        # 'Dataset' in value_dict keys, checked above
+        dataset_name = value_dict['Dataset'].strip()
+
+        # Check whether the user may change the dataset of the current row
+        if dataset_name not in seen_dataset_names:
+            if seen_datasets:
+                # already seen a dataset
+                # this is a different dataset
+                e3 = gettext("Row {row}: A different dataset is mentioned.").format(row=str(nl+2))
+                e4 = gettext('You can only create glosses for one dataset at a time.')
+                e5 = gettext('To create glosses in multiple datasets, use a separate CSV file for each dataset.')
+                error.append(e3)
+                error.append(e4)
+                error.append(e5)
+                return False
+
+            # only process a dataset_name once for the csv file being imported
+            # catch possible empty values for dataset, primarily for pretty printing error message
+            if dataset_name in ['', None, 0, 'NULL']:
+                e_dataset_empty = gettext("Row {row}: The Dataset is missing.").format(row=str(nl+2))
+                error.append(e_dataset_empty)
+                return False
+            try:
+                dataset = Dataset.objects.get(acronym=dataset_name)
+            except ObjectDoesNotExist:
+                # An error message should be returned here, the dataset does not exist
+                e_dataset_not_found = gettext("Row {row}: Dataset {acronym} does not exist.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
+                error.append(e_dataset_not_found)
+                return False
+
+            if dataset_name not in self.user_datasets_names:
+                e3 = gettext("Row {row}: You are not allowed to change dataset {acronym}.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
+                error.append(e3)
+                return False
+            if dataset not in self.selected_datasets:
+                e3 = gettext("Row {row}: Dataset {acronym} is not selected.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
+                error.append(e3)
+                return False
+            seen_datasets.append(dataset)
+            seen_dataset_names.append(dataset_name)
+        dataset = seen_datasets[0]
+
+        # put creation of value_dict for the new sentence inside an exception to catch any unexpected errors
+        # errors are kept track of as user feedback, but the code needs to be safe
+        try:
+            (new_sentence, already_exists, error_create, state['earlier_creation_same_csv'],
+             state['earlier_creation_annotationidgloss'], state['earlier_creation_lemmaidgloss']) \
+                = create_sentence_from_valuedict(value_dict, dataset, nl, state['earlier_creation_same_csv'],
+                                                 state['earlier_creation_annotationidgloss'],
+                                                 state['earlier_creation_lemmaidgloss'])
+        except (KeyError, ValueError):
+            print('import csv create sentences: got this far in processing loop before exception in row ', str(nl+2))
+            return False
+        if len(error_create):
+            errors_found_string = '\n'.join(error_create)
+            error.append(errors_found_string)
+        else:
+            state['creation'] += new_sentence
+        # whether or not glosses mentioned in the csv file already exist is accumulated in gloss_already_exists
+        state['gloss_already_exists'] += already_exists
+        return True
+
+
+CSV_ROW_CHECKS = {
+    CSVImportJob.CREATE_GLOSSES: CreateGlossesCheck,
+    CSVImportJob.UPDATE_GLOSSES: UpdateGlossesCheck,
+    CSVImportJob.UPDATE_LEMMAS: UpdateLemmasCheck,
+    CSVImportJob.CREATE_SENTENCES: CreateSentencesCheck,
+}
+
+
+class CSVRowApply(abc.ABC):
+    """The apply of the confirmed rows of one kind of import, the values of a row are the fields of the import template.
+    The rows have been checked, apply_row adds an error if a row can not be applied after all"""
+
+    def __init__(self, job, parameters):
+        self.user = job.user
+        self.selected_datasets = list(Dataset.objects.filter(id__in=parameters['datasets']))
+        self.dataset_languages = get_dataset_languages(self.selected_datasets)
+
+    @abc.abstractmethod
+    def apply_row(self, error, row, values):
+        pass
+
+
+class CreateGlossesApply(CSVRowApply):
+
+    def apply_row(self, error, row, values):
+        dataset = values['dataset']
+        try:
+            dataset_object = Dataset.objects.get(acronym=dataset)
+        except ObjectDoesNotExist:
+            # this is an error, this should have already been caught
+            error.append(gettext('Dataset not found: {dataset}').format(dataset=dataset))
+            return
+
+        lemmaidglosstranslations = {}
+        for language in dataset_object.translation_languages.all():
+            lemma_id_gloss = values['lemma_id_gloss_' + language.language_code_2char]
+            if lemma_id_gloss:
+                lemmaidglosstranslations[language] = lemma_id_gloss
+        # Check whether it is an existing one (correct, make a reference), ...
+        existing_lemmas = []
+        for language, term in lemmaidglosstranslations.items():
+            try:
+                existing_lemmas.append(LemmaIdglossTranslation.objects.get(lemma__dataset=dataset_object,
+                                                                           language=language,
+                                                                           text=term).lemma)
+            except ObjectDoesNotExist:
+                # New lemma will be created
+                pass
+
+        if len(existing_lemmas) == len(lemmaidglosstranslations) and len(set(existing_lemmas)) == 1:
+            lemma_for_gloss = existing_lemmas[0]
+        elif len(existing_lemmas) == 0:
+            # the chunk of rows is applied in a transaction
+            lemma_for_gloss = LemmaIdgloss(dataset=dataset_object)
+            lemma_for_gloss.save()
+            for language, term in lemmaidglosstranslations.items():
+                LemmaIdglossTranslation(lemma=lemma_for_gloss, language=language, text=term).save()
+        else:
+            # This case should not happen, it should have been caught in stage 1
+            error.append(gettext('To create glosses in dataset {acronym}, '
+                                 'the combination of Lemma ID Gloss translations should either refer '
+                                 'to an existing Lemma ID Gloss or make up a completely new Lemma ID gloss.').format(
+                acronym=dataset_object.acronym))
+            return
+
+        new_gloss = Gloss()
+        new_gloss.lemma = lemma_for_gloss
+        # Save the new gloss before updating it
+        new_gloss.save()
+        new_gloss.creationDate = DT.datetime.now()
+        new_gloss.creator.add(self.user)
+        new_gloss.excludeFromEcv = False
+        new_gloss.save()
+        for ua in AffiliatedUser.objects.filter(user=self.user):
+            AffiliatedGloss.objects.get_or_create(affiliation=ua.affiliation, gloss=new_gloss)
+
+        for language in self.dataset_languages:
+            annotation_id_gloss = values['annotation_id_gloss_' + language.language_code_2char]
+            if annotation_id_gloss:
+                AnnotationIdglossTranslation(language=language, gloss=new_gloss, text=annotation_id_gloss).save()
+
+
+class UpdateLemmasApply(CSVRowApply):
+    """The row of a lemma is its id"""
+
+    def apply_row(self, error, row, values):
+        lemma = LemmaIdgloss.objects.select_related().get(pk=row)
+
+        with override(LANGUAGE_CODE):
+            # when we do the changes, it has already been confirmed
+            # that changes to the translations ensure that there is at least one translation
+            lemma_idgloss_key_prefix = "Lemma ID Gloss ("
+            for fieldname, new_value in values.items():
+                if not fieldname.startswith(lemma_idgloss_key_prefix):
+                    continue
+                language_name = fieldname[len(lemma_idgloss_key_prefix):-1]
+
+                # compare new value to existing value
+                language_name_column = DEFAULT_LANGUAGE_HEADER_COLUMN['English']
+                language = Language.objects.filter(**{language_name_column: language_name}).first()
+                if not language:
+                    continue
+                lemma_translation = lemma.lemmaidglosstranslation_set.filter(language=language).first()
+                if lemma_translation:
+                    if new_value:
+                        # update the lemma translation
+                        lemma_translation.text = new_value
+                        lemma_translation.save()
+                    else:
+                        # setting a translation to empty deletes the translation
+                        # in the previous stage when proposing changes we have already checked to prevent all translations from being deleted
+                        lemma_translation.delete()
+                elif new_value:
+                    # this is a new lemma translation for the language
+                    LemmaIdglossTranslation(lemma=lemma, language=language, text=new_value).save()
+                # else:
+                    # this case should not occur, there is no translation for the language and the user wants to make an empty one
+
+
+class CreateSentencesApply(CSVRowApply):
+
+    def apply_row(self, error, row, values):
+        gloss_id = values['gloss_pk']
+        try:
+            gloss = Gloss.objects.get(id=int(gloss_id), archived=False)
+        except ObjectDoesNotExist:
+            # this is an error, this should have already been caught
+            error.append(f'Gloss not found: {gloss_id}')
+            return
+
+        dataset_acronym = values['dataset']
+        if not Dataset.objects.filter(acronym=dataset_acronym).exists():
+            # this is an error, this should have already been caught
+            error.append(f'Dataset not found: {dataset_acronym}')
+            return
+
+        csv_create_sentence(self.user, gloss, self.dataset_languages, values, create=True)
+
+
+CSV_ROW_APPLIES = {
+    CSVImportJob.CREATE_GLOSSES: CreateGlossesApply,
+    CSVImportJob.UPDATE_LEMMAS: UpdateLemmasApply,
+    CSVImportJob.CREATE_SENTENCES: CreateSentencesApply,
+}
+
+
+def state_path(job, appendix=STATE_APPENDIX):
+    return os.path.join(WRITABLE_FOLDER, job.csv_file + appendix)
+
+
+class StateEncoder(DjangoJSONEncoder):
+    """Save the datasets of the state as their id and the sets as lists"""
+
+    def default(self, o):
+        if isinstance(o, Dataset):
+            return {STATE_DATASET_KEY: o.id}
+        if isinstance(o, set):
+            return {STATE_SET_KEY: list(o)}
+        return super().default(o)
+
+
+def load_state(job, appendix=STATE_APPENDIX):
+    if not os.path.exists(state_path(job, appendix)):
+        return None
+    datasets = dict()
+
+    def decode_state_object(obj):
+        if STATE_DATASET_KEY in obj:
+            dataset_id = obj[STATE_DATASET_KEY]
+            if dataset_id not in datasets:
+                datasets[dataset_id] = Dataset.objects.get(id=dataset_id)
+            return datasets[dataset_id]
+        if STATE_SET_KEY in obj:
+            return set(obj[STATE_SET_KEY])
+        return obj
+
+    with open(state_path(job, appendix), 'r', encoding='utf-8') as state_file:
+        return json.load(state_file, object_hook=decode_state_object)
+
+
+def save_state(job, state, appendix=STATE_APPENDIX):
+    temporary_path = state_path(job, appendix) + '.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file, cls=StateEncoder)
+        state_file.flush()
+        os.fsync(state_file.fileno())
+    # the state of the last chunk or the one before it is kept
+    os.replace(temporary_path, state_path(job, appendix))
+
+
+def check_csv_rows(job, chunk_size=None):
+    """Check the rows of the file that are not done yet, saving the results after each chunk of rows"""
+    chunk_size = chunk_size or CSV_IMPORT_CHUNK_SIZE
+    parameters = job.get_parameters()
+    row_check = CSV_ROW_CHECKS[job.kind](job, parameters)
+    state = load_state(job) or row_check.initial_state()
+    if not job.rows_total:
+        job.rows_total = sum(1 for _ in csv_file_lines(job.csv_file, parameters['encoding'],
+                                                       start=parameters['header_lines']))
+        CSVImportJob.objects.filter(id=job.id).update(rows_total=job.rows_total)
+    lines = csv_file_lines(job.csv_file, parameters['encoding'], start=parameters['header_lines'] + state['rows_done'])
+    # create a template for an empty row with the desired number of columns
+    empty_row = [''] * len(parameters['header'])
+    while not state['stopped']:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            break
+        rows = []
+        for index, line in enumerate(chunk):
+            values = csv.reader([line], delimiter=parameters['delimiter']).__next__()
+            if values != empty_row:
+                # the row numbers of the messages are those of the body of the csv file
+                rows.append((state['rows_done'] + index, values))
+        row_check.check_chunk(state, rows)
+        state['rows_done'] += len(chunk)
+        save_state(job, state)
+        job.rows_done, job.number_of_errors = state['rows_done'], len(state['error'])
+        CSVImportJob.objects.filter(id=job.id).update(rows_done=job.rows_done, number_of_errors=job.number_of_errors,
+                                                      progressed=timezone.now())
+    # a file without rows has results too
+    save_state(job, state)
+    return state
+
+
+def apply_csv_rows(job, chunk_size=None):
+    """Apply the confirmed rows that are not done yet, each chunk in a transaction with the number of rows done.
+    The errors are saved after each chunk"""
+    chunk_size = chunk_size or CSV_IMPORT_CHUNK_SIZE
+    row_apply = CSV_ROW_APPLIES[job.kind](job, job.get_parameters())
+    state = load_state(job, APPLY_STATE_APPENDIX)
+    rows = state['rows']
+    while job.rows_done < len(rows):
+        chunk = rows[job.rows_done:job.rows_done + chunk_size]
+        errors = list(state['error'])
+        with transaction.atomic():
+            for row, values in chunk:
+                row_apply.apply_row(errors, row, values)
+            job.rows_done, job.number_of_errors = job.rows_done + len(chunk), len(errors)
+            CSVImportJob.objects.filter(id=job.id).update(rows_done=job.rows_done,
+                                                          number_of_errors=job.number_of_errors,
+                                                          progressed=timezone.now())
+        # the errors of a chunk that failed are not kept, the chunk is applied again
+        state['error'] = errors
+        save_state(job, state, APPLY_STATE_APPENDIX)
+    return state
+
+
+def run_csv_import_job(job_id, chunk_size=None):
+    """Run a queued job, returns the job or None if it was taken by another worker"""
+    claimed = CSVImportJob.objects.filter(id=job_id, status=CSVImportJob.QUEUED).update(
+        status=CSVImportJob.RUNNING, started=timezone.now(), progressed=timezone.now())
+    if not claimed:
+        return None
+    job = CSVImportJob.objects.select_related('user').get(id=job_id)
+    try:
+        # the messages are in the interface language of the user who uploaded the file
+        with override(job.get_parameters()['interface_language']):
+            if job.phase == CSVImportJob.APPLY:
+                apply_csv_rows(job, chunk_size)
+            else:
+                check_csv_rows(job, chunk_size)
+        job.message = ''
+        job.status = CSVImportJob.DONE
+    except Exception as e:
+        # a failed job must not stay running, it continues after the saved rows when it is queued again
+        job.message = repr(e)
+        job.status = CSVImportJob.FAILED
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'message', 'finished'])
+    return job
+
+
+def requeue_stale_csv_import_jobs(stale_after=CSV_IMPORT_STALE_AFTER):
+    """Queue the running jobs that made no progress for stale_after again, they were left when a worker stopped.
+    Returns the number of jobs that were queued again"""
+    stale = timezone.now() - stale_after
+    return CSVImportJob.objects.filter(Q(progressed__lt=stale) | Q(progressed=None, started__lt=stale),
+                                       status=CSVImportJob.RUNNING).update(status=CSVImportJob.QUEUED, started=None,
+                                                                          finished=None)
+
+
+def run_queued_csv_import_jobs():
+    """Run the queued jobs in this process, returns the number of jobs that were run"""
+    number_of_jobs = 0
+    for job_id in CSVImportJob.objects.filter(status=CSVImportJob.QUEUED).values_list('id', flat=True):
+        if run_csv_import_job(job_id) is not None:
+            number_of_jobs += 1
+    return number_of_jobs
+
+
+def csv_import_results(job):
+    """The results of a job that is done, as the context of the import template"""
+    state = load_state(job)
+    return {'changes': state['changes'], 'error': state['error'], 'creation': state['creation'],
+            'gloss_already_exists': state['gloss_already_exists'], 'seen_datasets': state['seen_datasets']}
+
+
+def csv_apply_results(job):
+    """The errors of applying the confirmed rows of a job that is done"""
+    return {'error': load_state(job, APPLY_STATE_APPENDIX)['error']}
+
+
+def csv_import_job_status(job):
+    return {'id': job.id, 'kind': job.kind, 'phase': job.phase, 'status': job.status, 'finished': job.is_finished(),
+            'rows_total': job.rows_total, 'rows_done': job.rows_done, 'number_of_errors': job.number_of_errors,
+            'message': job.message if job.status == CSVImportJob.FAILED else ''}
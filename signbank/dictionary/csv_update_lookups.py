@@ -0,0 +1,229 @@
+"""Lookup tables for Import CSV Update Glosses.
+
+All the glosses of the CSV file are loaded before the rows are compared. The same is done for
+their lemma and annotation translations, the field choices, handshapes, semantic fields and tags.
+This takes a fixed number of queries, independent of the number of rows.
+compare_valuedict_to_gloss reads the original values from these tables.
+The confirmed changes of the gloss fields are stored with one bulk update and bulk inserted revisions,
+the work of the post_save signals of Gloss is done once for all changed glosses.
+"""
+
+import datetime as DT
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.utils.timezone import get_current_timezone
+from django.utils.translation import override
+
+from tagging.models import Tag, TaggedItem
+
+from signbank.settings.server_specific import DEFAULT_LANGUAGE_HEADER_COLUMN, LANGUAGE_CODE
+from signbank.dictionary.models import (Dataset, Gloss, Language, LemmaIdglossTranslation,
+                                        AnnotationIdglossTranslation, FieldChoice, Handshape, SemanticField, GlossRevision,
+                                        record_package_changes)
+
+CSV_UPDATE_BATCH_SIZE = 1000
+
+
+class GlossUpdateLookups:
+    """The glosses with the given ids and the values their fields are compared with"""
+
+    def __init__(self, gloss_ids):
+        gloss_ids = set(gloss_ids)
+        self.glosses = Gloss.objects.filter(archived=False).select_related(
+            'lemma__dataset__default_language').prefetch_related('semField').in_bulk(gloss_ids)
+        dataset_ids = set(gloss.lemma.dataset_id for gloss in self.glosses.values() if gloss.lemma)
+
+        self.lemma_translations = defaultdict(dict)
+        for lemma_id, language_id, text in LemmaIdglossTranslation.objects.filter(
+                lemma__gloss__in=self.glosses.keys()).order_by('-id').values_list('lemma_id', 'language_id', 'text'):
+            # as filter().first(), the translation with the lowest id is kept
+            self.lemma_translations[lemma_id][language_id] = text
+
+        self.annotation_translations = defaultdict(dict)
+        self.first_annotations = dict()
+        # the annotations of all glosses of the datasets, to check whether a new annotation already exists
+        self.dataset_annotations = set()
+        for gloss_id, language_id, dataset_id, text in AnnotationIdglossTranslation.objects.filter(
+                gloss__lemma__dataset__in=dataset_ids).order_by('-id').values_list(
+                'gloss_id', 'language_id', 'gloss__lemma__dataset_id', 'text'):
+            self.dataset_annotations.add((dataset_id, language_id, text))
+            if gloss_id in self.glosses:
+                self.annotation_translations[gloss_id][language_id] = text
+                self.first_annotations[gloss_id] = text
+
+        self.translation_languages = defaultdict(list)
+        for dataset_language in Dataset.translation_languages.through.objects.filter(
+                dataset_id__in=dataset_ids).select_related('language').order_by('-language_id'):
+            self.translation_languages[dataset_language.dataset_id].append(dataset_language.language)
+
+        self.languages = dict()
+        for language in Language.objects.all():
+            self.languages.setdefault(getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English']), language)
+
+        # the names are compared in the language of the csv columns
+        with override(LANGUAGE_CODE):
+            self.field_choices = dict()
+            self.field_choices_by_name = defaultdict(dict)
+            self.field_choices_by_machine_value = defaultdict(dict)
+            for field_choice in FieldChoice.objects.order_by('-id'):
+                self.field_choices[field_choice.id] = field_choice
+                self.field_choices_by_name[field_choice.field][field_choice.name.lower()] = field_choice
+                self.field_choices_by_machine_value[field_choice.field][field_choice.machine_value] = field_choice
+            self.handshapes = dict()
+            self.handshapes_by_name = dict()
+            for handshape in Handshape.objects.order_by('-machine_value'):
+                self.handshapes[handshape.machine_value] = handshape
+                self.handshapes_by_name[handshape.name.lower()] = handshape
+            self.semantic_fields_by_name = defaultdict(list)
+            for semantic_field in SemanticField.objects.all():
+                self.semantic_fields_by_name[semantic_field.name.lower()].append(semantic_field)
+
+        self.tag_names = dict(Tag.objects.values_list('id', 'name'))
+        self.gloss_tag_names = defaultdict(list)
+        for object_id, tag_id in TaggedItem.objects.filter(object_id__in=self.glosses.keys()).values_list(
+                'object_id', 'tag_id'):
+            self.gloss_tag_names[object_id].append(self.tag_names[tag_id])
+
+    def language(self, language_name):
+        return self.languages.get(language_name)
+
+    def dataset_languages(self, dataset):
+        if dataset.id not in self.translation_languages:
+            self.translation_languages[dataset.id] = list(dataset.translation_languages.all())
+        return self.translation_languages[dataset.id]
+
+    def lemma_translation(self, gloss, language):
+        """The lemma translation of the gloss in the language or the empty string"""
+        return self.lemma_translations[gloss.lemma_id].get(language.id, '')
+
+    def annotation_translation(self, gloss, language):
+        """The annotation of the gloss in the language or None"""
+        return self.annotation_translations[gloss.id].get(language.id)
+
+    def annotation_exists(self, dataset, language, text):
+        return (dataset.id if dataset else None, language.id, text) in self.dataset_annotations
+
+    def default_annotation(self, gloss):
+        """As get_default_annotationidglosstranslation"""
+        if not gloss.lemma or not gloss.lemma.dataset:
+            return str(gloss.id)
+        annotations = self.annotation_translations[gloss.id]
+        if not annotations:
+            return str(gloss.id)
+        language_id = gloss.lemma.dataset.default_language_id
+        if not language_id and self.translation_languages[gloss.lemma.dataset_id]:
+            language_id = self.translation_languages[gloss.lemma.dataset_id][0].id
+        if language_id in annotations:
+            return annotations[language_id]
+        return self.first_annotations[gloss.id]
+
+    def field_choice_by_name(self, field_choice_category, name):
+        return self.field_choices_by_name[field_choice_category].get(name.lower())
+
+    def handshape_by_name(self, name):
+        return self.handshapes_by_name.get(name.lower())
+
+    def choice_of_gloss(self, gloss, field):
+        """The field choice or handshape of a foreign key field of the gloss, without a query"""
+        value = getattr(gloss, field.attname)
+        if value is None:
+            return None
+        if field.related_model == Handshape:
+            return self.handshapes.get(value)
+        return self.field_choices.get(value)
+
+    def semantic_fields(self, values):
+        """As lookup_semantic_fields, a name that is not found or is ambiguous is left out"""
+        found = dict()
+        for value in values:
+            semantic_fields = self.semantic_fields_by_name.get(value.lower(), [])
+            if len(semantic_fields) == 1:
+                found[semantic_fields[0].machine_value] = semantic_fields[0]
+        return [found[machine_value] for machine_value in sorted(found.keys())]
+
+    def semantic_fields_of_gloss(self, gloss):
+        return sorted(gloss.semField.all(), key=lambda semantic_field: semantic_field.machine_value)
+
+    def tags_as_string(self, gloss_id):
+        """As get_tags_as_string"""
+        tag_names = sorted(self.gloss_tag_names[gloss_id])
+        tag_names_display = ', '.join([tag_name.replace('_', ' ') for tag_name in tag_names])
+        return ', '.join(tag_names), tag_names_display
+
+
+def value_of_confirmed_field(field, new_value, lookups):
+    """The value to store for a gloss field from the machine value posted by the confirmation page"""
+    if isinstance(field, models.BooleanField):
+        if new_value in ['true', 'True', 'TRUE']:
+            return True
+        if new_value in ['None', 'Neutral']:
+            return None
+        return False
+    if isinstance(field, models.ForeignKey) and field.related_model == Handshape:
+        return lookups.handshapes[int(new_value)]
+    if hasattr(field, 'field_choice_category'):
+        return lookups.field_choices_by_machine_value[field.field_choice_category][int(new_value)]
+    return new_value
+
+
+def revision_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (FieldChoice, Handshape)):
+        value = value.name
+    # the revision values are limited in length
+    return str(value)[:100]
+
+
+def apply_confirmed_field_changes(user, field_changes, lookups):
+    """Store the new values of the gloss fields, field_changes maps gloss ids to a dict of field names and
+    posted machine values. Returns the changed glosses"""
+    changed_glosses = []
+    changed_fields = set()
+    revisions = []
+    now = DT.datetime.now(tz=get_current_timezone())
+    with override(LANGUAGE_CODE):
+        for gloss_id, new_values in field_changes.items():
+            gloss = lookups.glosses[gloss_id]
+            gloss_changed = False
+            for fieldname, new_value in new_values.items():
+                field = Gloss.get_field(fieldname)
+                new_value = value_of_confirmed_field(field, new_value, lookups)
+                if isinstance(field, models.ForeignKey):
+                    old_value = lookups.choice_of_gloss(gloss, field)
+                else:
+                    old_value = getattr(gloss, fieldname)
+                if old_value == new_value:
+                    continue
+                setattr(gloss, fieldname, new_value)
+                revisions.append(GlossRevision(gloss=gloss, user=user, time=now, field_name=fieldname,
+                                               old_value=revision_value(old_value),
+                                               new_value=revision_value(new_value)))
+                changed_fields.add(fieldname)
+                gloss_changed = True
+            if gloss_changed:
+                # bulk_update does not set the auto_now field, the packages find changed glosses by it
+                gloss.lastUpdated = now
+                changed_glosses.append(gloss)
+    if not changed_glosses:
+        return changed_glosses
+    with transaction.atomic():
+        Gloss.objects.bulk_update(changed_glosses, sorted(changed_fields) + ['lastUpdated'],
+                                  batch_size=CSV_UPDATE_BATCH_SIZE)
+        GlossRevision.objects.bulk_create(revisions, batch_size=CSV_UPDATE_BATCH_SIZE)
+        after_gloss_changes(changed_glosses, changed_fields)
+    return changed_glosses
+
+
+def after_gloss_changes(glosses, changed_fields):
+    """The work of the post_save signals of Gloss for glosses that were stored with a bulk update"""
+    from signbank.dictionary.phonology_signatures import update_minimalpairs_signatures
+    from signbank.dictionary.frequency_matrix import invalidate_choice_frequencies
+    from signbank.dictionary.dataset_visibility import invalidate_dataset_visibility
+    record_package_changes([(gloss.lemma.dataset_id if gloss.lemma else None, gloss.id) for gloss in glosses],
+                           batch_size=CSV_UPDATE_BATCH_SIZE)
+    update_minimalpairs_signatures(glosses)
+    invalidate_choice_frequencies()
+    if 'inWeb' in changed_fields:
+        invalidate_dataset_visibility()
@@ -0,0 +1,64 @@
+"""The datasets shown in the site banner.
+
+Finding the datasets with public glosses scans all public glosses, so the dataset ids are kept in the process
+until the version of the dataset visibility in the database changes, which happens when a gloss, lemma,
+dataset or dataset permission changes.
+The datasets a user has view permission for are found in one query and kept in the session,
+together with the version of the visibility data they were found with.
+"""
+
+import threading
+
+from guardian.shortcuts import get_objects_for_user
+
+from signbank.dictionary.models import Dataset, Gloss, data_version, bump_data_version
+
+DATASET_VISIBILITY_VERSION = 'dataset_visibility'
+
+_public_dataset_ids_lock = threading.Lock()
+# (version, dataset ids)
+_public_dataset_ids = None
+
+
+def dataset_visibility_version():
+    return data_version(DATASET_VISIBILITY_VERSION)
+
+
+def invalidate_dataset_visibility():
+    bump_data_version(DATASET_VISIBILITY_VERSION)
+
+
+def public_dataset_ids():
+    """The ids of the datasets that have public glosses"""
+    global _public_dataset_ids
+    version = dataset_visibility_version()
+    with _public_dataset_ids_lock:
+        found = _public_dataset_ids
+    if found and found[0] == version:
+        return found[1]
+    dataset_ids = list(Gloss.objects.filter(inWeb=True, archived=False).exclude(lemma=None).values_list(
+        'lemma__dataset__id', flat=True).distinct())
+    with _public_dataset_ids_lock:
+        _public_dataset_ids = (version, dataset_ids)
+    return dataset_ids
+
+
+def user_viewable_dataset_ids(request):
+    """The ids of the datasets the user of the request has view permission for"""
+    if not request.user.is_authenticated:
+        return []
+    if hasattr(request, '_viewable_dataset_ids'):
+        return request._viewable_dataset_ids
+    version = dataset_visibility_version()
+    stored = request.session.get('viewable_dataset_ids', {})
+    if stored.get('user') == request.user.id and stored.get('version') == version:
+        dataset_ids = stored['ids']
+    else:
+        # only the permissions of the user itself count, like get_user_perms
+        dataset_ids = list(get_objects_for_user(request.user, 'view_dataset', Dataset, use_groups=False,
+                                                with_superuser=False, accept_global_perms=False
+                                                ).values_list('id', flat=True))
+        request.session['viewable_dataset_ids'] = {'user': request.user.id, 'version': version, 'ids': dataset_ids}
+        request.session.modified = True
+    request._viewable_dataset_ids = dataset_ids
+    return dataset_ids
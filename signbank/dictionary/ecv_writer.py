@@ -0,0 +1,289 @@
+"""The ECV files of the datasets, the controlled vocabularies of the glosses for ELAN.
+
+The glosses of a dataset, their annotations and the translations of their senses are read with
+a fixed number of queries, and the XML is written to the file while the glosses are visited.
+The descriptions of the glosses are kept in a cache file per dataset. The description of a gloss is
+made again when its lastUpdated changed or a PackageCacheChange was recorded for it, as when
+the translations of its senses changed. write_changed_ecv_files only writes the ECV files of
+the datasets with glosses that changed after their ECV file was written.
+"""
+
+import datetime as DT
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from xml.sax.saxutils import XMLGenerator
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils.translation import override
+
+from signbank.settings.server_specific import (ECV_FOLDER_ABSOLUTE_PATH, ECV_DESCRIPTION_CACHE_FOLDER, ECV_SETTINGS,
+                                               DEFAULT_KEYWORDS_LANGUAGE, PREFIX_URL, URL)
+from signbank.dictionary.models import (Gloss, GlossSense, AnnotationIdglossTranslation, FieldChoice, Handshape,
+                                        package_changes_of_dataset)
+from signbank.dictionary.package_cache import PACKAGE_CACHE_MAX_AGE, PACKAGE_CACHE_CHANGE_MARGIN
+
+ANNOTATION_FIELD_PREFIX = 'annotationidglosstranslation_'
+
+
+def format_ecv_description(field_values, translations):
+    """The description of a gloss from the (field name, value) of ECV_SETTINGS['description_fields']
+    and the translations of its senses"""
+    desc = ""
+    for f, value in field_values:
+        # potential error: this pretty printing assumes a particular ordering of the fields
+        # parens might not match if sorted otherwise
+        # these fields seem to be hard coded
+        if f == 'handedness':
+            desc = value
+        elif f == 'domhndsh':
+            desc = desc + ', (' + value
+        elif f == 'subhndsh':
+            desc = desc + ',' + value
+        elif f == 'handCh':
+            desc = desc + '; ' + value + ')'
+        elif f == 'tokNo':
+            desc = desc + ' [' + value
+        elif f == 'tokNoSgnr':
+            desc = desc + '/' + value + ']'
+        else:
+            desc = desc + ', ' + value
+    if desc:
+        desc += ", "
+    return desc + ", ".join(translations)
+
+
+def ecv_file_path(dataset):
+    return os.path.join(ECV_FOLDER_ABSOLUTE_PATH, dataset.acronym.lower().replace(" ", "_") + ".ecv")
+
+
+def description_cache_path(dataset):
+    return os.path.join(ECV_DESCRIPTION_CACHE_FOLDER, dataset.acronym.lower().replace(" ", "_") + ".json")
+
+
+def description_settings():
+    """The settings the descriptions depend on, the cache is not used when they changed"""
+    return [ECV_SETTINGS['include_phonology_and_frequencies'], ECV_SETTINGS['description_fields']]
+
+
+def read_description_cache(dataset):
+    try:
+        with open(description_cache_path(dataset)) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    # older changes may have been pruned
+    if cache.get('settings') != description_settings() or cache['written'] < time.time() - PACKAGE_CACHE_MAX_AGE:
+        return None
+    return cache
+
+
+def write_description_cache(dataset, cache):
+    os.makedirs(ECV_DESCRIPTION_CACHE_FOLDER, exist_ok=True)
+    cache_path = description_cache_path(dataset)
+    with open(cache_path + '.tmp', 'w') as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(cache_path + '.tmp', cache_path)
+
+
+def changed_since(timestamp):
+    return DT.datetime.fromtimestamp(timestamp - PACKAGE_CACHE_CHANGE_MARGIN, tz=DT.timezone.utc)
+
+
+def ecv_glosses(dataset):
+    return Gloss.none_morpheme_objects().filter(excludeFromEcv=False, lemma__dataset=dataset)
+
+
+def description_foreign_keys():
+    foreign_keys = []
+    for f in ECV_SETTINGS['description_fields']:
+        try:
+            if isinstance(Gloss._meta.get_field(f), models.ForeignKey):
+                foreign_keys.append(f)
+        except FieldDoesNotExist:
+            continue
+    return foreign_keys
+
+
+class DatasetVocabulary:
+    """The glosses of the dataset in the ECV with their annotations and the translations of their senses"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.languages = list(dataset.translation_languages.all())
+        self.glosses = ecv_glosses(dataset).select_related(*description_foreign_keys()).in_bulk()
+
+        # as filter().first(), the annotation with the lowest id is kept
+        self.annotations = defaultdict(dict)
+        self.annotations_by_code = defaultdict(dict)
+        for gloss_id, language_id, language_code_2char, language_code_3char, text in AnnotationIdglossTranslation.objects.filter(
+                gloss__in=self.glosses.keys()).order_by('-id').values_list(
+                'gloss_id', 'language_id', 'language__language_code_2char', 'language__language_code_3char', 'text'):
+            self.annotations[gloss_id][language_id] = text
+            self.annotations_by_code[gloss_id][language_code_2char] = text
+            self.annotations_by_code[gloss_id][language_code_3char] = text
+
+        # the translations of each sense translation, in the order of the senses of the gloss
+        sense_translations = defaultdict(list)
+        for gloss_id, sense_translation_id, language_id, text in GlossSense.objects.filter(
+                gloss__in=self.glosses.keys(), sense__senseTranslations__translations__isnull=False).order_by(
+                'gloss_id', 'order', 'sense_id', 'sense__senseTranslations__id',
+                'sense__senseTranslations__translations__index').values_list(
+                'gloss_id', 'sense__senseTranslations__id', 'sense__senseTranslations__language_id',
+                'sense__senseTranslations__translations__translation__text'):
+            sense_translations[(gloss_id, sense_translation_id, language_id)].append(text.strip())
+        self.translations = defaultdict(list)
+        for (gloss_id, sense_translation_id, language_id), texts in sense_translations.items():
+            if ", ".join(texts):
+                self.translations[(gloss_id, language_id)].append(", ".join(texts))
+
+    def ordered_glosses(self):
+        """The glosses ordered by their annotation in the default language of the dataset, those starting with
+        a letter first. Glosses without annotations come last"""
+        if self.dataset.default_language:
+            language_code_2char = self.dataset.default_language.language_code_2char
+        else:
+            language_code_2char = DEFAULT_KEYWORDS_LANGUAGE['language_code_2char']
+        letters, special, seen = [], [], set()
+        for gloss_id, text in AnnotationIdglossTranslation.objects.filter(
+                gloss__in=self.glosses.keys(), language__language_code_2char=language_code_2char).order_by(
+                'text').values_list('gloss_id', 'text'):
+            if not text or gloss_id in seen:
+                continue
+            seen.add(gloss_id)
+            (letters if re.match(r'^[a-zA-Z]', text) else special).append(self.glosses[gloss_id])
+        empty = [gloss for gloss_id, gloss in sorted(self.glosses.items()) if gloss_id not in self.annotations]
+        return letters + special + empty
+
+    def annotation(self, gloss, language):
+        """As the get_annotation_idgloss_translation template filter"""
+        annotations = self.annotations[gloss.id]
+        if language.id in annotations:
+            return annotations[language.id]
+        return self.annotations_by_code[gloss.id].get('eng', str(gloss.id))
+
+    def field_value(self, gloss, f):
+        from signbank.tools import get_value_for_ecv
+        if f.startswith(ANNOTATION_FIELD_PREFIX):
+            return self.annotations_by_code[gloss.id].get(f[len(ANNOTATION_FIELD_PREFIX):], " ")
+        value = getattr(gloss, f)
+        if isinstance(value, (FieldChoice, Handshape)):
+            return value.name
+        return get_value_for_ecv(gloss, f)
+
+    def description(self, gloss, language):
+        """As get_ecv_description_for_gloss"""
+        field_values = []
+        if ECV_SETTINGS['include_phonology_and_frequencies']:
+            with override(language.language_code_2char):
+                field_values = [(f, self.field_value(gloss, f)) for f in ECV_SETTINGS['description_fields']]
+        return format_ecv_description(field_values, self.translations[(gloss.id, language.id)])
+
+    def descriptions(self, cache):
+        """The descriptions of the glosses by language, from the cache where the gloss did not change"""
+        changed_ids = set()
+        cached = dict()
+        if cache is not None:
+            changed_ids = set(package_changes_of_dataset(self.dataset, changed_since(cache['written'])).values_list(
+                'gloss_id', flat=True))
+            cached = cache['glosses']
+        descriptions = dict()
+        for gloss_id, gloss in self.glosses.items():
+            updated = gloss.lastUpdated.isoformat()
+            entry = cached.get(str(gloss_id))
+            if entry is None or entry['updated'] != updated or gloss_id in changed_ids or not all(
+                    language.language_code_2char in entry['descriptions'] for language in self.languages):
+                entry = {'updated': updated,
+                         'descriptions': dict((language.language_code_2char, self.description(gloss, language))
+                                              for language in self.languages)}
+            descriptions[str(gloss_id)] = entry
+        return descriptions
+
+
+def write_ecv_xml(ecv_file, vocabulary, descriptions):
+    from signbank.dictionary.templatetags.annotation_idgloss_translation import get_iso_639_3_info
+    dataset = vocabulary.dataset
+    resource_url = URL + PREFIX_URL + '/dictionary/gloss/'
+    xml = XMLGenerator(ecv_file, encoding='utf-8', short_empty_elements=True)
+    xml.startDocument()
+    xml.startElement('CV_RESOURCE', {
+        'AUTHOR': '', 'DATE': str(DT.date.today()) + 'T' + str(DT.datetime.now().time()), 'VERSION': '0.2',
+        'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance',
+        'xsi:noNamespaceSchemaLocation': 'http://www.mpi.nl/tools/elan/EAFv2.8.xsd'})
+    for language_code, data in get_iso_639_3_info(vocabulary.languages).items():
+        xml.ignorableWhitespace('\n    ')
+        xml.startElement('LANGUAGE', {'LANG_DEF': data[0], 'LANG_ID': language_code, 'LANG_LABEL': data[1]})
+        xml.endElement('LANGUAGE')
+    xml.ignorableWhitespace('\n    ')
+    xml.startElement('CONTROLLED_VOCABULARY', {'CV_ID': ECV_SETTINGS.get('CV_ID') or dataset.name + '-Signbank-lexicon'})
+    for language in vocabulary.languages:
+        xml.ignorableWhitespace('\n        ')
+        xml.startElement('DESCRIPTION', {'LANG_REF': language.language_code_3char})
+        xml.characters(dataset.description or '')
+        xml.endElement('DESCRIPTION')
+    for gloss in vocabulary.ordered_glosses():
+        gloss_descriptions = descriptions[str(gloss.id)]['descriptions']
+        xml.ignorableWhitespace('\n        ')
+        xml.startElement('CV_ENTRY_ML', {'CVE_ID': str(gloss.id), 'EXT_REF': 'er' + str(gloss.id)})
+        for language in vocabulary.languages:
+            xml.ignorableWhitespace('\n            ')
+            xml.startElement('CVE_VALUE', {'DESCRIPTION': gloss_descriptions[language.language_code_2char],
+                                           'LANG_REF': language.language_code_3char})
+            xml.characters(vocabulary.annotation(gloss, language))
+            xml.endElement('CVE_VALUE')
+        xml.ignorableWhitespace('\n        ')
+        xml.endElement('CV_ENTRY_ML')
+        xml.ignorableWhitespace('\n        ')
+        xml.startElement('EXTERNAL_REF', {'EXT_REF_ID': 'er' + str(gloss.id), 'TYPE': 'resource_url',
+                                          'VALUE': resource_url + str(gloss.id)})
+        xml.endElement('EXTERNAL_REF')
+    xml.ignorableWhitespace('\n    ')
+    xml.endElement('CONTROLLED_VOCABULARY')
+    xml.ignorableWhitespace('\n')
+    xml.endElement('CV_RESOURCE')
+    xml.endDocument()
+
+
+def write_dataset_ecv(dataset):
+    """Write the ECV file of the dataset, returns whether it was written and its path"""
+    started = time.time()
+    ecv_path = ecv_file_path(dataset)
+    vocabulary = DatasetVocabulary(dataset)
+    descriptions = vocabulary.descriptions(read_description_cache(dataset))
+    try:
+        with open(ecv_path + '.tmp', 'w', encoding='utf-8') as ecv_file:
+            write_ecv_xml(ecv_file, vocabulary, descriptions)
+        os.replace(ecv_path + '.tmp', ecv_path)
+    except PermissionError:
+        return False, ecv_path
+    write_description_cache(dataset, {'written': started, 'settings': description_settings(),
+                                      'glosses': descriptions})
+    return True, ecv_path
+
+
+def ecv_file_is_current(dataset):
+    """Whether no gloss of the dataset changed after its ECV file was written"""
+    ecv_path = ecv_file_path(dataset)
+    if not os.path.exists(ecv_path):
+        return False
+    written = os.path.getmtime(ecv_path)
+    # older changes may have been pruned
+    if written < time.time() - PACKAGE_CACHE_MAX_AGE:
+        return False
+    since = changed_since(written)
+    return (not package_changes_of_dataset(dataset, since).exists()
+            and not ecv_glosses(dataset).filter(lastUpdated__gte=since).exists())
+
+
+def write_changed_ecv_files(datasets):
+    """Write the ECV files of the datasets whose glosses changed, returns the written and failed paths"""
+    written, failed = [], []
+    for dataset in datasets:
+        if ecv_file_is_current(dataset) or not ecv_glosses(dataset).exists():
+            continue
+        success, ecv_path = write_dataset_ecv(dataset)
+        (written if success else failed).append(ecv_path)
+    return written, failed
@@ -1,9 +1,8 @@
-from django.db.models import Q
-
 from signbank.settings.server_specific import FIELDS, HANDEDNESS_ARTICULATION_FIELDS, HANDSHAPE_ETYMOLOGY_FIELDS
 from signbank.dictionary.models import (Gloss, Morpheme, Handshape, FieldChoice, Definition, MorphologyDefinition,
                                         ExampleSentence, OtherMedia, DerivationHistory, SemanticField,
                                         CATEGORY_MODELS_MAPPING, PhonologicalVariation)
+from signbank.dictionary.frequency_matrix import choice_frequencies
 from signbank.dictionary.translate_choice_list import (choicelist_queryset_to_translated_dict,
                                                        choicelist_queryset_to_machine_value_dict,
                                                        choicelist_queryset_to_colors)
@@ -154,15 +153,17 @@ def get_static_choice_lists(fieldname):
 
 def get_frequencies_for_category(category, fields, selected_datasets):
 
-    # get the field choices and the appropriate filter for querying the Gloss model (next step)
+    # get the field choices of the category
     if category in CATEGORY_MODELS_MAPPING.keys():
-        field_choices = CATEGORY_MODELS_MAPPING[category].objects.all()
         # the Gloss field is a handshape object or a many-to-many relation
-        field_filter = '__in'
+        field_choices = list(CATEGORY_MODELS_MAPPING[category].objects.all())
     else:
-        field_choices = FieldChoice.objects.filter(field__iexact=category)
         # the Gloss field is a FieldChoiceForeignKey
-        field_filter = '__machine_value__in'
+        field_choices = list(FieldChoice.objects.filter(field__iexact=category))
+    choice_objects = dict((choice.machine_value, choice) for choice in field_choices)
+
+    # the frequencies of the choices of each field, empty values are counted as machine value 0
+    frequencies = choice_frequencies(selected_datasets, fields)
 
     choices = dict()
 
@@ -176,22 +177,7 @@ def get_frequencies_for_category(category, fields, selected_datasets):
         # but for handshapes multiple fields have the same category, so this is a loop over the fields
         # the frequencies for all handshape fields for each choice are included
         for choice_list_field, machine_value in choice_list_machine_values:
-
-            if machine_value == 0:
-                # if the machine value is 0 or the field has not been set
-                # check for the machine value 0 object or a null field value
-
-                filter = field + '__machine_value'
-                frequency_for_field = Gloss.objects.filter(Q(lemma__dataset__in=selected_datasets, archived=False),
-                                                           Q(**{field + '__isnull': True}) |
-                                                           Q(**{filter: 0})).count()
-
-            else:
-                # otherwise, count the number of matches to the machine value
-                filter = field + field_filter
-                filter_value = [machine_value]
-                frequency_for_field = Gloss.objects.filter(lemma__dataset__in=selected_datasets, archived=False).filter(
-                    **{filter: filter_value}).count()
+            frequency_for_field = frequencies[field].get(machine_value, 0)
             if choice_list_field not in choices.keys():
                 choices[choice_list_field] = frequency_for_field
             else:
@@ -204,7 +190,7 @@ def get_frequencies_for_category(category, fields, selected_datasets):
         # concatenate the frequency determined above to the 'name' of the choice
         mvid, mvv = machine_value_string.split('_')
         machine_value = int(mvv)
-        choice_object = field_choices.get(machine_value=machine_value)
+        choice_object = choice_objects[machine_value]
         choice_name = choice_list[machine_value_string]
         display_with_frequency = choice_name + ' [' + str(frequency) + ']'
         category_choices.append((choice_object, display_with_frequency))
@@ -0,0 +1,59 @@
+"""The frequencies of the choices of the gloss fields per dataset.
+
+For each field the glosses of a dataset are counted per machine value in one grouped query.
+Glosses without a value are counted with machine value 0.
+The counts are kept in the cache per dataset until a gloss or a choice list changes.
+The version in the cache key is stored in the database, so a change is seen by all processes,
+also when each process has its own cache.
+"""
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from signbank.dictionary.models import Gloss, data_version, bump_data_version
+
+CHOICE_FREQUENCIES_VERSION = 'choice_frequencies'
+CHOICE_FREQUENCIES_TIMEOUT = 60 * 60
+
+
+def choice_frequencies_version():
+    return data_version(CHOICE_FREQUENCIES_VERSION)
+
+
+def invalidate_choice_frequencies():
+    bump_data_version(CHOICE_FREQUENCIES_VERSION)
+
+
+def count_field_choices(dataset_id, field):
+    """Map the machine values of the field to the number of glosses of the dataset with that value"""
+    # the machine value is the primary key of handshapes, semantic fields and derivation histories
+    rows = Gloss.objects.filter(lemma__dataset_id=dataset_id, archived=False).values(
+        field + '__machine_value').annotate(frequency=Count('id', distinct=True)).order_by()
+    frequencies = dict()
+    for row in rows:
+        machine_value = row[field + '__machine_value'] or 0
+        frequencies[machine_value] = frequencies.get(machine_value, 0) + row['frequency']
+    return frequencies
+
+
+def dataset_choice_frequencies(dataset_id, fields):
+    """The frequencies of the choices of the fields in the dataset, fields missing from the cache are counted"""
+    cache_key = 'choice_frequencies_%s_%s' % (dataset_id, choice_frequencies_version())
+    frequencies = cache.get(cache_key) or dict()
+    missing_fields = [field for field in fields if field not in frequencies]
+    if missing_fields:
+        for field in missing_fields:
+            frequencies[field] = count_field_choices(dataset_id, field)
+        cache.set(cache_key, frequencies, CHOICE_FREQUENCIES_TIMEOUT)
+    return frequencies
+
+
+def choice_frequencies(datasets, fields):
+    """Map each field to a dictionary of machine values to frequencies, summed over the datasets"""
+    frequencies = dict((field, dict()) for field in fields)
+    for dataset in datasets:
+        dataset_frequencies = dataset_choice_frequencies(dataset.id, fields)
+        for field in fields:
+            for machine_value, frequency in dataset_frequencies[field].items():
+                frequencies[field][machine_value] = frequencies[field].get(machine_value, 0) + frequency
+    return frequencies
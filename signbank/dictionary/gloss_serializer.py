@@ -0,0 +1,392 @@
+"""Bulk version of Gloss.get_fields_dict, used by the API and the package export.
+
+All related rows are fetched up front in a fixed number of queries, independent of the number of glosses.
+The dictionaries produced are identical to those of Gloss.get_fields_dict.
+"""
+
+import os
+from collections import defaultdict
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils.encoding import escape_uri_path
+from django.utils.translation import activate, gettext
+
+from tagging.models import TaggedItem
+
+from signbank.settings.server_specific import GLOSS_VIDEO_DIRECTORY, WRITABLE_FOLDER
+
+from signbank.dictionary.models import (Gloss, GlossSense, Translation, FieldChoice, Definition, AffiliatedGloss,
+                                        MorphologyDefinition, SimultaneousMorphologyDefinition, BlendMorphology,
+                                        AnnotationIdglossTranslation)
+
+SKIPPED_FIELDS = ['final_domhndsh', 'final_subhndsh', 'morphemePart', 'senses']
+EMPTY_VALUES = ['', '-', "None"]
+
+
+def gloss_fields_data():
+    """The (name, verbose title, field choice category) of the Gloss fields, as used by get_fields_dict"""
+    fields_data = []
+    for fname in Gloss.get_field_names():
+        field = Gloss.get_field(fname)
+        fc_category = field.field_choice_category if hasattr(field, 'field_choice_category') else None
+        fields_data.append((field.name, field.verbose_name.title(), fc_category))
+    return fields_data
+
+
+def idgloss_from_translations(gloss, lemma_translations):
+    # mirrors the fallbacks of the Gloss.idgloss property
+    if not gloss.lemma or not gloss.lemma.dataset:
+        return str(gloss.id)
+    default_language = gloss.lemma.dataset.default_language_id
+    for translation in lemma_translations:
+        if translation.language_id == default_language:
+            return translation.text
+    for translation in lemma_translations:
+        if translation.language.language_code_2char == settings.DEFAULT_KEYWORDS_LANGUAGE['language_code_2char']:
+            return translation.text
+    if lemma_translations:
+        return lemma_translations[0].text
+    return str(gloss.id)
+
+
+def default_annotations_of_glosses(gloss_ids):
+    """Bulk version of tools.get_default_annotationidglosstranslation, returns a dict gloss id -> annotation"""
+    if not gloss_ids:
+        return {}
+    glosses = Gloss.objects.filter(id__in=gloss_ids).select_related('lemma__dataset')
+    annotations = defaultdict(list)
+    for annotation in AnnotationIdglossTranslation.objects.filter(gloss_id__in=gloss_ids).order_by('pk'):
+        annotations[annotation.gloss_id].append(annotation)
+    first_language_of_dataset = {}
+    default_annotations = {}
+    for gloss in glosses:
+        if not gloss.lemma or not gloss.lemma.dataset:
+            default_annotations[gloss.id] = str(gloss.id)
+            continue
+        dataset = gloss.lemma.dataset
+        language_id = dataset.default_language_id
+        if not language_id:
+            if dataset.id not in first_language_of_dataset:
+                first_language = dataset.translation_languages.first()
+                first_language_of_dataset[dataset.id] = first_language.id if first_language else None
+            language_id = first_language_of_dataset[dataset.id]
+        annotations_of_gloss = annotations[gloss.id]
+        if not annotations_of_gloss:
+            default_annotations[gloss.id] = str(gloss.id)
+            continue
+        in_language = [a.text for a in annotations_of_gloss if a.language_id == language_id]
+        default_annotations[gloss.id] = in_language[0] if in_language else annotations_of_gloss[0].text
+    return default_annotations
+
+
+class GlossFieldsDictBuilder:
+    """Collects the related data of a list of glosses and builds the get_fields_dict output for each of them"""
+
+    def __init__(self, glosses, fieldnames, language_code, include_checksums=False):
+        activate(language_code)
+        self.fieldnames = fieldnames
+        self.include_checksums = include_checksums
+        if hasattr(glosses, 'select_related'):
+            glosses = glosses.select_related('lemma__dataset', 'domhndsh', 'subhndsh')
+        self.glosses = list(glosses)
+        self.gloss_ids = [gloss.id for gloss in self.glosses]
+        self.fields_data = [(f, verbose_name, fc_category) for (f, verbose_name, fc_category) in gloss_fields_data()
+                            if f not in SKIPPED_FIELDS]
+        self.requested = set(fieldnames)
+        self.load()
+
+    def wanted(self, label):
+        return label in self.requested
+
+    def load(self):
+        prefetches = ['lemma__dataset__translation_languages',
+                      'lemma__lemmaidglosstranslation_set__language',
+                      'annotationidglosstranslation_set']
+        verbose_names = dict((f, verbose_name) for (f, verbose_name, fc_category) in self.fields_data)
+        for f in ['creator', 'semField', 'derivHist', 'signlanguage']:
+            if f in verbose_names and self.wanted(verbose_names[f]):
+                prefetches.append(f)
+        if 'dialect' in verbose_names and self.wanted(verbose_names['dialect']):
+            prefetches.append('dialect__signlanguage')
+        prefetch_related_objects(self.glosses, *prefetches)
+
+        fieldchoice_ids = set()
+        for (f, verbose_name, fc_category) in self.fields_data:
+            if fc_category and self.wanted(verbose_name):
+                attname = Gloss.get_field(f).attname
+                fieldchoice_ids.update(getattr(gloss, attname) for gloss in self.glosses)
+        fieldchoice_ids.discard(None)
+        self.fieldchoices = FieldChoice.objects.in_bulk(list(fieldchoice_ids)) if fieldchoice_ids else {}
+
+        self.senses = self.load_senses() if any(f.startswith(gettext("Senses")) for f in self.fieldnames) else {}
+        self.video_paths = self.load_video_paths() if self.wanted(gettext("Video")) else {}
+        self.tags = self.load_tags() if self.wanted(gettext("Tags")) else {}
+        self.notes = self.load_notes() if self.wanted(gettext("Notes")) else {}
+        self.affiliations = self.load_affiliations() if self.wanted(gettext("Affiliation")) else {}
+        self.load_morphology()
+        self.perspective_videos = self.load_perspective_videos() \
+            if self.wanted(gettext("Perspective Videos")) else {}
+        self.nme_videos, self.nme_descriptions = self.load_nme_videos() \
+            if self.wanted(gettext("NME Videos")) else ({}, {})
+
+    def load_senses(self):
+        glosssenses = GlossSense.objects.filter(gloss_id__in=self.gloss_ids).select_related('sense').prefetch_related(
+            'sense__senseTranslations',
+            Prefetch('sense__senseTranslations__translations',
+                     queryset=Translation.objects.select_related('translation').order_by('index')))
+        senses = defaultdict(list)
+        for glosssense in glosssenses.order_by('gloss_id', 'order'):
+            senses[glosssense.gloss_id].append(glosssense.sense)
+        return senses
+
+    def load_video_paths(self):
+        from signbank.video.models import GlossVideo
+        video_paths = {}
+        glossvideos = GlossVideo.objects.filter(gloss_id__in=self.gloss_ids, gloss__archived=False,
+                                                glossvideonme=None, glossvideoperspective=None,
+                                                version=0).order_by('pk').values_list('gloss_id', 'videofile')
+        for gloss_id, videofile in glossvideos:
+            # in the case of multiple version 0 objects the first is used, like Gloss.get_video_path
+            video_paths.setdefault(gloss_id, str(videofile))
+        return video_paths
+
+    def load_tags(self):
+        tags = defaultdict(list)
+        for tagged_item in TaggedItem.objects.filter(object_id__in=self.gloss_ids).select_related('tag'):
+            tags[tagged_item.object_id].append(str(tagged_item.tag))
+        return tags
+
+    def load_notes(self):
+        notes = defaultdict(list)
+        for note in Definition.objects.filter(gloss_id__in=self.gloss_ids).select_related('role'):
+            notes[note.gloss_id].append(note.note_tuple())
+        return notes
+
+    def load_affiliations(self):
+        affiliations = defaultdict(list)
+        for affiliated_gloss in AffiliatedGloss.objects.filter(gloss_id__in=self.gloss_ids).select_related('affiliation'):
+            affiliations[affiliated_gloss.gloss_id].append(affiliated_gloss.affiliation.acronym)
+        return affiliations
+
+    def load_morphology(self):
+        self.sequential_morphology = defaultdict(list)
+        self.simultaneous_morphology = defaultdict(list)
+        self.blend_morphology = defaultdict(list)
+        component_ids = set()
+        if self.wanted(gettext("Sequential Morphology")):
+            for mdef in MorphologyDefinition.objects.filter(parent_gloss_id__in=self.gloss_ids,
+                                                            parent_gloss__archived=False,
+                                                            morpheme__archived=False).order_by('pk'):
+                self.sequential_morphology[mdef.parent_gloss_id].append(mdef.morpheme_id)
+                component_ids.add(mdef.morpheme_id)
+        if self.wanted(gettext("Simultaneous Morphology")):
+            for sim_morph in SimultaneousMorphologyDefinition.objects.filter(parent_gloss_id__in=self.gloss_ids,
+                                                                             parent_gloss__archived=False).order_by('pk'):
+                self.simultaneous_morphology[sim_morph.parent_gloss_id].append((sim_morph.morpheme_id, sim_morph.role))
+                component_ids.add(sim_morph.morpheme_id)
+        if self.wanted(gettext("Blend Morphology")):
+            for blend in BlendMorphology.objects.filter(parent_gloss_id__in=self.gloss_ids,
+                                                        parent_gloss__archived=False,
+                                                        glosses__archived=False).order_by('pk'):
+                self.blend_morphology[blend.parent_gloss_id].append((blend.glosses_id, blend.role))
+                component_ids.add(blend.glosses_id)
+        self.default_annotations = default_annotations_of_glosses(list(component_ids))
+
+    def load_perspective_videos(self):
+        from signbank.video.models import GlossVideoPerspective
+        perspective_videos = defaultdict(list)
+        for perspectivevideo in GlossVideoPerspective.objects.filter(gloss_id__in=self.gloss_ids, version=0):
+            perspective_videos[perspectivevideo.gloss_id].append(perspectivevideo)
+        return perspective_videos
+
+    def load_nme_videos(self):
+        from signbank.video.models import GlossVideoNME, GlossVideoDescription
+        nme_videos = defaultdict(list)
+        for nmevideo in GlossVideoNME.objects.filter(gloss_id__in=self.gloss_ids, perspective__in=['', 'center'],
+                                                     version=0):
+            nme_videos[nmevideo.gloss_id].append(nmevideo)
+        descriptions = {}
+        for description in GlossVideoDescription.objects.filter(nmevideo__gloss_id__in=self.gloss_ids,
+                                                                nmevideo__perspective__in=['', 'center'],
+                                                                nmevideo__version=0).order_by('pk'):
+            descriptions.setdefault((description.nmevideo_id, description.language_id), description.text)
+        return nme_videos, descriptions
+
+    def field_value(self, gloss, f, fieldchoice_category):
+        if f == 'lastUpdated':
+            return gloss.lastUpdated.date()
+        if f == 'creator':
+            return ', '.join([c.first_name for c in gloss.creator.all()])
+        if f in ['domhndsh', 'subhndsh', 'semField', 'derivHist', 'dialect', 'signlanguage']:
+            # these display methods use the select_related and prefetched objects
+            return getattr(gloss, 'get_' + f + '_display')()
+        if fieldchoice_category:
+            fieldchoice = self.fieldchoices.get(getattr(gloss, Gloss.get_field(f).attname))
+            if fieldchoice is None or fieldchoice.machine_value == 0:
+                return None
+            return fieldchoice.name
+        return str(getattr(gloss, f))
+
+    def video_path_on_disk(self, gloss, idgloss):
+        # same as video.models.get_gloss_path_to_video_file_on_disk, without looking up the idgloss again
+        from signbank.tools import get_two_letter_dir
+        if not gloss.lemma or not gloss.lemma.dataset:
+            return ""
+        relative_path = os.path.join(GLOSS_VIDEO_DIRECTORY, gloss.lemma.dataset.acronym,
+                                     get_two_letter_dir(idgloss), f'{idgloss}-{gloss.id}.mp4')
+        if os.path.exists(os.path.join(WRITABLE_FOLDER, relative_path)):
+            return relative_path
+        return ""
+
+    def video_url(self, gloss, idgloss):
+        from signbank.video.models import detect_video_file_extension
+        video_path = self.video_paths.get(gloss.id)
+        if video_path is None:
+            video_path = self.video_path_on_disk(gloss, idgloss)
+        if not video_path:
+            return '', ''
+        filepath = os.path.join(WRITABLE_FOLDER, video_path)
+        if not os.path.exists(filepath) or not detect_video_file_extension(filepath):
+            return '', ''
+        return escape_uri_path(video_path), video_path
+
+    def fields_dict(self, gloss):
+        from signbank.tools import get_checksum_for_path
+
+        fieldnames = self.fieldnames
+        fields = {}
+        lemma_translations = list(gloss.lemma.lemmaidglosstranslation_set.all()) if gloss.lemma else []
+        idgloss = idgloss_from_translations(gloss, lemma_translations)
+        if 'idgloss' in fieldnames:
+            fields['idgloss'] = idgloss
+
+        dataset = gloss.lemma.dataset if gloss.lemma else None
+        languages = list(dataset.translation_languages.all()) if dataset else []
+        annotation_translations = list(gloss.annotationidglosstranslation_set.all())
+        for language in languages:
+            texts = [t.text for t in lemma_translations if t.language_id == language.id]
+            field_name = gettext("Lemma ID Gloss") + ": %s" % language.name
+            if texts and field_name in fieldnames:
+                fields[field_name] = texts[0]
+        for language in languages:
+            texts = [t.text for t in annotation_translations if t.language_id == language.id]
+            field_name = gettext("Annotation ID Gloss") + ": %s" % language.name
+            if texts and field_name in fieldnames:
+                fields[field_name] = texts[0]
+
+        for language in languages:
+            field_name = gettext("Senses") + ": %s" % language.name
+            if field_name not in fieldnames:
+                continue
+            sensetranslations_for_this_language = dict()
+            for sensei, sense in enumerate(self.senses.get(gloss.id, []), 1):
+                sensetranslations = [st for st in sense.senseTranslations.all() if st.language_id == language.id]
+                if not sensetranslations:
+                    continue
+                keywords_list = [str(trans.translation.text) for trans in sensetranslations[0].translations.all()
+                                 if trans.translation.text != '']
+                if keywords_list:
+                    sensetranslations_for_this_language[str(sensei)] = ', '.join(keywords_list)
+            if sensetranslations_for_this_language.keys():
+                fields[field_name] = sensetranslations_for_this_language
+
+        for (f, field_verbose_name, fieldchoice_category) in self.fields_data:
+            if field_verbose_name not in fieldnames:
+                continue
+            field_value = self.field_value(gloss, f, fieldchoice_category)
+            if field_value is not None and field_value not in EMPTY_VALUES:
+                fields[field_verbose_name] = field_value
+
+        link_fieldname = gettext("Link")
+        if link_fieldname in fieldnames:
+            fields[link_fieldname] = str(settings.URL) + settings.PREFIX_URL + '/dictionary/gloss/' + str(gloss.pk)
+
+        video_fieldname = gettext("Video")
+        if video_fieldname in fieldnames:
+            video_url, video_path = self.video_url(gloss, idgloss)
+            if video_url:
+                fields[video_fieldname] = settings.URL + settings.PREFIX_URL + '/dictionary/protected_media/' + video_url
+                if self.include_checksums:
+                    fields[video_fieldname + '_checksum'] = get_checksum_for_path(
+                        os.path.join(WRITABLE_FOLDER, video_path))
+
+        tags_fieldname = gettext("Tags")
+        if tags_fieldname in fieldnames and self.tags.get(gloss.id):
+            fields[tags_fieldname] = sorted(self.tags[gloss.id])
+
+        notes_fieldname = gettext("Notes")
+        if notes_fieldname in fieldnames and self.notes.get(gloss.id):
+            notes_display = []
+            for (role, published, count, text) in sorted(self.notes[gloss.id], key=lambda x: (x[0], x[1], x[2], x[3])):
+                tuple_dict = dict()
+                tuple_dict[gettext("Published")] = published
+                tuple_dict[gettext("Index")] = count
+                tuple_dict[gettext("Type")] = role
+                tuple_dict[gettext("Text")] = text
+                notes_display.append(tuple_dict)
+            fields[notes_fieldname] = notes_display
+
+        affiliation_fieldname = gettext("Affiliation")
+        if affiliation_fieldname in fieldnames:
+            fields[affiliation_fieldname] = sorted(self.affiliations.get(gloss.id, []))
+
+        sequential_morphology = " + ".join([self.default_annotations[morpheme_id]
+                                            for morpheme_id in self.sequential_morphology.get(gloss.id, [])])
+        if sequential_morphology:
+            fields[gettext("Sequential Morphology")] = sequential_morphology
+
+        simultaneous_morphology = ", ".join([self.default_annotations[morpheme_id] + ':' + (role if role else '-')
+                                             for (morpheme_id, role) in self.simultaneous_morphology.get(gloss.id, [])])
+        if simultaneous_morphology:
+            fields[gettext("Simultaneous Morphology")] = simultaneous_morphology
+
+        blend_morphology = ', '.join([':'.join((self.default_annotations[component_id], role))
+                                      for (component_id, role) in self.blend_morphology.get(gloss.id, [])])
+        if blend_morphology:
+            fields[gettext("Blend Morphology")] = blend_morphology
+
+        perspective_videos_label = gettext("Perspective Videos")
+        if self.perspective_videos.get(gloss.id):
+            perspective_video_list = []
+            for perspectivevideo in self.perspective_videos[gloss.id]:
+                perspective_info = dict()
+                perspective_info["ID"] = str(perspectivevideo.id)
+                perspective_info[gettext("Link")] = (settings.URL + settings.PREFIX_URL + '/dictionary/protected_media/'
+                                                     + perspectivevideo.get_video_path())
+                if self.include_checksums:
+                    perspective_info['Checksum'] = get_checksum_for_path(
+                        os.path.join(WRITABLE_FOLDER, unquote(perspectivevideo.get_video_path())))
+                perspective_video_list.append(perspective_info)
+            fields[perspective_videos_label] = perspective_video_list
+
+        nme_videos_label = gettext("NME Videos")
+        if self.nme_videos.get(gloss.id):
+            nme_video_list = []
+            for nmevideo in self.nme_videos[gloss.id]:
+                nme_info = dict()
+                nme_info["ID"] = str(nmevideo.id)
+                nme_info[gettext("Index")] = str(nmevideo.offset)
+                for language in languages:
+                    info_field_name = gettext("Description") + ": %s" % language.name
+                    nme_info[info_field_name] = self.nme_descriptions.get((nmevideo.id, language.id), "")
+                nme_info[gettext("Link")] = (settings.URL + settings.PREFIX_URL + '/dictionary/protected_media/'
+                                             + nmevideo.get_video_path())
+                nme_info[gettext("Perspective")] = nmevideo.perspective
+                if self.include_checksums:
+                    nme_info['Checksum'] = get_checksum_for_path(
+                        os.path.join(WRITABLE_FOLDER, unquote(nmevideo.get_video_path())))
+                nme_video_list.append(nme_info)
+            fields[nme_videos_label] = nme_video_list
+
+        return fields
+
+    def fields_dicts(self):
+        return dict((gloss.id, self.fields_dict(gloss)) for gloss in self.glosses)
+
+
+def get_fields_dicts(glosses, fieldnames, language_code, include_checksums=False):
+    """Return a dict gloss id -> Gloss.get_fields_dict(fieldnames, language_code) for a queryset or list of glosses"""
+    builder = GlossFieldsDictBuilder(glosses, fieldnames, language_code, include_checksums=include_checksums)
+    return builder.fields_dicts()
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.core.exceptions import ObjectDoesNotExist
+from signbank.dictionary.models import Dataset
+from signbank.dictionary.phonology_signatures import rebuild_minimalpairs_signatures
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored phonology signatures used for minimal pairs, ' \
+           'for instance after the minimal pairs fields have been changed or glosses were updated in bulk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset_acronym', nargs="*", type=str)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Process all datasets",
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            dataset_acronyms = list(Dataset.objects.values_list('acronym', flat=True))
+        elif options['dataset_acronym']:
+            dataset_acronyms = options['dataset_acronym']
+        else:
+            print("No datasets given (or --all)")
+            return
+
+        for dataset_acronym in dataset_acronyms:
+            print("Processing", dataset_acronym)
+            try:
+                dataset = Dataset.objects.get(acronym=dataset_acronym)
+            except ObjectDoesNotExist as e:
+                print("Dataset '{}' not found.".format(dataset_acronym), e)
+                continue
+            rebuild_minimalpairs_signatures(dataset)
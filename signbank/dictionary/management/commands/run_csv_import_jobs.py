@@ -0,0 +1,55 @@
+"""Run the CSV import jobs that are still queued, for instance after the server was restarted.
+
+A job is only run when it is queued. A job that is marked as running but made no progress
+for --stale-after minutes was left when its worker stopped, it is queued again first and continues
+after its saved rows. Run this command after a restart of the server, or periodically from cron."""
+
+import datetime as DT
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from signbank.dictionary.models import CSVImportJob
+from signbank.dictionary.csv_import_jobs import (run_queued_csv_import_jobs, requeue_stale_csv_import_jobs,
+                                                 remove_csv_upload, CSV_IMPORT_STALE_AFTER)
+
+
+class Command(BaseCommand):
+
+    help = 'Check or apply the rows of the queued CSV import jobs in this process. A job continues after its saved rows. ' \
+           'Running jobs that made no progress for --stale-after minutes are queued again first. ' \
+           'With --requeue-running and --retry-failed, all jobs that are running or failed are run again.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-after', type=int, metavar='MINUTES',
+                            default=int(CSV_IMPORT_STALE_AFTER.total_seconds() // 60),
+                            help='Queue the running jobs that made no progress for this number of minutes again')
+        parser.add_argument('--requeue-running', action='store_true',
+                            help='Queue all the jobs that are marked as running again, '
+                                 'only use this when no other process runs CSV import jobs')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Queue the failed jobs again')
+        parser.add_argument('--remove-older-than', type=int, metavar='DAYS',
+                            help='Remove the finished jobs and their files that are older than this number of days')
+
+    def handle(self, *args, **options):
+        number_of_stale = requeue_stale_csv_import_jobs(DT.timedelta(minutes=options['stale_after']))
+        print("Stale CSV import jobs queued again:", number_of_stale)
+        statuses = []
+        if options['requeue_running']:
+            statuses.append(CSVImportJob.RUNNING)
+        if options['retry_failed']:
+            statuses.append(CSVImportJob.FAILED)
+        if statuses:
+            number_of_requeued = CSVImportJob.objects.filter(status__in=statuses).update(
+                status=CSVImportJob.QUEUED, started=None, finished=None)
+            print("CSV import jobs queued again:", number_of_requeued)
+        number_of_jobs = run_queued_csv_import_jobs()
+        print("CSV import jobs run:", number_of_jobs)
+        if options['remove_older_than'] is not None:
+            old_jobs = CSVImportJob.objects.filter(
+                status__in=[CSVImportJob.DONE, CSVImportJob.FAILED],
+                created__lt=timezone.now() - DT.timedelta(days=options['remove_older_than']))
+            for job in old_jobs:
+                remove_csv_upload(job.csv_file)
+            number_of_removed, _ = old_jobs.delete()
+            print("CSV import jobs removed:", number_of_removed)
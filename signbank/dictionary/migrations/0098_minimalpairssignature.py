@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0097_alter_gloss_absorifing_alter_gloss_absoripalm_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MinimalPairsSignature',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signature', models.TextField(blank=True)),
+                ('excluded', models.BooleanField(default=False)),
+                ('lastUpdated', models.DateTimeField(auto_now=True, verbose_name='Last updated')),
+                ('dataset', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='dictionary.dataset')),
+                ('gloss', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='minimalpairs_signature', to='dictionary.gloss')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['dataset', 'excluded'], name='minimalpairs_dataset_idx')],
+            },
+        ),
+    ]
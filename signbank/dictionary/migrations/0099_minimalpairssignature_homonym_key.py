@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:37
+
+from django.db import migrations, models
+
+
+def remove_signatures_without_homonym_key(apps, schema_editor):
+    # the signatures are rebuilt per dataset on first use, this time including the homonym key
+    MinimalPairsSignature = apps.get_model('dictionary', 'MinimalPairsSignature')
+    MinimalPairsSignature.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0098_minimalpairssignature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='minimalpairssignature',
+            name='homonym_key',
+            field=models.CharField(blank=True, db_index=True, max_length=32),
+        ),
+        migrations.RunPython(remove_signatures_without_homonym_key, migrations.RunPython.noop),
+    ]
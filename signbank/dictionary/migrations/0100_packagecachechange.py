@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0099_minimalpairssignature_homonym_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageCacheChange',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gloss_id', models.IntegerField()),
+                ('changed', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('dataset', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='dictionary.dataset')),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0100_packagecachechange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentFrequencyCache',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checksum', models.CharField(max_length=32)),
+                ('frequencies', models.TextField(blank=True)),
+                ('gloss_ids', models.TextField(blank=True)),
+                ('unmatched', models.TextField(blank=True)),
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='frequency_cache', to='dictionary.document')),
+            ],
+        ),
+    ]
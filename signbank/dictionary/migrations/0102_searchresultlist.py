@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0101_documentfrequencycache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchResultList',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result_type', models.CharField(max_length=50)),
+                ('item_ids', models.TextField(blank=True)),
+                ('updated', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
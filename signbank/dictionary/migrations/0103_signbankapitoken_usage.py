@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0102_searchresultlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='signbankapitoken',
+            name='last_used',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Last used'),
+        ),
+        migrations.AddField(
+            model_name='signbankapitoken',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Usage count'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dictionary', '0103_signbankapitoken_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CSVImportJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('create_gloss', 'Create glosses'), ('update_gloss', 'Update glosses'), ('update_lemma', 'Update lemmas'), ('create_sentences', 'Create sentences')], max_length=20)),
+                ('csv_file', models.CharField(max_length=255)),
+                ('parameters', models.TextField(blank=True)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=20)),
+                ('rows_total', models.IntegerField(default=0)),
+                ('rows_done', models.IntegerField(default=0)),
+                ('number_of_errors', models.IntegerField(default=0)),
+                ('message', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='csv_import_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 14:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0105_dataversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentfrequencycache',
+            name='speakers_checksum',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:20
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def keep_last_change_of_each_gloss(apps, schema_editor):
+    # a gloss gets one row, with the time of its last change
+    PackageCacheChange = apps.get_model('dictionary', 'PackageCacheChange')
+    last_ids = list(PackageCacheChange.objects.values('gloss_id').annotate(last_id=Max('id')).values_list(
+        'last_id', flat=True))
+    PackageCacheChange.objects.exclude(id__in=last_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0106_documentfrequencycache_speakers_checksum'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_last_change_of_each_gloss, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='packagecachechange',
+            name='gloss_id',
+            field=models.IntegerField(unique=True),
+        ),
+    ]
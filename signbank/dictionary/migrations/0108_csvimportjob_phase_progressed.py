@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dictionary', '0107_packagecachechange_unique_gloss'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvimportjob',
+            name='phase',
+            field=models.CharField(choices=[('check', 'Check the rows'), ('apply', 'Apply the confirmed rows')], default='check', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='csvimportjob',
+            name='progressed',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,24 +1,23 @@
 from colorfield.fields import ColorField
 import datetime as DT
 import re
-import copy
 import os
 import json
 import tagging
 
 from django.utils.timezone import get_current_timezone
-from django.db.models import Q, When, Case, IntegerField
+from django.db.models import Q
 from django.db import models
 from django.conf import settings
 from django.utils.encoding import escape_uri_path
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from django.db.models.signals import post_save, pre_delete, m2m_changed
-from django.utils.translation import gettext_noop, gettext_lazy as _, gettext, activate
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.utils.translation import gettext_lazy as _, gettext, activate
 from django.forms.utils import ValidationError
 from django.forms.models import model_to_dict
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
-from django.db import DatabaseError, IntegrityError
+from django.db import DatabaseError, IntegrityError, connection
 from django.db.transaction import TransactionManagementError
 from django.core.files import File
 from django.core.files.uploadedfile import TemporaryUploadedFile
@@ -1190,6 +1189,13 @@ class Gloss(Phonology):
                        ('view_advanced_properties', 'Include all properties in sign details'),
                        )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        gloss = super().from_db(db, field_names, values)
+        # the lemma as loaded, the corpus statistics are refreshed when a gloss with frequencies gets another lemma
+        gloss.loaded_lemma_id = gloss.__dict__.get('lemma_id')
+        return gloss
+
     def __str__(self):
         return self.idgloss
 
@@ -1802,56 +1808,35 @@ class Gloss(Phonology):
         data_datasets = []
         total_occurrences = 0
 
-        # Prepare counters
-        count_speakers_per_region = {}
-        frequency_per_region = {}
-        gloss_frequency_per_region = {}
-        speakers_per_region = {}
-
         try:
             frequency_regions = self.lemma.dataset.frequency_regions()
         except (ObjectDoesNotExist, AttributeError):
             return total_occurrences, data_datasets
 
-        frequency_objects = self.glossfrequency_set.all()
-
-        # the first loop tallies up the frequency data from the gloss frequency objects
-        for r in frequency_regions:
-            frequency_objects_at_location = frequency_objects.filter(speaker__location=r)
-            gloss_frequency_per_region[r] = frequency_objects_at_location
-            count_speakers_per_region[r] = frequency_objects_at_location.count()
-            frequency_per_region[r] = 0
-            speakers_per_region[r] = []
-            for frequency_obj_at_location in frequency_objects_at_location:
-                frequency_per_region[r] += frequency_obj_at_location.frequency
-                speaker = frequency_obj_at_location.speaker.identifier
-                if speaker not in speakers_per_region[r]:
-                    speakers_per_region[r].append(speaker)
-
-        # the second loop puts the data in the output structure
+        from signbank.dictionary.corpus_statistics import GlossFrequencyTable
+        (frequency_per_region,
+         speakers_per_region) = GlossFrequencyTable.of_gloss(self).occurrences_and_signers_per_region(self.id,
+                                                                                                     frequency_regions)
+
+        # put the data in the output structure
         for c in settings.FREQUENCY_CATEGORIES:
             if c == "Occurences":
                 dataset_dict = {}
                 dataset_dict['label'] = c
-                dataset_dict['data'] = []
-                for r in frequency_regions:
-                    k_value = frequency_per_region[r]
-                    dataset_dict['data'].append(k_value)
-                    total_occurrences += k_value
+                dataset_dict['data'] = frequency_per_region
+                total_occurrences += sum(frequency_per_region)
                 data_datasets.append(dataset_dict)
             elif c == "Signers":
                 dataset_dict = {}
                 dataset_dict['label'] = c
-                dataset_dict['data'] = []
-                for r in frequency_regions:
-                    k_value = len(speakers_per_region[r])
-                    dataset_dict['data'].append(k_value)
+                dataset_dict['data'] = speakers_per_region
                 data_datasets.append(dataset_dict)
         return total_occurrences, data_datasets
 
     def has_frequency_data(self):
 
-        glossfrequency_objects_count = self.glossfrequency_set.count()
+        from signbank.dictionary.corpus_statistics import GlossFrequencyTable
+        glossfrequency_objects_count = GlossFrequencyTable.of_gloss(self).number_of_rows(self.id)
 
         return glossfrequency_objects_count
 
@@ -1860,67 +1845,17 @@ class Gloss(Phonology):
         # returns a dictionary for this gloss of all the speaker details of speakers signing this gloss
         # in the corpus to which this gloss belongs
 
-        # two extra categories are used that are not currently displayed in the frequency table
-        SEX_CATEGORIES = ['Female', 'Male', 'Other']
-        AGE_CATEGORIES = ['< 25', '25 - 35', '36 - 65', '> 65', 'Unknown Age']
-
-        # get frequency objects for this gloss
-        glossfrequency_objects = self.glossfrequency_set.all()
-        # collect the speakers
-        speakers_with_gloss = [ gfo.speaker for gfo in glossfrequency_objects ]
-        # remove duplicates
-        speakers_with_gloss = list(set(speakers_with_gloss))
-
         # for the results, Other and Unknown Age are also tallied so that
         # the total number of speakers for the gloss is the same for gender and age
         # the interface needs this for showing percentages as well as raw data
-        speaker_data = {}
-        for i_key in SEX_CATEGORIES + AGE_CATEGORIES + ['Total']:
-            speaker_data[i_key] = 0
-
-        for speaker in speakers_with_gloss:
-            if speaker.gender == 'm':
-                speaker_data['Male'] += 1
-            elif speaker.gender == 'f':
-                speaker_data['Female'] += 1
-            else:
-                speaker_data['Other'] += 1
-            speaker_age = speaker.age
-            if speaker_age < 25:
-                speaker_data['< 25'] += 1
-            elif speaker_age <= 35:
-                speaker_data['25 - 35'] += 1
-            elif speaker_age <= 65:
-                speaker_data['36 - 65'] += 1
-            elif speaker.age > 65:
-                speaker_data['> 65'] += 1
-            else:
-                speaker_data['Unknown Age'] += 1
-            speaker_data['Total'] += 1
-
-        return speaker_data
+        from signbank.dictionary.corpus_statistics import GlossFrequencyTable
+        return GlossFrequencyTable.of_gloss(self).speaker_data(self.id)
 
     def speaker_age_data(self):
         # this method returns a dictionary mapping ages
         # to number of speakers of that age that sign the gloss
-
-        # get frequency objects for this gloss
-        glossfrequency_objects = self.glossfrequency_set.all()
-        # collect the speakers
-        speakers_with_gloss = [ gfo.speaker for gfo in glossfrequency_objects ]
-        # remove duplicates
-        speakers_with_gloss = list(set(speakers_with_gloss))
-
-        speaker_age_data = {}
-
-        for speaker in speakers_with_gloss:
-            # the resulting dictionary is going to be used in javascript so convert to string
-            speaker_age = str(speaker.age)
-            if speaker_age in speaker_age_data.keys():
-                speaker_age_data[speaker_age] += 1
-            else:
-                speaker_age_data[speaker_age] = 1
-        return speaker_age_data
+        from signbank.dictionary.corpus_statistics import GlossFrequencyTable
+        return GlossFrequencyTable.of_gloss(self).speaker_age_data(self.id)
 
     def get_relations_of_type(self, role):
         assert isinstance(role, FieldChoice), "Not a FieldChoice object"
@@ -2126,203 +2061,38 @@ class Gloss(Phonology):
         return values_tuple
 
     def minimalpairs_objects(self):
-        minimalpairs_objects_list = []
-
         if not self.lemma or not self.lemma.dataset:
             # take care of glosses without a dataset
-            return minimalpairs_objects_list
-
-        focus_gloss_values_tuple = self.minimal_pairs_tuple()
-        index_of_handedness = settings.MINIMAL_PAIRS_FIELDS.index('handedness')
-        handedness_of_this_gloss = focus_gloss_values_tuple[index_of_handedness]
-        empty_or_X_handedness = [str(fc.id) for fc in FieldChoice.objects.filter(field='Handedness', name__in=['-','N/A', 'X'])]
-        if handedness_of_this_gloss in empty_or_X_handedness:
-            # ignore gloss with empty or X handedness
-            return minimalpairs_objects_list
-
-        # the next few lines to determine the initial minimal_pairs_fields_qs look long-winded
-        finger_spelling_glosses = [a_idgloss_trans.gloss_id for a_idgloss_trans in
-                                   AnnotationIdglossTranslation.objects.filter(text__startswith="#")]
-        q = Q(lemma__dataset_id=self.lemma.dataset.id)
-
-        q_number_or_letter = Q(**{'domhndsh_number': True}) | Q(**{'subhndsh_number': True}) | \
-                             Q(**{'domhndsh_letter': True}) | Q(**{'subhndsh_letter': True})
-
-        # exclude glosses with empty handedness or empty strong hand
-        handedness_filter = 'handedness__name__in'
-        handedness_null = 'handedness__isnull'
-        strong_hand_filter = 'domhndsh__name__in'
-        strong_hand_null = 'domhndsh__isnull'
-        empty_value = ['-','N/A']
-
-        q_empty = Q(**{handedness_null: True}) | \
-                  Q(**{strong_hand_null: True}) | \
-                  Q(**{handedness_filter: empty_value}) | \
-                  Q(**{strong_hand_filter: empty_value})
-
-        minimal_pairs_fields_qs = Gloss.objects.select_related('lemma').exclude(
-                id__in=finger_spelling_glosses).exclude(id=self.id).filter(q).exclude(q_empty).exclude(q_number_or_letter)
-
-        minimal_pairs_fields = settings.MINIMAL_PAIRS_FIELDS
-
-        zipped_tuples = zip(minimal_pairs_fields, focus_gloss_values_tuple)
-
-        for (field, value_of_this_field) in zipped_tuples:
-            gloss_field = Gloss._meta.get_field(field)
-            if isinstance(gloss_field, models.ForeignKey) and gloss_field.related_model == Handshape:
-                # field is a handshape
-                different_field = 'different_' + field
-                field_compare = field + '__exact'
-                different_case = Case(When(**{ field_compare : value_of_this_field , 'then' : 0 }), default=1, output_field=IntegerField())
-                minimal_pairs_fields_qs = minimal_pairs_fields_qs.annotate(**{ different_field : different_case })
-            elif hasattr(gloss_field, 'field_choice_category'):
-                # field is a choice list
-                different_field = 'different_' + field
-                field_compare = field + '__exact'
-                different_case = Case(When(**{ field_compare : value_of_this_field , 'then' : 0 }), default=1, output_field=IntegerField())
-                minimal_pairs_fields_qs = minimal_pairs_fields_qs.annotate(**{ different_field : different_case })
-
-            else:
-                # field is a Boolean
-                different_field = 'different_' + field
-                field_compare = field + '__exact'
-                if value_of_this_field:
-                    different_case = Case(When(**{ field_compare : True , 'then' : 0 }), default=1, output_field=IntegerField())
-
-                    minimal_pairs_fields_qs = minimal_pairs_fields_qs.annotate(**{ different_field : different_case })
-
-                else:
-                    # Boolean values might be empty, so compare to True and invert
-                    different_case = Case(When(**{ field_compare : True , 'then': 1 }), default=0, output_field=IntegerField())
-
-                    minimal_pairs_fields_qs = minimal_pairs_fields_qs.annotate(**{ different_field : different_case })
-
-        # construct extra filter to check that the number of different fields is exactly 1
-        extra_comparison = ' + '.join('different_'+field for field in minimal_pairs_fields)
-        extra_comparison = '(' + extra_comparison + ') = 1'
-        extra_comparison = [ extra_comparison ]
-
-        minimal_pairs_fields_qs = minimal_pairs_fields_qs.extra(where= extra_comparison )
-
-        for o in minimal_pairs_fields_qs:
-            # return only the minimal pairs glosses, without the annotations
-            # since these were previously reduced to values for computation, fetch the objects
-            next_gloss = Gloss.objects.get(pk=o.__dict__['id'])
-            minimalpairs_objects_list.append(next_gloss)
-
-        return minimalpairs_objects_list
+            return []
+        return list(self.minimal_pairs_dict().keys())
 
     def minimal_pairs_dict(self):
-        focus_gloss_values_tuple = self.minimal_pairs_tuple()
+        # the minimal pairs are computed from the stored phonology signatures of the dataset,
+        # only the signatures that can be a minimal pair of this gloss are loaded
+        from signbank.dictionary.phonology_signatures import MinimalPairsIndex
 
-        index_of_handedness = settings.MINIMAL_PAIRS_FIELDS.index('handedness')
-        handedness_of_this_gloss = focus_gloss_values_tuple[index_of_handedness]
-
-        minimal_pairs_fields = dict()
-
-        empty_or_X_handedness = [str(fc.id) for fc in FieldChoice.objects.filter(field='Handedness', name__in=['-', 'N/A', 'X'])]
-        # If handedness is not defined for this gloss, don't bother to look up minimal pairs
-        if handedness_of_this_gloss in empty_or_X_handedness:
-            return minimal_pairs_fields
-
-        # Restrict minimal pairs search if gloss has empty phonology field for Strong Hand
-        index_of_handshape = settings.MINIMAL_PAIRS_FIELDS.index('domhndsh')
-        handshape_of_this_gloss = focus_gloss_values_tuple[index_of_handshape]
-        empty_handshape = [str(fc.machine_value) for fc in
-                            Handshape.objects.filter(name__in=['-', 'N/A'])]
-
-        if handshape_of_this_gloss in empty_handshape:
-            return minimal_pairs_fields
-
-        mpos = self.minimalpairs_objects()
+        if not self.lemma or not self.lemma.dataset:
+            return dict()
 
-        for o in mpos:
-            other_gloss_values_tuple = o.minimal_pairs_tuple()
-            zipped_tuples = zip(settings.MINIMAL_PAIRS_FIELDS, focus_gloss_values_tuple, other_gloss_values_tuple)
+        return MinimalPairsIndex(self.lemma.dataset, focus_gloss=self).minimal_pairs_dict(self)
 
-            for (field_name, field_value, other_field_value) in zipped_tuples:
-                if field_value in [None, '0'] and other_field_value in [None,'0']:
-                    continue
-                if field_value != other_field_value:
-                    gloss_field = Gloss._meta.get_field(field_name)
-                    field_label = gettext_noop(gloss_field.verbose_name)
-                    if field_name in ['domhndsh', 'subhndsh', 'final_domhndsh', 'final_subhndsh']:
-                        if field_value is not None:
-                            field_value = Handshape.objects.get(machine_value=int(field_value)).name
-                        if other_field_value is not None:
-                            other_field_value = Handshape.objects.get(machine_value=int(other_field_value)).name
-                    if hasattr(gloss_field, 'field_choice_category'):
-                        if field_value is not None:
-                            field_value = FieldChoice.objects.get(id=int(field_value)).name
-                        if other_field_value is not None:
-                            other_field_value = FieldChoice.objects.get(id=int(other_field_value)).name
-                    minimal_pairs_fields[o] = {field_name: (field_label, field_name, field_value, other_field_value, fieldname_to_kind(field_name))}
-
-        return minimal_pairs_fields
-
-    # Homonyms dynamically retrieved as glosses with the same phonology
+    # Homonyms retrieved as glosses of the dataset with the same stored phonology key
     def homonym_objects(self):
-        homonym_objects_list = []
+        from signbank.dictionary.phonology_signatures import homonym_key_of_gloss, ensure_minimalpairs_signatures
 
         if not self.lemma or not self.lemma.dataset:
-            return homonym_objects_list
-
-        phonology_for_gloss = self.phonology_matrix_homonymns()
-        handedness_of_this_gloss = phonology_for_gloss['handedness']
-
-        homonym_objects_list = []
+            return []
 
-        empty_or_X_handedness = [str(fc.id) for fc in FieldChoice.objects.filter(field='Handedness', name__in=['-','N/A', 'X'])]
-        if handedness_of_this_gloss in empty_or_X_handedness:
+        homonym_key = homonym_key_of_gloss(self)
+        if not homonym_key:
             # ignore gloss with empty or X handedness
-            return homonym_objects_list
-
-        q = Q(lemma__dataset_id=self.lemma.dataset.id)
-
-        foreign_key_fields = [f.name for f in Gloss._meta.fields if isinstance(f, FieldChoiceForeignKey)]
-        minimal_pair_fields = []
-        for field in settings.MINIMAL_PAIRS_FIELDS:
-            minimal_pair_fields.append(field)
-
-        for field in minimal_pair_fields + settings.HANDSHAPE_ETYMOLOGY_FIELDS + settings.HANDEDNESS_ARTICULATION_FIELDS:
-            value_of_this_field = phonology_for_gloss.get(field)
-            if value_of_this_field is None and field in foreign_key_fields:
-                # catch not set FK fields
-                comparison = field + '__isnull'
-                q.add(Q(**{comparison: True}), q.AND)
-            elif value_of_this_field == 'False' and field in settings.HANDEDNESS_ARTICULATION_FIELDS:
-                # fields weakdrop and weakprop use 3-valued logic, False only matches False, not Null
-                comparison1 = field + '__exact'
-                q.add(Q(**{comparison1: False}), q.AND)
-            elif value_of_this_field in ['-',' ','','None','False', None]:
-                # field is repeat or altern
-                comparison1 = field + '__isnull'
-                comparison2 = field + '__exact'
-                comparison3 = field + '__exact'
-                q_or = Q(**{comparison1: True})
-                q_or |= Q(**{comparison2: '0'})
-                q_or |= Q(**{comparison3: False})
-                q.add(q_or, q.AND)
-            elif value_of_this_field == 'Neutral':
-                # Can only match Null, not True or False
-                comparison = field + '__isnull'
-                q.add(Q(**{comparison: True}), q.AND)
-            elif value_of_this_field == 'True':
-                comparison = field + '__exact'
-                q.add(Q(**{comparison: True}), q.AND)
-            else:
-                # FK fields are str(int) and fall through to here
-                comparison = field + '__exact'
-                if field in foreign_key_fields:
-                    # look up based on field choice id
-                    value_of_this_field = int(value_of_this_field)
-                    comparison = field + '_id__exact'
-                q.add(Q(**{comparison: value_of_this_field}), q.AND)
-
-        qs = Gloss.objects.select_related('lemma').exclude(id=self.id).filter(q)
-        for o in qs:
-            homonym_objects_list.append(o)
-        return homonym_objects_list
+            return []
+
+        ensure_minimalpairs_signatures(self.lemma.dataset)
+        qs = Gloss.objects.select_related('lemma').filter(minimalpairs_signature__dataset=self.lemma.dataset,
+                                                          minimalpairs_signature__homonym_key=homonym_key
+                                                          ).exclude(id=self.id)
+        return list(qs)
 
     def homonyms(self):
         #  this function returns a 3-tuple of information about homonymns for this gloss
@@ -2932,6 +2702,253 @@ class DeletedGlossOrMedia(models.Model):
     deletion_date = models.DateField(default=date.today)
 
 
+class MinimalPairsSignature(models.Model):
+    """The normalised phonology of a gloss, used to compute minimal pairs and homonyms per dataset"""
+    gloss = models.OneToOneField("Gloss", on_delete=models.CASCADE, related_name='minimalpairs_signature')
+    dataset = models.ForeignKey("Dataset", on_delete=models.CASCADE, null=True)
+    # JSON dictionary of the normalised values of settings.MINIMAL_PAIRS_FIELDS
+    signature = models.TextField(blank=True)
+    # glosses that can never be a minimal pair of another gloss: archived, finger spelling, letter or number signs
+    excluded = models.BooleanField(default=False)
+    # hash of the normalised phonology matrix, glosses of a dataset with the same key are homonyms
+    homonym_key = models.CharField(max_length=32, blank=True, db_index=True)
+    lastUpdated = models.DateTimeField(_('Last updated'), auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['dataset', 'excluded'], name='minimalpairs_dataset_idx')]
+
+    def __str__(self):
+        return str(self.gloss_id) + ': ' + self.signature
+
+    def get_signature_dict(self):
+        return json.loads(self.signature) if self.signature else dict()
+
+
+@receiver(post_save, sender=Gloss, dispatch_uid='gloss_minimalpairs_signature')
+@receiver(post_save, sender='dictionary.Morpheme', dispatch_uid='morpheme_minimalpairs_signature')
+def update_minimalpairs_signature_of_gloss(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        # loading fixtures, the related objects may not exist yet
+        return
+    from signbank.dictionary.phonology_signatures import update_minimalpairs_signature
+    update_minimalpairs_signature(instance)
+
+
+class PackageCacheChange(models.Model):
+    """A gloss whose package data has changed, the cached packages of its dataset are patched on the next request.
+    A gloss has one row, with the time of its last change"""
+    # the dataset of a deleted gloss, the changes of the other glosses are found by their dataset
+    dataset = models.ForeignKey("Dataset", on_delete=models.CASCADE, null=True)
+    # not a foreign key, the gloss may have been deleted
+    gloss_id = models.IntegerField(unique=True)
+    changed = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return str(self.gloss_id) + ': ' + str(self.changed)
+
+
+def record_package_change(gloss_id, dataset_id=None):
+    """Record a change of the package data of the gloss with one update, the dataset is kept if it is not given"""
+    fields = {'changed': DT.datetime.now(tz=DT.timezone.utc)}
+    if dataset_id is not None:
+        fields['dataset_id'] = dataset_id
+    if not PackageCacheChange.objects.filter(gloss_id=gloss_id).update(**fields):
+        # a change recorded at the same time by another process is as good
+        PackageCacheChange.objects.bulk_create([PackageCacheChange(gloss_id=gloss_id, dataset_id=dataset_id)],
+                                               ignore_conflicts=True)
+
+
+def record_package_changes(dataset_gloss_ids, batch_size=None):
+    """Record the changes of the (dataset id, gloss id) pairs with bulk inserts that update the existing rows"""
+    changes = [PackageCacheChange(dataset_id=dataset_id, gloss_id=gloss_id)
+               for gloss_id, dataset_id in dict((gloss_id, dataset_id)
+                                                for dataset_id, gloss_id in dataset_gloss_ids).items()]
+    # MySQL finds the conflicting row itself
+    unique_fields = ['gloss_id'] if connection.features.supports_update_conflicts_with_target else None
+    PackageCacheChange.objects.bulk_create(changes, batch_size=batch_size, update_conflicts=True,
+                                           update_fields=['dataset', 'changed'], unique_fields=unique_fields)
+
+
+def package_changes_of_dataset(dataset, since):
+    """The package changes since the time of the glosses of the dataset and of its deleted glosses"""
+    return PackageCacheChange.objects.filter(
+        Q(dataset=dataset) | Q(gloss_id__in=Gloss.objects.filter(lemma__dataset=dataset).values('id')),
+        changed__gte=since)
+
+
+def loaded_dataset_id(gloss):
+    """The dataset of a gloss whose lemma is loaded, None otherwise, to record a change without a query"""
+    if gloss is None or not Gloss.lemma.is_cached(gloss) or gloss.lemma is None:
+        return None
+    return gloss.lemma.dataset_id
+
+
+def loaded_gloss(instance):
+    """The gloss of the object if it is loaded"""
+    return instance.gloss if type(instance).gloss.is_cached(instance) else None
+
+
+class DataVersion(models.Model):
+    """The version of data that the processes keep in memory, a process loads the data again when it changes.
+    The version is stored in the database because the cache is not shared by the processes"""
+    name = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return self.name + ': ' + str(self.version)
+
+
+def data_version(name):
+    """The version of the data, with one query on the unique name"""
+    return DataVersion.objects.filter(name=name).values_list('version', flat=True).first() or 0
+
+
+def bump_data_version(name):
+    # one update when the version exists, which it does after the first change
+    if not DataVersion.objects.filter(name=name).update(version=models.F('version') + 1):
+        DataVersion.objects.get_or_create(name=name, defaults={'version': 1})
+
+
+@receiver(post_save, sender=Gloss, dispatch_uid='gloss_package_change')
+@receiver(post_save, sender='dictionary.Morpheme', dispatch_uid='morpheme_package_change')
+@receiver(pre_delete, sender=Gloss, dispatch_uid='gloss_delete_package_change')
+@receiver(pre_delete, sender='dictionary.Morpheme', dispatch_uid='morpheme_delete_package_change')
+def record_package_change_of_gloss(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    dataset_id = loaded_dataset_id(instance)
+    if 'created' not in kwargs and dataset_id is None:
+        # the gloss is deleted, its dataset is recorded for the packages that still have it
+        dataset_id = LemmaIdgloss.objects.filter(id=instance.lemma_id).values_list('dataset_id', flat=True).first()
+    record_package_change(instance.id, dataset_id)
+
+
+@receiver(post_save, sender='dictionary.AnnotationIdglossTranslation', dispatch_uid='annotation_package_change')
+@receiver(post_delete, sender='dictionary.AnnotationIdglossTranslation', dispatch_uid='annotation_delete_package_change')
+@receiver(post_save, sender='dictionary.Definition', dispatch_uid='definition_package_change')
+@receiver(post_delete, sender='dictionary.Definition', dispatch_uid='definition_delete_package_change')
+@receiver(post_save, sender='dictionary.GlossSense', dispatch_uid='glosssense_package_change')
+@receiver(post_delete, sender='dictionary.GlossSense', dispatch_uid='glosssense_delete_package_change')
+@receiver(post_save, sender='dictionary.Translation', dispatch_uid='translation_package_change')
+@receiver(post_delete, sender='dictionary.Translation', dispatch_uid='translation_delete_package_change')
+def record_package_change_of_gloss_data(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    record_package_change(instance.gloss_id, loaded_dataset_id(loaded_gloss(instance)))
+
+
+@receiver(post_save, sender='dictionary.LemmaIdglossTranslation', dispatch_uid='lemma_package_change')
+def record_package_change_of_lemma(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    record_package_changes(Gloss.objects.filter(lemma_id=instance.lemma_id).values_list('lemma__dataset_id', 'id'))
+
+
+@receiver(post_save, sender='dictionary.DeletedGlossOrMedia', dispatch_uid='deleted_package_change')
+def record_package_change_of_deletion(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    record_package_change(instance.old_pk)
+
+
+@receiver(post_save, sender=Gloss, dispatch_uid='gloss_dataset_visibility')
+@receiver(post_save, sender='dictionary.Morpheme', dispatch_uid='morpheme_dataset_visibility')
+def invalidate_dataset_visibility_of_gloss(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and not set(update_fields) & {'inWeb', 'archived', 'lemma'}:
+        return
+    from signbank.dictionary.dataset_visibility import invalidate_dataset_visibility
+    invalidate_dataset_visibility()
+
+
+@receiver(post_delete, sender=Gloss, dispatch_uid='gloss_delete_dataset_visibility')
+@receiver(post_save, sender='dictionary.LemmaIdgloss', dispatch_uid='lemma_dataset_visibility')
+@receiver(post_delete, sender='dictionary.LemmaIdgloss', dispatch_uid='lemma_delete_dataset_visibility')
+@receiver(post_save, sender='dictionary.Dataset', dispatch_uid='dataset_dataset_visibility')
+@receiver(post_delete, sender='dictionary.Dataset', dispatch_uid='dataset_delete_dataset_visibility')
+@receiver(post_save, sender='guardian.UserObjectPermission', dispatch_uid='permission_dataset_visibility')
+@receiver(post_delete, sender='guardian.UserObjectPermission', dispatch_uid='permission_delete_dataset_visibility')
+def invalidate_dataset_visibility_of_datasets(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    from signbank.dictionary.dataset_visibility import invalidate_dataset_visibility
+    invalidate_dataset_visibility()
+
+
+class SearchResultList(models.Model):
+    """The ordered ids of the results of a search, shown in the search result bar of the detail pages
+    The session only refers to it, the labels of the results are looked up when they are shown"""
+    # gloss, sense, annotatedsentence, handshape or lemma
+    result_type = models.CharField(max_length=50)
+    # JSON list of ids, the results of senses are [gloss id, sense id] pairs
+    # and the results of annotated sentences are [annotated sentence id, gloss id] pairs
+    item_ids = models.TextField(blank=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return self.result_type + ': ' + str(self.updated)
+
+    def get_item_ids(self):
+        return json.loads(self.item_ids) if self.item_ids else list()
+
+
+class CSVImportJob(models.Model):
+    """The check of the rows of an uploaded CSV file and then the applying of the confirmed rows,
+    done in the background by signbank.dictionary.csv_import_jobs
+    The results are saved after each chunk of rows, a job that was stopped continues after the last saved chunk"""
+
+    CREATE_GLOSSES = 'create_gloss'
+    UPDATE_GLOSSES = 'update_gloss'
+    UPDATE_LEMMAS = 'update_lemma'
+    CREATE_SENTENCES = 'create_sentences'
+    KIND_CHOICES = ((CREATE_GLOSSES, 'Create glosses'),
+                    (UPDATE_GLOSSES, 'Update glosses'),
+                    (UPDATE_LEMMAS, 'Update lemmas'),
+                    (CREATE_SENTENCES, 'Create sentences'))
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed'))
+
+    CHECK = 'check'
+    APPLY = 'apply'
+    PHASE_CHOICES = ((CHECK, 'Check the rows'), (APPLY, 'Apply the confirmed rows'))
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    phase = models.CharField(max_length=20, choices=PHASE_CHOICES, default=CHECK)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='csv_import_jobs')
+    # relative to WRITABLE_FOLDER, the results are saved next to it
+    csv_file = models.CharField(max_length=255)
+    # JSON dictionary of the encoding, delimiter, header, datasets and options of the import
+    parameters = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    rows_total = models.IntegerField(default=0)
+    rows_done = models.IntegerField(default=0)
+    number_of_errors = models.IntegerField(default=0)
+    message = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    # set when the job is claimed and after each chunk, a running job that did not progress for long was stopped
+    progressed = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created', 'id']
+
+    def __str__(self):
+        return self.kind + ' ' + self.csv_file + ': ' + self.status
+
+    def is_finished(self):
+        return self.status in [CSVImportJob.DONE, CSVImportJob.FAILED]
+
+    def get_parameters(self):
+        return json.loads(self.parameters) if self.parameters else dict()
+
+
 RELATION_ROLE_CHOICES = (('homonym', 'Homonym'),
                          ('synonym', 'Synonym'),
                          ('variant', 'Variant'),
@@ -3437,11 +3454,9 @@ class Dataset(MetaModelMixin, models.Model):
 
     def frequency_regions(self):
 
-        gf_objects = GlossFrequency.objects.filter(gloss__lemma__dataset=self)
-        regions = gf_objects.values('speaker__location').distinct()
-        frequency_regions = [ v['speaker__location'] for v in regions ]
-        # the order of the reqions needs to be constant everywhere in the code. How?
-        return frequency_regions
+        # the regions are sorted, so the order is the same everywhere in the code
+        from signbank.dictionary.corpus_statistics import GlossFrequencyTable
+        return list(GlossFrequencyTable.of_dataset(self).regions)
 
     def generate_frequency_dict(self):
         fields_to_map = FIELDS['phonology'] + FIELDS['semantics']
@@ -3463,11 +3478,16 @@ class Dataset(MetaModelMixin, models.Model):
 
         # Sort the data by the translated verbose name field
         ordered_fields_data = sorted(fields_data, key=lambda x: x[1])
+        from signbank.dictionary.frequency_matrix import choice_frequencies
+        frequencies = choice_frequencies([self], [f for (f, field_verbose_name, category) in ordered_fields_data])
+        choice_lists = dict()
         frequency_lists_phonology_fields = OrderedDict()
         # To generate the correct order, iterate over the ordered fields data, which is ordered by translated verbose name
         for (f, field_verbose_name, fieldchoice_category) in ordered_fields_data:
             # Choices: the ones with machine_value 0 and 1 first, the rest is sorted by name, which is the translated name
-            if fieldchoice_category == 'Handshape':
+            if fieldchoice_category in choice_lists:
+                choice_list_this_field = choice_lists[fieldchoice_category]
+            elif fieldchoice_category == 'Handshape':
                 choice_list_this_field = list(Handshape.objects.filter(machine_value__lte=1).order_by('machine_value')) \
                                          + list(Handshape.objects.filter(machine_value__gt=1).order_by('name'))
             elif fieldchoice_category == 'SemField':
@@ -3479,48 +3499,42 @@ class Dataset(MetaModelMixin, models.Model):
             else:
                 choice_list_this_field = list(FieldChoice.objects.filter(field=fieldchoice_category, machine_value__lte=1).order_by('machine_value')) \
                                         + list(FieldChoice.objects.filter(field=fieldchoice_category, machine_value__gt=1).order_by('name'))
+            choice_lists[fieldchoice_category] = choice_list_this_field
 
             # Because we're dealing with multiple languages, we want the fields to be sorted for the language,
             # we maintain the order of the fields established for the choice_lists dict of field choice names
+            # empty values are counted as machine value 0
             choice_list_frequencies = OrderedDict()
             for fieldchoice in choice_list_this_field:
-                # variable column is field.name
-                variable_column = f
-                if variable_column.startswith('semField') and fieldchoice.machine_value > 0:
-                    variable_column_query = 'semField__machine_value__in'
-                    try:
-                        semantic_field = [sf.machine_value for sf in SemanticField.objects.filter(name__exact=fieldchoice.name)]
-                        choice_list_frequencies[fieldchoice.name] = Gloss.objects.filter(lemma__dataset=self, archived=False,
-                                                                                         **{
-                                                                                             variable_column_query: semantic_field}).count()
-                    except ObjectDoesNotExist:
-                        print('not found semantic choice, ignore: ', fieldchoice.name)
-                        continue
-                elif variable_column.startswith('derivHist') and fieldchoice.machine_value > 0:
-                    variable_column_query = 'derivHist__machine_value__in'
-                    try:
-                        derivation_field = [sf.machine_value for sf in DerivationHistory.objects.filter(name__exact=fieldchoice.name)]
-                        choice_list_frequencies[fieldchoice.name] = Gloss.objects.filter(lemma__dataset=self, archived=False,
-                                                                                         **{
-                                                                                             variable_column_query: derivation_field}).count()
-                    except ObjectDoesNotExist:
-                        print('not found derivation history choice, ignore: ', fieldchoice.name)
-                        continue
-                # empty values can be either 0 or else null
-                elif fieldchoice.machine_value == 0:
-                    choice_list_frequencies[fieldchoice.name] = Gloss.objects.filter(Q(lemma__dataset=self, archived=False),
-                                                                                     Q(**{variable_column + '__isnull': True}) |
-                                                                                     Q(**{variable_column: fieldchoice})).count()
-                else:
-                    choice_list_frequencies[fieldchoice.name] = Gloss.objects.filter(lemma__dataset=self, archived=False,
-                                                                                     **{variable_column: fieldchoice}).count()
-
-            # the new frequencies for this field are added using the update method to insure the order is maintained
-            frequency_lists_phonology_fields[f] = copy.deepcopy(choice_list_frequencies)
+                choice_list_frequencies[fieldchoice.name] = frequencies[f].get(fieldchoice.machine_value, 0)
+            frequency_lists_phonology_fields[f] = choice_list_frequencies
 
         return frequency_lists_phonology_fields
 
 
+@receiver(post_save, sender=Gloss, dispatch_uid='gloss_choice_frequencies')
+@receiver(post_delete, sender=Gloss, dispatch_uid='gloss_delete_choice_frequencies')
+@receiver(post_save, sender='dictionary.Morpheme', dispatch_uid='morpheme_choice_frequencies')
+@receiver(post_delete, sender='dictionary.Morpheme', dispatch_uid='morpheme_delete_choice_frequencies')
+@receiver(m2m_changed, sender=Gloss.semField.through, dispatch_uid='gloss_semfield_choice_frequencies')
+@receiver(m2m_changed, sender=Gloss.derivHist.through, dispatch_uid='gloss_derivhist_choice_frequencies')
+@receiver(post_save, sender='dictionary.LemmaIdgloss', dispatch_uid='lemma_choice_frequencies')
+@receiver(post_delete, sender='dictionary.LemmaIdgloss', dispatch_uid='lemma_delete_choice_frequencies')
+@receiver(post_save, sender=FieldChoice, dispatch_uid='fieldchoice_choice_frequencies')
+@receiver(post_delete, sender=FieldChoice, dispatch_uid='fieldchoice_delete_choice_frequencies')
+@receiver(post_save, sender=Handshape, dispatch_uid='handshape_choice_frequencies')
+@receiver(post_delete, sender=Handshape, dispatch_uid='handshape_delete_choice_frequencies')
+@receiver(post_delete, sender=SemanticField, dispatch_uid='semanticfield_delete_choice_frequencies')
+@receiver(post_delete, sender=DerivationHistory, dispatch_uid='derivationhistory_delete_choice_frequencies')
+def invalidate_choice_frequencies_of_glosses(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if kwargs.get('action') and not kwargs['action'].startswith('post_'):
+        return
+    from signbank.dictionary.frequency_matrix import invalidate_choice_frequencies
+    invalidate_choice_frequencies()
+
+
 class SignbankAPIToken(models.Model):
     """
     Overrides the Token model to use the
@@ -3531,6 +3545,9 @@ class SignbankAPIToken(models.Model):
     signbank_user = models.ForeignKey(User, verbose_name=_("Signbank User"), related_name='tokens',
                                       on_delete=models.CASCADE)
     created = models.DateTimeField(_("Created"), auto_now_add=True)
+    # updated in batches by signbank.api_token, may lag behind a little
+    last_used = models.DateTimeField(_("Last used"), null=True, blank=True)
+    usage_count = models.PositiveIntegerField(_("Usage count"), default=0)
 
     class Meta:
         verbose_name = _("Token")
@@ -3542,6 +3559,32 @@ class SignbankAPIToken(models.Model):
         return creation_date
 
 
+@receiver(post_save, sender=SignbankAPIToken, dispatch_uid='api_token_save_cache')
+@receiver(post_delete, sender=SignbankAPIToken, dispatch_uid='api_token_delete_cache')
+def invalidate_cached_api_token(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_used', 'usage_count'}:
+        return
+    from signbank.api_token import invalidate_api_tokens
+    invalidate_api_tokens()
+
+
+@receiver(post_save, sender=User, dispatch_uid='user_save_api_token_cache')
+@receiver(pre_delete, sender=User, dispatch_uid='user_delete_api_token_cache')
+def invalidate_cached_api_tokens_of_user(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    if not SignbankAPIToken.objects.filter(signbank_user=instance).exists():
+        return
+    from signbank.api_token import invalidate_api_tokens
+    invalidate_api_tokens()
+
+
 class Affiliation(models.Model):
     name = models.CharField(max_length=35)
     acronym = models.CharField(max_length=10, blank=True, help_text="Abbreviation for the affiliation")
@@ -3676,6 +3719,22 @@ class AnnotationIdglossTranslation(models.Model):
         super(AnnotationIdglossTranslation, self).save(*args, **kwargs)
 
 
+@receiver(post_save, sender=AnnotationIdglossTranslation, dispatch_uid='annotation_minimalpairs_signature')
+@receiver(models.signals.post_delete, sender=AnnotationIdglossTranslation,
+          dispatch_uid='annotation_delete_minimalpairs_signature')
+def update_minimalpairs_signature_of_annotation(sender, instance, **kwargs):
+    # finger spelling glosses are recognised by their annotation text, these are excluded from minimal pairs
+    if kwargs.get('raw'):
+        return
+    from signbank.dictionary.phonology_signatures import update_minimalpairs_signature
+    try:
+        gloss = Gloss.objects.get(id=instance.gloss_id)
+    except ObjectDoesNotExist:
+        # the gloss is being deleted
+        return
+    update_minimalpairs_signature(gloss)
+
+
 class LemmaIdgloss(MetaModelMixin, models.Model):
     dataset = models.ForeignKey("Dataset", verbose_name=_("Dataset"), on_delete=models.CASCADE,
                                 help_text=_("Dataset a lemma is part of"), null=True)
@@ -3795,6 +3854,34 @@ class Document(models.Model):
     identifier = models.CharField(max_length=100)
     creation_time = models.DateTimeField(blank=True)
 
+
+class DocumentFrequencyCache(models.Model):
+    """The counts of the EAF file of a document, the file is only parsed again when its checksum changes"""
+    document = models.OneToOneField("Document", on_delete=models.CASCADE, related_name='frequency_cache')
+    checksum = models.CharField(max_length=32)
+    # checksum of the persons of the corpus and their speakers when the counts were stored,
+    # the counts are stored again for other speakers
+    speakers_checksum = models.CharField(max_length=32, blank=True)
+    # JSON dictionary {participant: {gloss id or annotation: frequency}} as counted in the EAF file
+    frequencies = models.TextField(blank=True)
+    # JSON dictionary {gloss id or annotation: gloss id} of the gloss values found in the dataset
+    gloss_ids = models.TextField(blank=True)
+    # JSON list of the gloss values that did not match a gloss of the dataset
+    unmatched = models.TextField(blank=True)
+
+    def __str__(self):
+        return self.document.identifier + ': ' + self.checksum
+
+    def get_frequencies(self):
+        return json.loads(self.frequencies) if self.frequencies else dict()
+
+    def get_gloss_ids(self):
+        return json.loads(self.gloss_ids) if self.gloss_ids else dict()
+
+    def get_unmatched(self):
+        return json.loads(self.unmatched) if self.unmatched else list()
+
+
 class Speaker(models.Model):
 
     GENDER_CHOICES = (
@@ -3840,6 +3927,33 @@ class GlossFrequency(models.Model):
         return str(self.gloss.id) + ' ' + self.document.identifier + ' ' + self.speaker.identifier + ' ' + str(self.frequency)
 
 
+@receiver(post_save, sender=Speaker, dispatch_uid='speaker_corpus_statistics')
+@receiver(post_delete, sender=Speaker, dispatch_uid='speaker_delete_corpus_statistics')
+@receiver(post_delete, sender=Document, dispatch_uid='document_delete_corpus_statistics')
+@receiver(post_delete, sender=Gloss, dispatch_uid='gloss_delete_corpus_statistics')
+@receiver(post_save, sender='dictionary.LemmaIdgloss', dispatch_uid='lemma_corpus_statistics')
+def invalidate_corpus_statistics_of_corpus(sender, instance, **kwargs):
+    # GlossFrequency objects are stored in bulk, signbank.frequency invalidates the statistics for those
+    if kwargs.get('raw'):
+        return
+    from signbank.dictionary.corpus_statistics import invalidate_corpus_statistics
+    invalidate_corpus_statistics()
+
+
+@receiver(post_save, sender=Gloss, dispatch_uid='gloss_lemma_corpus_statistics')
+@receiver(post_save, sender='dictionary.Morpheme', dispatch_uid='morpheme_lemma_corpus_statistics')
+def invalidate_corpus_statistics_of_moved_gloss(sender, instance, created=False, **kwargs):
+    # the frequencies of a gloss that is given another lemma may move to another dataset
+    if kwargs.get('raw') or created:
+        return
+    loaded_lemma_id = getattr(instance, 'loaded_lemma_id', instance.lemma_id)
+    instance.loaded_lemma_id = instance.lemma_id
+    if loaded_lemma_id == instance.lemma_id or not GlossFrequency.objects.filter(gloss_id=instance.id).exists():
+        return
+    from signbank.dictionary.corpus_statistics import invalidate_corpus_statistics
+    invalidate_corpus_statistics()
+
+
 class QueryParameter(models.Model):
 
     search_history = models.ForeignKey("SearchHistory", null=True, on_delete=models.CASCADE)
@@ -4302,16 +4416,17 @@ class AnnotatedSentence(MetaModelMixin, models.Model):
         return False
 
     def add_annotations(self, annotations, gloss, start_cut=-1, end_cut=-1):
-        """Add annotations to the annotated sentence"""
+        """Add annotations to the annotated sentence, the labels are looked up and the annotated glosses are
+        created with one query each"""
+        from signbank.video.eaf_annotations import gloss_ids_of_labels
         dataset = gloss.lemma.dataset
 
-        for annotation in annotations:
-            if type(annotation) == dict:
-                gloss_translation = annotation['gloss']
-            else:
-                gloss_translation = annotation[0]
-            annotationIdGlossTranslation = AnnotationIdglossTranslation.objects.filter(text__exact=gloss_translation, language__in=dataset.translation_languages.all(), gloss__lemma__dataset=dataset).first()
-            if annotationIdGlossTranslation is None:
+        gloss_translations = [annotation['gloss'] if type(annotation) == dict else annotation[0]
+                              for annotation in annotations]
+        gloss_ids = gloss_ids_of_labels(dataset, gloss_translations, languages=dataset.translation_languages.all())
+        annotated_glosses = []
+        for annotation, gloss_translation in zip(annotations, gloss_translations):
+            if gloss_translation not in gloss_ids:
                 print("No annotation found for: ", gloss_translation)
                 continue
             else:
@@ -4341,7 +4456,9 @@ class AnnotatedSentence(MetaModelMixin, models.Model):
                     starttime = starttime - start_cut
                     endtime = endtime - start_cut
                 if not excluded:
-                    AnnotatedGloss.objects.create(gloss=annotationIdGlossTranslation.gloss, annotatedsentence=self, isRepresentative=repr, starttime=starttime, endtime=endtime)
+                    annotated_glosses.append(AnnotatedGloss(gloss_id=gloss_ids[gloss_translation], annotatedsentence=self,
+                                                            isRepresentative=repr, starttime=starttime, endtime=endtime))
+        AnnotatedGloss.objects.bulk_create(annotated_glosses)
 
     def get_annotated_glosses_list(self):
         annotated_glosses = []
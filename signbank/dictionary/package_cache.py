@@ -0,0 +1,174 @@
+"""Materialized package data for the app sync endpoint.
+
+The package view used to serialize every gloss and stat every video file on each request.
+Per (dataset, language, inWeb, extended_fields) the serialized glosses and video urls are kept on disk,
+together with a ready made zip of the full package.
+On a request only the glosses recorded in PackageCacheChange (or with a newer lastUpdated) since the last
+build are serialized again. Delta packages are filtered from the cached data.
+"""
+
+import datetime as DT
+import fcntl
+import json
+import os
+import time
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.urls import reverse
+from django.utils.dateformat import format
+
+from signbank.settings.server_specific import SIGNBANK_PACKAGES_FOLDER
+from signbank.dictionary.models import Gloss, PackageCacheChange, package_changes_of_dataset
+from signbank.dictionary.gloss_serializer import get_fields_dicts
+
+PACKAGE_CACHE_FOLDER = os.path.join(SIGNBANK_PACKAGES_FOLDER, 'cache')
+# the cached packages are rebuilt from scratch once a day, in case changes were made without signals
+PACKAGE_CACHE_MAX_AGE = 24 * 60 * 60
+# changes recorded shortly before a build may not have been visible to it yet
+PACKAGE_CACHE_CHANGE_MARGIN = 5
+
+
+class PackageCache:
+    """The cached package data of a dataset for one language, inWeb and extended_fields setting"""
+
+    def __init__(self, dataset, language_code, inWebSet, extended_fields):
+        self.dataset = dataset
+        self.language_code = language_code
+        self.inWebSet = inWebSet
+        self.extended_fields = extended_fields
+        name = '.'.join([dataset.acronym, language_code, 'web' if inWebSet else 'all',
+                         'extended' if extended_fields else 'basic'])
+        self.json_path = os.path.join(PACKAGE_CACHE_FOLDER, name + '.json')
+        self.zip_path = os.path.join(PACKAGE_CACHE_FOLDER, name + '.zip')
+        self.lock_path = os.path.join(PACKAGE_CACHE_FOLDER, name + '.lock')
+
+    def available_glosses(self):
+        if self.inWebSet:
+            return Gloss.objects.filter(lemma__dataset=self.dataset, inWeb=True, archived=False)
+        return Gloss.objects.filter(lemma__dataset=self.dataset, archived=False)
+
+    def fieldnames(self):
+        from signbank.tools import api_fields
+        return api_fields(self.dataset, self.language_code, self.extended_fields)
+
+    def serialize_glosses(self, glosses, fieldnames):
+        glosses = list(glosses.select_related('lemma__dataset', 'domhndsh', 'subhndsh'))
+        fields_dicts = get_fields_dicts(glosses, fieldnames, self.language_code)
+        return dict((str(gloss.pk), {'updated': int(format(gloss.lastUpdated, 'U')),
+                                     'data': fields_dicts[gloss.pk]}) for gloss in glosses)
+
+    @staticmethod
+    def video_entries(glossvideos):
+        entries = defaultdict(list)
+        for gv in glossvideos.order_by('pk'):
+            if not gv.videofile or not gv.videofile.name or not os.path.exists(str(gv.videofile.path)):
+                continue
+            video_name = os.path.splitext(os.path.basename(gv.videofile.name))[0]
+            video_url = reverse('dictionary:protected_media', args=[gv.small_video(use_name=True) or gv.videofile.name])
+            image_url = reverse('dictionary:protected_media', args=[gv.poster_file()])
+            entries[str(gv.gloss_id)].append([video_name, video_url, image_url,
+                                              os.path.getmtime(str(gv.videofile.path))])
+        return entries
+
+    def primary_videos(self, glosses):
+        from signbank.video.models import GlossVideo
+        return GlossVideo.objects.filter(gloss__in=glosses, glossvideonme=None, glossvideoperspective=None, version=0)
+
+    def build(self, started):
+        fieldnames = self.fieldnames()
+        glosses = self.available_glosses()
+        return {'built': started,
+                'full_build': started,
+                'fieldnames': fieldnames,
+                'glosses': self.serialize_glosses(glosses, fieldnames),
+                'videos': self.video_entries(self.primary_videos(glosses))}
+
+    def patch(self, package, started):
+        """Serialize the changed glosses again, returns whether anything changed"""
+        available_ids = set(self.available_glosses().values_list('id', flat=True))
+        cached_ids = set(int(gloss_id) for gloss_id in package['glosses'].keys())
+        since = DT.datetime.fromtimestamp(package['built'] - PACKAGE_CACHE_CHANGE_MARGIN, tz=DT.timezone.utc)
+        changed_ids = set(package_changes_of_dataset(self.dataset, since).values_list('gloss_id', flat=True))
+        changed_ids.update(Gloss.objects.filter(lemma__dataset=self.dataset,
+                                                lastUpdated__gte=since).values_list('id', flat=True))
+        removed_ids = cached_ids - available_ids
+        updated_ids = (changed_ids & available_ids) | (available_ids - cached_ids)
+        if not removed_ids and not updated_ids:
+            return False
+        for gloss_id in removed_ids | updated_ids:
+            package['glosses'].pop(str(gloss_id), None)
+            package['videos'].pop(str(gloss_id), None)
+        updated_glosses = Gloss.objects.filter(id__in=updated_ids)
+        package['glosses'].update(self.serialize_glosses(updated_glosses, package['fieldnames']))
+        package['videos'].update(self.video_entries(self.primary_videos(updated_glosses)))
+        package['built'] = started
+        return True
+
+    def read(self):
+        if not os.path.exists(self.json_path):
+            return None
+        with open(self.json_path, 'r') as json_file:
+            try:
+                return json.load(json_file)
+            except ValueError:
+                return None
+
+    def write(self, package):
+        from signbank.tools import create_zip_with_json_files
+        tmp_json_path = self.json_path + '.tmp'
+        with open(tmp_json_path, 'w') as json_file:
+            json.dump(package, json_file, cls=DjangoJSONEncoder)
+        tmp_zip_path = self.zip_path + '.tmp'
+        create_zip_with_json_files(self.collected_data(package, 0), tmp_zip_path)
+        # replace the files, clients that are still reading the old ones are not affected
+        os.replace(tmp_zip_path, self.zip_path)
+        os.replace(tmp_json_path, self.json_path)
+
+    def refresh(self):
+        """Bring the cached package up to date, other requests wait while one of them does the work"""
+        os.makedirs(PACKAGE_CACHE_FOLDER, exist_ok=True)
+        with open(self.lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                started = time.time()
+                package = self.read()
+                if package is None or started - package.get('full_build', 0) > PACKAGE_CACHE_MAX_AGE \
+                        or package['fieldnames'] != self.fieldnames() or not os.path.exists(self.zip_path):
+                    package = self.build(started)
+                    self.write(package)
+                    prune_package_cache_changes()
+                elif self.patch(package, started):
+                    self.write(package)
+                return package
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def collected_data(package, since_timestamp):
+        video_urls, image_urls = {}, {}
+        for entries in package['videos'].values():
+            for (video_name, video_url, image_url, mtime) in entries:
+                if mtime > since_timestamp:
+                    video_urls[video_name] = video_url
+                    image_urls[video_name] = image_url
+        glosses = dict((gloss_id, gloss['data']) for (gloss_id, gloss) in package['glosses'].items()
+                       if gloss['updated'] > since_timestamp)
+        return {'video_urls': video_urls, 'image_urls': image_urls, 'glosses': glosses}
+
+    def open_full_package(self):
+        """Return an open file of the full package zip"""
+        self.refresh()
+        # the zip is replaced atomically, an opened file stays valid
+        return open(self.zip_path, 'rb')
+
+    def delta_data(self, since_timestamp):
+        """The glosses and video urls of the package changed after since_timestamp"""
+        return self.collected_data(self.refresh(), since_timestamp)
+
+
+def prune_package_cache_changes():
+    # the cached packages are rebuilt completely before older changes are needed
+    oldest = DT.datetime.fromtimestamp(time.time() - PACKAGE_CACHE_MAX_AGE - PACKAGE_CACHE_CHANGE_MARGIN,
+                                       tz=DT.timezone.utc)
+    PackageCacheChange.objects.filter(changed__lt=oldest).delete()
@@ -0,0 +1,341 @@
+import json
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count
+from django.utils.translation import gettext_noop
+
+from signbank.dictionary.models import (Gloss, Handshape, FieldChoice, AnnotationIdglossTranslation,
+                                        MinimalPairsSignature, fieldname_to_kind)
+
+
+def minimalpairs_signature_values(gloss):
+    """
+    Normalised values of the minimal pairs fields of a gloss
+    Choice list and handshape fields are the string of the foreign key, or None if not set
+    Boolean fields are 'True' or None, the minimal pairs comparison does not distinguish False from not set
+    """
+    signature = dict()
+    for field in settings.MINIMAL_PAIRS_FIELDS:
+        gloss_field = Gloss._meta.get_field(field)
+        if isinstance(gloss_field, models.ForeignKey):
+            # use the attname to avoid fetching the related object
+            field_value = getattr(gloss, gloss_field.attname)
+            signature[field] = str(field_value) if field_value is not None else None
+        else:
+            signature[field] = 'True' if getattr(gloss, field) else None
+    return signature
+
+
+def gloss_excluded_from_minimalpairs(gloss, finger_spelling_glosses=None):
+    """
+    Glosses that can never be the minimal pair of another gloss
+    The check on empty handedness and strong hand choices is done when the index is built,
+    since those depend on the names of the choices
+    """
+    if gloss.archived or not gloss.lemma_id:
+        return True
+    if gloss.handedness_id is None or gloss.domhndsh_id is None:
+        return True
+    # letter and number signs
+    for field in settings.HANDSHAPE_ETYMOLOGY_FIELDS:
+        if getattr(gloss, field):
+            return True
+    # finger spelling glosses are identified by annotation text #
+    if finger_spelling_glosses is not None:
+        return gloss.id in finger_spelling_glosses
+    return AnnotationIdglossTranslation.objects.filter(gloss_id=gloss.id, text__startswith="#").exists()
+
+
+def homonym_matrix_values(gloss):
+    """
+    Normalised phonology matrix of a gloss, glosses with the same matrix are homonyms
+    This keeps the semantics of Gloss.phonology_matrix_homonymns:
+    choice list fields are the id or None, handshape fields are the machine value, where 0 is the same as not set,
+    weakdrop and weakprop are 'True', 'False' or 'Neutral', for the other Booleans not set is the same as 'False'
+    """
+    matrix = dict()
+    for field in settings.MINIMAL_PAIRS_FIELDS + settings.HANDSHAPE_ETYMOLOGY_FIELDS \
+            + settings.HANDEDNESS_ARTICULATION_FIELDS:
+        gloss_field = Gloss._meta.get_field(field)
+        field_value = getattr(gloss, gloss_field.attname)
+        if isinstance(gloss_field, models.ForeignKey):
+            if gloss_field.related_model == Handshape and field_value == 0:
+                field_value = None
+            matrix[field] = str(field_value) if field_value is not None else None
+        elif field in settings.HANDEDNESS_ARTICULATION_FIELDS:
+            matrix[field] = 'Neutral' if field_value is None else str(bool(field_value))
+        else:
+            matrix[field] = str(bool(field_value))
+    return matrix
+
+
+def homonym_exclusion_values():
+    """The handedness choices and strong hand handshapes for which no homonyms are computed"""
+    empty_or_X_handedness = [str(fc_id) for fc_id in FieldChoice.objects.filter(
+        field=FieldChoice.HANDEDNESS, name__in=['-', 'N/A', 'X']).values_list('id', flat=True)]
+    empty_handshape = [str(machine_value) for machine_value in Handshape.objects.filter(
+        name__in=['-', 'N/A']).values_list('machine_value', flat=True)]
+    return empty_or_X_handedness, empty_handshape
+
+
+def homonym_key_of_gloss(gloss, exclusion_values=None):
+    """Hash of the normalised phonology matrix, or the empty string if the gloss has no homonyms"""
+    if gloss.archived or not gloss.lemma_id:
+        return ''
+    empty_or_X_handedness, empty_handshape = exclusion_values if exclusion_values else homonym_exclusion_values()
+    matrix = homonym_matrix_values(gloss)
+    if matrix['handedness'] in empty_or_X_handedness or matrix['domhndsh'] in empty_handshape:
+        return ''
+    return hashlib.md5(json.dumps(matrix, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def update_minimalpairs_signature(gloss):
+    """
+    Called from the post_save signals of Gloss and AnnotationIdglossTranslation
+    This updates both the minimal pairs signature and the homonym key of the gloss
+    """
+    if not gloss.pk:
+        return
+    dataset_id = gloss.lemma.dataset_id if gloss.lemma else None
+    MinimalPairsSignature.objects.update_or_create(gloss_id=gloss.pk,
+                                                   defaults={'dataset_id': dataset_id,
+                                                             'signature': json.dumps(
+                                                                 minimalpairs_signature_values(gloss)),
+                                                             'excluded': gloss_excluded_from_minimalpairs(gloss),
+                                                             'homonym_key': homonym_key_of_gloss(gloss)})
+
+
+def update_minimalpairs_signatures(glosses):
+    """Update the signatures of glosses that were stored with a bulk update, in a fixed number of queries"""
+    gloss_ids = [gloss.id for gloss in glosses]
+    finger_spelling_glosses = set(AnnotationIdglossTranslation.objects.filter(
+        gloss_id__in=gloss_ids, text__startswith="#").values_list('gloss_id', flat=True))
+    exclusion_values = homonym_exclusion_values()
+    signatures = [MinimalPairsSignature(gloss_id=gloss.id,
+                                        dataset_id=gloss.lemma.dataset_id if gloss.lemma else None,
+                                        signature=json.dumps(minimalpairs_signature_values(gloss)),
+                                        excluded=gloss_excluded_from_minimalpairs(gloss, finger_spelling_glosses),
+                                        homonym_key=homonym_key_of_gloss(gloss, exclusion_values))
+                  for gloss in glosses]
+    with transaction.atomic():
+        MinimalPairsSignature.objects.filter(gloss_id__in=gloss_ids).delete()
+        MinimalPairsSignature.objects.bulk_create(signatures, batch_size=1000)
+
+
+def rebuild_minimalpairs_signatures(dataset):
+    """Recompute the signatures of all the glosses of the dataset in a fixed number of queries"""
+    glosses = Gloss.objects.filter(lemma__dataset=dataset).select_related('lemma')
+    finger_spelling_glosses = set(AnnotationIdglossTranslation.objects.filter(
+        gloss__lemma__dataset=dataset, text__startswith="#").values_list('gloss_id', flat=True))
+    exclusion_values = homonym_exclusion_values()
+    signatures = [MinimalPairsSignature(gloss_id=gloss.id,
+                                        dataset_id=dataset.id,
+                                        signature=json.dumps(minimalpairs_signature_values(gloss)),
+                                        excluded=gloss_excluded_from_minimalpairs(gloss, finger_spelling_glosses),
+                                        homonym_key=homonym_key_of_gloss(gloss, exclusion_values))
+                  for gloss in glosses]
+    with transaction.atomic():
+        MinimalPairsSignature.objects.filter(
+            models.Q(dataset=dataset) | models.Q(gloss__lemma__dataset=dataset)).delete()
+        MinimalPairsSignature.objects.bulk_create(signatures, batch_size=1000)
+
+
+def ensure_minimalpairs_signatures(dataset):
+    """Build the signatures of the dataset if these are missing or were computed for other minimal pairs fields"""
+    if Gloss.objects.filter(lemma__dataset=dataset, minimalpairs_signature__isnull=True).exists():
+        rebuild_minimalpairs_signatures(dataset)
+        return
+    first_signature = MinimalPairsSignature.objects.filter(dataset=dataset).first()
+    if first_signature and set(first_signature.get_signature_dict().keys()) != set(settings.MINIMAL_PAIRS_FIELDS):
+        rebuild_minimalpairs_signatures(dataset)
+
+
+def same_signature_value(field, value):
+    """Condition on the signatures of glosses with the normalised value of minimalpairs_signature_values"""
+    gloss_field = Gloss._meta.get_field(field)
+    lookup = 'gloss__' + gloss_field.attname
+    if not isinstance(gloss_field, models.ForeignKey):
+        if value:
+            return models.Q(**{lookup: True})
+        return models.Q(**{lookup: False}) | models.Q(**{lookup + '__isnull': True})
+    if gloss_field.related_model == Handshape and value in [None, '0']:
+        # the minimal pairs comparison does not distinguish handshape 0 from not set
+        return models.Q(**{lookup: 0}) | models.Q(**{lookup + '__isnull': True})
+    if value is None:
+        return models.Q(**{lookup + '__isnull': True})
+    return models.Q(**{lookup: int(value)})
+
+
+class MinimalPairsIndex:
+    """
+    All the minimal pairs of a dataset, computed from the stored signatures in one pass
+    For each minimal pairs field there is a bucket of the signatures with that field left out
+    Two glosses in the same bucket that have a different value for the left out field are a minimal pair
+    If a focus gloss is given, only the signatures that can be in a bucket of the focus gloss are loaded
+    """
+
+    def __init__(self, dataset, focus_gloss=None):
+        self.dataset = dataset
+        self.fields = list(settings.MINIMAL_PAIRS_FIELDS)
+        self.index_of_handedness = self.fields.index('handedness')
+        self.index_of_handshape = self.fields.index('domhndsh')
+
+        ensure_minimalpairs_signatures(dataset)
+
+        empty_value = ['-', 'N/A']
+        self.empty_handedness = [str(fc_id) for fc_id in FieldChoice.objects.filter(
+            field=FieldChoice.HANDEDNESS, name__in=empty_value).values_list('id', flat=True)]
+        self.empty_or_X_handedness = [str(fc_id) for fc_id in FieldChoice.objects.filter(
+            field=FieldChoice.HANDEDNESS, name__in=empty_value + ['X']).values_list('id', flat=True)]
+        self.empty_handshape = [str(machine_value) for machine_value in Handshape.objects.filter(
+            name__in=empty_value).values_list('machine_value', flat=True)]
+
+        signatures = MinimalPairsSignature.objects.filter(dataset=dataset, excluded=False)
+        if focus_gloss is not None:
+            signatures = signatures.filter(self.candidates_of_gloss(focus_gloss))
+        self.signatures = dict()
+        for gloss_id, signature in signatures.values_list('gloss_id', 'signature'):
+            values = self.signature_tuple(json.loads(signature))
+            if values[self.index_of_handedness] in self.empty_handedness + [None]:
+                continue
+            if values[self.index_of_handshape] in self.empty_handshape + [None]:
+                continue
+            self.signatures[gloss_id] = values
+
+        self.buckets = [defaultdict(list) for _ in self.fields]
+        for gloss_id, values in self.signatures.items():
+            for index in range(len(self.fields)):
+                self.buckets[index][values[:index] + values[index+1:]].append(gloss_id)
+
+        self.handshape_names = None
+        self.fieldchoice_names = None
+        self.gloss_objects = dict()
+
+    def candidates_of_gloss(self, gloss):
+        """
+        A minimal pair differs in one field, so it has the same value as the gloss for at least two of
+        handedness, strong hand and location. The condition uses the indexed columns of the glosses
+        """
+        values = minimalpairs_signature_values(gloss)
+        fields = ['handedness', 'domhndsh'] + (['locprim'] if 'locprim' in self.fields else [])
+        if len(fields) < 3:
+            return same_signature_value('handedness', values['handedness']) \
+                | same_signature_value('domhndsh', values['domhndsh'])
+        candidates = models.Q()
+        for index, field in enumerate(fields):
+            other_fields = fields[:index] + fields[index+1:]
+            candidates |= same_signature_value(other_fields[0], values[other_fields[0]]) \
+                & same_signature_value(other_fields[1], values[other_fields[1]])
+        return candidates
+
+    def signature_tuple(self, signature_dict):
+        return tuple(signature_dict.get(field) for field in self.fields)
+
+    def minimal_pairs_of_signature(self, values, gloss_id=None):
+        """Returns a list of tuples (other gloss id, field name, value, other value)"""
+        if values[self.index_of_handedness] in self.empty_or_X_handedness:
+            # ignore gloss with empty or X handedness
+            return []
+        if values[self.index_of_handshape] in self.empty_handshape:
+            return []
+        minimal_pairs = []
+        for index, field in enumerate(self.fields):
+            for other_gloss_id in self.buckets[index].get(values[:index] + values[index+1:], []):
+                if other_gloss_id == gloss_id:
+                    continue
+                other_value = self.signatures[other_gloss_id][index]
+                if other_value == values[index]:
+                    continue
+                if values[index] in [None, '0'] and other_value in [None, '0']:
+                    continue
+                minimal_pairs.append((other_gloss_id, field, values[index], other_value))
+        return minimal_pairs
+
+    def minimal_pairs_of_gloss(self, gloss):
+        # the signature of the focus gloss is computed from the object, in case it has not been saved yet
+        values = self.signature_tuple(minimalpairs_signature_values(gloss))
+        return self.minimal_pairs_of_signature(values, gloss.id)
+
+    def all_minimal_pairs(self):
+        """Dictionary of gloss id to the minimal pairs of the gloss, for all the glosses of the dataset"""
+        return {gloss_id: self.minimal_pairs_of_signature(values, gloss_id)
+                for gloss_id, values in self.signatures.items()}
+
+    def load_choice_names(self):
+        handshape_ids, fieldchoice_ids = set(), set()
+        for index, field in enumerate(self.fields):
+            gloss_field = Gloss._meta.get_field(field)
+            if not isinstance(gloss_field, models.ForeignKey):
+                continue
+            values = set(values[index] for values in self.signatures.values() if values[index] is not None)
+            if gloss_field.related_model == Handshape:
+                handshape_ids.update(int(value) for value in values)
+            else:
+                fieldchoice_ids.update(int(value) for value in values)
+        self.handshape_names = {str(h.machine_value): h.name
+                                for h in Handshape.objects.filter(machine_value__in=handshape_ids)}
+        self.fieldchoice_names = {str(fc.id): fc.name for fc in FieldChoice.objects.filter(id__in=fieldchoice_ids)}
+
+    def display_value(self, field, value):
+        if value is None:
+            return None
+        gloss_field = Gloss._meta.get_field(field)
+        if not isinstance(gloss_field, models.ForeignKey):
+            return value
+        if self.handshape_names is None:
+            self.load_choice_names()
+        if gloss_field.related_model == Handshape:
+            if value not in self.handshape_names:
+                self.handshape_names[value] = Handshape.objects.get(machine_value=int(value)).name
+            return self.handshape_names[value]
+        if value not in self.fieldchoice_names:
+            self.fieldchoice_names[value] = FieldChoice.objects.get(id=int(value)).name
+        return self.fieldchoice_names[value]
+
+    def get_gloss_objects(self, gloss_ids):
+        missing_ids = [gloss_id for gloss_id in gloss_ids if gloss_id not in self.gloss_objects]
+        if missing_ids:
+            self.gloss_objects.update(Gloss.objects.select_related('lemma').prefetch_related(
+                'annotationidglosstranslation_set__language').in_bulk(missing_ids))
+        return [self.gloss_objects[gloss_id] for gloss_id in gloss_ids if gloss_id in self.gloss_objects]
+
+    def minimal_pairs_dict(self, gloss):
+        """
+        Same format as Gloss.minimal_pairs_dict
+        Dictionary of other gloss to a dictionary of the differing field to
+        (field label, field name, value, other value, field kind)
+        """
+        minimal_pairs = self.minimal_pairs_of_gloss(gloss)
+        other_glosses = {other_gloss.id: other_gloss for other_gloss in
+                         self.get_gloss_objects([other_gloss_id for (other_gloss_id, _, _, _) in minimal_pairs])}
+        minimal_pairs_fields = dict()
+        for (other_gloss_id, field_name, field_value, other_field_value) in minimal_pairs:
+            if other_gloss_id not in other_glosses:
+                continue
+            field_label = gettext_noop(Gloss._meta.get_field(field_name).verbose_name)
+            minimal_pairs_fields[other_glosses[other_gloss_id]] = {
+                field_name: (field_label, field_name,
+                             self.display_value(field_name, field_value),
+                             self.display_value(field_name, other_field_value),
+                             fieldname_to_kind(field_name))}
+        return minimal_pairs_fields
+
+
+def homonym_groups(dataset):
+    """
+    Dictionary of (dataset id, homonym key) to the ids of the glosses that share it,
+    only for keys shared by more than one gloss
+    The dataset id is part of the key, so the groups of several datasets can be put in one dictionary
+    The shared keys are found with one GROUP BY on the stored homonym keys of the dataset
+    """
+    ensure_minimalpairs_signatures(dataset)
+    shared_keys = MinimalPairsSignature.objects.filter(dataset=dataset).exclude(homonym_key='').values(
+        'homonym_key').annotate(num_glosses=Count('id')).filter(num_glosses__gt=1).values('homonym_key')
+    groups = defaultdict(list)
+    for gloss_id, homonym_key in MinimalPairsSignature.objects.filter(
+            dataset=dataset, homonym_key__in=shared_keys).values_list('gloss_id', 'homonym_key'):
+        groups[(dataset.id, homonym_key)].append(gloss_id)
+    return groups
@@ -62,6 +62,26 @@ def sensetranslations_per_language_dict(gloss):
     return sensetranslations_per_language
 
 
+def sensetranslations_per_language_dict_prefetched(gloss):
+    # As sensetranslations_per_language_dict, the related objects are iterated with all()
+    # so the prefetched gloss senses, sense translations and translations are used
+    sensetranslations_per_language = dict()
+    glosssenses = sorted(gloss.glosssense_set.all(), key=lambda gs: gs.order)
+    for language in gloss.lemma.dataset.translation_languages.all():
+        sensetranslations_for_this_language = dict()
+        for sensei, glosssense in enumerate(glosssenses, 1):
+            sensetranslations = sorted([sensetranslation for sensetranslation in glosssense.sense.senseTranslations.all()
+                                        if sensetranslation.language_id == language.id], key=lambda st: st.pk)
+            if not sensetranslations:
+                continue
+            translations = sorted(sensetranslations[0].translations.all(), key=lambda trans: trans.index)
+            if translations:
+                keywords_list = [trans.translation.text for trans in translations if trans.translation.text != '']
+                sensetranslations_for_this_language[sensei] = ', '.join(keywords_list)
+        sensetranslations_per_language[language] = sensetranslations_for_this_language
+    return sensetranslations_per_language
+
+
 def senses_translations_per_language_list(sense):
     # Put senses per language in a dictionary mapping language to a dictionary of sense number to list of strings
     assert isinstance(sense, Sense), "Not a Sense object"
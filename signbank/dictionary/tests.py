@@ -5,13 +5,14 @@ from pathlib import Path
 from os import path
 from os.path import isfile, join
 import subprocess
+import time
 from datetime import datetime
 
 from django.utils.timezone import get_current_timezone
 from django.db.models import CharField, TextField
 from django.db.models.fields import BooleanField
 from django.db import models
-from django.db.models import Q
+from django.db.models import Q, QuerySet
 from django.contrib.auth.models import User, Permission, Group
 from django.test import TestCase
 from django.contrib.admin.sites import AdminSite
@@ -23,26 +24,47 @@ from django.utils import translation
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.urls import reverse_lazy, reverse
 
-from guardian.shortcuts import assign_perm
-from collections import OrderedDict
+from guardian.shortcuts import assign_perm, remove_perm
+from collections import OrderedDict, defaultdict
 
 from signbank.settings.base import BASE_DIR
 from signbank.settings.server_specific import (PREFIX_URL, MODELTRANSLATION_LANGUAGES, ECV_FOLDER_ABSOLUTE_PATH,
                                                FIELDS, OBLIGATORY_FIELDS, DEFAULT_DATASET, API_FIELDS,
                                                DEFAULT_DATASET_ACRONYM, TEST_DATASET_ACRONYM, WRITABLE_FOLDER,
-                                               DEFAULT_LANGUAGE_HEADER_COLUMN, DEFAULT_DATASET_LANGUAGE_ID,
+                                               GLOSS_VIDEO_DIRECTORY, DEFAULT_LANGUAGE_HEADER_COLUMN, DEFAULT_DATASET_LANGUAGE_ID,
                                                ESCAPE_UPLOADED_VIDEO_FILE_PATH, ADMIN_URL, HANDSHAPE_ETYMOLOGY_FIELDS,
                                                HANDEDNESS_ARTICULATION_FIELDS, DATASET_METADATA_DIRECTORY,
-                                               TEST_DATA_DIRECTORY, DATASET_EAF_DIRECTORY)
-from signbank.video.models import GlossVideo
+                                               TEST_DATA_DIRECTORY, DATASET_EAF_DIRECTORY, LANGUAGE_CODE,
+                                               ECV_SETTINGS)
+from signbank.video.models import (GlossVideo, VideoProcessingJob, MediaFile, reconcile_glossvideo_file_states,
+                                   add_small_appendix, storage)
+from signbank.video.inventory import scan_media_inventory, sync_media_files
+from signbank.dataset_operations import find_unlinked_video_files_for_dataset
+from signbank.video.media_pipeline import find_missing_media
+from signbank.video.relocation import (plan_video_relocations, write_journal, complete_relocation, rollback_relocation,
+                                       unfinished_relocation_journals)
+from signbank.video.jobs import enqueue_video_job, run_video_job, run_queued_video_jobs
+from signbank.video.eaf_annotations import get_glosses_from_eaf, covered_points
+from signbank.video.zip_ingestion import read_zip_video_members, import_zipped_videos
+from signbank.query_parameters import apply_video_filters_to_results
 from signbank.dictionary.models import (Dataset, Language, Gloss, Morpheme, Handshape, Keyword, SignLanguage,
                                         GlossSense, MorphologyDefinition,
                                         FieldChoice, FieldChoiceForeignKey, SemanticField, DerivationHistory,
                                         SemanticFieldTranslation, Definition, Translation, AnnotationIdglossTranslation,
                                         OtherMedia, GlossRevision, fieldname_to_kind_table,
-                                        GlossFrequency, Document, Speaker, Corpus,
+                                        GlossFrequency, Document, Speaker, Corpus, DocumentFrequencyCache,
                                         UserProfile, LemmaIdgloss, LemmaIdglossTranslation, get_default_language_id,
-                                        Dialect, Relation)
+                                        Dialect, Relation, MinimalPairsSignature, Sense, SenseTranslation,
+                                        SignbankAPIToken, CSVImportJob, AnnotatedSentence, AnnotatedGloss,
+                                        PackageCacheChange, bump_data_version)
+from signbank.dictionary.phonology_signatures import MinimalPairsIndex, homonym_groups
+from signbank.dictionary.gloss_serializer import get_fields_dicts
+from signbank.dictionary.package_cache import PackageCache
+from signbank.dictionary.dataset_visibility import public_dataset_ids, user_viewable_dataset_ids
+from signbank.dictionary.adminviews import order_queryset_by_sort_order
+from signbank.api_token import (generate_auth_token, hash_token, get_api_user, flush_api_token_usage,
+                                APIAuthException)
+from signbank.csv_interface import csv_gloss_rows, csv_gloss_to_row, sense_translations_for_language
 from signbank.dictionary.forms import GlossCreateForm, FieldChoiceForm, LemmaCreateForm
 from signbank.dictionary.views import gloss_api_get_sign_name_and_media_info
 from signbank.frequency import (import_corpus_speakers, configure_corpus_documents_for_dataset,
@@ -51,13 +73,26 @@ from signbank.frequency import (import_corpus_speakers, configure_corpus_documen
                                 dictionary_glosses_to_documents, document_to_speakers, document_to_glosses,
                                 gloss_to_documents, speaker_to_glosses, dictionary_speakers_to_glosses,
                                 dictionary_speakers_to_documents, speaker_to_documents, get_corpus_speakers,
-                                get_gloss_tokNo, get_gloss_tokNoSgnr, update_corpus_document_counts)
+                                get_gloss_tokNo, get_gloss_tokNoSgnr, update_corpus_document_counts,
+                                count_corpus_eaf_files, save_gloss_frequencies)
+from signbank.dictionary.corpus_statistics import GlossFrequencyTable, corpus_statistics_version
+from signbank.sign_counter import SignCounter, frequencies_per_person_per_file
 from signbank.dictionary.admin import HandshapeAdmin, FieldChoiceAdmin
 
 from signbank.tools import (get_gloss_handshape_fields, get_fields_with_choices_glosses, get_fields_with_choices_handshapes,
                             get_fields_with_choices_definition, get_fields_with_choices_morphology_definition,
                             get_fields_with_choices_other_media_type, get_fields_with_choices_morpheme_type,
-                            get_fields_with_choices_relation)
+                            get_fields_with_choices_relation, api_fields, construct_scrollbar,
+                            store_search_results, get_search_results, search_results_window,
+                            map_search_results_to_gloss_list, compare_valuedict_to_gloss,
+                            write_ecv_file_for_dataset, get_ecv_description_for_gloss)
+from signbank.dictionary.csv_update_lookups import GlossUpdateLookups
+from signbank.dictionary.ecv_writer import (DatasetVocabulary, write_dataset_ecv, write_changed_ecv_files,
+                                            ecv_file_is_current, ecv_file_path, description_cache_path)
+from signbank.dictionary.package_cache import PACKAGE_CACHE_CHANGE_MARGIN
+from signbank.dictionary.csv_import_jobs import (run_csv_import_job, csv_import_results, remove_csv_upload,
+                                                 requeue_stale_csv_import_jobs, UpdateGlossesCheck, UpdateLemmasApply,
+                                                 STATE_APPENDIX, STATE_DATASET_KEY, CSV_IMPORT_STALE_AFTER)
 
 from xml.etree import ElementTree
 
@@ -379,6 +414,173 @@ class BasicCRUDTests(TestCase):
         print('test_package_function: API_FIELDS: ', API_FIELDS)
         print('test_package_function: get_fields_dict: ', result)
 
+    def create_gloss_with_senses(self, dataset, text):
+        new_lemma = LemmaIdgloss(dataset=dataset)
+        new_lemma.save()
+        new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1,
+                          locprim=self.locprim_fieldchoice_1, domhndsh=self.domhndsh_1)
+        new_gloss.save()
+        for language in dataset.translation_languages.all():
+            LemmaIdglossTranslation(text=text + '_lemma', lemma=new_lemma, language=language).save()
+            AnnotationIdglossTranslation(text=text, gloss=new_gloss, language=language).save()
+            for order in [1, 2]:
+                keyword = Keyword.objects.get_or_create(text=text + '_' + language.language_code_2char + str(order))[0]
+                keyword_translation = Translation(gloss=new_gloss, language=language, translation=keyword,
+                                                  index=1, orderIndex=order)
+                keyword_translation.save()
+                sense_translation = SenseTranslation(language=language)
+                sense_translation.save()
+                sense_translation.translations.add(keyword_translation)
+                sense = Sense()
+                sense.save()
+                sense.senseTranslations.add(sense_translation)
+                GlossSense(gloss=new_gloss, sense=sense, order=order).save()
+        Definition(gloss=new_gloss, text='note of ' + text, count=1).save()
+        return new_gloss
+
+    def test_bulk_fields_dict(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        fieldnames = api_fields(test_dataset, 'en', advanced=True)
+
+        glosses = [self.create_gloss_with_senses(test_dataset, 'thisisatemporarybulkgloss' + str(i)) for i in range(6)]
+
+        # the bulk serializer returns the same dictionaries as get_fields_dict
+        fields_dicts = get_fields_dicts(Gloss.objects.filter(id__in=[g.id for g in glosses]), fieldnames, 'en')
+        for gloss in glosses:
+            self.assertEqual(fields_dicts[gloss.id], gloss.get_fields_dict(fieldnames, 'en'))
+            self.assertEqual(len(fields_dicts[gloss.id][translation.gettext("Senses") + ": %s" % test_dataset.default_language.name]), 2)
+
+        # the number of queries does not depend on the number of glosses
+        with CaptureQueriesContext(connection) as two_glosses:
+            get_fields_dicts(Gloss.objects.filter(id__in=[g.id for g in glosses[:2]]), fieldnames, 'en')
+        with CaptureQueriesContext(connection) as six_glosses:
+            get_fields_dicts(Gloss.objects.filter(id__in=[g.id for g in glosses]), fieldnames, 'en')
+        self.assertEqual(len(two_glosses.captured_queries), len(six_glosses.captured_queries))
+        self.assertLess(len(six_glosses.captured_queries), 25)
+
+    def test_csv_gloss_rows(self):
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        dataset_languages = test_dataset.translation_languages.all()
+        fieldnames = FIELDS['main'] + FIELDS['phonology'] + FIELDS['semantics'] + FIELDS['frequency'] + ['inWeb', 'isNew']
+        fields = [Gloss.get_field(fname) for fname in fieldnames if fname in Gloss.get_field_names()]
+
+        glosses = [self.create_gloss_with_senses(test_dataset, 'thisisatemporarycsvgloss' + str(i)) for i in range(3)]
+        query_set = Gloss.objects.filter(id__in=[g.id for g in glosses]).order_by('id')
+
+        # the rows generated from prefetched chunks are those of the glosses exported one at a time
+        rows = list(csv_gloss_rows(query_set, dataset_languages, fields))
+        self.assertEqual(len(rows), 3)
+        for row, gloss in zip(rows, query_set):
+            self.assertEqual(row, csv_gloss_to_row(Gloss.objects.get(id=gloss.id), dataset_languages, fields))
+            self.assertIn(sense_translations_for_language(gloss, test_dataset.default_language), row)
+            self.assertNotEqual(sense_translations_for_language(gloss, test_dataset.default_language), "")
+
+    def test_order_by_choice_list_field(self):
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        glosses = [self.create_gloss_with_senses(test_dataset, 'thisisatemporarysortedgloss' + str(i)) for i in range(3)]
+        glosses[1].handedness = None
+        glosses[1].save()
+        glosses[2].handedness = self.handedness_fieldchoice_2
+        glosses[2].save()
+        qs = Gloss.objects.filter(id__in=[g.id for g in glosses])
+
+        # the choice list columns are ordered in the database, unset values come last
+        ordered = order_queryset_by_sort_order({'sortOrder': 'handedness'}, qs, ['en'])
+        self.assertIsInstance(ordered, QuerySet)
+        ordered_ids = list(ordered.values_list('id', flat=True))
+        self.assertEqual(ordered_ids[-1], glosses[1].id)
+        ordered_reversed = order_queryset_by_sort_order({'sortOrder': '-handedness'}, qs, ['en'])
+        self.assertEqual(ordered_reversed.count(), 3)
+
+        ordered = order_queryset_by_sort_order({}, qs, ['en'])
+        self.assertIsInstance(ordered, QuerySet)
+        self.assertEqual(list(ordered.values_list('id', flat=True)), [g.id for g in glosses])
+
+    def test_glosslist_rows_ajax(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        glosses = [self.create_gloss_with_senses(test_dataset, 'thisisatemporaryrowgloss' + str(i)) for i in range(6)]
+        client = Client()
+        client.login(username='test-user', password='test-user')
+        gloss_ids = [str(gloss.id) for gloss in reversed(glosses)]
+
+        # the rows of a page are rendered by one request, in the order of the gloss ids
+        response = client.get(reverse('dictionary:glosslist_rows_ajax'), {'gloss_ids': ','.join(gloss_ids)})
+        self.assertEqual(response.status_code, 200)
+        row_ids = re.findall(r'id = "glossrow_(\d+)"', response.content.decode('utf-8'))
+        self.assertEqual(row_ids, gloss_ids)
+        self.assertContains(response, 'thisisatemporaryrowgloss5')
+
+        # the number of queries does not grow with the number of rows
+        with CaptureQueriesContext(connection) as two_rows:
+            client.get(reverse('dictionary:glosslist_rows_ajax'), {'gloss_ids': ','.join(gloss_ids[:2])})
+        with CaptureQueriesContext(connection) as six_rows:
+            client.get(reverse('dictionary:glosslist_rows_ajax'), {'gloss_ids': ','.join(gloss_ids)})
+        self.assertEqual(len(two_rows.captured_queries), len(six_rows.captured_queries))
+
+    def test_search_result_bar(self):
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        language_code = test_dataset.default_language.language_code_2char
+        glosses = [self.create_gloss_with_senses(test_dataset, 'thisisatemporaryscrollgloss' + str(i)) for i in range(5)]
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request.session = self.client.session
+
+        # the session only refers to the ordered ids of the search results
+        qs = Gloss.objects.filter(id__in=[gloss.id for gloss in glosses]).order_by('id')
+        store_search_results(request, construct_scrollbar(qs, 'sign', language_code))
+        search_results = get_search_results(request)
+        self.assertEqual(search_results['href_type'], 'gloss')
+        self.assertEqual(search_results['count'], 5)
+        self.assertNotIn('data_label', json.dumps(request.session['search_results']))
+        self.assertEqual(map_search_results_to_gloss_list(search_results)[0], [gloss.id for gloss in glosses])
+
+        # the labels are looked up for a window around the active search result
+        window = search_results_window(search_results, active_id=str(glosses[3].id), size=2)
+        self.assertEqual(window['start'], 2)
+        self.assertEqual(window['count'], 5)
+        self.assertEqual([item['id'] for item in window['items']], [str(glosses[2].id), str(glosses[3].id)])
+        self.assertEqual(window['items'][0]['data_label'], 'thisisatemporaryscrollgloss2')
+
+    def test_package_cache(self):
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        gloss = self.create_gloss_with_senses(test_dataset, 'thisisatemporarycachedgloss')
+        package_cache = PackageCache(test_dataset, 'en', False, False)
+
+        package = package_cache.refresh()
+        annotation_field = translation.gettext("Annotation ID Gloss") + ": %s" % test_dataset.default_language.name
+        self.assertEqual(package['glosses'][str(gloss.id)]['data'][annotation_field], 'thisisatemporarycachedgloss')
+
+        # a changed annotation is patched into the cached package
+        annotation = AnnotationIdglossTranslation.objects.get(gloss=gloss, language=test_dataset.default_language)
+        annotation.text = 'thisisatemporarychangedgloss'
+        annotation.save()
+        package = package_cache.refresh()
+        self.assertEqual(package['glosses'][str(gloss.id)]['data'][annotation_field], 'thisisatemporarychangedgloss')
+        self.assertIn(str(gloss.id), package_cache.delta_data(int(time.time()) - 60)['glosses'])
+        # a gloss has one recorded change, with the time of its last change
+        self.assertEqual(PackageCacheChange.objects.filter(gloss_id=gloss.id).count(), 1)
+
+        # a changed lemma translation is recorded for the glosses of the lemma, with their dataset
+        PackageCacheChange.objects.filter(gloss_id=gloss.id).delete()
+        LemmaIdglossTranslation.objects.filter(lemma=gloss.lemma).first().save()
+        self.assertEqual(list(PackageCacheChange.objects.filter(gloss_id=gloss.id).values_list('dataset_id', flat=True)),
+                         [test_dataset.id])
+
+        # an archived gloss is removed from the cached package
+        gloss.archived = True
+        gloss.save()
+        package = package_cache.refresh()
+        self.assertNotIn(str(gloss.id), package['glosses'])
+
+        for path in [package_cache.json_path, package_cache.zip_path, package_cache.lock_path]:
+            os.remove(path)
+
 #Deprecated?
 class BasicQueryTests(TestCase):
 
@@ -603,6 +805,53 @@ class ImportExportTests(TestCase):
                 os.remove(filename_path)
                 print('Temp ecv file removed.')
 
+    def test_write_dataset_ecv(self):
+        from unittest.mock import patch
+
+        new_lemma = LemmaIdgloss(dataset=self.test_dataset)
+        new_lemma.save()
+        LemmaIdglossTranslation(text='thisisanecvtest', lemma=new_lemma,
+                                language=self.test_dataset.default_language).save()
+        new_gloss = Gloss(lemma=new_lemma,
+                          handedness=FieldChoice.objects.filter(field='Handedness', machine_value__gt=1).first())
+        new_gloss.save()
+        AnnotationIdglossTranslation(gloss=new_gloss, language=self.test_dataset.default_language,
+                                     text='ECVWRITERTEST').save()
+        languages = list(self.test_dataset.translation_languages.all())
+        language_info = dict((language.language_code_3char, ('', language.name)) for language in languages)
+
+        ecv_path = ecv_file_path(self.test_dataset)
+        try:
+            with patch('signbank.dictionary.templatetags.annotation_idgloss_translation.get_iso_639_3_info',
+                       return_value=language_info):
+                self.assertEqual(write_ecv_file_for_dataset(self.test_dataset.acronym), (True, ecv_path))
+                entry = ElementTree.parse(ecv_path).getroot().find(
+                    "./CONTROLLED_VOCABULARY/CV_ENTRY_ML[@CVE_ID='%d']" % new_gloss.id)
+                value = entry.find("./CVE_VALUE[@LANG_REF='%s']" % self.test_dataset.default_language.language_code_3char)
+                self.assertEqual(value.text, 'ECVWRITERTEST')
+                language_code_2char = self.test_dataset.default_language.language_code_2char
+                self.assertEqual(value.get('DESCRIPTION'), get_ecv_description_for_gloss(
+                    new_gloss, language_code_2char, ECV_SETTINGS['include_phonology_and_frequencies']))
+
+                # the descriptions of the glosses that did not change are read from the cache
+                PackageCacheChange.objects.all().delete()
+                with patch.object(DatasetVocabulary, 'description', return_value='') as description:
+                    write_dataset_ecv(self.test_dataset)
+                    description.assert_not_called()
+                    new_gloss.save()
+                    write_dataset_ecv(self.test_dataset)
+                    self.assertEqual(description.call_count, len(languages))
+
+                # the file is only written again when a gloss changed after it was written
+                later = time.time() + 2 * PACKAGE_CACHE_CHANGE_MARGIN
+                os.utime(ecv_path, (later, later))
+                self.assertTrue(ecv_file_is_current(self.test_dataset))
+                self.assertEqual(write_changed_ecv_files([self.test_dataset]), ([], []))
+        finally:
+            for path in [ecv_path, description_cache_path(self.test_dataset)]:
+                if os.path.exists(path):
+                    os.remove(path)
+
     def test_DatasetListView_ECV_export_no_permission_change_dataset(self):
 
         print('Test DatasetListView export_ecv without permission')
@@ -777,6 +1026,18 @@ class ImportExportTests(TestCase):
         assign_perm('change_dataset', self.user, self.test_dataset)
         print('User has permmission to change dataset.')
 
+        def apply_confirmed_rows(form_data, **kwargs):
+            # the confirmed rows are applied by a job, its page shows the results when it is done
+            response = client.post(reverse_lazy('import_csv_create'), form_data)
+            job = CSVImportJob.objects.filter(user=self.user).latest('id')
+            self.assertRedirects(response, reverse('import_csv_create') + '?job=' + str(job.id),
+                                 fetch_redirect_response=False)
+            self.assertEqual(job.phase, CSVImportJob.APPLY)
+            self.assertEqual(run_csv_import_job(job.id).status, CSVImportJob.DONE)
+            response = client.get(reverse('import_csv_create'), {'job': job.id}, **kwargs)
+            remove_csv_upload(job.csv_file)
+            return response
+
         gloss_id = 1
         lemma_idgloss_translation_prefix = 'test_lemma_translation_'
         annotation_idgloss_translation_prefix = 'test_annotation_translation_'
@@ -794,7 +1055,7 @@ class ImportExportTests(TestCase):
                                                     test_annotation_translation_index)
 
         print('Form data test 1 of test_Import_csv_new_gloss_for_lemma: \n', form_data)
-        response = client.post(reverse_lazy('import_csv_create'), form_data)
+        response = apply_confirmed_rows(form_data)
         self.assertContains(response, 'Changes are live.')
 
         # Prepare form data for linking to AN EXISTING LemmaIdgloss + LemmaIdglossTranslations
@@ -809,7 +1070,7 @@ class ImportExportTests(TestCase):
                                                     test_annotation_translation_index)
 
         print('Form data test 2 of test_Import_csv_new_gloss_for_lemma: \n', form_data)
-        response = client.post(reverse_lazy('import_csv_create'), form_data)
+        response = apply_confirmed_rows(form_data)
         self.assertContains(response, 'Changes are live.')
 
         count_dataset_translation_languages = self.test_dataset.translation_languages.all().count()
@@ -831,7 +1092,7 @@ class ImportExportTests(TestCase):
                                                     test_annotation_translation_index)
 
         print('Form data test 3 of test_Import_csv_new_gloss_for_lemma: \n', form_data)
-        response = client.post(reverse_lazy('import_csv_create'), form_data, follow=True)
+        response = apply_confirmed_rows(form_data, follow=True)
 
         if count_dataset_translation_languages > 1:
             print('More than one translation language, attempt to update to combination of existing and new lemma translations')
@@ -946,6 +1207,294 @@ class VideoTests(TestCase):
             print('status code: ', response.status_code)
             self.assertEqual(response.status_code, '302')
 
+    def test_video_file_present_filter(self):
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        new_lemma = LemmaIdgloss(dataset=test_dataset)
+        new_lemma.save()
+        new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1)
+        new_gloss.save()
+
+        video_name = os.path.join('glossvideo', test_dataset.acronym, 'th',
+                                  'thisisatemporaryfilepresenttest-' + str(new_gloss.pk) + '.mp4')
+        glossvideo = GlossVideo(gloss=new_gloss, videofile=video_name, version=0)
+        glossvideo.save()
+        self.assertFalse(glossvideo.file_present)
+
+        query_set = Gloss.objects.filter(id=new_gloss.id)
+        self.assertEqual(apply_video_filters_to_results(Gloss, query_set, {'hasvideo': '2'}).count(), 0)
+        self.assertEqual(apply_video_filters_to_results(Gloss, query_set, {'hasvideo': '3'}).count(), 1)
+
+        # the file is put in place outside of the storage, the reconciler notices it
+        video_path = os.path.join(WRITABLE_FOLDER, video_name)
+        os.makedirs(os.path.dirname(video_path), exist_ok=True)
+        with open(video_path, 'wb') as video_file:
+            video_file.write(b'0' * 100)
+        try:
+            self.assertEqual(reconcile_glossvideo_file_states(GlossVideo.objects.filter(gloss=new_gloss)), 1)
+            glossvideo.refresh_from_db()
+            self.assertTrue(glossvideo.file_present)
+            self.assertEqual(glossvideo.file_size, 100)
+            self.assertEqual(apply_video_filters_to_results(Gloss, query_set, {'hasvideo': '2'}).count(), 1)
+            self.assertEqual(apply_video_filters_to_results(Gloss, query_set, {'hasvideo': '3'}).count(), 0)
+        finally:
+            os.remove(video_path)
+
+        self.assertEqual(reconcile_glossvideo_file_states(GlossVideo.objects.filter(gloss=new_gloss)), 1)
+        self.assertEqual(apply_video_filters_to_results(Gloss, query_set, {'hasvideo': '2'}).count(), 0)
+
+    def test_video_processing_jobs(self):
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        assign_perm('change_dataset', self.user, test_dataset)
+        new_lemma = LemmaIdgloss(dataset=test_dataset)
+        new_lemma.save()
+        new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1)
+        new_gloss.save()
+        video_name = os.path.join('glossvideo', test_dataset.acronym, 'th',
+                                  'thisisatemporaryjobtest-' + str(new_gloss.pk) + '.mp4')
+        glossvideo = GlossVideo(gloss=new_gloss, videofile=video_name, version=0)
+        glossvideo.save()
+
+        # a job is not queued twice for the same file
+        job = enqueue_video_job(VideoProcessingJob.EXTRACT_FRAME, glossvideo)
+        self.assertEqual(enqueue_video_job(VideoProcessingJob.EXTRACT_FRAME, glossvideo).id, job.id)
+        self.assertNotEqual(enqueue_video_job(VideoProcessingJob.STILL_IMAGE, glossvideo).id, job.id)
+
+        client = Client()
+        client.login(username='test-user', password='test-user')
+        response = client.get(reverse('video_jobs_status', kwargs={'glossid': new_gloss.pk}))
+        self.assertFalse(response.json()['finished'])
+
+        # the video file does not exist, the job fails instead of staying queued or running
+        finished_job = run_video_job(job.id)
+        self.assertEqual(finished_job.status, VideoProcessingJob.FAILED)
+        self.assertIsNone(run_video_job(job.id))
+        self.assertEqual(run_queued_video_jobs(), 1)
+        response = client.get(reverse('video_jobs_status', kwargs={'glossid': new_gloss.pk}))
+        self.assertTrue(response.json()['finished'])
+
+    def test_find_missing_media(self):
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        new_lemma = LemmaIdgloss(dataset=test_dataset)
+        new_lemma.save()
+        new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1)
+        new_gloss.save()
+        video_name = os.path.join('glossvideo', test_dataset.acronym, 'th',
+                                  'thisisatemporarymissingmediatest-' + str(new_gloss.pk) + '.mp4')
+        glossvideo = GlossVideo(gloss=new_gloss, videofile=video_name, version=0)
+        glossvideo.save()
+
+        # a video that is not on disk gets no task
+        self.assertFalse([task for task in find_missing_media(test_dataset) if task.glossvideo_id == glossvideo.id])
+
+        video_path = os.path.join(WRITABLE_FOLDER, video_name)
+        os.makedirs(os.path.dirname(video_path), exist_ok=True)
+        with open(video_path, 'wb') as video_file:
+            video_file.write(b'0' * 100)
+        poster_path = glossvideo.poster_path_on_disk()
+        try:
+            tasks = [task for task in find_missing_media(test_dataset) if task.glossvideo_id == glossvideo.id]
+            self.assertEqual(len(tasks), 1)
+            self.assertEqual(tasks[0].poster_path, poster_path)
+            self.assertEqual(tasks[0].small_video_path, add_small_appendix(video_path))
+
+            # only the small video is missing once the poster exists
+            os.makedirs(os.path.dirname(poster_path), exist_ok=True)
+            with open(poster_path, 'wb') as poster_file:
+                poster_file.write(b'0')
+            tasks = [task for task in find_missing_media(test_dataset) if task.glossvideo_id == glossvideo.id]
+            self.assertIsNone(tasks[0].poster_path)
+            self.assertFalse([task for task in find_missing_media(test_dataset, small_videos=False)
+                              if task.glossvideo_id == glossvideo.id])
+        finally:
+            os.remove(video_path)
+            if os.path.exists(poster_path):
+                os.remove(poster_path)
+
+    def test_relocate_videos(self):
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        new_lemma = LemmaIdgloss(dataset=test_dataset)
+        new_lemma.save()
+        translation = LemmaIdglossTranslation(text='thisisarelocationtest', lemma=new_lemma,
+                                              language=test_dataset.default_language)
+        translation.save()
+        new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1)
+        new_gloss.save()
+        glossvideo = GlossVideo(gloss=new_gloss, videofile='', version=0)
+        glossvideo.save()
+        old_name = glossvideo.relocated_video_file_path()
+        GlossVideo.objects.filter(id=glossvideo.id).update(videofile=old_name)
+        old_path = os.path.join(WRITABLE_FOLDER, old_name)
+        os.makedirs(os.path.dirname(old_path), exist_ok=True)
+        with open(old_path, 'wb') as video_file:
+            video_file.write(b'0' * 100)
+
+        # renaming the lemma moves the video, the journal is removed after the commit
+        with self.captureOnCommitCallbacks(execute=True):
+            translation.text = 'thisisamovedrelocationtest'
+            translation.save()
+        glossvideo.refresh_from_db()
+        new_name = glossvideo.videofile.name
+        new_path = os.path.join(WRITABLE_FOLDER, new_name)
+        created_paths = [old_path, new_path]
+        try:
+            self.assertIn('thisisamovedrelocationtest', new_name)
+            self.assertFalse(os.path.exists(old_path))
+            self.assertTrue(os.path.exists(new_path))
+            self.assertEqual(unfinished_relocation_journals(), [])
+
+            # an interrupted move can be rolled back with its journal
+            LemmaIdglossTranslation.objects.filter(id=translation.id).update(text='thisisarolledbackrelocationtest')
+            plan = plan_video_relocations([glossvideo])
+            self.assertEqual(len(plan['moves']), 1)
+            created_paths.append(os.path.join(WRITABLE_FOLDER, plan['moves'][0]['new_name']))
+            journal_path = write_journal(plan)
+            with self.captureOnCommitCallbacks(execute=True):
+                complete_relocation(plan, journal_path)
+            self.assertFalse(os.path.exists(new_path))
+            journal_path = write_journal(plan)
+            with self.captureOnCommitCallbacks(execute=True):
+                rollback_relocation(plan, journal_path)
+            glossvideo.refresh_from_db()
+            self.assertEqual(glossvideo.videofile.name, new_name)
+            self.assertTrue(os.path.exists(new_path))
+            self.assertFalse(os.path.exists(journal_path))
+        finally:
+            for path in created_paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def test_media_inventory(self):
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        new_lemma = LemmaIdgloss(dataset=test_dataset)
+        new_lemma.save()
+        new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1)
+        new_gloss.save()
+        linked_name = os.path.join(GLOSS_VIDEO_DIRECTORY, test_dataset.acronym, 'th',
+                                   'thisisaninventorytest-' + str(new_gloss.pk) + '.mp4')
+        unlinked_name = os.path.join(GLOSS_VIDEO_DIRECTORY, test_dataset.acronym, 'th',
+                                     'thisisanunlinkedinventorytest-' + str(new_gloss.pk) + '.mp4')
+        GlossVideo(gloss=new_gloss, videofile=linked_name, version=0).save()
+        for name in [linked_name, unlinked_name]:
+            path = os.path.join(WRITABLE_FOLDER, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as video_file:
+                video_file.write(b'0' * 100)
+        try:
+            scan_media_inventory(folders=(GLOSS_VIDEO_DIRECTORY,))
+            self.assertEqual(MediaFile.objects.get(path=linked_name).size, 100)
+            self.assertTrue(MediaFile.objects.get(path=linked_name).linked)
+            self.assertFalse(MediaFile.objects.get(path=unlinked_name).linked)
+            unlinked_files = find_unlinked_video_files_for_dataset(test_dataset)
+            self.assertIn(unlinked_name, unlinked_files)
+            self.assertNotIn(linked_name, unlinked_files)
+
+            # a second scan only updates what changed on disk
+            with open(os.path.join(WRITABLE_FOLDER, linked_name), 'ab') as video_file:
+                video_file.write(b'0' * 100)
+            os.remove(os.path.join(WRITABLE_FOLDER, unlinked_name))
+            added, updated, removed = scan_media_inventory(folders=(GLOSS_VIDEO_DIRECTORY,))
+            self.assertEqual((added, removed), (0, 1))
+            self.assertEqual(MediaFile.objects.get(path=linked_name).size, 200)
+            self.assertFalse(MediaFile.objects.filter(path=unlinked_name).exists())
+        finally:
+            for name in [linked_name, unlinked_name]:
+                if os.path.exists(os.path.join(WRITABLE_FOLDER, name)):
+                    os.remove(os.path.join(WRITABLE_FOLDER, name))
+
+    def test_media_inventory_follows_video_changes(self):
+        from django.core.files.base import ContentFile
+
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        new_lemma = LemmaIdgloss(dataset=test_dataset)
+        new_lemma.save()
+        new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1)
+        new_gloss.save()
+        name = os.path.join(GLOSS_VIDEO_DIRECTORY, test_dataset.acronym, 'th',
+                            'thisisasyncedinventorytest-' + str(new_gloss.pk) + '.mp4')
+        glossvideo = GlossVideo(gloss=new_gloss, videofile=name, version=0)
+        glossvideo.save()
+        self.assertFalse(MediaFile.objects.filter(path=name).exists())
+        try:
+            # a file written by the storage is in the inventory without a scan
+            self.assertEqual(storage.save(name, ContentFile(b'0' * 100)), name)
+            self.assertEqual(MediaFile.objects.get(path=name).size, 100)
+            self.assertTrue(MediaFile.objects.get(path=name).linked)
+
+            # the file of a deleted gloss video is removed from the inventory
+            with self.captureOnCommitCallbacks(execute=True):
+                glossvideo.delete()
+            self.assertFalse(os.path.exists(os.path.join(WRITABLE_FOLDER, name)))
+            self.assertFalse(MediaFile.objects.filter(path=name).exists())
+
+            # a file that is not linked to a gloss video
+            with open(os.path.join(WRITABLE_FOLDER, name), 'wb') as video_file:
+                video_file.write(b'0' * 200)
+            sync_media_files([name])
+            self.assertEqual(MediaFile.objects.get(path=name).size, 200)
+            self.assertFalse(MediaFile.objects.get(path=name).linked)
+        finally:
+            if os.path.exists(os.path.join(WRITABLE_FOLDER, name)):
+                os.remove(os.path.join(WRITABLE_FOLDER, name))
+
+    def test_import_zipped_videos(self):
+        import tempfile
+        import zipfile
+        from unittest.mock import patch
+
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        language = test_dataset.default_language
+        glosses = []
+        for lemma_text in ['thisisazipimporttest', 'thisisasecondzipimporttest']:
+            new_lemma = LemmaIdgloss(dataset=test_dataset)
+            new_lemma.save()
+            LemmaIdglossTranslation(text=lemma_text, lemma=new_lemma, language=language).save()
+            new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1)
+            new_gloss.save()
+            glosses.append(new_gloss)
+        AnnotationIdglossTranslation(gloss=glosses[1], language=language, text='ZIPIMPORTTEST').save()
+
+        zip_handle, zip_path = tempfile.mkstemp(suffix='.zip')
+        with os.fdopen(zip_handle, 'wb') as zip_file, zipfile.ZipFile(zip_file, 'w') as archive:
+            archive.writestr('.DS_Store', b'')
+            archive.writestr(test_dataset.acronym + '/' + str(glosses[0].pk) + '.mp4', b'0' * 100)
+            archive.writestr(test_dataset.acronym + '/' + language.language_code_3char + '/ZIPIMPORTTEST.mp4', b'1' * 100)
+            archive.writestr(test_dataset.acronym + '/999999999.mp4', b'2' * 100)
+        members = read_zip_video_members(test_dataset, zip_path)
+        self.assertEqual(len(members), 3)
+
+        names = [os.path.join(GLOSS_VIDEO_DIRECTORY, test_dataset.acronym, 'th',
+                              lemma_text + '-' + str(gloss.pk) + '.mp4')
+                 for lemma_text, gloss in zip(['thisisazipimporttest', 'thisisasecondzipimporttest'], glosses)]
+        try:
+            # the files are put in place when the gloss videos are committed, the jobs are not run
+            with patch('signbank.video.jobs.video_job_executor'):
+                with self.captureOnCommitCallbacks() as callbacks:
+                    progress = list(import_zipped_videos(self.user, test_dataset, zip_path, members))
+                for name in names:
+                    self.assertFalse(os.path.exists(os.path.join(WRITABLE_FOLDER, name)))
+                    self.assertTrue(os.path.exists(os.path.join(WRITABLE_FOLDER, name + '.partial')))
+                for callback in callbacks:
+                    callback()
+            self.assertEqual(progress[0], {'videos': 3})
+            self.assertEqual(progress[-1], {'imported': 2, 'failed': 1})
+            failed = [result for result in progress[1:-1] if result['importstatus'] == 'Failed']
+            self.assertEqual([result['videofile'] for result in failed], ['999999999.mp4'])
+            self.assertFalse(os.path.exists(zip_path))
+
+            # the members are streamed to the video paths of their glosses
+            for gloss, name, content in zip(glosses, names, [b'0' * 100, b'1' * 100]):
+                self.assertEqual(GlossVideo.objects.get(gloss=gloss, version=0).videofile.name, name)
+                with open(os.path.join(WRITABLE_FOLDER, name), 'rb') as video_file:
+                    self.assertEqual(video_file.read(), content)
+            # the conversion and the still images are left to the video processing jobs
+            self.assertEqual(sorted(VideoProcessingJob.objects.filter(glossvideo__gloss__in=glosses).values_list(
+                'kind', flat=True)), sorted([VideoProcessingJob.CONVERT_TO_MP4, VideoProcessingJob.STILL_IMAGE] * 2))
+        finally:
+            for path in [zip_path] + [os.path.join(WRITABLE_FOLDER, name + appendix)
+                                      for name in names for appendix in ['', '.partial']]:
+                if os.path.exists(path):
+                    os.remove(path)
+
     def test_create_and_delete_utf8_video(self):
 
         client = Client()
@@ -1101,6 +1650,34 @@ class AjaxTests(TestCase):
         print(response.content)
         self.assertContains(response,NAME)
 
+    def test_api_token_user(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        new_token = generate_auth_token()
+        signbank_token = SignbankAPIToken.objects.create(signbank_user=self.user, api_token=hash_token(new_token))
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION='Bearer ' + new_token)
+
+        self.assertEqual(get_api_user(request), self.user)
+        # the token is kept in the process, only the version of the tokens is looked up
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get_api_user(request), self.user)
+        self.assertEqual(len(queries.captured_queries), 1)
+
+        flush_api_token_usage()
+        signbank_token.refresh_from_db()
+        self.assertEqual(signbank_token.usage_count, 2)
+        self.assertIsNotNone(signbank_token.last_used)
+
+        # a changed token is refused right away, the version of the tokens in the database is changed
+        signbank_token.api_token = hash_token(generate_auth_token())
+        signbank_token.save()
+        self.assertRaises(APIAuthException, get_api_user, request)
+
+        # a deleted token is refused right away
+        signbank_token.delete()
+        self.assertRaises(APIAuthException, get_api_user, request)
+
 class FrontEndTests(TestCase):
 
     def setUp(self):
@@ -1256,6 +1833,36 @@ class ManageDatasetTests(TestCase):
         # Create a user to Grant and Revoke view and change permissions
         self.user2 = User.objects.create_user('test-user2', 'example@example.com', 'test-user2')
 
+    def test_dataset_visibility(self):
+        """
+        Tests whether the cached dataset visibility follows changes of glosses and permissions
+        :return:
+        """
+        Gloss.objects.filter(lemma__dataset=self.test_dataset).update(inWeb=False)
+        self.new_gloss.save()
+        self.assertNotIn(self.test_dataset.id, public_dataset_ids())
+        self.new_gloss.inWeb = True
+        self.new_gloss.save()
+        self.assertIn(self.test_dataset.id, public_dataset_ids())
+
+        session = self.client.session
+        request = RequestFactory().get('/')
+        request.user = self.user2
+        request.session = session
+        self.assertNotIn(self.test_dataset.id, user_viewable_dataset_ids(request))
+        assign_perm('view_dataset', self.user2, self.test_dataset)
+        # the permissions are kept for the request, and found again for the next request
+        self.assertNotIn(self.test_dataset.id, user_viewable_dataset_ids(request))
+        request = RequestFactory().get('/')
+        request.user = self.user2
+        request.session = session
+        self.assertIn(self.test_dataset.id, user_viewable_dataset_ids(request))
+        remove_perm('view_dataset', self.user2, self.test_dataset)
+        request = RequestFactory().get('/')
+        request.user = self.user2
+        request.session = session
+        self.assertNotIn(self.test_dataset.id, user_viewable_dataset_ids(request))
+
     def test_User_is_not_logged_in(self):
         """
         Tests whether managing datasets is blocked when not logged in
@@ -2739,6 +3346,52 @@ class testFrequencyAnalysis(TestCase):
                     self.assertContains(response, datasetId_fieldCategory_FCname_emptySuffix, html=True)
 
 
+    def test_frequency_matrix(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        dataset_name = DEFAULT_DATASET
+        test_dataset = Dataset.objects.get(name=dataset_name)
+
+        for (handedness, domhndsh) in [(self.handedness_fieldchoice_1, self.test_handshape1),
+                                       (self.handedness_fieldchoice_1, None),
+                                       (self.handedness_fieldchoice_2, self.test_handshape2)]:
+            new_lemma = LemmaIdgloss(dataset=test_dataset)
+            new_lemma.save()
+            new_gloss = Gloss(lemma=new_lemma, handedness=handedness, domhndsh=domhndsh)
+            new_gloss.save()
+
+        dataset_glosses = Gloss.objects.filter(lemma__dataset=test_dataset, archived=False)
+        frequency_dict = test_dataset.generate_frequency_dict()
+        self.assertEqual(frequency_dict['handedness'][self.handedness_fieldchoice_1.name],
+                         dataset_glosses.filter(handedness=self.handedness_fieldchoice_1).count())
+        self.assertEqual(frequency_dict['domhndsh'][self.test_handshape2.name],
+                         dataset_glosses.filter(domhndsh=self.test_handshape2).count())
+        empty_handshape = Handshape.objects.get(machine_value=0)
+        self.assertEqual(frequency_dict['domhndsh'][empty_handshape.name],
+                         dataset_glosses.filter(Q(domhndsh__isnull=True) | Q(domhndsh__machine_value=0)).count())
+
+        # the counts are cached, only the choice lists are queried
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(test_dataset.generate_frequency_dict(), frequency_dict)
+        self.assertFalse([query for query in queries.captured_queries if 'COUNT' in query['sql'].upper()])
+
+        # changing a gloss updates the frequencies
+        changed_gloss = dataset_glosses.filter(handedness=self.handedness_fieldchoice_2).first()
+        changed_gloss.handedness = self.handedness_fieldchoice_1
+        changed_gloss.save()
+        frequency_dict = test_dataset.generate_frequency_dict()
+        self.assertEqual(frequency_dict['handedness'][self.handedness_fieldchoice_1.name],
+                         dataset_glosses.filter(handedness=self.handedness_fieldchoice_1).count())
+
+        # a change by another process raises the version in the database, the counts in this cache are not used
+        from signbank.dictionary.frequency_matrix import CHOICE_FREQUENCIES_VERSION
+        Gloss.objects.filter(id=changed_gloss.id).update(handedness=self.handedness_fieldchoice_2)
+        bump_data_version(CHOICE_FREQUENCIES_VERSION)
+        frequency_dict = test_dataset.generate_frequency_dict()
+        self.assertEqual(frequency_dict['handedness'][self.handedness_fieldchoice_1.name],
+                         dataset_glosses.filter(handedness=self.handedness_fieldchoice_1).count())
+
     def test_frequency_sorting(self):
 
         # set the test dataset
@@ -2807,6 +3460,180 @@ class testFrequencyAnalysis(TestCase):
                 # Make sure the sorted field choices are in the same order
                 self.assertEqual(translated_choices, frequency_choices_f_keys)
 
+    @staticmethod
+    def write_synthetic_corpus(folder, number_of_files=300, number_of_glosses=200, number_of_signers=40):
+        import random
+        random.seed(1)
+        metadata_file = os.path.join(folder, 'metadata.tsv')
+        with open(metadata_file, 'w') as meta:
+            meta.write('Signer\tMetadata region\tAge\tGender\n')
+            for signer in range(number_of_signers):
+                meta.write('S%d\t%s\t%s\t%s\n' % (signer, random.choice(['north', 'south', 'east']),
+                                                 random.choice(['young', 'old']), random.choice(['f', 'm'])))
+        for document in range(number_of_files):
+            # a few of the signers have no metadata
+            signers = random.sample(range(number_of_signers + 3), 2)
+            time_slots, tiers = [], []
+            for signer in signers:
+                for hand in 'LR':
+                    annotations = []
+                    end = 0
+                    for i in range(random.randint(5, 40)):
+                        begin = end + random.randint(0, 400)
+                        end = begin + random.randint(100, 600)
+                        slot = len(time_slots)
+                        time_slots += ['<TIME_SLOT TIME_SLOT_ID="ts%d" TIME_VALUE="%d"/>' % (slot, begin),
+                                       '<TIME_SLOT TIME_SLOT_ID="ts%d" TIME_VALUE="%d"/>' % (slot + 1, end)]
+                        annotations.append('<ANNOTATION><ALIGNABLE_ANNOTATION ANNOTATION_ID="a%d" TIME_SLOT_REF1="ts%d" '
+                                           'TIME_SLOT_REF2="ts%d"><ANNOTATION_VALUE>G%d</ANNOTATION_VALUE>'
+                                           '</ALIGNABLE_ANNOTATION></ANNOTATION>'
+                                           % (slot, slot, slot + 1, random.randint(0, number_of_glosses)))
+                    tiers.append('<TIER TIER_ID="Gloss%s S%d" PARTICIPANT="S%d" LINGUISTIC_TYPE_REF="gloss">%s</TIER>'
+                                 % (hand, signer, signer, ''.join(annotations)))
+            with open(os.path.join(folder, 'document%03d.eaf' % document), 'w') as eaf:
+                eaf.write('<ANNOTATION_DOCUMENT><TIME_ORDER>%s</TIME_ORDER>%s</ANNOTATION_DOCUMENT>'
+                          % (''.join(time_slots), ''.join(tiers)))
+        return metadata_file
+
+    @staticmethod
+    def nested_loop_sign_counts(sign_counter):
+        # the per gloss walk over all persons and documents that SignCounter used to do after every file
+        sign_counts = {}
+        for gloss in sorted(sign_counter.freqs.keys()):
+            number_of_signers = 0
+            for person in sorted(sign_counter.freqsPerPerson.keys()):
+                for document in sorted(sign_counter.freqsPerPerson[person].keys()):
+                    if gloss in sign_counter.freqsPerPerson[person][document]:
+                        number_of_signers += 1
+            region_frequencies = defaultdict(lambda: defaultdict(int))
+            for region in sorted(sign_counter.freqsPerRegion.keys()):
+                for person in sorted(sign_counter.freqsPerRegion[region].keys()):
+                    if gloss in sign_counter.freqsPerRegion[region][person]:
+                        region_frequencies[region]['frequency'] += sign_counter.freqsPerRegion[region][person][gloss]
+                        region_frequencies[region]['numberOfSigners'] += 1
+            something_frequencies = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+            for something in sorted(sign_counter.freqsPerSomething.keys()):
+                for item in sorted(sign_counter.freqsPerSomething[something].keys()):
+                    for person in sorted(sign_counter.freqsPerSomething[something][item].keys()):
+                        if gloss in sign_counter.freqsPerSomething[something][item][person]:
+                            label = 'frequencyPer' + something
+                            something_frequencies[label][item]['frequency'] += \
+                                sign_counter.freqsPerSomething[something][item][person][gloss]
+                            something_frequencies[label][item]['numberOfSigners'] += 1
+            sign_counts[gloss] = {'frequency': sign_counter.freqs[gloss], 'numberOfSigners': number_of_signers,
+                                  'frequenciesPerRegion': region_frequencies}
+            sign_counts[gloss].update(something_frequencies)
+        return sign_counts
+
+    def test_sign_counter_synthetic_corpus(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as corpus_folder:
+            metadata_file = self.write_synthetic_corpus(corpus_folder)
+
+            start = time.time()
+            sign_counter = SignCounter(metadata_file, [corpus_folder], 0)
+            sign_counter.run()
+            run_time = time.time() - start
+
+            start = time.time()
+            expected_sign_counts = self.nested_loop_sign_counts(sign_counter)
+            nested_loop_time = time.time() - start
+
+        self.assertEqual(sign_counter.get_result(), expected_sign_counts)
+        self.assertGreater(len(sign_counter.get_result()), 0)
+        # the counts are aggregated while streaming, the whole run is cheaper than a single nested loop computation,
+        # which used to be done after every file
+        self.assertLess(run_time, nested_loop_time * len(sign_counter.all_files))
+
+    def test_parallel_eaf_counting(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as corpus_folder:
+            self.write_synthetic_corpus(corpus_folder, number_of_files=40)
+            eaf_files = sorted(join(corpus_folder, f) for f in os.listdir(corpus_folder) if f.endswith('.eaf'))
+
+            sign_counter = SignCounter(None, eaf_files, 0)
+            sign_counter.run()
+            frequencies_per_person = defaultdict(lambda: defaultdict(dict))
+            for eaf_file, file_frequencies in frequencies_per_person_per_file(eaf_files, 0, processes=2):
+                for person, documents in file_frequencies.items():
+                    for document, glosses in documents.items():
+                        frequencies_per_person[person][document].update(glosses)
+
+        # the frequencies counted by the worker processes are those of a single SignCounter
+        self.assertEqual(frequencies_per_person, sign_counter.freqsPerPerson)
+
+    def test_incremental_corpus_counts(self):
+        import tempfile
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        dataset_acronym = test_dataset.acronym
+        corpus = Corpus(name=dataset_acronym, description='Corpus ' + dataset_acronym,
+                        speakers_are_cross_referenced=True)
+        corpus.save()
+        speaker_objects = {}
+        for signer in range(40):
+            speaker = Speaker(identifier='S' + str(signer) + '_' + dataset_acronym, age=30, location='north')
+            speaker.save()
+            speaker_objects['S' + str(signer)] = speaker
+
+        with tempfile.TemporaryDirectory() as corpus_folder:
+            self.write_synthetic_corpus(corpus_folder, number_of_files=20)
+            eaf_files = sorted(join(corpus_folder, f) for f in os.listdir(corpus_folder) if f.endswith('.eaf'))
+
+            (parsed_documents, updated_glosses) = count_corpus_eaf_files(dataset_acronym, corpus, speaker_objects,
+                                                                         eaf_files)
+            self.assertEqual(len(parsed_documents), 20)
+            self.assertEqual(DocumentFrequencyCache.objects.filter(document__corpus=corpus).count(), 20)
+
+            # the files have not changed, nothing is parsed or stored
+            (parsed_documents, updated_glosses) = count_corpus_eaf_files(dataset_acronym, corpus, speaker_objects,
+                                                                         eaf_files)
+            self.assertEqual(parsed_documents, [])
+            self.assertEqual(updated_glosses, {})
+
+            # a gloss that was not in the dataset is added, it is counted from the cached frequencies
+            new_lemma = LemmaIdgloss(dataset=test_dataset)
+            new_lemma.save()
+            new_gloss = Gloss(lemma=new_lemma)
+            new_gloss.save()
+            annotation = AnnotationIdglossTranslation(gloss=new_gloss, language=test_dataset.default_language, text='G5')
+            annotation.save()
+            (parsed_documents, updated_glosses) = count_corpus_eaf_files(dataset_acronym, corpus, speaker_objects,
+                                                                         eaf_files)
+            self.assertEqual(parsed_documents, [])
+            self.assertIn(new_gloss.id, updated_glosses.keys())
+
+            sign_counter = SignCounter(None, eaf_files, 0)
+            sign_counter.run()
+            expected_frequency = sum(documents[document].get('G5', 0)
+                                     for person, documents in sign_counter.freqsPerPerson.items()
+                                     if person in speaker_objects for document in documents)
+            self.assertGreater(expected_frequency, 0)
+            self.assertEqual(sum(GlossFrequency.objects.filter(gloss=new_gloss).values_list('frequency', flat=True)),
+                             expected_frequency)
+
+            # only a modified file is parsed again
+            with open(eaf_files[0], 'a') as eaf:
+                eaf.write('\n')
+            (parsed_documents, updated_glosses) = count_corpus_eaf_files(dataset_acronym, corpus, speaker_objects,
+                                                                         eaf_files)
+            self.assertEqual(parsed_documents, ['document000'])
+            self.assertEqual(sum(GlossFrequency.objects.filter(gloss=new_gloss).values_list('frequency', flat=True)),
+                             expected_frequency)
+
+            # a person that is no longer a speaker in the metadata, the cached counts are stored again
+            removed_person = next(person for person, speaker in speaker_objects.items()
+                                  if GlossFrequency.objects.filter(speaker=speaker).exists())
+            removed_speaker = speaker_objects.pop(removed_person)
+            (parsed_documents, updated_glosses) = count_corpus_eaf_files(dataset_acronym, corpus, speaker_objects,
+                                                                         eaf_files)
+            self.assertEqual(parsed_documents, [])
+            self.assertFalse(GlossFrequency.objects.filter(speaker=removed_speaker).exists())
+            expected_frequency = sum(documents[document].get('G5', 0)
+                                     for person, documents in sign_counter.freqsPerPerson.items()
+                                     if person in speaker_objects for document in documents)
+        self.assertEqual(sum(GlossFrequency.objects.filter(gloss=new_gloss).values_list('frequency', flat=True)),
+                         expected_frequency)
+
 
 class testSettings(TestCase):
 
@@ -3442,6 +4269,60 @@ class Corpus_Tests(TestCase):
             self.assertEqual(tokNo, gl.tokNo)
 
 
+    def test_gloss_frequency_summaries(self):
+        corpus = Corpus(name=self.test_dataset.acronym, description='Corpus')
+        corpus.save()
+        document = Document(corpus=corpus, identifier='TEST1', creation_time=datetime.now(tz=get_current_timezone()))
+        document.save()
+        speakers = []
+        for (identifier, gender, age, location) in [('S1', 'f', 20, 'Amsterdam'), ('S2', 'm', 30, 'Amsterdam'),
+                                                    ('S3', 'm', 70, 'Groningen')]:
+            speaker = Speaker(identifier=identifier + '_' + self.test_dataset.acronym, gender=gender, age=age,
+                              location=location)
+            speaker.save()
+            speakers.append(speaker)
+        gloss, other_gloss = Gloss.objects.filter(lemma__dataset=self.test_dataset)[:2]
+        for (speaker, frequency_gloss, frequency) in [(speakers[0], gloss, 3), (speakers[1], gloss, 2),
+                                                      (speakers[2], gloss, 4), (speakers[2], other_gloss, 1)]:
+            GlossFrequency(speaker=speaker, document=document, gloss=frequency_gloss, frequency=frequency).save()
+
+        self.assertEqual(self.test_dataset.frequency_regions(), ['Amsterdam', 'Groningen'])
+        table = GlossFrequencyTable.of_dataset(self.test_dataset)
+        self.assertEqual(table.occurrences_and_signers_per_region(gloss.id, ['Groningen', 'Amsterdam', 'Utrecht']),
+                         ([4, 5, 0], [1, 2, 0]))
+        self.assertEqual(gloss.has_frequency_data(), 3)
+
+        speaker_data = gloss.speaker_data()
+        self.assertEqual((speaker_data['Female'], speaker_data['Male'], speaker_data['Total']), (1, 2, 3))
+        self.assertEqual((speaker_data['< 25'], speaker_data['25 - 35'], speaker_data['> 65']), (1, 1, 1))
+        self.assertEqual(gloss.speaker_age_data(), {'20': 1, '30': 1, '70': 1})
+        self.assertEqual(other_gloss.speaker_data()['Total'], 1)
+
+        # frequencies stored in bulk replace the summaries
+        GlossFrequency.objects.filter(gloss=other_gloss).delete()
+        save_gloss_frequencies({(speakers[0].id, document.id, other_gloss.id): 2})
+        self.assertEqual(other_gloss.speaker_data()['Female'], 1)
+        self.assertEqual(other_gloss.speaker_data()['Male'], 0)
+
+        # the version is kept in the database, so the tables of all processes are refreshed
+        version = corpus_statistics_version()
+        speakers[0].location = 'Utrecht'
+        speakers[0].save()
+        self.assertGreater(corpus_statistics_version(), version)
+        self.assertEqual(GlossFrequencyTable.of_dataset(self.test_dataset).regions, ['Amsterdam', 'Groningen', 'Utrecht'])
+
+        # a gloss with frequencies that gets another lemma changes the statistics, saving it otherwise does not
+        gloss = Gloss.objects.get(id=gloss.id)
+        new_lemma = LemmaIdgloss(dataset=self.test_dataset)
+        new_lemma.save()
+        version = corpus_statistics_version()
+        gloss.save()
+        self.assertEqual(corpus_statistics_version(), version)
+        gloss.lemma = new_lemma
+        gloss.save()
+        self.assertGreater(corpus_statistics_version(), version)
+
+
 class MinimalPairsTests(TestCase):
 
     # This test exists because a bug had previously been found with the display of the repeat phonology field
@@ -3740,6 +4621,136 @@ class MinimalPairsTests(TestCase):
                 # this test makes sure that when minimal pair rows are displayed that the values differ in the display
                 self.assertNotEqual(focus_gloss_value, other_gloss_value)
 
+    def test_minimalpairs_signature_index(self):
+
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        language = Language.objects.get(id=get_default_language_id())
+
+        glosses = {}
+        for gloss_id in range(1, 5):
+            new_lemma = LemmaIdgloss(dataset=test_dataset)
+            new_lemma.save()
+            LemmaIdglossTranslation(text="thisisatemporarytestlemmaidglosstranslation" + str(gloss_id),
+                                    lemma=new_lemma, language=language).save()
+            new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1,
+                              domhndsh=self.test_handshape1, locprim=self.locprim_fieldchoice_1)
+            new_gloss.save()
+            glosses[gloss_id] = new_gloss
+
+        # the signature is stored by the post_save signal of the gloss
+        glosses[2].locprim = self.locprim_fieldchoice_2
+        glosses[2].save()
+        self.assertEqual(MinimalPairsSignature.objects.get(gloss=glosses[2]).get_signature_dict()['locprim'],
+                         str(self.locprim_fieldchoice_2.id))
+
+        # gloss 3 differs in two fields, gloss 4 is a letter sign
+        glosses[3].locprim = self.locprim_fieldchoice_2
+        glosses[3].repeat = True
+        glosses[3].save()
+        glosses[4].repeat = True
+        glosses[4].domhndsh_letter = True
+        glosses[4].save()
+
+        minimalpairs_index = MinimalPairsIndex(test_dataset)
+        minimal_pairs = minimalpairs_index.minimal_pairs_of_gloss(glosses[1])
+        self.assertIn((glosses[2].id, 'locprim', str(self.locprim_fieldchoice_1.id),
+                       str(self.locprim_fieldchoice_2.id)), minimal_pairs)
+        other_gloss_ids = [other_gloss_id for (other_gloss_id, _, _, _) in minimal_pairs]
+        self.assertNotIn(glosses[3].id, other_gloss_ids)
+        self.assertNotIn(glosses[4].id, other_gloss_ids)
+
+        # the index of a focus gloss only loads the signatures that can be its minimal pairs
+        glosses[4].handedness = self.handedness_fieldchoice_2
+        glosses[4].locprim = self.locprim_fieldchoice_2
+        glosses[4].domhndsh_letter = False
+        glosses[4].save()
+        minimalpairs_index = MinimalPairsIndex(test_dataset)
+        for gloss in glosses.values():
+            focus_gloss_index = MinimalPairsIndex(test_dataset, focus_gloss=gloss)
+            self.assertEqual(sorted(focus_gloss_index.minimal_pairs_of_gloss(gloss)),
+                             sorted(minimalpairs_index.minimal_pairs_of_gloss(gloss)))
+        self.assertNotIn(glosses[4].id, MinimalPairsIndex(test_dataset, focus_gloss=glosses[1]).signatures)
+
+        # gloss 2 and gloss 3 only differ in the repeat field
+        self.assertIn(glosses[3], glosses[2].minimal_pairs_dict().keys())
+
+    def test_homonym_groups(self):
+
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        language = Language.objects.get(id=get_default_language_id())
+
+        glosses = {}
+        for gloss_id in range(1, 5):
+            new_lemma = LemmaIdgloss(dataset=test_dataset)
+            new_lemma.save()
+            LemmaIdglossTranslation(text="thisisatemporarytestlemmaidglosstranslation" + str(gloss_id),
+                                    lemma=new_lemma, language=language).save()
+            new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1,
+                              domhndsh=self.test_handshape1, locprim=self.locprim_fieldchoice_1)
+            new_gloss.save()
+            glosses[gloss_id] = new_gloss
+
+        # weakdrop is three valued, False is not the same as Neutral
+        glosses[2].weakdrop = False
+        glosses[2].save()
+        # repeat is two valued, False is the same as not set
+        glosses[3].repeat = False
+        glosses[3].save()
+        glosses[4].archived = True
+        glosses[4].save()
+
+        self.assertEqual(MinimalPairsSignature.objects.get(gloss=glosses[1]).homonym_key,
+                         MinimalPairsSignature.objects.get(gloss=glosses[3]).homonym_key)
+        self.assertEqual(MinimalPairsSignature.objects.get(gloss=glosses[4]).homonym_key, '')
+
+        homonyms_of_gloss = glosses[1].homonym_objects()
+        self.assertIn(glosses[3], homonyms_of_gloss)
+        self.assertNotIn(glosses[2], homonyms_of_gloss)
+        self.assertNotIn(glosses[4], homonyms_of_gloss)
+
+        grouped_gloss_ids = [gloss_ids for gloss_ids in homonym_groups(test_dataset).values()
+                             if glosses[1].id in gloss_ids]
+        self.assertEqual(len(grouped_gloss_ids), 1)
+        self.assertIn(glosses[3].id, grouped_gloss_ids[0])
+
+    def test_homonym_groups_of_two_datasets(self):
+
+        test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        other_dataset = Dataset(id=max(Dataset.objects.values_list('id', flat=True)) + 1,
+                                acronym=TEST_DATASET_ACRONYM, name=TEST_DATASET_ACRONYM,
+                                default_language=test_dataset.default_language,
+                                signlanguage=test_dataset.signlanguage)
+        other_dataset.save()
+        language = Language.objects.get(id=get_default_language_id())
+
+        # two glosses with the same phonology in each dataset
+        glosses_per_dataset = {}
+        for dataset in [test_dataset, other_dataset]:
+            glosses_per_dataset[dataset.id] = []
+            for gloss_id in range(1, 3):
+                new_lemma = LemmaIdgloss(dataset=dataset)
+                new_lemma.save()
+                LemmaIdglossTranslation(text="thisisatemporarytestlemmaidglosstranslation" + str(gloss_id),
+                                        lemma=new_lemma, language=language).save()
+                new_gloss = Gloss(lemma=new_lemma, handedness=self.handedness_fieldchoice_1,
+                                  domhndsh=self.test_handshape1, locprim=self.locprim_fieldchoice_1)
+                new_gloss.save()
+                glosses_per_dataset[dataset.id].append(new_gloss.id)
+
+        # the groups of the datasets are put together as in the homonym list
+        same_phonology_groups = dict()
+        for dataset in [test_dataset, other_dataset]:
+            same_phonology_groups.update(homonym_groups(dataset))
+
+        for dataset_id, gloss_ids in glosses_per_dataset.items():
+            groups_of_glosses = [group for group in same_phonology_groups.values() if gloss_ids[0] in group]
+            self.assertEqual(len(groups_of_glosses), 1)
+            self.assertEqual(set(gloss_ids), set(groups_of_glosses[0]) & set(gloss_ids))
+            # the glosses of the other dataset are in another group
+            for other_dataset_id, other_gloss_ids in glosses_per_dataset.items():
+                if other_dataset_id != dataset_id:
+                    self.assertFalse(set(other_gloss_ids) & set(groups_of_glosses[0]))
+
 
 class GlossApiGetSignNameAndMediaInfoTests(TestCase):
 
@@ -4310,3 +5321,228 @@ class CSVTests(TestCase):
         self.assertTrue((role_seealso, gloss3, gloss4) in relations)
         self.assertTrue((role_seealso, gloss4, gloss3) in relations)
 
+
+    def testBulkUpdateFieldsCSV(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        client = Client()
+        client.login(username=self.user.username, password='test-user')
+        glosses = list(Gloss.objects.filter(lemma__dataset=self.test_dataset,
+                                            annotationidglosstranslation__text__startswith='TEMPORARYTESTGLOSS_'
+                                            ).distinct().order_by('id'))
+        handedness_choices = list(FieldChoice.objects.filter(field=FieldChoice.HANDEDNESS,
+                                                             machine_value__gt=1).order_by('machine_value'))
+        with translation.override(LANGUAGE_CODE):
+            handedness_column = str(Gloss.get_field('handedness').verbose_name)
+            handedness_name = handedness_choices[0].name
+
+        # the rows are compared with the looked up values, without queries per row
+        lookups = GlossUpdateLookups([gloss.id for gloss in glosses])
+        with self.assertNumQueries(0):
+            for nl, gloss in enumerate(glosses):
+                value_dict = {'Signbank ID': str(gloss.id), handedness_column: handedness_name}
+                changes, errors, _, _ = compare_valuedict_to_gloss(value_dict, gloss.id, [self.test_dataset.acronym],
+                                                                   nl, set(), {}, 'keep', 'replace', 'keep',
+                                                                   'replace', 'keep', lookups=lookups)
+                self.assertEqual(errors, [])
+                self.assertEqual(changes[0]['new_machine_value'], handedness_choices[0].machine_value)
+
+        # the confirmed changes are stored with a number of queries that does not grow with the number of glosses
+        form_data = {'update_or_create': 'update'}
+        for gloss in glosses[:2]:
+            form_data[f'{gloss.pk}.handedness'] = str(handedness_choices[0].machine_value)
+        with CaptureQueriesContext(connection) as two_glosses:
+            client.post(reverse_lazy('import_csv_update'), form_data)
+        form_data = {'update_or_create': 'update'}
+        for gloss in glosses:
+            form_data[f'{gloss.pk}.handedness'] = str(handedness_choices[1].machine_value)
+        last_updated = dict(Gloss.objects.filter(id__in=[gloss.id for gloss in glosses]).values_list('id', 'lastUpdated'))
+        with CaptureQueriesContext(connection) as four_glosses:
+            client.post(reverse_lazy('import_csv_update'), form_data)
+        self.assertEqual(len(two_glosses.captured_queries), len(four_glosses.captured_queries))
+
+        for gloss in glosses:
+            gloss.refresh_from_db()
+            self.assertEqual(gloss.handedness, handedness_choices[1])
+            # the incremental packages find the changed glosses by lastUpdated
+            self.assertGreater(gloss.lastUpdated, last_updated[gloss.id])
+        self.assertEqual(GlossRevision.objects.filter(gloss__in=glosses, field_name='handedness').count(), 6)
+        self.assertEqual(MinimalPairsSignature.objects.get(gloss=glosses[0]).get_signature_dict()['handedness'],
+                         str(handedness_choices[1].id))
+
+    def testCSVImportJob(self):
+        from unittest.mock import patch
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        client = Client()
+        client.login(username=self.user.username, password='test-user')
+        glosses = list(Gloss.objects.filter(lemma__dataset=self.test_dataset,
+                                            annotationidglosstranslation__text__startswith='TEMPORARYTESTGLOSS_'
+                                            ).distinct().order_by('id'))
+        handedness_choice = FieldChoice.objects.filter(field=FieldChoice.HANDEDNESS, machine_value__gt=1).first()
+        with translation.override(LANGUAGE_CODE):
+            handedness_column = str(Gloss.get_field('handedness').verbose_name)
+            handedness_name = handedness_choice.name
+        csv_lines = ['Signbank ID,Dataset,' + handedness_column]
+        for gloss in glosses:
+            csv_lines.append(f'{gloss.pk},{self.test_dataset.acronym},{handedness_name}')
+        # a gloss that does not exist, the row gets an error
+        csv_lines.append(f'0,{self.test_dataset.acronym},{handedness_name}')
+        csv_file = SimpleUploadedFile('update.csv', '\r\n'.join(csv_lines).encode('utf-8'))
+
+        # the upload starts a job and shows its progress
+        response = client.post(reverse('import_csv_update'), {'file': csv_file})
+        job = CSVImportJob.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('import_csv_update') + '?job=' + str(job.id),
+                             fetch_redirect_response=False)
+        self.assertEqual(job.status, CSVImportJob.QUEUED)
+        response = client.get(reverse('import_csv_update'), {'job': job.id})
+        self.assertContains(response, 'The rows of the CSV file are being checked.')
+
+        # the job fails in the second chunk, the first chunk is kept
+        check_chunk = UpdateGlossesCheck.check_chunk
+        checked_chunks = []
+
+        def check_chunk_and_stop(row_check, state, rows):
+            checked_chunks.append(rows)
+            if len(checked_chunks) == 2:
+                raise ValueError('server stopped')
+            check_chunk(row_check, state, rows)
+
+        with patch.object(UpdateGlossesCheck, 'check_chunk', check_chunk_and_stop):
+            job = run_csv_import_job(job.id, chunk_size=2)
+        self.assertEqual(job.status, CSVImportJob.FAILED)
+        self.assertEqual((job.rows_done, job.rows_total), (2, 5))
+
+        # run again, the job continues after the rows that were done
+        CSVImportJob.objects.filter(id=job.id).update(status=CSVImportJob.QUEUED)
+        with patch.object(UpdateGlossesCheck, 'check_chunk', check_chunk_and_stop):
+            job = run_csv_import_job(job.id, chunk_size=2)
+        self.assertEqual(job.status, CSVImportJob.DONE)
+        self.assertEqual((job.rows_done, job.number_of_errors), (5, 1))
+        self.assertEqual([nl for rows in checked_chunks for nl, values in rows], [0, 1, 2, 3, 2, 3, 4])
+
+        results = csv_import_results(job)
+        self.assertEqual(sorted(change['pk'] for change in results['changes']), [gloss.pk for gloss in glosses])
+        self.assertEqual(results['seen_datasets'], [self.test_dataset])
+        # the results are saved as JSON with the id of the dataset
+        with open(os.path.join(WRITABLE_FOLDER, job.csv_file + STATE_APPENDIX), 'r', encoding='utf-8') as state_file:
+            self.assertEqual(json.load(state_file)['seen_datasets'], [{STATE_DATASET_KEY: self.test_dataset.id}])
+        response = client.get(reverse('import_csv_update'), {'job': job.id})
+        self.assertContains(response, 'Could not find gloss for Signbank ID 0.')
+        remove_csv_upload(job.csv_file)
+
+    def testCSVApplyJob(self):
+        from unittest.mock import patch
+
+        client = Client()
+        client.login(username=self.user.username, password='test-user')
+        lemmas = list(LemmaIdgloss.objects.filter(dataset=self.test_dataset,
+                                                  lemmaidglosstranslation__text__startswith='TEMPORARYTESTLEMMA_'
+                                                  ).distinct().order_by('id'))
+        language = self.test_dataset.default_language
+        lemma_column = 'Lemma ID Gloss ({})'.format(getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English']))
+        form_data = {f'{lemma.pk}.{lemma_column}': f'TEMPORARYTESTLEMMA_CHANGED_{lemma.pk}' for lemma in lemmas}
+
+        # the confirmed rows are queued as the apply phase of a job
+        response = client.post(reverse('import_csv_lemmas'), form_data)
+        job = CSVImportJob.objects.get(user=self.user)
+        self.assertRedirects(response, reverse('import_csv_lemmas') + '?job=' + str(job.id),
+                             fetch_redirect_response=False)
+        self.assertEqual((job.phase, job.status, job.rows_total), (CSVImportJob.APPLY, CSVImportJob.QUEUED, 4))
+        response = client.get(reverse('import_csv_lemmas'), {'job': job.id})
+        self.assertContains(response, 'The confirmed rows are being applied.')
+
+        # the job fails in the second chunk, the first chunk is applied and the second is rolled back
+        apply_row = UpdateLemmasApply.apply_row
+        applied_rows = []
+
+        def apply_row_and_stop(row_apply, error, row, values):
+            applied_rows.append(int(row))
+            apply_row(row_apply, error, row, values)
+            if len(applied_rows) == 3:
+                raise ValueError('server stopped')
+
+        with patch.object(UpdateLemmasApply, 'apply_row', apply_row_and_stop):
+            job = run_csv_import_job(job.id, chunk_size=2)
+        self.assertEqual(job.status, CSVImportJob.FAILED)
+        self.assertEqual(job.rows_done, 2)
+        self.assertEqual(LemmaIdglossTranslation.objects.filter(
+            text__startswith='TEMPORARYTESTLEMMA_CHANGED_').count(), 2)
+
+        # a job that was left running by a stopped worker is queued again once it made no progress for long
+        now = datetime.now(tz=get_current_timezone())
+        CSVImportJob.objects.filter(id=job.id).update(status=CSVImportJob.RUNNING, progressed=now)
+        self.assertEqual(requeue_stale_csv_import_jobs(), 0)
+        CSVImportJob.objects.filter(id=job.id).update(progressed=now - CSV_IMPORT_STALE_AFTER * 2)
+        self.assertEqual(requeue_stale_csv_import_jobs(), 1)
+
+        # run again, the job continues after the rows that were applied
+        with patch.object(UpdateLemmasApply, 'apply_row', apply_row_and_stop):
+            job = run_csv_import_job(job.id, chunk_size=2)
+        self.assertEqual(job.status, CSVImportJob.DONE)
+        self.assertEqual((job.rows_done, job.number_of_errors), (4, 0))
+        self.assertEqual(applied_rows, [lemma.pk for lemma in lemmas[:3]] + [lemma.pk for lemma in lemmas[2:]])
+        for lemma in lemmas:
+            self.assertEqual(lemma.lemmaidglosstranslation_set.get(language=language).text,
+                             f'TEMPORARYTESTLEMMA_CHANGED_{lemma.pk}')
+
+        # posting the rows again does not apply them again
+        response = client.post(reverse('import_csv_lemmas') + '?job=' + str(job.id), form_data)
+        self.assertEqual(CSVImportJob.objects.get(id=job.id).status, CSVImportJob.DONE)
+        response = client.get(reverse('import_csv_lemmas'), {'job': job.id})
+        self.assertContains(response, 'Changes are live.')
+        remove_csv_upload(job.csv_file)
+
+
+class AnnotatedSentenceTests(TestCase):
+
+    def setUp(self):
+        self.test_dataset = Dataset.objects.get(name=DEFAULT_DATASET)
+        self.glosses = []
+        for inx in [1, 2, 3]:
+            new_lemma = LemmaIdgloss(dataset=self.test_dataset)
+            new_lemma.save()
+            new_gloss = Gloss(lemma=new_lemma)
+            new_gloss.save()
+            for language in self.test_dataset.translation_languages.all():
+                AnnotationIdglossTranslation(gloss=new_gloss, language=language, text=f'EAFTESTGLOSS_{inx}').save()
+            self.glosses.append(new_gloss)
+
+    def test_get_glosses_from_eaf(self):
+        from types import SimpleNamespace
+
+        # time slot values are strings in milliseconds, as read by pympi
+        timeslots = dict(('ts%d' % time, str(time)) for time in [0, 50, 80, 100, 120, 150, 180, 190, 200, 250, 300, 310])
+        right_hand = {'a1': ('ts0', 'ts100', 'EAFTESTGLOSS_1', None),
+                      'a2': ('ts200', 'ts300', 'EAFTESTGLOSS_2', None)}
+        left_hand = {'a3': ('ts50', 'ts80', 'EAFTESTGLOSS_3', None),
+                     'a4': ('ts120', 'ts180', 'EAFTESTGLOSS_3', None),
+                     'a5': ('ts150', 'ts250', 'EAFTESTGLOSS_1', None),
+                     'a6': ('ts190', 'ts310', 'UNKNOWNGLOSS', None)}
+        eaf = SimpleNamespace(timeslots=timeslots, tiers={'Glosses R': (right_hand,), 'Glosses L': (left_hand,),
+                                                          'Sentences': ({'a7': ('ts0', 'ts310', 'A sentence.', None)},)})
+
+        # the labels of all tiers are looked up with one query, after the dataset
+        with self.assertNumQueries(2):
+            glosses, labels_not_found, sentence_dict = get_glosses_from_eaf(eaf, self.test_dataset.acronym)
+        # a left hand annotation overlaps if it starts or ends within a right hand annotation
+        self.assertEqual(glosses, [['EAFTESTGLOSS_1', 0, 100], ['EAFTESTGLOSS_3', 120, 180],
+                                   ['EAFTESTGLOSS_2', 200, 300]])
+        self.assertEqual(labels_not_found, ['UNKNOWNGLOSS'])
+        self.assertEqual(sentence_dict, {self.test_dataset.default_language.language_code_3char: 'A sentence.'})
+        self.assertEqual(covered_points([0, 5, 10, 15, 20, 35], [(10, 20), (0, 5), (12, 14), (30, 40)]),
+                         {0, 5, 10, 15, 20, 35})
+        self.assertEqual(covered_points([6, 9, 21, 29, 41], [(10, 20), (0, 5), (12, 14), (30, 40)]), set())
+
+        # the annotated glosses are created together
+        annotated_sentence = AnnotatedSentence.objects.create()
+        annotations = glosses + [{'gloss': 'EAFTESTGLOSS_2', 'representative': True, 'starttime': '310',
+                                  'endtime': '400'}, ['UNKNOWNGLOSS', 0, 10]]
+        annotated_sentence.add_annotations(annotations, self.glosses[0])
+        annotated_glosses = AnnotatedGloss.objects.filter(annotatedsentence=annotated_sentence).order_by('starttime')
+        self.assertEqual([(annotated_gloss.gloss, annotated_gloss.starttime, annotated_gloss.isRepresentative)
+                          for annotated_gloss in annotated_glosses],
+                         [(self.glosses[0], 0, False), (self.glosses[2], 120, False), (self.glosses[1], 200, False),
+                          (self.glosses[1], 310, True)])
@@ -202,6 +202,7 @@ urlpatterns = [
     re_path(r'^ajax/homonyms/(?P<gloss_id>\d+)/$', signbank.dictionary.adminviews.homonyms_ajax_complete, name='homonyms_ajax_complete'),
     re_path(r'^ajax/minimalpairs/(?P<gloss_id>.*)/$', signbank.dictionary.adminviews.minimalpairs_ajax_complete, name='minimalpairs_ajax_complete'),
     re_path(r'^ajax/glossrow/(?P<gloss_id>.*)/$', signbank.dictionary.adminviews.glosslist_ajax_complete, name='glosslist_ajax_complete'),
+    re_path(r'^ajax/glossrows/$', signbank.dictionary.adminviews.glosslist_rows_ajax, name='glosslist_rows_ajax'),
     re_path(r'^ajax/glosslistheader/$', signbank.dictionary.adminviews.glosslistheader_ajax, name='glosslistheader_ajax'),
     re_path(r'^ajax/senserow/(?P<sense_id>.*)/$', signbank.dictionary.adminviews.senselist_ajax_complete, name='senselist_ajax_complete'),
     re_path(r'^ajax/senselistheader/$', signbank.dictionary.adminviews.senselistheader_ajax, name='senselistheader_ajax'),
@@ -247,6 +248,8 @@ urlpatterns = [
             signbank.api_interface.upload_zipped_videos_folder_json, name='upload_zipped_videos_folder_json'),
     re_path(r'upload_zipped_videos_archive/(?P<datasetid>\d+)/$',
             signbank.api_interface.upload_zipped_videos_archive, name='upload_zipped_videos_archive'),
+    re_path(r'import_zipped_videos_json/(?P<datasetid>\d+)/$',
+            signbank.api_interface.import_zipped_videos_json, name='import_zipped_videos_json'),
 
     re_path(r'upload_videos_to_glosses/(?P<datasetid>\d+)/$',
             signbank.api_interface.upload_videos_to_glosses, name='upload_videos_to_glosses'),
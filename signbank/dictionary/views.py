@@ -1,6 +1,4 @@
 import os.path
-import datetime as DT
-import csv
 import time
 import sys
 import re
@@ -18,11 +16,10 @@ from django.utils.datastructures import MultiValueDictKeyError
 from django.utils.encoding import escape_uri_path
 from urllib.parse import quote
 from django.contrib import messages
-from django.core.exceptions import ValidationError, ObjectDoesNotExist, MultipleObjectsReturned, PermissionDenied
-from django.utils.translation import gettext_lazy as _, activate, override, gettext
+from django.core.exceptions import ValidationError, ObjectDoesNotExist, PermissionDenied
+from django.utils.translation import gettext_lazy as _, activate, gettext
 from django.views.decorators.csrf import csrf_exempt
 from django.views.static import serve
-from django.db.transaction import atomic
 from django.db.models import Q
 from django.core.files import File
 
@@ -40,10 +37,11 @@ from signbank.settings.base import (MAXIMUM_UPLOAD_SIZE, SUPPORTED_CITATION_IMAG
                                     ALWAYS_REQUIRE_LOGIN, MEDIA_ROOT, ESCAPE_UPLOADED_VIDEO_FILE_PATH)
 from signbank.video.models import (GlossVideo, small_appendix, add_small_appendix)
 from signbank.video.forms import VideoUploadForGlossCreateForm
+from signbank.video.inventory import media_file_paths
 from signbank.dictionary.models import (Dataset, Language, Gloss, Morpheme, LemmaIdgloss, LemmaIdglossTranslation,
                                         Handshape, SignLanguage, AnnotatedSentence,
-                                        AnnotationIdglossTranslation, FieldChoice, AffiliatedUser, AffiliatedGloss,
-                                        DeletedGlossOrMedia,
+                                        AnnotationIdglossTranslation, FieldChoice,
+                                        DeletedGlossOrMedia, CSVImportJob,
                                         get_default_language_id, CATEGORY_MODELS_MAPPING)
 from signbank.dictionary.forms import (LemmaCreateForm, GlossCreateForm, MorphemeCreateForm, ImageUploadForHandshapeForm,
                                        ImageUploadForGlossForm, CSVUploadForm)
@@ -52,16 +50,21 @@ from signbank.dictionary.update_csv import (update_simultaneous_morphology, upda
                                             update_sequential_morphology, subst_relations, subst_foreignrelations,
                                             update_tags, subst_notes, subst_semanticfield)
 from signbank.dictionary.context_data import get_selected_datasets
+from signbank.dictionary.package_cache import PackageCache
+from signbank.dictionary.csv_update_lookups import GlossUpdateLookups, apply_confirmed_field_changes
+from signbank.dictionary.csv_import_jobs import (stage_csv_upload, remove_csv_upload, read_csv_head,
+                                                 csv_import_parameters, start_csv_import_job, csv_import_results,
+                                                 start_csv_apply_job, csv_apply_results, csv_import_job_status)
 from signbank.tools import (get_two_letter_dir, get_default_annotationidglosstranslation,
                             get_dataset_languages, get_datasets_with_public_glosses, get_interface_language_and_default_language_codes,
-                            create_gloss_from_valuedict, compare_valuedict_to_gloss, compare_valuedict_to_lemma,
                             create_zip_with_json_files,
                             detect_delimiter,
                             split_csv_lines_header_body,
-                            split_csv_lines_sentences_header_body, create_sentence_from_valuedict,
-                            get_deleted_gloss_or_media_data, get_gloss_data, add_relations_to_revision_history)
+                            split_csv_lines_sentences_header_body,
+                            get_deleted_gloss_or_media_data, add_relations_to_revision_history,
+                            keep_search_results_of_type)
 from signbank.dictionary.field_choices import fields_to_fieldcategory_dict
-from signbank.csv_interface import (csv_create_senses, csv_update_sentences, csv_create_sentence, required_csv_columns,
+from signbank.csv_interface import (csv_create_senses, csv_update_sentences, required_csv_columns,
                                     choice_fields_choices)
 from signbank.dictionary.translate_choice_list import (machine_value_to_translated_human_value,
                                                        choicelist_queryset_to_translated_dict)
@@ -89,14 +92,7 @@ def gloss(request, glossid):
         raise Http404
 
     # set session variables for scroll bar
-    if 'search_results' in request.session.keys():
-        search_results = request.session['search_results']
-    else:
-        search_results = []
-    if search_results and len(search_results) > 0:
-        if request.session['search_results'][0]['href_type'] not in ['gloss', 'morpheme', 'annotatedsentence']:
-            # if the results have the wrong type
-            request.session['search_results'] = []
+    keep_search_results_of_type(request, ['gloss', 'morpheme', 'annotatedsentence'])
 
     if 'search_type' in request.session.keys():
         if request.session['search_type'] not in ['sign', 'morpheme', 'annotatedsentence',
@@ -305,16 +301,17 @@ def missing_video_list(selected_datasets):
     """A list of signs that don't have an
     associated video file"""
 
-    glosses = Gloss.objects.filter(archived=False, morpheme=None, lemma__dataset__in=selected_datasets)
-    for gloss in glosses:
-        gloss_video_path = video_file_path(gloss)
-        gloss_video = GlossVideo.objects.filter(gloss=gloss, version=0, glossvideonme=None, glossvideoperspective=None)
-        if not gloss_video.count():
-            # does not have GlossVideo object
-            file_path = os.path.join(WRITABLE_FOLDER, gloss_video_path)
-            if os.path.exists(file_path.encode('utf-8')):
-                # there is a video file but no GlossVideo object
-                yield gloss, gloss_video_path
+    # the glosses that do not have a GlossVideo object
+    glossvideos = GlossVideo.objects.filter(version=0, glossvideonme=None, glossvideoperspective=None)
+    glosses = Gloss.objects.filter(archived=False, morpheme=None, lemma__dataset__in=selected_datasets).exclude(
+        id__in=glossvideos.values('gloss_id'))
+    gloss_video_paths = [(gloss, video_file_path(gloss)) for gloss in glosses]
+    # the video files are looked up in the media inventory
+    existing_paths = media_file_paths(gloss_video_path for gloss, gloss_video_path in gloss_video_paths)
+    for gloss, gloss_video_path in gloss_video_paths:
+        if gloss_video_path in existing_paths:
+            # there is a video file but no GlossVideo object
+            yield gloss, gloss_video_path
 
 
 def missing_video_view(request):
@@ -460,14 +457,27 @@ def add_new_morpheme(request):
     return render(request,'dictionary/add_morpheme.html',context)
 
 
+def render_csv_import_job(request, job):
+    """The page that shows the progress of checking the rows of an uploaded CSV file, until the job is done"""
+    return render(request, 'dictionary/csv_import_job.html',
+                  {'job': job, 'job_status': csv_import_job_status(job),
+                   'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
+                   'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
+
+
+@login_required
+def csv_import_job_progress(request, jobid):
+    """The status of a CSV import job of the user, the progress page polls this until the job is finished"""
+    job = get_object_or_404(CSVImportJob, pk=jobid, user=request.user)
+    return JsonResponse(csv_import_job_status(job))
+
+
 def import_csv_create(request):
     user = request.user
     user_datasets = guardian.shortcuts.get_objects_for_user(user, 'change_dataset', Dataset)
-    user_datasets_names = [dataset.acronym for dataset in user_datasets]
 
     selected_datasets = get_selected_datasets(request)
     dataset_languages = get_dataset_languages(selected_datasets)
-    selected_dataset_acronyms = [dataset.acronym for dataset in selected_datasets]
 
     translation_languages_dict = {}
     # this dictionary is used in the template, it maps each dataset to a list of tuples
@@ -481,7 +491,6 @@ def import_csv_create(request):
             translation_languages_dict[dataset_object].append(language_tuple)
 
     seen_datasets = []
-    seen_dataset_names = []
 
     # fatal errors are duplicate column headers, data in columns without headers
     # column headers that do not correspond to database fields
@@ -500,9 +509,6 @@ def import_csv_create(request):
     error = []
     creation = []
     gloss_already_exists = []
-    earlier_creation_same_csv = {}
-    earlier_creation_annotationidgloss = {}
-    earlier_creation_lemmaidgloss = {}
 
     # Propose changes
     if len(request.FILES) > 0:
@@ -511,7 +517,7 @@ def import_csv_create(request):
         try:
             # files that will fail here include those renamed to .csv which are not csv
             # non UTF-8 encoded files also fail
-            csv_text = new_file.read().decode('UTF-8-sig')
+            csv_file = stage_csv_upload(new_file, 'UTF-8-sig')
         except (UnicodeDecodeError, UnicodeError):
             feedback_message = _('Unrecognised format in selected CSV file.')
             messages.add_message(request, messages.ERROR, feedback_message)
@@ -528,8 +534,8 @@ def import_csv_create(request):
                            'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
                            'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
 
-        fatal_error = False
-        csv_lines = re.compile('[\r\n]+').split(csv_text)  # split csv text on any combination of new line characters
+        # the header is looked for in the first lines, the rows are checked by a CSVImportJob
+        csv_lines = read_csv_head(csv_file, 'UTF-8-sig')
 
         delimiter_okay, found_delimiter = detect_delimiter(csv_lines)
         delimiter_okay, keys_found, missing_keys, extra_keys, csv_header, csv_body = split_csv_lines_header_body(dataset_languages,
@@ -545,6 +551,7 @@ def import_csv_create(request):
             else:
                 feedback_message = gettext('Some required column headers are missing: {missingkeys}').format(missingkeys=', '.join(missing_keys))
             messages.add_message(request, messages.ERROR, feedback_message)
+            remove_csv_upload(csv_file)
             return render(request, 'dictionary/import_csv_create.html',
                           {'form': uploadform, 'stage': 0, 'changes': changes,
                            'error': error,
@@ -572,6 +579,7 @@ def import_csv_create(request):
             messages.add_message(request, messages.ERROR, feedback_message)
             encoding_error = True
         if encoding_error:
+            remove_csv_upload(csv_file)
             return render(request, 'dictionary/import_csv_create.html',
                           {'form': uploadform, 'stage': 0, 'changes': changes,
                            'creation': creation,
@@ -584,268 +592,33 @@ def import_csv_create(request):
                            'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
                            'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
 
-        # create a template for an empty row with the desired number of columns
-        empty_row = [''] * len(csv_header)
-        for nl, line in enumerate(csv_body):
-            if len(line) == 0:
-                # this happens at the end of the file
-                continue
-            values = csv.reader([line], delimiter=found_delimiter).__next__()
-            if values == empty_row:
-                continue
-
-            # construct value_dict for row
-            value_dict = {}
-            for nv, value in enumerate(values):
-                if nv >= len(csv_header):
-                    # this has already been checked above
-                    # it's here to avoid needing an exception on the subscript [nv]
-                    continue
-                value_dict[csv_header[nv]] = value
-
-            # 'Dataset' in value_dict keys, checked above
-            dataset_name = value_dict['Dataset'].strip()
-
-            if dataset_name not in selected_dataset_acronyms:
-                e3 = gettext("Row {row}: Dataset {acronym} is not selected.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
-                error.append(e3)
-                break
-            if dataset_name not in user_datasets_names:
-                e3 = gettext("Row {row}: You are not allowed to change dataset {acronym}.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
-                error.append(e3)
-                break
-            # Check whether the user may change the dataset of the current row
-            if dataset_name not in seen_dataset_names:
-                if seen_datasets:
-                    # already seen a dataset
-                    # this is a different dataset
-                    e3 = gettext("Row {row}: A different dataset is mentioned.").format(row=str(nl+2))
-                    e4 = gettext('You can only create glosses for one dataset at a time.')
-                    e5 = gettext('To create glosses in multiple datasets, use a separate CSV file for each dataset.')
-                    error.append(e3)
-                    error.append(e4)
-                    error.append(e5)
-                    break
-
-                # only process a dataset_name once for the csv file being imported
-                # catch possible empty values for dataset, primarily for pretty printing error message
-                if dataset_name in ['', None, 0, 'NULL']:
-                    e_dataset_empty = gettext('Row {row}: The Dataset is missing.').format(row=str(nl+2))
-                    error.append(e_dataset_empty)
-                    break
-                try:
-                    dataset = Dataset.objects.get(acronym=dataset_name)
-                except ObjectDoesNotExist:
-                    # An error message should be returned here, the dataset does not exist
-                    e_dataset_not_found = gettext("Row {row}: Dataset {acronym} does not exist.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
-                    error.append(e_dataset_not_found)
-                    break
-
-                if seen_datasets and dataset not in seen_datasets:
-                    e4 = gettext('You can only create glosses for one dataset at a time.')
-                    e5 = gettext('To create glosses in multiple datasets, use a separate CSV file for each dataset.')
-                    error.append(e4)
-                    error.append(e5)
-                    break
-                else:
-                    seen_datasets.append(dataset)
-                    seen_dataset_names.append(dataset_name)
-
-            empty_lemma_translation = False
-            # The Lemma ID Gloss may already exist.
-            # store the lemma translations for the current row in dict lemmaidglosstranslations
-            # for those translations, look up existing lemmas with (one of) those translations
-            lemmaidglosstranslations = {}
-            existing_lemmas = {}
-            existing_lemmas_list = []
-            new_lemmas = {}
-            contextual_error_messages_lemmaidglosstranslations = []
-            annotationidglosstranslations = {}
-            try:
-                dataset = seen_datasets[0]
-            except (KeyError, IndexError):
-                # this is kind of stupid, we already made sure a dataset was found, but python can't tell if it's been initialised
-                # dataset is a local variable above and we put it into the (singleton) list seen_datasets
-                break
-            translation_languages = dataset.translation_languages.all()
-
-            # check annotation translations
-            for language in translation_languages:
-                language_name = getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English'])
-                annotationidglosstranslation_text = value_dict["Annotation ID Gloss (%s)" % language_name]
-                annotationidglosstranslations[language] = annotationidglosstranslation_text
-
-                annotationtranslation_for_this_text_language = AnnotationIdglossTranslation.objects.filter(
-                    gloss__lemma__dataset=dataset, language=language, text__exact=annotationidglosstranslation_text)
-
-                if annotationtranslation_for_this_text_language:
-                    error_string = gettext("Row {row}: contains an already existing Annotation ID Gloss for {language}: {annotation}").format(row=str(nl+2), language=language_name, annotation=annotationidglosstranslation_text)
-                    error.append(error_string)
-
-            # check lemma translations
-            for language in translation_languages:
-                language_name = getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English'])
-                column_name = "Lemma ID Gloss (%s)" % language_name
-                lemmaidglosstranslation_text = value_dict[column_name].strip()
-                # also stores empty values
-                lemmaidglosstranslations[language] = lemmaidglosstranslation_text
-
-                lemmatranslation_for_this_text_language = LemmaIdglossTranslation.objects.filter(
-                    lemma__dataset=dataset, language=language, text__exact=lemmaidglosstranslation_text)
-                if lemmatranslation_for_this_text_language:
-                    one_lemma = lemmatranslation_for_this_text_language[0].lemma
-                    existing_lemmas[language.language_code_2char] = one_lemma
-                    if not one_lemma in existing_lemmas_list:
-                        existing_lemmas_list.append(one_lemma)
-                        help = gettext("Row {row}: Existing Lemma ID Gloss ({language}): {lemmatext}").format(row=str(nl+2), language=language_name, lemmatext=lemmaidglosstranslation_text)
-                        contextual_error_messages_lemmaidglosstranslations.append(help)
-                elif not lemmaidglosstranslation_text:
-                    # lemma translation is empty, determine if existing lemma is also empty for this language
-                    if existing_lemmas_list:
-                        lemmatranslation_for_this_text_language = LemmaIdglossTranslation.objects.filter(
-                            lemma__dataset=dataset, lemma=existing_lemmas_list[0],
-                            language=language)
-                        if lemmatranslation_for_this_text_language:
-                            help = gettext("Row {row}: Lemma ID Gloss ({language}): is empty.").format(row=str(nl + 2), language=language_name)
-                            contextual_error_messages_lemmaidglosstranslations.append(help)
-                            empty_lemma_translation = True
-                    else:
-                        empty_lemma_translation = True
-                else:
-                    new_lemmas[language.language_code_2char] = lemmaidglosstranslation_text
-                    help = gettext("Row {row}: New Lemma ID Gloss ({language}): {lemmatext}").format(row=str(nl+2), language=language_name, lemmatext=lemmaidglosstranslation_text)
-                    contextual_error_messages_lemmaidglosstranslations.append(help)
-
-            if len(existing_lemmas_list) > 0:
-                if len(existing_lemmas_list) > 1:
-                    e1 = gettext('Row {row}: The Lemma translations refer to different lemmas.').format(row=str(nl+2))
-                    error.append(e1)
-                elif empty_lemma_translation:
-                    e1 = gettext('Row {row}: Exactly one lemma matches, but one of the translations in the csv is empty.').format(row=str(nl+2))
-                    error.append(e1)
-                if len(new_lemmas.keys()) and len(existing_lemmas.keys()):
-                    e1 = gettext('Row {row}: Combination of existing and new lemma translations.').format(row=str(nl+2))
-                    error.append(e1)
-            elif not len(new_lemmas.keys()):
-                e1 = gettext('Row {row}: No lemma translations provided.').format(row=str(nl + 2))
-                error.append(e1)
-
-            if error:
-                # these are feedback errors, don't bother comparing the new gloss to existing values, we already found an error
-                continue
-
-            # put creation of value_dict for the new gloss inside an exception to catch any unexpected errors
-            # errors are kept track of as user feedback, but the code needs to be safe
-            try:
-                (new_gloss, already_exists, error_create, earlier_creation_same_csv, earlier_creation_annotationidgloss, earlier_creation_lemmaidgloss) \
-                    = create_gloss_from_valuedict(value_dict,dataset,nl, earlier_creation_same_csv, earlier_creation_annotationidgloss, earlier_creation_lemmaidgloss)
-            except (KeyError, ValueError):
-                print('import csv create: got this far in processing loop before exception in row ', str(nl+2))
-                break
-            if len(error_create):
-                errors_found_string = '\n'.join(error_create)
-                error.append(errors_found_string)
-            else:
-                creation += new_gloss
-            # whether or not glosses mentioned in the csv file already exist is accummulated in gloss_already_exists
-            # one version of the template also shows these with the errors, so the user might remove extra data from the csv to reduce its size
-            gloss_already_exists += already_exists
-            continue
-
-        stage = 1
+        job = start_csv_import_job(user, CSVImportJob.CREATE_GLOSSES, csv_file,
+                                   csv_import_parameters('UTF-8-sig', found_delimiter, csv_header, csv_lines, csv_body,
+                                                         selected_datasets))
+        return redirect(reverse('import_csv_create') + '?job=' + str(job.id))
 
     # Do changes
     elif len(request.POST) > 0:
-
-        glosses_to_create = dict()
-
-        for key, new_value in request.POST.items():
-
-            # obtain tuple values for each proposed gloss
-            # pk is the row number in the import file!
-            try:
-                pk, fieldname = key.split('.')
-
-                if pk not in glosses_to_create.keys():
-                    glosses_to_create[pk] = dict()
-                glosses_to_create[pk][fieldname] = new_value
-
-            # In case there's no dot, this is not a value we set at the previous page
-            except ValueError:
-                # when the database token csrfmiddlewaretoken is passed, there is no dot
-                continue
-
-        # these should be error free based on the django template import_csv_create.html
-        for row in glosses_to_create.keys():
-            dataset = glosses_to_create[row]['dataset']
-
-            try:
-                dataset_object = Dataset.objects.get(acronym=dataset)
-            except ObjectDoesNotExist:
-                # this is an error, this should have already been caught
-                e1 = gettext('Dataset not found: {dataset}').format(dataset=dataset)
-                error.append(e1)
-                continue
-
-            lemmaidglosstranslations = {}
-            for language in dataset_object.translation_languages.all():
-                lemma_id_gloss = glosses_to_create[row]['lemma_id_gloss_' + language.language_code_2char]
-                if lemma_id_gloss:
-                    lemmaidglosstranslations[language] = lemma_id_gloss
-            # Check whether it is an existing one (correct, make a reference), ...
-            existing_lemmas = []
-            for language, term in lemmaidglosstranslations.items():
-                try:
-                    existing_lemmas.append(LemmaIdglossTranslation.objects.get(lemma__dataset=dataset_object,
-                                                                               language=language,
-                                                                               text=term).lemma)
-                except ObjectDoesNotExist as e:
-                    # New lemma will be created
-                    pass
-            existing_lemmas_set = set(existing_lemmas)
-
-            if len(existing_lemmas) == len(lemmaidglosstranslations) and len(existing_lemmas_set) == 1:
-                lemma_for_gloss = existing_lemmas[0]
-            elif len(existing_lemmas) == 0:
-                with atomic():
-                    lemma_for_gloss = LemmaIdgloss(dataset=dataset_object)
-                    lemma_for_gloss.save()
-                    for language, term in lemmaidglosstranslations.items():
-                        new_lemmaidglosstranslation = LemmaIdglossTranslation(lemma=lemma_for_gloss,
-                                                                              language=language, text=term)
-                        new_lemmaidglosstranslation.save()
-            else:
-                # This case should not happen, it should have been caught in stage 1
-                e1 = gettext('To create glosses in dataset {acronym}, '
-                             'the combination of Lemma ID Gloss translations should either refer '
-                             'to an existing Lemma ID Gloss or make up a completely new Lemma ID gloss.').format(acronym=dataset_object.acronym)
-                error.append(e1)
-                continue
-
-            new_gloss = Gloss()
-            new_gloss.lemma = lemma_for_gloss
-            # Save the new gloss before updating it
-            new_gloss.save()
-            new_gloss.creationDate = DT.datetime.now()
-            new_gloss.creator.add(request.user)
-            new_gloss.excludeFromEcv = False
-            new_gloss.save()
-            user_affiliations = AffiliatedUser.objects.filter(user=request.user)
-            if user_affiliations.count() > 0:
-                for ua in user_affiliations:
-                    new_affiliation, created = AffiliatedGloss.objects.get_or_create(affiliation=ua.affiliation,
-                                                                                     gloss=new_gloss)
-
-            for language in dataset_languages:
-                annotation_id_gloss = glosses_to_create[row]['annotation_id_gloss_' + language.language_code_2char]
-                if annotation_id_gloss:
-                    annotationidglosstranslation = AnnotationIdglossTranslation()
-                    annotationidglosstranslation.language = language
-                    annotationidglosstranslation.gloss = new_gloss
-                    annotationidglosstranslation.text = annotation_id_gloss
-                    annotationidglosstranslation.save()
-
-        stage = 2
+        # the confirmed rows are applied by the job that checked them
+        job = None
+        if request.GET.get('job', '').isdigit():
+            job = get_object_or_404(CSVImportJob, pk=int(request.GET['job']), user=user, kind=CSVImportJob.CREATE_GLOSSES)
+        job = start_csv_apply_job(user, CSVImportJob.CREATE_GLOSSES, job, request.POST, selected_datasets)
+        return redirect(reverse('import_csv_create') + '?job=' + str(job.id))
+
+    # Show the progress or the results of checking or applying the rows
+    elif request.GET.get('job', '').isdigit():
+        job = get_object_or_404(CSVImportJob, pk=int(request.GET['job']), user=user, kind=CSVImportJob.CREATE_GLOSSES)
+        if job.status != CSVImportJob.DONE:
+            return render_csv_import_job(request, job)
+        if job.phase == CSVImportJob.APPLY:
+            error = csv_apply_results(job)['error']
+            stage = 2
+        else:
+            results = csv_import_results(job)
+            changes, error, creation = results['changes'], results['error'], results['creation']
+            gloss_already_exists, seen_datasets = results['gloss_already_exists'], results['seen_datasets']
+            stage = 1
 
     # Show uploadform
     else:
@@ -868,7 +641,6 @@ def import_csv_create(request):
 def import_csv_update(request):
     user = request.user
     user_datasets = guardian.shortcuts.get_objects_for_user(user, 'change_dataset', Dataset)
-    user_datasets_names = [dataset.acronym for dataset in user_datasets]
 
     selected_datasets = get_selected_datasets(request)
     dataset_languages = get_dataset_languages(selected_datasets)
@@ -889,7 +661,6 @@ def import_csv_update(request):
             translation_languages_dict[dataset_object].append(language_tuple)
 
     seen_datasets = []
-    seen_dataset_names = []
 
     # fatal errors are duplicate column headers, data in columns without headers
     # column headers that do not correspond to database fields
@@ -906,18 +677,9 @@ def import_csv_update(request):
     error = []
     creation = []
     gloss_already_exists = []
-    earlier_updates_same_csv = []
-    earlier_updates_lemmaidgloss = {}
 
     encoding_error = False
 
-    # this is needed in case the user has exported the csv first and not removed the frequency columns
-    # this code retrieves the column headers in English
-
-    gloss_fields = [Gloss.get_field(fname) for fname in Gloss.get_field_names()]
-    with override(LANGUAGE_CODE):
-        columns_to_skip = {field.verbose_name: field for field in gloss_fields if field.name in FIELDS['frequency']}
-
     # this is needed to make sure the interface shows the correct language
     activate(request.LANGUAGE_CODE)
 
@@ -929,7 +691,7 @@ def import_csv_update(request):
         try:
             # files that will fail here include those renamed to .csv which are not csv
             # non UTF-8 encoded files also fail
-            csv_text = new_file.read().decode('UTF-8-sig')
+            csv_file = stage_csv_upload(new_file, 'UTF-8-sig')
         except (UnicodeDecodeError, UnicodeError):
             feedback_message = _('Unrecognised format in selected CSV file.')
             messages.add_message(request, messages.ERROR, feedback_message)
@@ -948,8 +710,8 @@ def import_csv_update(request):
                            'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
                            'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
 
-        fatal_error = False
-        csv_lines = re.compile('[\r\n]+').split(csv_text) # split the csv text on any combination of new line characters
+        # the header is looked for in the first lines, the rows are checked by a CSVImportJob
+        csv_lines = read_csv_head(csv_file, 'UTF-8-sig')
 
         # the obtains the notes togggle
         notes_toggle = 'keep'
@@ -1000,6 +762,7 @@ def import_csv_update(request):
             else:
                 feedback_message = gettext('Some required column headers are missing: {columns}').format(columns=', '.join(missing_keys))
             messages.add_message(request, messages.ERROR, feedback_message)
+            remove_csv_upload(csv_file)
             return render(request, 'dictionary/import_csv_update.html',
                           {'form': uploadform, 'stage': 0, 'changes': changes,
                            'error': error,
@@ -1029,6 +792,7 @@ def import_csv_update(request):
             messages.add_message(request, messages.ERROR, feedback_message)
             encoding_error = True
         if encoding_error:
+            remove_csv_upload(csv_file)
             return render(request, 'dictionary/import_csv_update.html',
                           {'form': uploadform, 'stage': 0, 'changes': changes,
                            'creation': creation,
@@ -1043,139 +807,20 @@ def import_csv_update(request):
                            'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
                            'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
 
-        # create a template for an empty row with the desired number of columns
-        empty_row = [''] * len(csv_header)
-        for nl, line in enumerate(csv_body):
-            if len(line) == 0:
-                # this happens at the end of the file
-                continue
-            values = csv.reader([line], delimiter=found_delimiter).__next__()
-            if values == empty_row:
-                continue
-
-            # construct value_dict for row
-            value_dict = {}
-            for nv, value in enumerate(values):
-                if nv >= len(csv_header):
-                    # this has already been checked above
-                    # it's here to avoid needing an exception on the subscript [nv]
-                    continue
-                elif csv_header[nv] in columns_to_skip.keys():
-                    continue
-                value_dict[csv_header[nv]] = value
-
-            # 'Signbank ID' in value_dict keys, checked above
-            try:
-                pk = int(value_dict['Signbank ID'])
-            except (ValueError, KeyError):
-                # the ID is not a number
-                e = gettext('Row {row}: Signbank ID must be numerical: {glossid}').format(row=str(nl+2), glossid=str(value_dict['Signbank ID']))
-                error.append(e)
-                fatal_error = True
-                break
-
-            # 'Dataset' in value_dict keys, checked above
-            dataset_name = value_dict['Dataset'].strip()
-
-            if dataset_name not in seen_dataset_names:
-                # catch possible empty values for dataset, primarily for pretty printing error message
-                if dataset_name in ['', None, 0, 'NULL']:
-                    e_dataset_empty = gettext('Row {row}: The Dataset is missing.').format(row=str(nl + 2))
-                    error.append(e_dataset_empty)
-                    break
-                try:
-                    dataset = Dataset.objects.get(acronym=dataset_name)
-                except ObjectDoesNotExist:
-                    # The dataset does not exist
-                    e_dataset_not_found = gettext("Row {row}: Dataset {acronym} does not exist.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
-                    error.append(e_dataset_not_found)
-                    fatal_error = True
-                    break
-                if dataset_name not in user_datasets_names:
-                    # Check whether the user may change the dataset of the current row
-                    e3 = gettext("Row {row}: You are not allowed to change dataset {acronym}.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
-                    error.append(e3)
-                    fatal_error = True
-                    break
-                if dataset not in selected_datasets:
-                    e3 = gettext("Row {row}: Dataset {acronym} is not selected.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
-                    error.append(e3)
-                    fatal_error = True
-                    break
-                if seen_datasets:
-                    # already seen a dataset
-                    if dataset not in seen_datasets:
-                        # seen more than one dataset
-                        seen_datasets.append(dataset)
-                        seen_dataset_names.append(dataset_name)
-                else:
-                    seen_datasets.append(dataset)
-                    seen_dataset_names.append(dataset_name)
-                    # saw the first dataset
-
-            if fatal_error or encoding_error:
-                # break out of enumerate csv lines
-                # Dataset or Signbank ID data for configuring updates in the next step is compromised
-                break
-            # The Lemma ID Gloss may already exist.
-            lemmaidglosstranslations = {}
-            contextual_error_messages_lemmaidglosstranslations = []
-            for language in dataset.translation_languages.all():
-                language_name = getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English'])
-                column_name = "Lemma ID Gloss (%s)" % language_name
-                if column_name in value_dict:
-                    lemma_idgloss_value = value_dict[column_name].strip()
-                    # also stores empty values
-                    lemmaidglosstranslations[language] = lemma_idgloss_value
-            # updating glosses
-            try:
-                gloss = Gloss.objects.select_related().get(pk=pk, archived=False)
-            except ObjectDoesNotExist as e:
-                e = gettext("Row {row}: Could not find gloss for Signbank ID {glossid}.").format(row=str(nl+2), glossid=str(pk))
-                error.append(e)
-                continue
-
-            if gloss.lemma.dataset != dataset:
-                e1 = gettext('Row {row}: The Dataset column ({acronym}) does not correspond to that of the Signbank ID ({glossid})').format(row=str(nl+2), acronym=dataset.acronym, glossid=str(pk))
-                error.append(e1)
-                # ignore the rest of the row
-                continue
-            # dataset is the same
-
-            # If there are changes in the LemmaIdglossTranslation, the changes should refer to another LemmaIdgloss
-            current_lemmaidglosstranslations = {}
-            for language in gloss.lemma.dataset.translation_languages.all():
-                lemma_translation = LemmaIdglossTranslation.objects.filter(language=language, lemma=gloss.lemma).first()
-                current_lemmaidglosstranslations[language] = lemma_translation.text if lemma_translation else ''
-            if lemmaidglosstranslations \
-                    and current_lemmaidglosstranslations != lemmaidglosstranslations:
-                help = gettext("Row {row}: Attempt to update Lemma translations for Signbank ID {glossid}. Use Import CSV Lemma Update instead.").format(row=str(nl+2), glossid=str(pk))
-                error.append(help)
-                continue
-
-            try:
-                (changes_found, errors_found, earlier_updates_same_csv, earlier_updates_lemmaidgloss) = \
-                            compare_valuedict_to_gloss(value_dict, gloss.id, user_datasets_names, nl,
-                                                       earlier_updates_same_csv, earlier_updates_lemmaidgloss,
-                                                       notes_toggle, notes_assign_toggle,
-                                                       semfield_toggle, semfield_assign_toggle, tags_toggle)
-                changes += changes_found
-
-                if errors_found:
-                    errors_found_string = '\n'.join(errors_found)
-                    error += [errors_found_string]
-
-            except KeyError as e:
-
-                e_string = str(e)
-                error.append(e_string)
-        stage = 1
+        job = start_csv_import_job(user, CSVImportJob.UPDATE_GLOSSES, csv_file,
+                                   csv_import_parameters('UTF-8-sig', found_delimiter, csv_header, csv_lines, csv_body,
+                                                         selected_datasets, notes_toggle=notes_toggle,
+                                                         notes_assign_toggle=notes_assign_toggle,
+                                                         semfield_toggle=semfield_toggle,
+                                                         semfield_assign_toggle=semfield_assign_toggle,
+                                                         tags_toggle=tags_toggle))
+        return redirect(reverse('import_csv_update') + '?job=' + str(job.id))
 
     # Do changes
     elif len(request.POST) > 0:
         gloss_fields = Gloss.get_field_names()
 
-        lemmaidglosstranslations_per_gloss = {}
+        posted_changes = []
         for key, new_value in request.POST.items():
 
             try:
@@ -1186,7 +831,18 @@ def import_csv_update(request):
                 # when the database token csrfmiddlewaretoken is passed, there is no dot
                 continue
 
-            gloss = Gloss.objects.select_related().get(pk=pk, archived=False)
+            posted_changes.append((int(pk), fieldname, new_value))
+
+        lookups = GlossUpdateLookups([pk for (pk, fieldname, new_value) in posted_changes])
+        # the changes of the gloss fields are stored together, after the changes of the related objects
+        field_changes = {}
+
+        lemmaidglosstranslations_per_gloss = {}
+        for pk, fieldname, new_value in posted_changes:
+
+            gloss = lookups.glosses.get(pk)
+            if gloss is None:
+                continue
 
             # This is no longer allowed. The column is skipped.
             # Updating the lemma idgloss is a special procedure, not only because it has relations to other parts of
@@ -1199,16 +855,10 @@ def import_csv_update(request):
                 lemmaidglosstranslations_per_gloss[gloss][language_name] = new_value
 
                 # compare new value to existing value
-                language_name_column = DEFAULT_LANGUAGE_HEADER_COLUMN['English']
-                languages = Language.objects.filter(**{language_name_column:language_name})
-                if languages:
-                    language = languages.first()
-                    lemma_idglosses = gloss.lemma.lemmaidglosstranslation_set.filter(language=language)
-                    if lemma_idglosses:
-                        lemma_idgloss_string = lemma_idglosses[0].text
-                    else:
-                        # lemma not set
-                        lemma_idgloss_string = ''
+                language = lookups.language(language_name)
+                if language:
+                    # the empty string if the lemma is not set
+                    lemma_idgloss_string = lookups.lemma_translation(gloss, language)
                     if lemma_idgloss_string != new_value and new_value not in ['None', '']:
                         error_string = gettext(
                             "Attempt to update Lemma translations: {new_value}. Use Import CSV Lemma Update instead.").format(
@@ -1225,11 +875,9 @@ def import_csv_update(request):
             # database
             annotation_idgloss_key_prefix = "Annotation ID Gloss ("
             if fieldname.startswith(annotation_idgloss_key_prefix):
-                language_name_column = DEFAULT_LANGUAGE_HEADER_COLUMN['English']
                 language_name = fieldname[len(annotation_idgloss_key_prefix):-1]
-                languages = Language.objects.filter(**{language_name_column:language_name})
-                if languages:
-                    language = languages.first()
+                language = lookups.language(language_name)
+                if language:
                     annotation_idglosses = gloss.annotationidglosstranslation_set.filter(language=language)
                     if annotation_idglosses:
                         annotation_idgloss = annotation_idglosses.first()
@@ -1240,18 +888,16 @@ def import_csv_update(request):
             keywords_key_prefix = "Senses ("
             # Updating the keywords is a special procedure, because it has relations to other parts of the database
             if fieldname.startswith(keywords_key_prefix):
-                language_name_column = DEFAULT_LANGUAGE_HEADER_COLUMN['English']
                 language_name = fieldname[len(keywords_key_prefix):-1]
-                language = Language.objects.filter(**{language_name_column: language_name}).first()
+                language = lookups.language(language_name)
                 if language:
                     csv_create_senses(request, gloss, language, new_value, create=True)
                 continue
 
             example_sentences_key_prefix = "Example Sentences ("
             if fieldname.startswith(example_sentences_key_prefix):
-                language_name_column = DEFAULT_LANGUAGE_HEADER_COLUMN['English']
                 language_name = fieldname[len(example_sentences_key_prefix):-1]
-                language = Language.objects.filter(**{language_name_column: language_name}).first()
+                language = lookups.language(language_name)
                 if language:
                     csv_update_sentences(request, gloss, language, new_value, update=True)
                 continue
@@ -1336,41 +982,24 @@ def import_csv_update(request):
                 subst_notes(gloss,new_value)
                 continue
 
-            with override(LANGUAGE_CODE):
-                if fieldname not in gloss_fields:
-                    continue
-                field = Gloss.get_field(fieldname)
-                # Replace the value for bools
-                if field.__class__.__name__ == 'BooleanField':
-
-                    if new_value in ['true','True', 'TRUE']:
-                        new_value = True
-                    elif new_value == 'None' or new_value == 'Neutral':
-                        new_value = None
-                    else:
-                        new_value = False
-                elif isinstance(field, models.ForeignKey) and field.related_model == Handshape:
-                    new_value = Handshape.objects.get(machine_value=int(new_value))
-                elif hasattr(field, 'field_choice_category'):
-                    new_value = FieldChoice.objects.get(machine_value=int(new_value),
-                                                        field=Gloss.get_field(fieldname).field_choice_category)
-                # Remember this for renaming the video later
-                if fieldname == 'idgloss':
-                    video_path_before = WRITABLE_FOLDER+gloss.get_video_path()
-
-                # The normal change and save procedure
-                # the new value machine value of Handshape or FieldChoice has been replaced with an object reference above
-                setattr(gloss, fieldname, new_value)
-                gloss.save()
+            if fieldname in gloss_fields:
+                field_changes.setdefault(gloss.id, {})[fieldname] = new_value
 
-                #Also update the video if needed
-                if fieldname == 'idgloss':
-                    video_path_after = WRITABLE_FOLDER+gloss.get_video_path()
-                    if os.path.isfile(video_path_before):
-                        os.rename(video_path_before,video_path_after)
+        # one bulk update of the glosses, with the revisions of the changed fields
+        apply_confirmed_field_changes(request.user, field_changes, lookups)
 
         stage = 2
 
+    # Show the progress or the results of checking the rows
+    elif request.GET.get('job', '').isdigit():
+        job = get_object_or_404(CSVImportJob, pk=int(request.GET['job']), user=user, kind=CSVImportJob.UPDATE_GLOSSES)
+        if job.status != CSVImportJob.DONE:
+            return render_csv_import_job(request, job)
+        results = csv_import_results(job)
+        changes, error, creation = results['changes'], results['error'], results['creation']
+        gloss_already_exists, seen_datasets = results['gloss_already_exists'], results['seen_datasets']
+        stage = 1
+
     #Show uploadform
     else:
 
@@ -1402,7 +1031,6 @@ def import_csv_update(request):
 def import_csv_lemmas(request):
     user = request.user
     user_datasets = guardian.shortcuts.get_objects_for_user(user, 'change_dataset', Dataset)
-    user_datasets_names = [dataset.acronym for dataset in user_datasets]
 
     selected_datasets = get_selected_datasets(request)
     dataset_languages = Language.objects.filter(dataset__in=selected_datasets).distinct()
@@ -1429,8 +1057,6 @@ def import_csv_lemmas(request):
     seen_datasets = []
     changes = []
     error = []
-    earlier_updates_same_csv = []
-    earlier_updates_lemmaidgloss = {}
 
     if not selected_datasets or selected_datasets.count() > 1:
         feedback_message = _('Please select a single dataset for which you have change permission.')
@@ -1446,9 +1072,8 @@ def import_csv_lemmas(request):
                        'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
                        'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
 
-    # set the allowed dataset names to selected dataset, which must have change permission (checked below)
+    # the selected dataset, which must have change permission (checked below)
     dataset = selected_datasets.first()
-    seen_dataset_names = [dataset.acronym]
 
     if dataset not in user_datasets:
         feedback_message = gettext('You do not have change permission for the chosen dataset.')
@@ -1473,7 +1098,7 @@ def import_csv_lemmas(request):
         try:
             # files that will fail here include those renamed to .csv which are not csv
             # non UTF-8 encoded files also fail
-            csv_text = new_file.read().decode('UTF-8-sig')
+            csv_file = stage_csv_upload(new_file, 'UTF-8-sig')
         except (UnicodeDecodeError, UnicodeError):
             feedback_message = gettext('Unrecognised text encoding. Please export your file to UTF-8 format.')
             messages.add_message(request, messages.ERROR, feedback_message)
@@ -1488,8 +1113,8 @@ def import_csv_lemmas(request):
                            'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
                            'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
 
-        fatal_error = False
-        csv_lines = re.compile('[\r\n]+').split(csv_text)  # split the csv text on new line characters
+        # the header is looked for in the first lines, the rows are checked by a CSVImportJob
+        csv_lines = read_csv_head(csv_file, 'UTF-8-sig')
 
         delimiter_okay, found_delimiter = detect_delimiter(csv_lines)
         delimiter_okay, keys_found, missing_keys, extra_keys, csv_header, csv_body = split_csv_lines_header_body(dataset_languages,
@@ -1505,6 +1130,7 @@ def import_csv_lemmas(request):
             else:
                 feedback_message = gettext('Some required column headers are missing: {columns}').format(columns=', '.join(missing_keys))
             messages.add_message(request, messages.ERROR, feedback_message)
+            remove_csv_upload(csv_file)
             return render(request, 'dictionary/import_csv_update_lemmas.html',
                           {'form': uploadform, 'stage': 0, 'changes': changes,
                            'error': error,
@@ -1515,175 +1141,32 @@ def import_csv_lemmas(request):
                            'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
                            'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
 
-        # create a template for an empty row with the desired number of columns
-        empty_row = [''] * len(csv_header)
-        for nl, line in enumerate(csv_body):
-            if len(line) == 0:
-                # this happens at the end of the file
-                continue
-            values = csv.reader([line], delimiter=found_delimiter).__next__()
-            if values == empty_row:
-                continue
-
-            # construct value_dict for row
-            value_dict = {}
-            for nv, value in enumerate(values):
-                if nv >= len(csv_header):
-                    # this has already been checked above
-                    # it's here to avoid needing an exception on the subscript [nv]
-                    continue
-                value_dict[csv_header[nv]] = value
-
-            if 'Lemma ID' in value_dict.keys():
-                # make sure it is numerical
-                try:
-                    pk = int(value_dict['Lemma ID'])
-                except ValueError:
-                    e = gettext('Row {row}: Lemma ID must be numerical: {lemmaid}').format(row=str(nl+2), lemmaid=str(value_dict['Lemma ID']))
-                    error.append(e)
-                    fatal_error = True
-                    break
-            if 'Signbank ID' in value_dict.keys():
-                # make sure it is numerical
-                try:
-                    pk = int(value_dict['Signbank ID'])
-                except ValueError:
-                    e = gettext('Row {row}: Signbank ID must be numerical: {glossid}').format(row=str(nl+2), glossid=str(value_dict['Signbank ID']))
-                    error.append(e)
-                    fatal_error = True
-                    break
-
-            dataset_name = value_dict['Dataset'].strip()
-
-            # catch possible empty values for dataset, primarily for pretty printing error message
-            if dataset_name == '' or dataset_name is None or dataset_name == 0 or dataset_name == 'NULL':
-                e_dataset_empty = gettext('Row {row}: The Dataset is missing.').format(row=str(nl+2))
-                error.append(e_dataset_empty)
-                fatal_error = True
-                break
-            if dataset_name not in seen_dataset_names:
-                # seen more than one dataset
-                e3 = gettext('Row {row}: Dataset not in selected datasets: {dataset}').format(row=str(nl+2), dataset=dataset_name)
-                error.append(e3)
-                fatal_error = True
-                break
-
-            # The Lemma ID Gloss may already exist.
-            lemmaidglosstranslations = {}
-            for language in dataset.translation_languages.all():
-                language_name = getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English'])
-                column_name = "Lemma ID Gloss (%s)" % language_name
-                if column_name in value_dict:
-                    lemma_idgloss_value = value_dict[column_name]
-                    # also stores empty values
-                    lemmaidglosstranslations[language] = lemma_idgloss_value
-
-            lemma = None
-            # updating lemmas, propose changes (make dict)
-            if 'Lemma ID' in value_dict.keys():
-                lemmaid = value_dict['Lemma ID']
-                try:
-                    lemma = LemmaIdgloss.objects.select_related().get(pk=int(lemmaid))
-                except ObjectDoesNotExist as e:
-                    e = gettext('Row {row}: Could not find lemma for Lemma ID {lemmaid}').format(row=str(nl+2), lemmaid=lemmaid)
-                    error.append(e)
-                    continue
-            elif 'Signbank ID' in value_dict.keys():
-                glossid = value_dict['Signbank ID']
-                try:
-                    gloss = Gloss.objects.select_related().get(pk=int(glossid), archived=False)
-                    lemma = gloss.lemma
-                    value_dict['Lemma ID'] = str(lemma.pk)
-                except ObjectDoesNotExist as e:
-                    e = gettext('Row {row}: Could not find lemma for Signbank ID {glossid}').format(row=str(nl+2), glossid=glossid)
-                    error.append(e)
-                    continue
-            if not lemma:
-                e = gettext('Row {row}: Could not identify lemma.').format(row=str(nl+2))
-                error.append(e)
-                continue
-            if lemma.dataset.acronym != dataset_name:
-                e1 = gettext('Row {row}: The Dataset column ({acronym}) does not correspond to that of the Lemma ID ({lemmaid})').format(row=str(nl+2), acronym=dataset.acronym, lemmaid=str(lemma.pk))
-                error.append(e1)
-                # ignore the rest of the row
-                continue
-            # dataset is the same
-
-            # If there are changes in the LemmaIdglossTranslation, the changes should refer to another LemmaIdgloss
-            current_lemmaidglosstranslations = {}
-            for language in lemma.dataset.translation_languages.all():
-                try:
-                    lemma_translation = LemmaIdglossTranslation.objects.get(language=language, lemma=lemma)
-                    current_lemmaidglosstranslations[language] = lemma_translation.text
-                except (KeyError, IndexError, ValueError, ObjectDoesNotExist, MultipleObjectsReturned):
-                    current_lemmaidglosstranslations[language] = ''
-
-            try:
-                (changes_found, errors_found, earlier_updates_same_csv, earlier_updates_lemmaidgloss) = \
-                            compare_valuedict_to_lemma(value_dict, lemma.id, user_datasets_names, nl,
-                                                       lemmaidglosstranslations, current_lemmaidglosstranslations,
-                                                       earlier_updates_same_csv, earlier_updates_lemmaidgloss)
-                changes += changes_found
-
-                if len(errors_found):
-                    # more than one error found
-                    errors_found_string = '\n'.join(errors_found)
-                    error.append(errors_found_string)
-
-            except KeyError as e:
-
-                e_string = str(e)
-                error.append(e_string)
-        stage = 1
+        job = start_csv_import_job(user, CSVImportJob.UPDATE_LEMMAS, csv_file,
+                                   csv_import_parameters('UTF-8-sig', found_delimiter, csv_header, csv_lines, csv_body,
+                                                         [dataset]))
+        return redirect(reverse('import_csv_lemmas') + '?job=' + str(job.id))
 
     # Do changes
     elif len(request.POST) > 0:
-
-        for key, new_value in request.POST.items():
-
-            try:
-                pk, fieldname = key.split('.')
-
-            # In case there's no dot, this is not a value we set in the proposed changes
-            except ValueError:
-                # when the database token csrfmiddlewaretoken is passed, there is no dot
-                continue
-
-            lemma = LemmaIdgloss.objects.select_related().get(pk=pk)
-
-            with override(LANGUAGE_CODE):
-
-                # when we do the changes, it has already been confirmed
-                # that changes to the translations ensure that there is at least one translation
-                lemma_idgloss_key_prefix = "Lemma ID Gloss ("
-                if fieldname.startswith(lemma_idgloss_key_prefix):
-                    language_name = fieldname[len(lemma_idgloss_key_prefix):-1]
-
-                    # compare new value to existing value
-                    language_name_column = DEFAULT_LANGUAGE_HEADER_COLUMN['English']
-                    languages = Language.objects.filter(**{language_name_column: language_name})
-                    if languages:
-                        language = languages[0]
-                        lemma_idglosses = lemma.lemmaidglosstranslation_set.filter(language=language)
-                        if lemma_idglosses:
-                            # update the lemma translation
-                            lemma_translation = lemma_idglosses.first()
-                            if new_value:
-                                setattr(lemma_translation, 'text', new_value)
-                                lemma_translation.save()
-                            else:
-                                # setting a translation to empty deletes the translation
-                                # in the previous stage when proposing changes we have already checked to prevent all translations from being deleted
-                                lemma_translation.delete()
-                        elif new_value:
-                            # this is a new lemma translation for the language
-                            lemma_translation = LemmaIdglossTranslation(lemma=lemma, language=language)
-                            setattr(lemma_translation, 'text', new_value)
-                            lemma_translation.save()
-                        # else:
-                            # this case should not occur, there is no translation for the language and the user wants to make an empty one
-
-        stage = 2
+        # the confirmed rows are applied by the job that checked them
+        job = None
+        if request.GET.get('job', '').isdigit():
+            job = get_object_or_404(CSVImportJob, pk=int(request.GET['job']), user=user, kind=CSVImportJob.UPDATE_LEMMAS)
+        job = start_csv_apply_job(user, CSVImportJob.UPDATE_LEMMAS, job, request.POST, selected_datasets)
+        return redirect(reverse('import_csv_lemmas') + '?job=' + str(job.id))
+
+    # Show the progress or the results of checking or applying the rows
+    elif request.GET.get('job', '').isdigit():
+        job = get_object_or_404(CSVImportJob, pk=int(request.GET['job']), user=user, kind=CSVImportJob.UPDATE_LEMMAS)
+        if job.status != CSVImportJob.DONE:
+            return render_csv_import_job(request, job)
+        if job.phase == CSVImportJob.APPLY:
+            error = csv_apply_results(job)['error']
+            stage = 2
+        else:
+            results = csv_import_results(job)
+            changes, error, seen_datasets = results['changes'], results['error'], results['seen_datasets']
+            stage = 1
 
     # Show uploadform
     else:
@@ -2115,10 +1598,8 @@ def package(request, language_code='en'):
     if not dataset:
         return HttpResponseBadRequest(gettext('Dataset not found.'))
     if request.user.is_authenticated:
-        available_glosses = Gloss.objects.filter(lemma__dataset=dataset, archived=False)
         inWebSet = False  # not necessary
     else:
-        available_glosses = Gloss.objects.filter(lemma__dataset=dataset, inWeb=True, archived=False)
         inWebSet = True
 
     first_part_of_file_name = 'signbank_pa'
@@ -2146,28 +1627,21 @@ def package(request, language_code='en'):
         video_folder_name += '_small'
 
     archive_file_name = '.'.join([first_part_of_file_name, timestamp_part_of_file_name, 'zip'])
+
+    package_cache = PackageCache(dataset, language_code, inWebSet, extended_fields)
+
+    if since_timestamp == 0:
+        # the full package is served straight from the cache
+        response = HttpResponse(FileWrapper(package_cache.open_full_package()), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename='+archive_file_name
+        return response
+
     archive_file_path = SIGNBANK_PACKAGES_FOLDER + archive_file_name
 
-    video_urls = {os.path.splitext(os.path.basename(gv.videofile.name))[0]:
-                      reverse('dictionary:protected_media', args=[gv.small_video(use_name=True) or gv.videofile.name])
-                  for gv in GlossVideo.objects.filter(gloss__in=available_glosses, glossvideonme=None, glossvideoperspective=None, version=0)
-                  if gv.videofile and gv.videofile.name and os.path.exists(str(gv.videofile.path))
-                  and os.path.getmtime(str(gv.videofile.path)) > since_timestamp}
-    image_urls = {os.path.splitext(os.path.basename(gv.videofile.name))[0]:
-                       reverse('dictionary:protected_media', args=[gv.poster_file()])
-                  for gv in GlossVideo.objects.filter(gloss__in=available_glosses, glossvideonme=None, glossvideoperspective=None, version=0)
-                  if gv.videofile and gv.videofile.name and os.path.exists(str(gv.videofile.path))
-                  and os.path.getmtime(str(gv.videofile.path)) > since_timestamp}
-
-    collected_data = {'video_urls': video_urls,
-                      'image_urls': image_urls,
-                      'glosses': get_gloss_data(since_timestamp, language_code,
-                                                               dataset, inWebSet, extended_fields)}
-
-    if since_timestamp != 0:
-        collected_data['deleted_glosses'] = get_deleted_gloss_or_media_data('gloss', since_timestamp)
-        collected_data['deleted_videos'] = get_deleted_gloss_or_media_data('video', since_timestamp)
-        collected_data['deleted_images'] = get_deleted_gloss_or_media_data('image', since_timestamp)
+    collected_data = package_cache.delta_data(since_timestamp)
+    collected_data['deleted_glosses'] = get_deleted_gloss_or_media_data('gloss', since_timestamp)
+    collected_data['deleted_videos'] = get_deleted_gloss_or_media_data('video', since_timestamp)
+    collected_data['deleted_images'] = get_deleted_gloss_or_media_data('image', since_timestamp)
 
     create_zip_with_json_files(collected_data, archive_file_path)
 
@@ -2603,7 +2077,6 @@ def gloss_api_get_sign_name_and_media_info(request):
 def import_csv_create_sentences(request):
     user = request.user
     user_datasets = get_objects_for_user(user, 'change_dataset', Dataset)
-    user_datasets_names = [dataset.acronym for dataset in user_datasets]
 
     selected_datasets = get_selected_datasets(request)
     dataset_languages = get_dataset_languages(selected_datasets)
@@ -2619,7 +2092,6 @@ def import_csv_create_sentences(request):
             translation_languages_dict[dataset_object].append(language_tuple)
 
     seen_datasets = []
-    seen_dataset_names = []
 
     encoding_error = False
 
@@ -2628,9 +2100,6 @@ def import_csv_create_sentences(request):
     error = []
     creation = []
     gloss_already_exists = []
-    earlier_creation_same_csv = {}
-    earlier_creation_annotationidgloss = {}
-    earlier_creation_lemmaidgloss = {}
 
     # Propose changes
     if len(request.FILES) > 0:
@@ -2640,7 +2109,7 @@ def import_csv_create_sentences(request):
         try:
             # files that will fail here include those renamed to .csv which are not csv
             # non UTF-8 encoded files also fail
-            csv_text = new_file.read().decode('UTF-8')
+            csv_file = stage_csv_upload(new_file, 'UTF-8')
         except (UnicodeDecodeError, UnicodeError):
             feedback_message = gettext('Unrecognised format in selected CSV file.')
             messages.add_message(request, messages.ERROR, feedback_message)
@@ -2657,8 +2126,8 @@ def import_csv_create_sentences(request):
                            'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
                            'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
 
-        fatal_error = False
-        csv_lines = re.compile('[\r\n]+').split(csv_text)  # split the csv text on any combination of newline characters
+        # the header is looked for in the first lines, the rows are checked by a CSVImportJob
+        csv_lines = read_csv_head(csv_file, 'UTF-8')
 
         delimiter_okay, found_delimiter = detect_delimiter(csv_lines)
         keys_found, missing_keys, extra_keys, csv_header, csv_body = split_csv_lines_sentences_header_body(dataset_languages, csv_lines,
@@ -2673,6 +2142,7 @@ def import_csv_create_sentences(request):
             else:
                 feedback_message = gettext('Some required column headers are missing: {missingkeys}').format(missingkeys=', '.join(missing_keys))
             messages.add_message(request, messages.ERROR, feedback_message)
+            remove_csv_upload(csv_file)
             return render(request, 'dictionary/import_csv_create_sentences.html',
                           {'form': uploadform, 'stage': 0, 'changes': changes,
                            'error': error,
@@ -2687,6 +2157,7 @@ def import_csv_create_sentences(request):
             # this is intended to assist the user in the case that a wrong file was selected
             feedback_message = gettext('Extra columns were found: {extrakeys}').format(extrakeys=', '.join(extra_keys))
             messages.add_message(request, messages.ERROR, feedback_message)
+            remove_csv_upload(csv_file)
             return render(request, 'dictionary/import_csv_create_sentences.html',
                           {'form': uploadform, 'stage': 0, 'changes': changes,
                            'error': error,
@@ -2697,156 +2168,33 @@ def import_csv_create_sentences(request):
                            'USE_REGULAR_EXPRESSIONS': USE_REGULAR_EXPRESSIONS,
                            'SHOW_DATASET_INTERFACE_OPTIONS': SHOW_DATASET_INTERFACE_OPTIONS})
 
-        # create a template for an empty row with the desired number of columns
-        empty_row = [''] * len(csv_header)
-        for nl, line in enumerate(csv_body):
-            if len(line) == 0:
-                # this happens at the end of the file
-                continue
-            values = csv.reader([line], delimiter=found_delimiter).__next__()
-            if values == empty_row:
-                continue
-
-            # construct value_dict for row
-            value_dict = {}
-            for nv, value in enumerate(values):
-                if nv >= len(csv_header):
-                    # this has already been checked above
-                    # it's here to avoid needing an exception on the subscript [nv]
-                    continue
-                value_dict[csv_header[nv]] = value
-
-            # 'Dataset' in value_dict keys, checked above
-            dataset_name = value_dict['Dataset'].strip()
-
-            # Check whether the user may change the dataset of the current row
-            if dataset_name not in seen_dataset_names:
-                if seen_datasets:
-                    # already seen a dataset
-                    # this is a different dataset
-                    e3 = gettext("Row {row}: A different dataset is mentioned.").format(row=str(nl+2))
-                    e4 = gettext('You can only create glosses for one dataset at a time.')
-                    e5 = gettext('To create glosses in multiple datasets, use a separate CSV file for each dataset.')
-                    error.append(e3)
-                    error.append(e4)
-                    error.append(e5)
-                    break
-
-                # only process a dataset_name once for the csv file being imported
-                # catch possible empty values for dataset, primarily for pretty printing error message
-                if dataset_name in ['', None, 0, 'NULL']:
-                    e_dataset_empty = gettext("Row {row}: The Dataset is missing.").format(row=str(nl+2))
-                    error.append(e_dataset_empty)
-                    break
-                try:
-                    dataset = Dataset.objects.get(acronym=dataset_name)
-                except ObjectDoesNotExist:
-                    # An error message should be returned here, the dataset does not exist
-                    e_dataset_not_found = gettext("Row {row}: Dataset {acronym} does not exist.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
-                    error.append(e_dataset_not_found)
-                    break
-
-                if dataset_name not in user_datasets_names:
-                    e3 = gettext("Row {row}: You are not allowed to change dataset {acronym}.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
-                    error.append(e3)
-                    break
-                if dataset not in selected_datasets:
-                    e3 = gettext("Row {row}: Dataset {acronym} is not selected.").format(row=str(nl+2), acronym=value_dict['Dataset'].strip())
-                    error.append(e3)
-                    break
-                if seen_datasets:
-                    # already seen a dataset
-                    if dataset not in seen_datasets:
-                        # seen more than one dataset
-                        # e4 = 'You are attempting to modify two datasets.'
-
-                        e4 = gettext('You can only create sentences for one dataset at a time.')
-                        e5 = gettext('To create sentences in multiple datasets, use a separate CSV file for each dataset.')
-                        error.append(e4)
-                        error.append(e5)
-                        break
-
-                else:
-                    seen_datasets.append(dataset)
-                    seen_dataset_names.append(dataset_name)
-
-            translation_languages = dataset.translation_languages.all()
-
-            sentence_translations = dict()
-            # check sentence translations
-            for language in translation_languages:
-                language_name = getattr(language, DEFAULT_LANGUAGE_HEADER_COLUMN['English'])
-                column_name = "Example Sentences (%s)" % language_name
-                sentence_text = value_dict[column_name].strip()
-                # also stores empty values
-                sentence_translations[language] = sentence_text
-
-            # put creation of value_dict for the new gloss inside an exception to catch any unexpected errors
-            # errors are kept track of as user feedback, but the code needs to be safe
-            try:
-                (new_gloss, already_exists, error_create, earlier_creation_same_csv, earlier_creation_annotationidgloss, earlier_creation_lemmaidgloss) \
-                    = create_sentence_from_valuedict(value_dict,dataset,nl, earlier_creation_same_csv, earlier_creation_annotationidgloss, earlier_creation_lemmaidgloss)
-            except (KeyError, ValueError):
-                print('import csv create sentences: got this far in processing loop before exception in row ', str(nl+2))
-                break
-            if len(error_create):
-                errors_found_string = '\n'.join(error_create)
-                error.append(errors_found_string)
-            else:
-                creation += new_gloss
-            # whether or not glosses mentioned in the csv file already exist is accumulated in gloss_already_exists
-            # one version of the template also shows these with the errors, so the user might remove extra data
-            # from the csv to reduce its size
-            gloss_already_exists += already_exists
-            continue
-
-        stage = 1
+        job = start_csv_import_job(user, CSVImportJob.CREATE_SENTENCES, csv_file,
+                                   csv_import_parameters('UTF-8', found_delimiter, csv_header, csv_lines, csv_body,
+                                                         selected_datasets))
+        return redirect(reverse('import_csv_create_sentences') + '?job=' + str(job.id))
 
     # Do changes
     elif len(request.POST) > 0:
-
-        glosses_to_create = dict()
-
-        for key, new_value in request.POST.items():
-
-            # obtain tuple values for each proposed gloss
-            # pk is the row number in the import file!
-            try:
-                pk, fieldname = key.split('.')
-
-                if pk not in glosses_to_create.keys():
-                    glosses_to_create[pk] = dict()
-                glosses_to_create[pk][fieldname] = new_value
-
-            except ValueError:
-                # when the database token csrfmiddlewaretoken is passed, there is no dot
-                continue
-
-        # these should be error free based on the django template import_csv_create_sentences.html
-        for row in glosses_to_create.keys():
-            gloss_id = glosses_to_create[row]['gloss_pk']
-
-            try:
-                gloss = Gloss.objects.get(id=int(gloss_id), archived=False)
-            except ObjectDoesNotExist:
-                # this is an error, this should have already been caught
-                e1 = f'Gloss not found: {gloss_id}'
-                error.append(e1)
-                continue
-
-            dataset_acronym = glosses_to_create[row]['dataset']
-
-            try:
-                dataset = Dataset.objects.get(acronym=dataset_acronym)
-            except ObjectDoesNotExist:
-                # this is an error, this should have already been caught
-                e1 = f'Dataset not found: {dataset_acronym}'
-                error.append(e1)
-                continue
-
-            csv_create_sentence(request, gloss, dataset_languages, glosses_to_create[row], create=True)
-
-        stage = 2
+        # the confirmed rows are applied by the job that checked them
+        job = None
+        if request.GET.get('job', '').isdigit():
+            job = get_object_or_404(CSVImportJob, pk=int(request.GET['job']), user=user, kind=CSVImportJob.CREATE_SENTENCES)
+        job = start_csv_apply_job(user, CSVImportJob.CREATE_SENTENCES, job, request.POST, selected_datasets)
+        return redirect(reverse('import_csv_create_sentences') + '?job=' + str(job.id))
+
+    # Show the progress or the results of checking or applying the rows
+    elif request.GET.get('job', '').isdigit():
+        job = get_object_or_404(CSVImportJob, pk=int(request.GET['job']), user=user, kind=CSVImportJob.CREATE_SENTENCES)
+        if job.status != CSVImportJob.DONE:
+            return render_csv_import_job(request, job)
+        if job.phase == CSVImportJob.APPLY:
+            error = csv_apply_results(job)['error']
+            stage = 2
+        else:
+            results = csv_import_results(job)
+            changes, error, creation = results['changes'], results['error'], results['creation']
+            gloss_already_exists, seen_datasets = results['gloss_already_exists'], results['seen_datasets']
+            stage = 1
 
     # Show uploadform
     else:
@@ -1,12 +1,15 @@
 import os
 import json
 import csv
+import hashlib
 import locale
+from collections import defaultdict
 
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 from django.shortcuts import get_object_or_404, HttpResponseRedirect, HttpResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
 
 from django.utils.translation import gettext_lazy as _
@@ -15,9 +18,11 @@ from signbank.settings.server_specific import (PREFIX_URL, WRITABLE_FOLDER, TEST
                                                DATASET_METADATA_DIRECTORY, METADATA_LOCATION,
                                                MINIMUM_OVERLAP_BETWEEN_SIGNING_HANDS)
 
-from signbank.dictionary.models import Dataset, Gloss, Corpus, Document, Speaker, GlossFrequency
-from signbank.tools import get_default_annotationidglosstranslation, get_eaf_creation_time
-from signbank.sign_counter import SignCounter
+from signbank.dictionary.models import (Dataset, Gloss, Corpus, Document, Speaker, GlossFrequency,
+                                       DocumentFrequencyCache)
+from signbank.dictionary.corpus_statistics import invalidate_corpus_statistics
+from signbank.tools import get_default_annotationidglosstranslation, get_eaf_creation_time, get_checksum_for_path
+from signbank.sign_counter import SignCounter, frequencies_per_person_per_file
 
 
 def get_gloss_from_frequency_dict(dataset_acronym, gloss_id_or_value):
@@ -647,28 +652,35 @@ def dictionary_speakerIdentifiers_to_speakerObjects(dataset_acronym):
 
 
 def dictionary_documentIdentifiers_to_documentObjects(corpus, document_identifiers_of_eaf_files, document_creation_dates_of_eaf_files):
-    dictionary_documentIds_to_documentObjs = {}
+    # to speed up processing later, document objects are already looked up
+    dictionary_documentIds_to_documentObjs = dict((document.identifier, document) for document in
+                                                  Document.objects.filter(corpus=corpus))
     for document_id in document_identifiers_of_eaf_files:
-        try:
-            document = Document.objects.get(corpus=corpus, identifier=document_id)
-        except ObjectDoesNotExist:
-            document = Document()
-            document.identifier = document_id
-            document.corpus = corpus
-            document.creation_time = document_creation_dates_of_eaf_files[document_id]
-            document.save()
-        # to speed up processing later, document objects are already looked up
+        if document_id in dictionary_documentIds_to_documentObjs:
+            continue
+        document = Document()
+        document.identifier = document_id
+        document.corpus = corpus
+        document.creation_time = document_creation_dates_of_eaf_files[document_id]
+        document.save()
         dictionary_documentIds_to_documentObjs[document_id] = document
-    return dictionary_documentIds_to_documentObjs
+    return dict((document_id, dictionary_documentIds_to_documentObjs[document_id])
+                for document_id in document_identifiers_of_eaf_files)
 
 
-def process_frequencies_per_speaker(dataset_acronym, speaker_objects, document_objects, frequencies_per_speaker):
+def process_frequencies_per_speaker(dataset_acronym, speaker_objects, document_objects, frequencies_per_speaker,
+                                    glosses_of_values=None):
 
     if not frequencies_per_speaker:
         return [],{},[]
     glosses_not_in_signbank = []
     updated_glosses = {}
     glosses_in_other_dataset = []
+    # the frequencies of the same gloss value are looked up once
+    if glosses_of_values is None:
+        glosses_of_values = {}
+    # (speaker id, document id, gloss id) -> frequency
+    new_frequencies = {}
     for pers in frequencies_per_speaker.keys():
         if pers not in speaker_objects.keys():
             print('Corpus ', dataset_acronym, ': Speaker not found: ', pers)
@@ -679,23 +691,16 @@ def process_frequencies_per_speaker(dataset_acronym, speaker_objects, document_o
                 continue
             gloss_frequency_list = sorted(frequencies_per_speaker[pers][doc].items())
             for gloss_id_or_value, cnt in gloss_frequency_list:
-                gloss = get_gloss_from_frequency_dict(dataset_acronym, gloss_id_or_value)
+                if gloss_id_or_value not in glosses_of_values:
+                    glosses_of_values[gloss_id_or_value] = get_gloss_from_frequency_dict(dataset_acronym,
+                                                                                         gloss_id_or_value)
+                gloss = glosses_of_values[gloss_id_or_value]
                 if gloss:
                     # the gloss returned has a lemma and a dataset
                     if gloss.dataset.acronym == dataset_acronym:
                         if gloss.id not in updated_glosses.keys():
                             updated_glosses[gloss.id] = gloss
-                        try:
-                            gloss_frequency = GlossFrequency.objects.get(speaker=speaker_objects[pers],
-                                                                         document=document_objects[doc], gloss=gloss)
-                            gloss_frequency.frequency = cnt
-                        except ObjectDoesNotExist:
-                            gloss_frequency = GlossFrequency()
-                            gloss_frequency.speaker = speaker_objects[pers]
-                            gloss_frequency.document = document_objects[doc]
-                            gloss_frequency.gloss = gloss
-                            gloss_frequency.frequency = cnt
-                        gloss_frequency.save()
+                        new_frequencies[(speaker_objects[pers].id, document_objects[doc].id, gloss.id)] = cnt
                     else:
                         # found a matching gloss in a different dataset
                         annotation_matching_gloss_id = get_default_annotationidglosstranslation(gloss)
@@ -706,10 +711,40 @@ def process_frequencies_per_speaker(dataset_acronym, speaker_objects, document_o
                     if gloss_id_or_value not in glosses_not_in_signbank:
                         glosses_not_in_signbank += [gloss_id_or_value]
 
+    save_gloss_frequencies(new_frequencies)
+
     # print('glosses not in signbank: ', glosses_not_in_signbank)
     return glosses_not_in_signbank, updated_glosses, glosses_in_other_dataset
 
 
+def save_gloss_frequencies(new_frequencies):
+    """Store a dict (speaker id, document id, gloss id) -> frequency as GlossFrequency objects in one transaction"""
+    if not new_frequencies:
+        return
+    speaker_ids = set(speaker_id for (speaker_id, document_id, gloss_id) in new_frequencies.keys())
+    document_ids = set(document_id for (speaker_id, document_id, gloss_id) in new_frequencies.keys())
+    existing_frequencies = {}
+    for gloss_frequency in GlossFrequency.objects.filter(speaker_id__in=speaker_ids, document_id__in=document_ids):
+        key = (gloss_frequency.speaker_id, gloss_frequency.document_id, gloss_frequency.gloss_id)
+        existing_frequencies.setdefault(key, gloss_frequency)
+
+    frequencies_to_create = []
+    frequencies_to_update = []
+    for (speaker_id, document_id, gloss_id), cnt in new_frequencies.items():
+        gloss_frequency = existing_frequencies.get((speaker_id, document_id, gloss_id))
+        if gloss_frequency is None:
+            frequencies_to_create.append(GlossFrequency(speaker_id=speaker_id, document_id=document_id,
+                                                        gloss_id=gloss_id, frequency=cnt))
+        elif gloss_frequency.frequency != cnt:
+            gloss_frequency.frequency = cnt
+            frequencies_to_update.append(gloss_frequency)
+
+    with transaction.atomic():
+        GlossFrequency.objects.bulk_create(frequencies_to_create, batch_size=1000)
+        GlossFrequency.objects.bulk_update(frequencies_to_update, ['frequency'], batch_size=1000)
+    invalidate_corpus_statistics()
+
+
 def configure_corpus_documents(**kwargs):
 
     for corpus in Corpus.objects.all():
@@ -720,10 +755,8 @@ def configure_corpus_documents(**kwargs):
 def configure_corpus_documents_for_dataset(dataset_acronym, **kwargs):
     if 'testing' in kwargs.keys():
         dataset_eaf_folder = os.path.join(WRITABLE_FOLDER, TEST_DATA_DIRECTORY, DATASET_EAF_DIRECTORY,dataset_acronym)
-        metadata_location = os.path.join(WRITABLE_FOLDER, TEST_DATA_DIRECTORY, DATASET_METADATA_DIRECTORY, dataset_acronym + '_metadata.csv')
     else:
         dataset_eaf_folder = os.path.join(WRITABLE_FOLDER, DATASET_EAF_DIRECTORY, dataset_acronym)
-        metadata_location = os.path.join(WRITABLE_FOLDER, DATASET_METADATA_DIRECTORY, dataset_acronym + '_metadata.csv')
 
     # create a Corpus object if it does not exist
     try:
@@ -743,106 +776,151 @@ def configure_corpus_documents_for_dataset(dataset_acronym, **kwargs):
         return
 
     # create Document objects for the EAF files
-    eaf_file_paths_small_files = []
-    eaf_file_paths_large_files = []
+    eaf_file_paths = []
     for file_or_folder in os.listdir(dataset_eaf_folder):
         if os.path.isdir(os.path.join(dataset_eaf_folder, file_or_folder)):
             for filename in os.listdir(os.path.join(dataset_eaf_folder, file_or_folder)):
-                filesize = os.path.getsize(dataset_eaf_folder + os.sep + str(file_or_folder) + os.sep + str(filename))
-                if filesize > 50000:
-                    eaf_file_paths_large_files.append(dataset_eaf_folder + os.sep + str(file_or_folder) + os.sep + str(filename))
-                else:
-                    eaf_file_paths_small_files.append(dataset_eaf_folder + os.sep + str(file_or_folder) + os.sep + str(filename))
+                eaf_file_paths.append(dataset_eaf_folder + os.sep + str(file_or_folder) + os.sep + str(filename))
         else:
-            filesize = os.path.getsize(dataset_eaf_folder + os.sep + str(file_or_folder))
-            if filesize > 50000:
-                eaf_file_paths_large_files.append(dataset_eaf_folder + os.sep + str(file_or_folder))
-            else:
-                eaf_file_paths_small_files.append(dataset_eaf_folder + os.sep + str(file_or_folder))
+            eaf_file_paths.append(dataset_eaf_folder + os.sep + str(file_or_folder))
 
-    # fetch document identifiers and creation dates for all eaf files
-    # get filenames out of paths to use as document identifiers
-    document_identifiers = []
-    document_creation_dates = {}
-    for eaf_path in eaf_file_paths_small_files + eaf_file_paths_large_files:
-        file_basename = os.path.basename(eaf_path)
-        basename = os.path.splitext(file_basename)[0]
-        document_identifiers += [basename]
-        document_creation_dates[basename] = get_eaf_creation_time(eaf_path)
+    (parsed_documents, updated_glosses) = count_corpus_eaf_files(dataset_acronym, corpus,
+                                                                 dictionary_speakerIds_to_speakerObjs, eaf_file_paths)
 
-    # create document objects for all document identifiers, if don't already exist
-    dictionary_documentIds_to_documentObjs = dictionary_documentIdentifiers_to_documentObjects(corpus,
-                                                                                               document_identifiers,
-                                                                                               document_creation_dates)
+    # after processing GlossFreqyency data for all glosses in the EAF files, calculate the relevant info per gloss
+    for gid in updated_glosses.keys():
+        updated_glosses[gid].tokNo = get_gloss_tokNo(dataset_acronym, gid)
+        updated_glosses[gid].tokNoSgnr = get_gloss_tokNoSgnr(dataset_acronym, gid)
+        updated_glosses[gid].save()
 
-    updated_glosses = {}
-    glosses_not_in_signbank = []
-    glosses_in_other_dataset = []
-    if eaf_file_paths_small_files:
-        sign_counter = SignCounter(metadata_location,
-                                   eaf_file_paths_small_files,
-                                   MINIMUM_OVERLAP_BETWEEN_SIGNING_HANDS)
 
-        try:
-            sign_counter.run()
-        except KeyError:
-            # the counter scripts generate a key error if a speaker is not found
-            print('configure_corpus_documents: Speakers not found for corpus ', eaf_file_paths_small_files)
-            return
+def document_checksum(eaf_paths):
+    # documents with the same identifier in different folders are counted together
+    checksums = [get_checksum_for_path(eaf_path) or '' for eaf_path in sorted(eaf_paths)]
+    if len(checksums) == 1:
+        return checksums[0]
+    return hashlib.md5(''.join(checksums).encode('utf-8')).hexdigest()
 
-        # we get the frequencies from the sign_counter object
-        try:
-            frequencies_per_speaker = sign_counter.freqsPerPerson
-        except KeyError:
-            print('configure_corpus_documents: No frequency data calculated for ', eaf_file_paths_small_files)
-            frequencies_per_speaker = {}
-
-        (glosses_not_in_signbank, updated_glosses, glosses_in_other_dataset) = process_frequencies_per_speaker(dataset_acronym,
-                                                                                     dictionary_speakerIds_to_speakerObjs,
-                                                                                     dictionary_documentIds_to_documentObjs,
-                                                                                     frequencies_per_speaker)
-
-    # process big files
-    for large_eaf_file in eaf_file_paths_large_files:
-        sign_counter = SignCounter(metadata_location,
-                                   [large_eaf_file],
-                                   MINIMUM_OVERLAP_BETWEEN_SIGNING_HANDS)
 
-        try:
-            sign_counter.run()
-        except KeyError:
-            # KeyError is raised if the participants in the eaf file are not found in the metadata file
-            print('configure_corpus_documents: Speakers not found for document: ', large_eaf_file)
+def speakers_checksum(speaker_objects):
+    """Checksum of the persons of the EAF files and the ids of their speakers, as found in the metadata"""
+    persons_and_speakers = sorted((person, speaker.id) for person, speaker in speaker_objects.items())
+    return hashlib.md5(json.dumps(persons_and_speakers).encode('utf-8')).hexdigest()
+
+
+def count_corpus_eaf_files(dataset_acronym, corpus, speaker_objects, eaf_paths):
+    """Store the GlossFrequency objects of the EAF files of a corpus, using the DocumentFrequencyCache
+    Only the files whose checksum changed are parsed. The cached counts of an unchanged file are resolved again
+    if one of its unmatched gloss values is now a gloss of the dataset, or one of its glosses no longer is,
+    or if the speakers of the persons changed since the counts were stored.
+    Returns the identifiers of the parsed documents and a dictionary of the glosses whose frequencies changed"""
+    paths_of_documents = defaultdict(list)
+    for eaf_path in eaf_paths:
+        paths_of_documents[os.path.splitext(os.path.basename(eaf_path))[0]].append(eaf_path)
+    checksums = dict((document_id, document_checksum(paths)) for document_id, paths in paths_of_documents.items())
+    caches = dict((cache.document.identifier, cache) for cache in
+                  DocumentFrequencyCache.objects.filter(document__corpus=corpus).select_related('document'))
+    changed_documents = sorted(document_id for document_id in paths_of_documents.keys()
+                               if document_id not in caches or caches[document_id].checksum != checksums[document_id])
+
+    # only the changed files are opened to get their creation time
+    creation_dates = {}
+    for document_id in changed_documents:
+        creation_dates[document_id] = max(get_eaf_creation_time(eaf_path)
+                                          for eaf_path in paths_of_documents[document_id])
+    document_objects = dictionary_documentIdentifiers_to_documentObjects(corpus, sorted(paths_of_documents.keys()),
+                                                                         creation_dates)
+
+    glosses_of_values = {}
+
+    def dataset_gloss_of_value(gloss_id_or_value):
+        if gloss_id_or_value not in glosses_of_values:
+            glosses_of_values[gloss_id_or_value] = get_gloss_from_frequency_dict(dataset_acronym, gloss_id_or_value)
+        gloss = glosses_of_values[gloss_id_or_value]
+        if gloss and gloss.dataset.acronym == dataset_acronym:
+            return gloss
+        return None
+
+    frequencies_of_documents = {}
+    current_speakers_checksum = speakers_checksum(speaker_objects)
+    gloss_ids_in_dataset = set(Gloss.objects.filter(lemma__dataset__acronym=dataset_acronym).values_list('id', flat=True))
+    for document_id, cache in caches.items():
+        if document_id not in paths_of_documents or document_id in creation_dates:
+            continue
+        if cache.speakers_checksum == current_speakers_checksum \
+                and all(gloss_id in gloss_ids_in_dataset for gloss_id in cache.get_gloss_ids().values()) \
+                and not any(dataset_gloss_of_value(value) for value in cache.get_unmatched()):
             continue
+        frequencies_of_documents[document_id] = cache.get_frequencies()
+
+    changed_paths = [eaf_path for document_id in changed_documents for eaf_path in paths_of_documents[document_id]]
+    for eaf_path, frequencies_per_person in frequencies_per_person_per_file(changed_paths,
+                                                                           MINIMUM_OVERLAP_BETWEEN_SIGNING_HANDS):
+        document_id = os.path.splitext(os.path.basename(eaf_path))[0]
+        document_frequencies = frequencies_of_documents.setdefault(document_id, {})
+        for person, documents in frequencies_per_person.items():
+            person_frequencies = document_frequencies.setdefault(person, {})
+            for gloss_id_or_value, cnt in documents.get(document_id, {}).items():
+                person_frequencies[gloss_id_or_value] = person_frequencies.get(gloss_id_or_value, 0) + cnt
+
+    if not frequencies_of_documents:
+        return [], {}
+
+    frequencies_per_speaker = defaultdict(dict)
+    for document_id, document_frequencies in frequencies_of_documents.items():
+        for person, person_frequencies in document_frequencies.items():
+            frequencies_per_speaker[person][document_id] = person_frequencies
+
+    # the frequencies of the counted documents are replaced, glosses that are no longer in them are updated too
+    counted_document_ids = [document_objects[document_id].id for document_id in frequencies_of_documents.keys()]
+    previous_frequencies = GlossFrequency.objects.filter(document_id__in=counted_document_ids)
+    previous_gloss_ids = set(previous_frequencies.values_list('gloss_id', flat=True))
+    with transaction.atomic():
+        previous_frequencies.delete()
+        (glosses_not_in_signbank, updated_glosses, glosses_in_other_dataset) = process_frequencies_per_speaker(
+            dataset_acronym, speaker_objects, document_objects, frequencies_per_speaker, glosses_of_values)
+    invalidate_corpus_statistics()
+    for gloss in Gloss.objects.filter(id__in=previous_gloss_ids - set(updated_glosses.keys())):
+        updated_glosses[gloss.id] = gloss
+
+    caches_to_create, caches_to_update = [], []
+    for document_id, document_frequencies in frequencies_of_documents.items():
+        gloss_ids, unmatched = {}, []
+        for gloss_id_or_value in sorted(set(value for person_frequencies in document_frequencies.values()
+                                            for value in person_frequencies.keys())):
+            gloss = dataset_gloss_of_value(gloss_id_or_value)
+            if gloss:
+                gloss_ids[gloss_id_or_value] = gloss.id
+            else:
+                unmatched.append(gloss_id_or_value)
+        cache = caches.get(document_id)
+        if cache is None:
+            cache = DocumentFrequencyCache(document=document_objects[document_id])
+            caches_to_create.append(cache)
+        else:
+            caches_to_update.append(cache)
+        cache.checksum = checksums[document_id]
+        cache.speakers_checksum = current_speakers_checksum
+        cache.frequencies = json.dumps(document_frequencies, sort_keys=True)
+        cache.gloss_ids = json.dumps(gloss_ids, sort_keys=True)
+        cache.unmatched = json.dumps(unmatched)
 
-        # we get the frequencies from the sign_counter object
-        try:
-            frequencies_per_speaker_sub = sign_counter.freqsPerPerson
-        except KeyError:
-            print('except KeyError after sign_counter.freqsPerPerson, large file: ', large_eaf_file)
-            frequencies_per_speaker_sub = {}
-
-        (glosses_not_in_signbank_sub, updated_glosses_sub, glosses_in_other_dataset_sub) = process_frequencies_per_speaker(dataset_acronym,
-                                                                                             dictionary_speakerIds_to_speakerObjs,
-                                                                                             dictionary_documentIds_to_documentObjs,
-                                                                                             frequencies_per_speaker_sub)
-        for gloss_id_or_value in glosses_not_in_signbank_sub:
-            if gloss_id_or_value not in glosses_not_in_signbank:
-                glosses_not_in_signbank.append(gloss_id_or_value)
-
-        for gloss_id in updated_glosses_sub.keys():
-            if gloss_id not in updated_glosses.keys():
-                updated_glosses[gloss_id] = updated_glosses_sub[gloss_id]
-
-        for gloss_id_or_value in glosses_in_other_dataset_sub:
-            if gloss_id_or_value not in glosses_in_other_dataset:
-                glosses_in_other_dataset.append(gloss_id_or_value)
+    documents_to_update = []
+    for document_id in changed_documents:
+        # update the creation_date to that of the eaf files that were updated
+        document_objects[document_id].creation_time = creation_dates[document_id]
+        documents_to_update.append(document_objects[document_id])
 
-    # after processing GlossFreqyency data for all glosses in the EAF files, calculate the relevant info per gloss
-    for gid in updated_glosses.keys():
-        updated_glosses[gid].tokNo = get_gloss_tokNo(dataset_acronym, gid)
-        updated_glosses[gid].tokNoSgnr = get_gloss_tokNoSgnr(dataset_acronym, gid)
-        updated_glosses[gid].save()
+    with transaction.atomic():
+        DocumentFrequencyCache.objects.bulk_create(caches_to_create, batch_size=500)
+        DocumentFrequencyCache.objects.bulk_update(caches_to_update, ['checksum', 'speakers_checksum', 'frequencies',
+                                                                      'gloss_ids', 'unmatched'], batch_size=500)
+        Document.objects.bulk_update(documents_to_update, ['creation_time'], batch_size=500)
+
+    # for the purposes of debugging, this is the data that is accumulated during processing
+    # print('count_corpus_eaf_files: glosses not in signbank: ', glosses_not_in_signbank)
+    # print('count_corpus_eaf_files: glosses_in_other_dataset: ', glosses_in_other_dataset)
+    return changed_documents, updated_glosses
 
 
 def get_path_of_eaf_file(dataset_eaf_folder, eaf_paths, document_id):
@@ -862,10 +940,8 @@ def get_path_of_eaf_file(dataset_eaf_folder, eaf_paths, document_id):
 def update_corpus_counts(dataset_acronym, **kwargs):
     if 'testing' in kwargs.keys():
         dataset_eaf_folder = os.path.join(WRITABLE_FOLDER, TEST_DATA_DIRECTORY, DATASET_EAF_DIRECTORY, dataset_acronym)
-        metadata_location = os.path.join(WRITABLE_FOLDER, TEST_DATA_DIRECTORY, DATASET_METADATA_DIRECTORY, dataset_acronym + '_metadata.csv')
     else:
         dataset_eaf_folder = os.path.join(WRITABLE_FOLDER, DATASET_EAF_DIRECTORY, dataset_acronym)
-        metadata_location = os.path.join(WRITABLE_FOLDER, DATASET_METADATA_DIRECTORY,dataset_acronym + '_metadata.csv')
 
     try:
         corpus = Corpus.objects.get(name=dataset_acronym)
@@ -882,122 +958,10 @@ def update_corpus_counts(dataset_acronym, **kwargs):
 
     uploaded_paths = uploaded_eaf_paths(dataset_acronym, **kwargs)
 
-    eaf_file_paths_small_files = []
-    eaf_file_paths_large_files = []
-    for filename in uploaded_paths:
-        filesize = os.path.getsize(filename)
-        if filesize > 50000:
-            eaf_file_paths_large_files.append(filename)
-        else:
-            eaf_file_paths_small_files.append(filename)
-
-    existing_documents = Document.objects.filter(corpus__name=dataset_acronym)
-    existing_documents_creation_dates = {}
-    for d in existing_documents:
-        existing_documents_creation_dates[d.identifier] = d.creation_time
-
-    document_identifiers_of_eaf_files = []
-    document_creation_dates_of_eaf_files = {}
-    all_eaf_files = eaf_file_paths_small_files + eaf_file_paths_large_files
-    for eaf_path in all_eaf_files:
-        file_basename = os.path.basename(eaf_path)
-        basename = os.path.splitext(file_basename)[0]
-        document_identifiers_of_eaf_files += [basename]
-        document_creation_dates_of_eaf_files[basename] = get_eaf_creation_time(eaf_path)
-
-    # the initial idea what to only update modified documents
-    # however, glosses in the eaf files previously not found in the corpus may have been added since last processing
-    # this ends up just storing all the document ids of eaf files
-    documents_to_update = []
-
-    # create document objects for all document identifiers, if don't already exist
-    dictionary_documentIds_to_documentObjs = dictionary_documentIdentifiers_to_documentObjects(corpus,
-                                                                                               document_identifiers_of_eaf_files,
-                                                                                               document_creation_dates_of_eaf_files)
-
-    update_small_eaf_files = []
-    for eaf_path in eaf_file_paths_small_files:
-        file_basename = os.path.basename(eaf_path)
-        basename = os.path.splitext(file_basename)[0]
-        update_small_eaf_files += [ eaf_path ]
-        documents_to_update += [ basename ]
-
-    update_large_eaf_files = []
-    for eaf_path in eaf_file_paths_large_files:
-        file_basename = os.path.basename(eaf_path)
-        basename = os.path.splitext(file_basename)[0]
-        update_large_eaf_files += [ eaf_path ]
-        documents_to_update += [basename]
-
-    glosses_not_in_signbank = []
-    updated_glosses = {}
-    glosses_in_other_dataset = []
-    if update_small_eaf_files:
-        sign_counter = SignCounter(metadata_location,
-                                   update_small_eaf_files,
-                                   MINIMUM_OVERLAP_BETWEEN_SIGNING_HANDS)
-        try:
-            sign_counter.run()
-        except KeyError:
-            # the counter scripts generate a key error if a speaker is not found
-            print('frequency.update_corpus_counts: Speakers not found for corpus ', eaf_file_paths_small_files)
-            return
-
-        try:
-            frequencies_per_speaker = sign_counter.freqsPerPerson
-        except KeyError:
-            frequencies_per_speaker = {}
-
-        (glosses_not_in_signbank, updated_glosses, glosses_in_other_dataset) = process_frequencies_per_speaker(dataset_acronym,
-                                                                                     dictionary_speakerIds_to_speakerObjs,
-                                                                                     dictionary_documentIds_to_documentObjs,
-                                                                                     frequencies_per_speaker)
-
-
-    # this is used in testing on large data sets to skip the large eaf files
-    # more processing is done after the large files for loop
-    # if update_large_eaf_files:
-    #     update_large_eaf_files = []
-
-    # process big files
-    for large_eaf_file in update_large_eaf_files:
-        sign_counter = SignCounter(metadata_location,
-                                   [large_eaf_file],
-                                   MINIMUM_OVERLAP_BETWEEN_SIGNING_HANDS)
-        try:
-            sign_counter.run()
-        except KeyError:
-            # KeyError is raised if the participants in the eaf file are not found in the metadata file
-            print('frequency.update_corpus_counts: Speakers not found for document: ', large_eaf_file)
-            continue
-
-        # we get the frequencies from the sign_counter object
-        try:
-            frequencies_per_speaker_sub = sign_counter.freqsPerPerson
-        except (KeyError, ObjectDoesNotExist):
-            frequencies_per_speaker_sub = {}
-
-        (glosses_not_in_signbank_sub, updated_glosses_sub, glosses_in_other_dataset_sub) = process_frequencies_per_speaker(dataset_acronym,
-                                                                                             dictionary_speakerIds_to_speakerObjs,
-                                                                                             dictionary_documentIds_to_documentObjs,
-                                                                                             frequencies_per_speaker_sub)
-
-        for gloss_id_or_value in glosses_not_in_signbank_sub:
-            if gloss_id_or_value not in glosses_not_in_signbank:
-                glosses_not_in_signbank.append(gloss_id_or_value)
-
-        for gloss_id in updated_glosses_sub.keys():
-            if gloss_id not in updated_glosses.keys():
-                updated_glosses[gloss_id] = updated_glosses_sub[gloss_id]
-
-        for gloss_id_or_value in glosses_in_other_dataset_sub:
-            if gloss_id_or_value not in glosses_in_other_dataset:
-                glosses_in_other_dataset.append(gloss_id_or_value)
-
-    for did in documents_to_update:
-        # update the creation_date to that of the eaf files that were updated
-        dictionary_documentIds_to_documentObjs[did].creation_time = document_creation_dates_of_eaf_files[did]
-        dictionary_documentIds_to_documentObjs[did].save()
+    # only the modified documents are parsed, the cached counts of the others are stored again
+    # if glosses in the eaf files previously not found in the corpus have been added since last processing
+    (parsed_documents, updated_glosses) = count_corpus_eaf_files(dataset_acronym, corpus,
+                                                                 dictionary_speakerIds_to_speakerObjs, uploaded_paths)
 
     # revise the hard coded frequency fields tokNo and tokNoSgnr
     for gid in updated_glosses.keys():
@@ -1005,11 +969,9 @@ def update_corpus_counts(dataset_acronym, **kwargs):
         updated_glosses[gid].tokNoSgnr = get_gloss_tokNoSgnr(dataset_acronym, gid)
         updated_glosses[gid].save()
 
-    # for the purposes of debugging, this is the data that is accumulated during processing
-    # these could be incorporated into a return tuple and used elsewhere in the template for the corpus
+    # print('update_corpus_counts: parsed documents: ', parsed_documents)
     # print('update_corpus_counts: updated glosses: ', updated_glosses)
-    # print('update_corpus_counts: glosses not in signbank: ', glosses_not_in_signbank)
-    # print('update_corpus_counts: glosses_in_other_dataset: ', glosses_in_other_dataset)
+    return parsed_documents
 
 
 def update_corpus_document_counts(dataset_acronym, document_id, **kwargs):
@@ -1126,6 +1088,7 @@ def update_document_counts(request, dataset_id, document_id):
             except ObjectDoesNotExist:
                 print('GlossFrequency exists for Gloss but  not in updated glosses, but not retrieved properly: ', gl)
                 continue
+    invalidate_corpus_statistics()
     if updated_glosses:
         original_value = [ _('Glosses updated') + '\t' + document_date_stamp + '\t' + number_of_glosses ]
     else:
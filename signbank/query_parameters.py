@@ -1,6 +1,5 @@
 import re
 import datetime as DT
-from pathlib import Path
 
 from django import forms
 from django.db.models.functions import Concat
@@ -12,7 +11,7 @@ from django.utils.translation import gettext, gettext_lazy as _
 from tagging.models import TaggedItem, Tag
 
 from signbank.settings.base import EARLIEST_GLOSS_CREATION_DATE, DATE_FORMAT
-from signbank.settings.server_specific import (USE_REGULAR_EXPRESSIONS, WRITABLE_FOLDER,
+from signbank.settings.server_specific import (USE_REGULAR_EXPRESSIONS,
                                                GLOSS_LIST_DISPLAY_FIELDS, SEARCH_BY, HANDEDNESS_ARTICULATION_FIELDS, HANDSHAPE_ETYMOLOGY_FIELDS)
 from signbank.video.models import GlossVideo, GlossVideoNME
 from signbank.dictionary.models import (Language, SignLanguage, Dialect, Gloss, Morpheme, GlossSense, ExampleSentence,
@@ -176,62 +175,33 @@ def apply_language_filters_to_results(model, qs, query_parameters):
     return qs
 
 
-def matching_file_exists(videofile):
-    video_file_full_path = Path(WRITABLE_FOLDER, videofile)
-    if video_file_full_path.exists():
-        return True
-    else:
-        return False
-
-
 def apply_video_filters_to_results(model, qs, query_parameters):
     # The 'hasvideo' form field has these choices: [('0', '-'), ('2', _('Yes')), ('3', _('No'))]
-    gloss_prefix = 'gloss__' if model in [GlossSense, AnnotatedGloss] else ''
-    filter_id = gloss_prefix + 'id__in'
-    gloss_ids = [gl.id if model == Gloss else gl.gloss.id for gl in qs]
     if 'hasvideo' not in query_parameters.keys() or query_parameters['hasvideo'] not in ['2', '3']:
         return qs
-    glossvideo_queryset = GlossVideo.objects.filter(gloss__id__in=gloss_ids, glossvideonme=None, glossvideoperspective=None, version=0)
-    queryset_res = glossvideo_queryset.values('id', 'videofile')
+    gloss_prefix = 'gloss__' if model in [GlossSense, AnnotatedGloss] else ''
+    filter_id = gloss_prefix + 'id__in'
+    # the stored file_present of the videos is used, this is a subquery instead of a look at every file
+    primary_videos = GlossVideo.objects.filter(glossvideonme=None, glossvideoperspective=None, version=0)
     if query_parameters['hasvideo'] == '2':
         # '2' is the True choice
-        results = [qv['id'] for qv in queryset_res
-                   if matching_file_exists(qv['videofile'])]
-        gloss_video_objects = GlossVideo.objects.filter(id__in=results)
-        gloss_ids = [gv.gloss.id for gv in gloss_video_objects]
-    else:
-        # '3' is the False choice
-        results = [qv['id'] for qv in queryset_res
-                   if not matching_file_exists(qv['videofile'])]
-        gloss_video_objects = GlossVideo.objects.filter(id__in=results)
-        gloss_ids = [gv.gloss.id for gv in gloss_video_objects]
-        # add glosses to results if the gloss has no gloss video at all
-        null_videos = qs.filter(Q(**{gloss_prefix + 'glossvideo__isnull': True}))
-        gloss_ids_without_video = [gl.id if model == Gloss else gl.gloss.id for gl in null_videos]
-        gloss_ids = list(set(gloss_ids).union(gloss_ids_without_video))
-    return qs.filter(Q(**{filter_id: gloss_ids}))
+        return qs.filter(Q(**{filter_id: primary_videos.filter(file_present=True).values('gloss_id')}))
+    # '3' is the False choice
+    # add glosses to results if the gloss has no gloss video at all
+    return qs.filter(Q(**{filter_id: primary_videos.filter(file_present=False).values('gloss_id')})
+                     | ~Q(**{filter_id: GlossVideo.objects.values('gloss_id')}))
 
 
 def apply_nmevideo_filters_to_results(model, qs, query_parameters):
     # The 'hasnmevideo' form field has these choices: [('0', '-'), ('2', _('Yes')), ('3', _('No'))]
-    gloss_prefix = 'gloss__' if model in [GlossSense, AnnotatedGloss] else ''
-    filter_id = gloss_prefix + 'id__in'
-    gloss_ids = [gl.id if model == Gloss else gl.gloss.id for gl in qs]
     if 'hasnmevideo' not in query_parameters.keys() or query_parameters['hasnmevideo'] not in ['2', '3']:
         return qs
-    glossvideo_queryset = GlossVideoNME.objects.filter(gloss__id__in=gloss_ids, version=0)
-    queryset_res = glossvideo_queryset.values('id', 'videofile')
-    if query_parameters['hasnmevideo'] == '2':
-        # '2' is the True choice
-        results = [qv['id'] for qv in queryset_res
-                   if matching_file_exists(qv['videofile'])]
-    else:
-        # '3' is the False choice
-        results = [qv['id'] for qv in queryset_res
-                   if not matching_file_exists(qv['videofile'])]
-    gloss_video_objects = GlossVideoNME.objects.filter(id__in=results)
-    gloss_ids = [gv.gloss.id for gv in gloss_video_objects]
-    return qs.filter(Q(**{filter_id: gloss_ids}))
+    gloss_prefix = 'gloss__' if model in [GlossSense, AnnotatedGloss] else ''
+    filter_id = gloss_prefix + 'id__in'
+    # '2' is the True choice, '3' is the False choice
+    file_present = query_parameters['hasnmevideo'] == '2'
+    nme_videos = GlossVideoNME.objects.filter(version=0, file_present=file_present)
+    return qs.filter(Q(**{filter_id: nme_videos.values('gloss_id')}))
 
 
 def convert_query_parameters_to_filter(query_parameters):
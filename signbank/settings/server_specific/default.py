@@ -24,6 +24,10 @@ DATASET_METADATA_DIRECTORY = 'metadata_eafs'
 TEST_DATA_DIRECTORY = 'test_data'
 BACKUP_VIDEOS_FOLDER = 'video_backups'
 DELETED_FILES_FOLDER = 'prullenmand'
+# journals of gloss video moves that are not finished, see the run_video_relocations command
+VIDEO_RELOCATION_JOURNAL_FOLDER = 'video_relocations'
+# uploaded CSV files and the results of checking their rows, see the run_csv_import_jobs command
+CSV_IMPORT_FOLDER = 'csv_imports'
 
 # Tmp folder to use
 TMP_DIR = '/tmp'
@@ -45,6 +49,16 @@ METADATA_LOCATION = 'metadata.csv'
 # Video software to use to get the middle frame
 FFMPEG_PROGRAM = "ffmpeg"
 
+# Convert uploaded gloss videos and make their images in worker threads instead of in the request,
+# run the management command run_video_jobs to process jobs that were left when the server stopped
+VIDEO_PROCESSING_IN_BACKGROUND = True
+VIDEO_PROCESSING_WORKERS = 2
+
+# The rows of uploaded CSV files are checked in a worker thread, in chunks of rows,
+# run the management command run_csv_import_jobs to continue jobs that were left when the server stopped
+CSV_IMPORT_WORKERS = 1
+CSV_IMPORT_CHUNK_SIZE = 500
+
 # List of tuples containing the name and the email address of the admins
 ADMINS = [('Spongebob Squarepants','s.squarepants@gmail.com')]
 
@@ -227,6 +241,8 @@ OBLIGATORY_FIELDS = []
 ECV_FOLDER = 'ecv/'
 ECV_FILE = 'myecv.ecv'
 ECV_FOLDER_ABSOLUTE_PATH = WRITABLE_FOLDER+ECV_FOLDER
+# the descriptions of the glosses in the ECV files, kept between the writes of a file
+ECV_DESCRIPTION_CACHE_FOLDER = WRITABLE_FOLDER+'ecv_cache/'
 
 # What do you want to include in the ECV file?
 ECV_SETTINGS = {
@@ -4,6 +4,8 @@ import os
 import re
 import sys
 import csv
+import multiprocessing
+from functools import partial
 from lxml import etree
 from collections import defaultdict
 import flatdict
@@ -23,6 +25,12 @@ class SignCounter:
         self.freqsPerRegion = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
         self.freqsPerSomething = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(int))))
 
+        # per gloss totals, kept up to date while the annotations are counted
+        self.signersPerGloss = defaultdict(int)
+        self.regionFrequencies = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+        self.somethingFrequencies = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(int))))
+        self.sign_counts = {}
+
         for f in files:
             self.add_file(f)
 
@@ -57,9 +65,9 @@ class SignCounter:
         for f in self.all_files:
             try:
                 self.process_file(f)
-                self.generate_result()
             except KeyError as ke:
                 sys.stderr.write("KeyError in file %s: '%s'\n" % (f, ke.args[0]))
+        self.generate_result()
 
     def process_file(self, fname):
         file_basename = os.path.basename(fname)
@@ -264,10 +272,15 @@ class SignCounter:
 
                 for person in tmp[gloss]['participants'].keys():
                     self.freqsPerPerson[person][basename][gloss] += 1
+                    if self.freqsPerPerson[person][basename][gloss] == 1:
+                        # first occurrence of the gloss for this person in this document
+                        self.signersPerGloss[gloss] += 1
 
                     try:
                         region = self.metadata[person][self.region_metadata_id]
                         self.freqsPerRegion[region][person][gloss] += 1
+                        self.add_frequency(self.regionFrequencies[gloss][region],
+                                           self.freqsPerRegion[region][person][gloss])
                     except:
                         pass
 
@@ -276,10 +289,19 @@ class SignCounter:
                             if something != 'self.region_metadata_id':
                                 item = self.metadata[person][something]
                                 self.freqsPerSomething[something][item][person][gloss] += 1
+                                self.add_frequency(self.somethingFrequencies[gloss][something][item],
+                                                   self.freqsPerSomething[something][item][person][gloss])
                     except:
                         pass
 
+    @staticmethod
+    def add_frequency(frequencies, person_frequency):
+        frequencies['frequency'] += 1
+        if person_frequency == 1:
+            frequencies['numberOfSigners'] += 1
+
     def generate_result(self):
+        """Compute sign_counts from the totals collected by restructure, this is done once after all files"""
         number_of_tokens = 0
         number_of_types = 0
         number_of_singletons = 0
@@ -292,47 +314,57 @@ class SignCounter:
             if self.freqs[gloss] == 1:
                 number_of_singletons += 1
 
-            # Person frequencies
-            number_of_signers = 0
-            for person in sorted(self.freqsPerPerson.keys()):
-                for document in sorted(self.freqsPerPerson[person].keys()):
-                    if gloss in self.freqsPerPerson[person][document]:
-                        number_of_signers += 1
-
-            # Uncomment the following to pass this in the result
-            # signer_frequencies = defaultdict(lambda: defaultdict(int))
-            # for person in sorted(self.freqsPerPerson.keys()):
-            #     for document in sorted(self.freqsPerPerson[person].keys()):
-            #         if gloss in self.freqsPerPerson[person][document].keys():
-            #             signer_frequencies[person][document] = self.freqsPerPerson[person][document][gloss]
+            # Person frequencies: the number of (person, document) combinations the gloss occurs in
+            number_of_signers = self.signersPerGloss[gloss]
 
             # Region frequencies
             region_frequencies = defaultdict(lambda: defaultdict(int))
-            for region in sorted(self.freqsPerRegion.keys()):
-                # region_frequencies[region]['frequency'] = 0
-                for person in sorted(self.freqsPerRegion[region].keys()):
-                    if gloss in self.freqsPerRegion[region][person]:
-                        region_frequencies[region]['frequency'] += self.freqsPerRegion[region][person][gloss]
-                        region_frequencies[region]['numberOfSigners'] += 1
+            gloss_regions = self.regionFrequencies.get(gloss, {})
+            for region in sorted(gloss_regions.keys()):
+                region_frequencies[region]['frequency'] = gloss_regions[region]['frequency']
+                region_frequencies[region]['numberOfSigners'] = gloss_regions[region]['numberOfSigners']
 
             something_frequencies = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-            for something in sorted(self.freqsPerSomething.keys()):
-                for item in sorted(self.freqsPerSomething[something].keys()):
-                    for person in sorted(self.freqsPerSomething[something][item].keys()):
-                        if gloss in self.freqsPerSomething[something][item][person]:
-                            label = 'frequencyPer' + something
-                            something_frequencies[label][item]['frequency'] += \
-                                self.freqsPerSomething[something][item][person][gloss]
-                            something_frequencies[label][item]['numberOfSigners'] += 1
+            gloss_somethings = self.somethingFrequencies.get(gloss, {})
+            for something in sorted(gloss_somethings.keys()):
+                label = 'frequencyPer' + something
+                for item in sorted(gloss_somethings[something].keys()):
+                    something_frequencies[label][item]['frequency'] = gloss_somethings[something][item]['frequency']
+                    something_frequencies[label][item]['numberOfSigners'] = \
+                        gloss_somethings[something][item]['numberOfSigners']
 
             self.sign_counts[gloss] = {'frequency': self.freqs[gloss], 'numberOfSigners': number_of_signers,
-                                    'frequenciesPerRegion': region_frequencies} #, 'frequenciesPerSpeaker': signer_frequencies}
+                                    'frequenciesPerRegion': region_frequencies}
             self.sign_counts[gloss].update(something_frequencies)
 
     def get_result(self):
         return self.sign_counts
 
 
+def eaf_frequencies_per_person(eaf_file, minimum_overlap=0, gloss_tier_type='gloss'):
+    """Count the glosses of one EAF file, returns {person: {document: {gloss: frequency}}}
+    This runs in the worker processes of frequencies_per_person_per_file, it does not use the database"""
+    sign_counter = SignCounter(None, [eaf_file], minimum_overlap, gloss_tier_type)
+    for f in sign_counter.all_files:
+        try:
+            sign_counter.process_file(f)
+        except KeyError as ke:
+            sys.stderr.write("KeyError in file %s: '%s'\n" % (f, ke.args[0]))
+    return dict((person, dict((document, dict(glosses)) for document, glosses in documents.items()))
+                for person, documents in sign_counter.freqsPerPerson.items())
+
+
+def frequencies_per_person_per_file(eaf_files, minimum_overlap=0, processes=None):
+    """Parse and count the EAF files in a pool of processes, yields (eaf_file, frequencies per person) in order"""
+    count_file = partial(eaf_frequencies_per_person, minimum_overlap=minimum_overlap)
+    if len(eaf_files) <= 1 or processes == 1:
+        for eaf_file in eaf_files:
+            yield eaf_file, count_file(eaf_file)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        yield from zip(eaf_files, pool.imap(count_file, eaf_files, chunksize=4))
+
+
 def output_results(result, csv_file=False):
     if not csv_file:
         print(json.dumps(result, sort_keys=True, indent=4))
@@ -6,12 +6,13 @@ import json
 import hashlib
 import re
 import copy
-import codecs
 from lxml import etree
 import datetime as DT
+from collections import defaultdict
 from datetime import date
 from dateutil.parser import parse
 
+from django.conf import settings
 from django.db import models
 from django.db.models.fields import BooleanField
 from django.utils.translation import override, activate, gettext, gettext_lazy as _
@@ -22,7 +23,6 @@ from django.core.exceptions import ObjectDoesNotExist, EmptyResultSet
 from django.contrib.auth.models import User
 from django.http import JsonResponse, HttpResponse
 from django.shortcuts import render
-from django.template.loader import get_template
 
 from urllib.parse import urlencode
 from guardian.shortcuts import get_objects_for_user
@@ -31,20 +31,25 @@ from signbank.settings.server_specific import (FIELDS, DEFAULT_LANGUAGE_HEADER_C
                                                DEBUG_CSV, HANDEDNESS_ARTICULATION_FIELDS, LANGUAGES, WSGI_FILE,
                                                DEFAULT_DATASET_PK, TMP_DIR, FFMPEG_PROGRAM, GLOSS_VIDEO_DIRECTORY,
                                                GLOSS_IMAGE_DIRECTORY, DEFAULT_DATASET_ACRONYM, DEFAULT_KEYWORDS_LANGUAGE,
-                                               ECV_SETTINGS, ECV_FOLDER_ABSOLUTE_PATH, URL, PREFIX_URL,
+                                               ECV_SETTINGS,
                                                LANGUAGES_LANGUAGE_CODE_3CHAR)
+from signbank.dictionary.dataset_visibility import public_dataset_ids
 from signbank.dictionary.models import (Dataset, Gloss, Morpheme, Dialect, SignLanguage, Language, FieldChoice,
                                         SemanticField, DeletedGlossOrMedia, UserProfile, get_default_language_id,
                                         Handshape, LemmaIdgloss, FieldChoiceForeignKey, Definition,
                                         LemmaIdglossTranslation, MorphologyDefinition, AnnotatedSentenceTranslation,
-                                        ExampleSentence, OtherMedia, Relation, GlossRevision)
+                                        ExampleSentence, OtherMedia, Relation, GlossRevision, AnnotatedGloss,
+                                        AnnotationIdglossTranslation, Sense, SearchResultList)
 from signbank.csv_interface import (sense_translations_for_language, update_senses_parse,
                                     update_sentences_parse, sense_examplesentences_for_language, get_sense_numbers,
                                     parse_sentence_row, get_senses_to_sentences, csv_sentence_tuples_list_compare,
                                     required_csv_columns, trim_columns_in_row,
                                     normalize_field_choice)
 from signbank.dictionary.update_csv import validate_and_resolve_gloss_relations
+from signbank.dictionary.csv_update_lookups import GlossUpdateLookups
 from signbank.dictionary.field_choices import fields_to_fieldcategory_dict
+from signbank.dictionary.gloss_serializer import get_fields_dicts
+from signbank.dictionary.ecv_writer import (format_ecv_description, write_dataset_ecv, write_changed_ecv_files)
 
 from tagging.models import TaggedItem, Tag
 from signbank.video.extract_middle_frame import MiddleFrameExtracter
@@ -300,16 +305,19 @@ def create_gloss_from_valuedict(valuedict, dataset, row_nr, earlier_creation_sam
 
 def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
                                earlier_updates_same_csv, earlier_updates_lemmaidgloss,
-                               notes_toggle, notes_assign_toggle, semfield_toggle, semfield_assign_toggle, tags_toggle):
-    """Takes a dict of arbitrary key-value pairs, and compares them to a gloss"""
+                               notes_toggle, notes_assign_toggle, semfield_toggle, semfield_assign_toggle, tags_toggle,
+                               lookups=None):
+    """Takes a dict of arbitrary key-value pairs, and compares them to a gloss
+    The original values are taken from the lookups, the GlossUpdateLookups of all glosses of the csv"""
     # called by import_csv_update in views.py
 
     errors_found = []
     differences = []
 
-    try:
-        gloss = Gloss.objects.select_related().get(pk=gloss_id)
-    except ObjectDoesNotExist:
+    if lookups is None:
+        lookups = GlossUpdateLookups([gloss_id])
+    gloss = lookups.glosses.get(gloss_id)
+    if gloss is None:
         error_string = gettext("Could not find gloss for ID {glossid}.").format(glossid=str(gloss_id))
         errors_found.append(error_string)
         return differences, errors_found, earlier_updates_same_csv, earlier_updates_lemmaidgloss
@@ -319,7 +327,7 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
         errors_found.append(e)
         return differences, errors_found, earlier_updates_same_csv, earlier_updates_lemmaidgloss
     else:
-        earlier_updates_same_csv.append(gloss_id)
+        earlier_updates_same_csv.add(gloss_id)
     column_name_error = False
     tag_name_error = False
 
@@ -329,7 +337,7 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
     # Create an overview of all fields, sorted by their human name
     with override(LANGUAGE_CODE):
 
-        default_annotationidglosstranslation = get_default_annotationidglosstranslation(gloss)
+        default_annotationidglosstranslation = lookups.default_annotation(gloss)
 
         # these are the same fields as for csv export
         # do not include frequency fields
@@ -361,22 +369,14 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
 
             annotation_idgloss_key_prefix = "Annotation ID Gloss ("
             if human_key.startswith(annotation_idgloss_key_prefix):
-                language_name_column = DEFAULT_LANGUAGE_HEADER_COLUMN['English']
                 language_name = human_key[len(annotation_idgloss_key_prefix):-1]
-                languages = Language.objects.filter(**{language_name_column: language_name})
-                if languages:
-                    language = languages.first()
-                    annotation_idglosses = gloss.annotationidglosstranslation_set.filter(language=language)
-                    if annotation_idglosses.count() > 0:
-                        annotation_idgloss_string = annotation_idglosses.first().text
+                language = lookups.language(language_name)
+                if language:
+                    annotation_idgloss_string = lookups.annotation_translation(gloss, language)
+                    if annotation_idgloss_string is not None:
 
                         if annotation_idgloss_string != new_human_value and new_human_value not in ['None', '']:
-                            glosses_with_same_annotation = Gloss.objects.filter(
-                                annotationidglosstranslation__text__exact=new_human_value,
-                                annotationidglosstranslation__language=language,
-                                lemma__dataset=gloss.lemma.dataset).count()
-
-                            if glosses_with_same_annotation:
+                            if lookups.annotation_exists(gloss.lemma.dataset, language, new_human_value):
                                 error_string = gettext("Signbank ID {glossid} key value already exists: '{column}': '{value}'").format(glossid=str(gloss_id), column=human_key, value=str(new_human_value))
                                 errors_found += [error_string]
 
@@ -395,17 +395,11 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
 
             lemma_idgloss_key_prefix = "Lemma ID Gloss ("
             if human_key.startswith(lemma_idgloss_key_prefix):
-                language_name_column = DEFAULT_LANGUAGE_HEADER_COLUMN['English']
                 language_name = human_key[len(lemma_idgloss_key_prefix):-1]
-                languages = Language.objects.filter(**{language_name_column: language_name})
-                if languages:
-                    language = languages[0]
-                    lemma_idglosses = gloss.lemma.lemmaidglosstranslation_set.filter(language=language)
-                    if lemma_idglosses:
-                        lemma_idgloss_string = lemma_idglosses[0].text
-                    else:
-                        # lemma not set
-                        lemma_idgloss_string = ''
+                language = lookups.language(language_name)
+                if language:
+                    # the empty string if the lemma is not set
+                    lemma_idgloss_string = lookups.lemma_translation(gloss, language)
                     if lemma_idgloss_string != new_human_value and new_human_value not in ['None', '']:
                         error_string = gettext("Attempt to update Lemma translations: '{column}'").format(column=human_key)
                         errors_found += [error_string]
@@ -413,9 +407,8 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
 
             keywords_key_prefix = "Senses ("
             if human_key.startswith(keywords_key_prefix):
-                language_name_column = DEFAULT_LANGUAGE_HEADER_COLUMN['English']
                 language_name = human_key[len(keywords_key_prefix):-1]
-                language = Language.objects.filter(**{language_name_column: language_name}).first()
+                language = lookups.language(language_name)
                 if not language:
                     current_keyword_string = ""
                     error_string = gettext("Non-existent language specified for Senses column: '{column}'").format(column=human_key)
@@ -448,9 +441,8 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
 
             example_sentences_key_prefix = "Example Sentences ("
             if human_key.startswith(example_sentences_key_prefix):
-                language_name_column = DEFAULT_LANGUAGE_HEADER_COLUMN['English']
                 language_name = human_key[len(example_sentences_key_prefix):-1]
-                language = Language.objects.filter(**{language_name_column: language_name}).first()
+                language = lookups.language(language_name)
                 sense_numbers = get_sense_numbers(gloss)
                 sense_numbers_to_sentences = get_senses_to_sentences(gloss)
                 if not language:
@@ -734,7 +726,7 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
                 if tags_toggle == 'keep' and (new_human_value == 'None' or new_human_value == ''):
                     continue
 
-                (tag_names_string, sorted_tags_display) = get_tags_as_string(gloss_id)
+                (tag_names_string, sorted_tags_display) = lookups.tags_as_string(gloss_id)
 
                 if new_human_value in ['None', '']:
                     (sorted_new_tags_display, sorted_new_tags, new_tag_errors, tag_name_error) = \
@@ -744,7 +736,8 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
 
                     (sorted_new_tags_display, sorted_new_tags, new_tag_errors, tag_name_error) = \
                         check_existence_tags(gloss_id, new_human_value_list, tag_name_error,
-                                             default_annotationidglosstranslation)
+                                             default_annotationidglosstranslation,
+                                             all_tags=lookups.tag_names.values())
 
                 if len(new_tag_errors):
                     errors_found += new_tag_errors
@@ -807,8 +800,8 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
                     continue
 
                 # make sure all fields exist
-                new_values_sorted_lookup = lookup_semantic_fields(new_human_value_list)
-                if new_values_sorted_lookup.count() != len(new_human_value_list):
+                new_values_sorted_lookup = lookups.semantic_fields(new_human_value_list)
+                if len(new_values_sorted_lookup) != len(new_human_value_list):
                     error_string = gettext("For gloss '{annotation}' ({glossid}), could not parse '{value}' for '{column}'.").format(
                         annotation=default_annotationidglosstranslation, glossid=str(gloss_id), value=new_human_value,
                         column=human_key)
@@ -816,12 +809,12 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
                     continue
                 new_semfield_sorted_lookup_values = [str(sf.name) for sf in new_values_sorted_lookup]
                 new_semanticfield_value = ', '.join(new_semfield_sorted_lookup_values)
-                original_sorted_semfield_values = [str(sf.name) for sf in gloss.semField.all().order_by('machine_value')]
+                original_sorted_semfield_values = [str(sf.name) for sf in lookups.semantic_fields_of_gloss(gloss)]
                 original_semanticfield_value = ", ".join(original_sorted_semfield_values)
                 if new_semanticfield_value != original_semanticfield_value:
                     if semfield_assign_toggle == 'update':
                         combined_semfield = original_sorted_semfield_values + new_semfield_sorted_lookup_values
-                        compined_values_sorted_lookup = lookup_semantic_fields(combined_semfield)
+                        compined_values_sorted_lookup = lookups.semantic_fields(combined_semfield)
                         new_semanticfield_value = ', '.join([str(sf.name) for sf in compined_values_sorted_lookup])
 
                     differences.append({'pk': gloss_id,
@@ -865,37 +858,32 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
                 if new_human_value in ['', '0', ' ', None, 'None']:
                     new_human_value = '-'
 
-                try:
-                    field_choice = FieldChoice.objects.get(name__iexact=new_human_value, field=field.field_choice_category)
-                    new_machine_value = field_choice.machine_value
-                except ObjectDoesNotExist:
-                    normalised_choice = normalize_field_choice(new_human_value)
-                    try:
-                        field_choice = FieldChoice.objects.get(name__iexact=normalised_choice,
-                                                               field=field.field_choice_category)
-                        new_machine_value = field_choice.machine_value
-                    except ObjectDoesNotExist:
-                        error_string = gettext(
-                            "For gloss '{annotation}' ({glossid}), could not find option '{value}' for '{column}'.").format(
-                            annotation=default_annotationidglosstranslation, glossid=str(gloss_id),
-                            value=new_human_value, column=human_key)
-                        errors_found += [error_string]
-                        continue
+                field_choice = lookups.field_choice_by_name(field.field_choice_category, new_human_value)
+                if field_choice is None:
+                    field_choice = lookups.field_choice_by_name(field.field_choice_category,
+                                                                normalize_field_choice(new_human_value))
+                if field_choice is None:
+                    error_string = gettext(
+                        "For gloss '{annotation}' ({glossid}), could not find option '{value}' for '{column}'.").format(
+                        annotation=default_annotationidglosstranslation, glossid=str(gloss_id),
+                        value=new_human_value, column=human_key)
+                    errors_found += [error_string]
+                    continue
+                new_machine_value = field_choice.machine_value
 
             elif isinstance(field, models.ForeignKey) and field.related_model == Handshape:
                 if new_human_value in ['', '0', ' ', None, 'None']:
                     new_human_value = '-'
 
-                try:
-                    handshape = Handshape.objects.get(name__iexact=new_human_value)
-                    new_machine_value = handshape.machine_value
-                except ObjectDoesNotExist:
+                handshape = lookups.handshape_by_name(new_human_value)
+                if handshape is None:
                     error_string = gettext(
                         "For gloss '{annotation}' ({glossid}), could not find option '{value}' for '{column}'.").format(
                         annotation=default_annotationidglosstranslation, glossid=str(gloss_id),
                         value=new_human_value, column=human_key)
                     errors_found += [error_string]
                     continue
+                new_machine_value = handshape.machine_value
 
             # Do something special for integers and booleans
             elif field.__class__.__name__ == 'IntegerField':
@@ -948,7 +936,8 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
 
             # Try to translate the key to machine keys if possible
             try:
-                original_machine_value = getattr(gloss, gloss_field_name)
+                # the attname avoids fetching the field choice or handshape, these are in the lookups
+                original_machine_value = getattr(gloss, field.attname)
             except KeyError:
                 error_string = gettext(
                     "For gloss '{annotation}' ({glossid}), could not get original value for field: '{field}'").format(
@@ -959,13 +948,9 @@ def compare_valuedict_to_gloss(valuedict, gloss_id, my_datasets, nl,
 
             # Translate back the machine value from the gloss
 
-            if hasattr(field, 'field_choice_category'):
-                original_field_value = getattr(gloss, gloss_field_name)
-                original_machine_value = original_field_value.machine_value if original_field_value else 0
-                original_human_value = original_field_value.name if original_field_value else '-'
-
-            elif isinstance(field, models.ForeignKey) and field.related_model == Handshape:
-                original_field_value = getattr(gloss, gloss_field_name)
+            if hasattr(field, 'field_choice_category') or \
+                    (isinstance(field, models.ForeignKey) and field.related_model == Handshape):
+                original_field_value = lookups.choice_of_gloss(gloss, field)
                 original_machine_value = original_field_value.machine_value if original_field_value else 0
                 original_human_value = original_field_value.name if original_field_value else '-'
 
@@ -1339,16 +1324,15 @@ def get_tags_as_string(gloss_id):
     return tag_names_string, tag_names_display
 
 
-def check_existence_tags(gloss_id, new_human_value_list, tag_name_error, default_annotationidglosstranslation):
+def check_existence_tags(gloss_id, new_human_value_list, tag_name_error, default_annotationidglosstranslation,
+                         all_tags=None):
     # convert new Tags csv value to proper format
     # values is not empty
+    # all_tags are the names of the existing tags, if these have been looked up before
 
-    tags_objects = Tag.objects.all()
-    refreshed_tags = []
-    for tag in tags_objects:
-        tag.refresh_from_db()
-        refreshed_tags.append(tag)
-    all_tags = [t.name for t in refreshed_tags]
+    if all_tags is None:
+        all_tags = Tag.objects.values_list('name', flat=True)
+    all_tags = set(all_tags)
 
     new_tag_errors = []
 
@@ -1652,11 +1636,13 @@ def get_gloss_data(since_timestamp=0, language_code='en', dataset=None, inWebSet
 
     api_fields_2023 = api_fields(dataset, language_code, extended_fields)
 
+    updated_glosses = [gloss for gloss in glosses.select_related('lemma__dataset', 'domhndsh', 'subhndsh')
+                       if int(format(gloss.lastUpdated, 'U')) > since_timestamp]
+    fields_dicts = get_fields_dicts(updated_glosses, api_fields_2023, language_code)
+
     gloss_data = {}
-    for gloss in glosses:
-        if int(format(gloss.lastUpdated, 'U')) > since_timestamp:
-            data = gloss.get_fields_dict(api_fields_2023, language_code)
-            gloss_data[str(gloss.pk)] = data
+    for gloss in updated_glosses:
+        gloss_data[str(gloss.pk)] = fields_dicts[gloss.pk]
 
     return gloss_data
 
@@ -1727,8 +1713,8 @@ def get_datasets_with_public_glosses():
 
     # Make sure a non-empty set is returned, for anonymous users when no datasets are public
     # the first query fetches glosses that are public, then obtains those glosses' dataset ids
-    datasets_of_public_glosses = Gloss.objects.filter(inWeb=True, archived=False).values('lemma__dataset__id').distinct()
-    datasets_with_public_glosses = Dataset.objects.filter(id__in=datasets_of_public_glosses)
+    # the dataset ids are cached until public glosses change
+    datasets_with_public_glosses = Dataset.objects.filter(id__in=public_dataset_ids())
     return datasets_with_public_glosses
 
 
@@ -1955,62 +1941,28 @@ def get_fields_with_choices_relation():
 
 def write_ecv_files_for_all_datasets():
 
-    all_dataset_objects = Dataset.objects.all()
-
-    for ds in all_dataset_objects:
-        success, ecv_filename = write_ecv_file_for_dataset(ds.acronym)
-        if success:
-            print('Saved ECV for Dataset ', ds.name, ' to file: ', ecv_filename)
-        else:
-            print('Error saving ECV for Dataset ', ds.name, ' to filename: ', ecv_filename)
+    written, failed = write_changed_ecv_files(Dataset.objects.all())
+    for ecv_filename in written:
+        print('Saved ECV to file: ', ecv_filename)
+    for ecv_filename in failed:
+        print('Error saving ECV to filename: ', ecv_filename)
 
     return True
 
 
 def write_ecv_file_for_dataset(dataset_name):
-    dataset_id = Dataset.objects.get(acronym=dataset_name)
+    dataset = Dataset.objects.get(acronym=dataset_name)
 
-    query_dataset = Gloss.none_morpheme_objects().filter(excludeFromEcv=False).filter(lemma__dataset=dataset_id)
-    if not query_dataset:
+    if not Gloss.none_morpheme_objects().filter(excludeFromEcv=False, lemma__dataset=dataset).exists():
         return ''
 
-    sOrder = 'annotationidglosstranslation__text'
-    if dataset_id.default_language:
-        lang_attr_name = dataset_id.default_language.language_code_2char
-    else:
-        lang_attr_name = DEFAULT_KEYWORDS_LANGUAGE['language_code_2char']
-    sort_language = 'annotationidglosstranslation__language__language_code_2char'
-    qs_empty = query_dataset.filter(**{sOrder + '__isnull': True})
-    qs_letters = query_dataset.filter(**{sOrder + '__regex': r'^[a-zA-Z]', sort_language: lang_attr_name})
-    qs_special = query_dataset.filter(**{sOrder + '__regex': r'^[^a-zA-Z]', sort_language: lang_attr_name})
-
-    ordered = list(qs_letters.order_by(sOrder))
-    ordered += list(qs_special.order_by(sOrder))
-    ordered += list(qs_empty)
-
-    context = {
-        'CV_ID': ECV_SETTINGS['CV_ID'] if 'CV_ID' in ECV_SETTINGS else "",
-        'date': str(DT.date.today()) + 'T' + str(DT.datetime.now().time()),
-        'glosses': ordered,
-        'dataset': dataset_id,
-        'languages': dataset_id.translation_languages.all(),
-        'resource_url': URL + PREFIX_URL + '/dictionary/gloss/'
-    }
-    ecv_template = get_template('dictionary/ecv.xml')
-    xmlstr = ecv_template.render(context)
-    ecv_file = os.path.join(ECV_FOLDER_ABSOLUTE_PATH, dataset_name.lower().replace(" ", "_") + ".ecv")
-    try:
-        f = codecs.open(ecv_file, "w", "utf-8")
-        f.write(xmlstr)
-        return True, ecv_file
-    except PermissionError:
-        return False, ecv_file
+    return write_dataset_ecv(dataset)
 
 
 def get_ecv_description_for_gloss(gloss, lang, include_phonology_and_frequencies=False):
     activate(lang)
 
-    desc = ""
+    field_values = []
     if include_phonology_and_frequencies:
 
         for f in ECV_SETTINGS['description_fields']:
@@ -2019,27 +1971,7 @@ def get_ecv_description_for_gloss(gloss, lang, include_phonology_and_frequencies
                 value = getattr(gloss, f).name
             else:
                 value = get_value_for_ecv(gloss, f)
-
-            # potential error: this pretty printing assumes a particular ordering of the fields
-            # parens might not match if sorted otherwise
-            # these fields seem to be hard coded
-            if f == 'handedness':
-                desc = value
-            elif f == 'domhndsh':
-                desc = desc + ', (' + value
-            elif f == 'subhndsh':
-                desc = desc + ',' + value
-            elif f == 'handCh':
-                desc = desc + '; ' + value + ')'
-            elif f == 'tokNo':
-                desc = desc + ' [' + value
-            elif f == 'tokNoSgnr':
-                desc = desc + '/' + value + ']'
-            else:
-                desc = desc + ', ' + value
-
-    if desc and include_phonology_and_frequencies:
-        desc += ", "
+            field_values.append((f, value))
 
     lang = Language.objects.get(language_code_2char=lang)
     trans = []
@@ -2047,14 +1979,8 @@ def get_ecv_description_for_gloss(gloss, lang, include_phonology_and_frequencies
         for st in sense.senseTranslations.filter(language=lang).order_by('sense'):
             if str(st) != "":
                 trans.append(str(st))
-    desc += ", ".join(
-        # The next line was adapted from an older version of this code,
-        # that happened to do nothing. I left this for future usage.
-        # map(lambda t: str(t.encode('ascii','xmlcharrefreplace')) if isinstance(t, unicode) else t, trans)
-        trans
-    )
 
-    return desc
+    return format_ecv_description(field_values, trans)
 
 
 def get_value_for_ecv(gloss, fieldname):
@@ -2087,66 +2013,211 @@ def get_value_for_ecv(gloss, fieldname):
     return value
 
 
+SEARCH_RESULTS_HREF_TYPES = {'gloss': 'gloss', 'sense': 'gloss', 'annotatedsentence': 'annotatedsentence',
+                             'handshape': 'handshape', 'lemma': 'lemma/update'}
+# the number of search results of which the labels are sent to the search result bar at once
+SEARCH_RESULTS_WINDOW = 100
+
+
+def scrollbar_item_ids(qs, fields):
+    # the objects of a queryset are not fetched, only the values of the fields
+    if isinstance(qs, models.QuerySet):
+        values = qs.values_list(*fields)
+    else:
+        values = [[getattr(item, field) for field in fields] for item in qs]
+    if len(fields) == 1:
+        return [value[0] for value in values]
+    return [list(value) for value in values]
+
+
 def construct_scrollbar(qs, search_type, language_code):
-    items = []
+    """The ordered ids of the search results for the search result bar
+    The labels are looked up by search_result_items for the results that are shown"""
     if search_type in ['sign', 'sign_or_morpheme', 'morpheme', 'sign_handshape', 'annotatedsentence']:
-        for item in qs:
-            if item.is_morpheme():
-                href_type = 'morpheme'
-            elif item.is_annotatedgloss():
-                sentence = AnnotatedSentenceTranslation.objects.filter(annotatedsentence=item.annotatedsentence).first()
-                sentence_words = sentence.text.split() if sentence and sentence.text else []
-                sentence_prefix = ' '.join(sentence_words[:5]) if sentence else ''
-                data_label = f'{item.gloss.idgloss} ({item.annotatedsentence.id}. {sentence_prefix}...)'
-                items.append(dict(id=str(item.annotatedsentence.id), glossid=str(item.gloss.id),
-                                  data_label=data_label, gloss_label=str(item.gloss.idgloss),
-                                  href_type='annotatedsentence'))
-                continue
-            else:
-                href_type = 'gloss'
-            annotationidglosstranslations = item.annotationidglosstranslation_set.filter(
-                language__language_code_2char__exact=language_code
-            )
-            if annotationidglosstranslations and len(annotationidglosstranslations) > 0:
-                gloss_text = annotationidglosstranslations.first().text
-                if not gloss_text:
-                    gloss_text = item.idgloss
-                items.append(dict(id=str(item.id), data_label=gloss_text, href_type=href_type))
-            else:
-                # no annotations found for gloss
-                # idgloss defaults to the id if nothing is found
-                items.append(dict(id=str(item.id), data_label=item.idgloss, href_type=href_type))
-
+        model = qs.model if isinstance(qs, models.QuerySet) else type(qs[0]) if qs else Gloss
+        if model == AnnotatedGloss:
+            result_type = 'annotatedsentence'
+            item_ids = scrollbar_item_ids(qs, ['annotatedsentence_id', 'gloss_id'])
+        else:
+            result_type = 'gloss'
+            item_ids = scrollbar_item_ids(qs, ['id'])
     elif search_type in ['handshape']:
-        for item in qs:
-            data_label = item.name
-            items.append(dict(id=str(item.machine_value), data_label=data_label, href_type='handshape'))
-
+        result_type = 'handshape'
+        item_ids = scrollbar_item_ids(qs, ['machine_value'])
     elif search_type in ['lemma']:
+        result_type = 'lemma'
+        item_ids = scrollbar_item_ids(qs, ['id'])
+    elif search_type in ['sense']:
+        result_type = 'sense'
+        item_ids = scrollbar_item_ids(qs, ['gloss_id', 'sense_id'])
+    else:
+        result_type = 'gloss'
+        item_ids = []
+    return {'result_type': result_type, 'item_ids': item_ids, 'language_code': language_code}
+
+
+def store_search_results(request, scrollbar):
+    """Keep the ordered ids of the search results in a SearchResultList, the session only refers to it"""
+    if not scrollbar['item_ids']:
+        request.session['search_results'] = []
+        request.session.modified = True
+        return
+    search_results = request.session.get('search_results')
+    search_result_list = None
+    if isinstance(search_results, dict):
+        search_result_list = SearchResultList.objects.filter(id=search_results['id']).first()
+    if search_result_list is None:
+        prune_search_result_lists()
+        search_result_list = SearchResultList()
+    search_result_list.result_type = scrollbar['result_type']
+    search_result_list.item_ids = json.dumps(scrollbar['item_ids'])
+    search_result_list.save()
+    request.session['search_results'] = {'id': search_result_list.id,
+                                         'result_type': scrollbar['result_type'],
+                                         'href_type': SEARCH_RESULTS_HREF_TYPES[scrollbar['result_type']],
+                                         'language_code': scrollbar['language_code'],
+                                         'count': len(scrollbar['item_ids'])}
+    request.session.modified = True
+
+
+def prune_search_result_lists():
+    # the search results of expired sessions are no longer needed
+    oldest = DT.datetime.now(tz=get_current_timezone()) - DT.timedelta(seconds=settings.SESSION_COOKIE_AGE)
+    SearchResultList.objects.filter(updated__lt=oldest).delete()
+
+
+def get_search_results(request):
+    """The reference to the search results of the session, or None"""
+    search_results = request.session.get('search_results')
+    if not isinstance(search_results, dict):
+        # no search results, or search results stored by an older version in the session
+        return None
+    return search_results
+
+
+def search_results_href_type(request):
+    search_results = get_search_results(request)
+    return search_results['href_type'] if search_results else None
+
+
+def clear_search_results(request):
+    request.session['search_results'] = []
+    request.session.modified = True
+
+
+def keep_search_results_of_type(request, href_types):
+    # the search results of another kind of object are not shown in the search result bar
+    href_type = search_results_href_type(request)
+    if href_type is not None and href_type not in href_types:
+        clear_search_results(request)
+
+
+def get_search_result_ids(search_results):
+    if not search_results:
+        return []
+    search_result_list = SearchResultList.objects.filter(id=search_results['id']).first()
+    return search_result_list.get_item_ids() if search_result_list else []
+
+
+def idglosses_of_glosses(gloss_ids):
+    """Dictionary of gloss id to idgloss, as Gloss.idgloss, looked up in one query"""
+    lemma_translations = defaultdict(list)
+    for (gloss_id, language_id, language_code_2char, text, default_language_id) in LemmaIdglossTranslation.objects.filter(
+            lemma__gloss__id__in=gloss_ids).order_by('pk').values_list(
+            'lemma__gloss__id', 'language_id', 'language__language_code_2char', 'text',
+            'lemma__dataset__default_language_id'):
+        lemma_translations[gloss_id].append((language_id, language_code_2char, text, default_language_id))
+    idglosses = dict()
+    for gloss_id in gloss_ids:
+        translations = lemma_translations[gloss_id]
+        texts = [text for (language_id, language_code_2char, text, default_language_id) in translations
+                 if language_id == default_language_id] \
+            or [text for (language_id, language_code_2char, text, default_language_id) in translations
+                if language_code_2char == DEFAULT_KEYWORDS_LANGUAGE['language_code_2char']] \
+            or [text for (language_id, language_code_2char, text, default_language_id) in translations]
+        idglosses[gloss_id] = texts[0] if texts else str(gloss_id)
+    return idglosses
+
+
+def search_result_items(search_results, item_ids):
+    """The search result bar items of item_ids, the labels are looked up for these items only"""
+    result_type = search_results['result_type']
+    language_code = search_results['language_code']
+    items = []
+    if result_type == 'gloss':
+        morpheme_ids = set(Morpheme.objects.filter(id__in=item_ids).values_list('id', flat=True))
+        annotations = dict()
+        for (gloss_id, text) in AnnotationIdglossTranslation.objects.filter(
+                gloss__id__in=item_ids, language__language_code_2char__exact=language_code).order_by(
+                '-pk').values_list('gloss_id', 'text'):
+            annotations[gloss_id] = text
+        glosses_without_annotation = [gloss_id for gloss_id in item_ids if not annotations.get(gloss_id)]
+        idglosses = idglosses_of_glosses(glosses_without_annotation)
+        for gloss_id in item_ids:
+            href_type = 'morpheme' if gloss_id in morpheme_ids else 'gloss'
+            data_label = annotations.get(gloss_id) or idglosses[gloss_id]
+            items.append(dict(id=str(gloss_id), data_label=data_label, href_type=href_type))
+    elif result_type == 'annotatedsentence':
+        idglosses = idglosses_of_glosses([gloss_id for (sentence_id, gloss_id) in item_ids])
+        sentences = dict()
+        for (sentence_id, text) in AnnotatedSentenceTranslation.objects.filter(
+                annotatedsentence__id__in=[sentence_id for (sentence_id, gloss_id) in item_ids]).order_by(
+                '-pk').values_list('annotatedsentence_id', 'text'):
+            sentences[sentence_id] = text
+        for (sentence_id, gloss_id) in item_ids:
+            sentence_words = sentences[sentence_id].split() if sentences.get(sentence_id) else []
+            sentence_prefix = ' '.join(sentence_words[:5])
+            data_label = f'{idglosses[gloss_id]} ({sentence_id}. {sentence_prefix}...)'
+            items.append(dict(id=str(sentence_id), glossid=str(gloss_id), data_label=data_label,
+                              gloss_label=str(idglosses[gloss_id]), href_type='annotatedsentence'))
+    elif result_type == 'handshape':
+        names = dict((handshape.machine_value, handshape.name)
+                     for handshape in Handshape.objects.filter(machine_value__in=item_ids))
+        for machine_value in item_ids:
+            items.append(dict(id=str(machine_value), data_label=names.get(machine_value, ''), href_type='handshape'))
+    elif result_type == 'lemma':
         # there is no lemma details, so the href goes to lemma/update
-        for item in qs:
-            lemmaidglosstranslations = item.lemmaidglosstranslation_set.all()
-            if lemmaidglosstranslations:
-                if len(lemmaidglosstranslations) == 1:
-                    # there are lemma's with only one translation, make sure they can be printed in the scroll bar
-                    lemma_text = lemmaidglosstranslations.first().text
-                else:
-                    lemma_text = str(item.id)
-                    for tr in lemmaidglosstranslations:
-                        if tr.language.language_code_2char == language_code:
-                            lemma_text = tr.text
-                items.append(dict(id=str(item.id), data_label=lemma_text, href_type='lemma/update'))
+        lemma_translations = defaultdict(list)
+        for translation in LemmaIdglossTranslation.objects.filter(lemma__id__in=item_ids).select_related(
+                'language').order_by('pk'):
+            lemma_translations[translation.lemma_id].append(translation)
+        for lemma_id in item_ids:
+            lemmaidglosstranslations = lemma_translations[lemma_id]
+            if len(lemmaidglosstranslations) == 1:
+                # there are lemma's with only one translation, make sure they can be printed in the scroll bar
+                lemma_text = lemmaidglosstranslations[0].text
             else:
-                # no translations found for lemma
-                items.append(dict(id=str(item.id), data_label=str(item.id), href_type='lemma/update'))
-
-    elif search_type in ['sense']:
-        for item in qs:
-            data_label = f'({item.sense})'
-            items.append(dict(id=str(item.gloss.id), data_label=data_label, href_type='gloss'))
+                lemma_text = str(lemma_id)
+                for tr in lemmaidglosstranslations:
+                    if tr.language.language_code_2char == language_code:
+                        lemma_text = tr.text
+            items.append(dict(id=str(lemma_id), data_label=lemma_text, href_type='lemma/update'))
+    elif result_type == 'sense':
+        senses = Sense.objects.filter(id__in=[sense_id for (gloss_id, sense_id) in item_ids]).prefetch_related(
+            'senseTranslations__translations__translation')
+        senses = dict((sense.id, sense) for sense in senses)
+        for (gloss_id, sense_id) in item_ids:
+            data_label = f'({senses[sense_id]})' if sense_id in senses else '()'
+            items.append(dict(id=str(gloss_id), data_label=data_label, href_type='gloss'))
     return items
 
 
+def search_results_window(search_results, active_id='', start=None, size=SEARCH_RESULTS_WINDOW):
+    """The part of the search results shown in the search result bar, around the active item if start is not given"""
+    item_ids = get_search_result_ids(search_results)
+    if start is None:
+        start = 0
+        for position, item_id in enumerate(item_ids):
+            if active_id in ([str(identifier) for identifier in item_id] if isinstance(item_id, list)
+                             else [str(item_id)]):
+                start = max(0, position - size // 2)
+                break
+    start = max(0, min(start, len(item_ids)))
+    window = item_ids[start:start + size]
+    return {'start': start, 'count': len(item_ids),
+            'items': search_result_items(search_results, window) if window else []}
+
+
 def searchform_panels(searchform, searchfields):
     search_by_fields = []
     for field in searchfields:
@@ -2160,11 +2231,15 @@ def map_search_results_to_gloss_list(search_results):
     if not search_results:
         return [], []
     gloss_ids = []
-    for search_result in search_results:
-        if search_result['href_type'] == 'annotatedsentence':
-            gloss_ids.append(search_result['glossid'])
+    for item_id in get_search_result_ids(search_results):
+        if search_results['href_type'] == 'annotatedsentence':
+            # the results of annotated sentences are [annotated sentence id, gloss id] pairs
+            gloss_ids.append(item_id[1])
+        elif isinstance(item_id, list):
+            # the results of senses are [gloss id, sense id] pairs
+            gloss_ids.append(item_id[0])
         else:
-            gloss_ids.append(search_result['id'])
+            gloss_ids.append(item_id)
     return gloss_ids, Gloss.objects.filter(id__in=gloss_ids)
 
 
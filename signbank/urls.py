@@ -66,6 +66,8 @@ urlpatterns = [
             name='import_csv_create_sentences'),
     re_path(r'^signs/import_csv_update/$', signbank.dictionary.views.import_csv_update, name='import_csv_update'),
     re_path(r'^signs/import_csv_lemmas/$', signbank.dictionary.views.import_csv_lemmas, name='import_csv_lemmas'),
+    re_path(r'^signs/import_csv_job/(?P<jobid>\d+)/$', signbank.dictionary.views.csv_import_job_progress,
+            name='csv_import_job_progress'),
     re_path(r'^signs/senses/search/$', SenseListView.as_view(), name='senses_search'),
     re_path(r'^signs/annotatedgloss/search/$', AnnotatedGlossListView.as_view(), name='annotatedgloss_search'),
     re_path(r'^analysis/homonyms/$', HomonymListView.as_view(), name='admin_homonyms_list'),
@@ -1,12 +1,13 @@
 
 from django.contrib import admin
 from signbank.video.models import (GlossVideo, GlossVideoHistory, AnnotatedVideo, ExampleVideoHistory,
-                                   build_filename)
+                                   MediaFile, build_filename)
 from signbank.dictionary.models import Dataset, AnnotatedGloss, Gloss
 from django.contrib.auth.models import User
 from signbank.settings.base import *
 from signbank.settings.server_specific import WRITABLE_FOLDER, FILESYSTEM_SIGNBANK_GROUPS, DEBUG_VIDEOS, DELETED_FILES_FOLDER
 from django.utils.translation import gettext_lazy as _
+from django.db.models import Exists, OuterRef, Subquery
 from signbank.tools import get_two_letter_dir
 from signbank.video.convertvideo import video_file_type_extension, convert_video
 from signbank.video.operations import (filename_matches_nme, filename_matches_perspective,
@@ -55,21 +56,9 @@ class GlossVideoFileSystemGroupFilter(admin.SimpleListFilter):
         return filesystem_groups
 
     def queryset(self, request, queryset):
-
-        def matching_file_group(videofile, key):
-            if not key:
-                return False
-            video_file_full_path = Path(WRITABLE_FOLDER, videofile)
-            if not video_file_full_path.exists():
-                return False
-            return video_file_full_path.group() == key
-
-        queryset_res = queryset.values('id', 'videofile')
-        results = [qv['id'] for qv in queryset_res
-                   if matching_file_group(qv['videofile'], self.value())]
-
+        # the groups of the files are taken from the media inventory
         if self.value():
-            return queryset.filter(id__in=results)
+            return queryset.filter(Exists(MediaFile.objects.filter(path=OuterRef('videofile'), group=self.value())))
         else:
             return queryset.all()
 
@@ -89,23 +78,12 @@ class GlossVideoExistenceFilter(admin.SimpleListFilter):
         return file_exists
 
     def queryset(self, request, queryset):
-
-        def matching_file_exists(videofile, key):
-            if not key:
-                return False
-            if 'glossvideo' not in videofile:
-                return False
-            video_file_full_path = Path(WRITABLE_FOLDER, videofile)
-            if video_file_full_path.exists():
-                return key == 'True'
-            else:
-                return key == 'False'
-
-        queryset_res = queryset.values('id', 'videofile')
-        results = [qv['id'] for qv in queryset_res
-                   if matching_file_exists(qv['videofile'], self.value())]
-        if self.value():
-            return queryset.filter(id__in=results)
+        # the files are looked up in the media inventory
+        file_exists = Exists(MediaFile.objects.filter(path=OuterRef('videofile')))
+        if self.value() == 'True':
+            return queryset.filter(videofile__contains='glossvideo').filter(file_exists)
+        elif self.value() == 'False':
+            return queryset.filter(videofile__contains='glossvideo').filter(~file_exists)
         else:
             return queryset.all()
 
@@ -581,6 +559,15 @@ class GlossVideoAdmin(admin.ModelAdmin):
     search_fields = ['^gloss__annotationidglosstranslation__text', '^gloss__lemma__lemmaidglosstranslation__text']
     actions = [rename_extension_videos, remove_backups, renumber_backups, unlink_files, convert_non_mp4_videos]
 
+    def get_queryset(self, request):
+        # the file columns are taken from the media inventory instead of the disk, see signbank.video.inventory
+        media_files = MediaFile.objects.filter(path=OuterRef('videofile'))
+        return super().get_queryset(request).annotate(
+            media_ctime=Subquery(media_files.values('ctime')[:1]),
+            media_group=Subquery(media_files.values('group')[:1]),
+            media_mode=Subquery(media_files.values('mode')[:1]),
+            media_size=Subquery(media_files.values('size')[:1]))
+
     def video_file(self, obj=None):
         """
         column VIDEO FILE
@@ -616,51 +603,36 @@ class GlossVideoAdmin(admin.ModelAdmin):
         column FILE TIMESTAMP
         if the file exists, this will display its timestamp in the list view
         """
-        if obj is None or not str(obj.videofile):
-            return ""
-        video_file_full_path = os.path.join(WRITABLE_FOLDER, str(obj.videofile))
-        if not os.path.exists(video_file_full_path):
+        if obj is None or not str(obj.videofile) or getattr(obj, 'media_ctime', None) is None:
             return ""
-        return DT.datetime.fromtimestamp(os.path.getctime(video_file_full_path))
+        return DT.datetime.fromtimestamp(obj.media_ctime)
 
     def file_group(self, obj=None):
         """
         column FILE GROUP
         if the file exists, this will display the file system group in the list view
         """
-        if obj is None or not str(obj.videofile):
-            return ""
-        video_file_full_path = Path(WRITABLE_FOLDER, str(obj.videofile))
-        if not video_file_full_path.exists():
+        if obj is None or not str(obj.videofile) or getattr(obj, 'media_group', None) is None:
             return ""
-        group = video_file_full_path.group()
-        return group
+        return obj.media_group
 
     def file_size(self, obj=None):
         """
         column FILE SIZE
         if the file exists, this will display the file size in the list view
         """
-        if obj is None or not str(obj.videofile):
-            return ""
-        video_file_full_path = Path(WRITABLE_FOLDER, str(obj.videofile))
-        if not video_file_full_path.exists():
+        if obj is None or not str(obj.videofile) or getattr(obj, 'media_size', None) is None:
             return ""
-        size = str(video_file_full_path.stat().st_size)
-        return size
+        return str(obj.media_size)
 
     def permissions(self, obj=None):
         """
         column PERMISSIONS
         if the file exists, this will display the file system permissions in the list view
         """
-        if obj is None or not str(obj.videofile):
-            return ""
-        video_file_full_path = Path(WRITABLE_FOLDER, str(obj.videofile))
-        if not video_file_full_path.exists():
+        if obj is None or not str(obj.videofile) or getattr(obj, 'media_mode', None) is None:
             return ""
-        stats = stat.filemode(video_file_full_path.stat().st_mode)
-        return stats
+        return stat.filemode(obj.media_mode)
 
     def video_type(self, obj=None):
         """
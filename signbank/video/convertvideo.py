@@ -11,12 +11,10 @@ except KeyError:
 
 import sys
 import os
-import time
-import signal
 import shutil
 import glob
 import ffmpeg
-from subprocess import Popen, PIPE
+from subprocess import PIPE
 import re
 import subprocess
 from signbank.settings.server_specific import DEBUG_VIDEOS
@@ -76,30 +74,20 @@ def get_middle_timecode(videofile):
 def run_ffmpeg(sourcefile, targetfile, timeout=60, options=[]):
     """Run FFMPEG with some command options, returning the output"""
 
-    errormsg = ""
-    
     ffmpeg = [FFMPEG_PROGRAM, "-y", "-i", sourcefile]
     ffmpeg += options
     ffmpeg += [targetfile]
 
-    process = Popen(ffmpeg, stdout=PIPE, stderr=PIPE)
-    start = time.time()
-    
-    while process.poll() is None:
-        if time.time()-start > timeout:
-            # we've gone over time, kill the process  
-            os.kill(process.pid, signal.SIGKILL)
-            print("Killing ffmpeg process for", sourcefile)
-            errormsg = "Conversion of video took too long.  This site is only able to host relatively short videos."
-            return errormsg
-        
-    status = process.poll()
-    out, err = process.communicate()
-    
-    # should check status
-    
+    try:
+        # wait for the process without using the processor, it is killed when it takes too long
+        process = subprocess.run(ffmpeg, stdout=PIPE, stderr=PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print("Killing ffmpeg process for", sourcefile)
+        errormsg = "Conversion of video took too long.  This site is only able to host relatively short videos."
+        return errormsg
+
     # return the error output - messages from ffmpeg
-    return err
+    return process.stderr
 
 
 def extract_frame(sourcefile, targetfile):
@@ -304,7 +292,7 @@ def rename_video_to_match_video_format(sourcefile):
     return True, new_filename
 
 
-def convert_video(sourcefile, targetfile):
+def convert_video(sourcefile, targetfile, timeout=None):
     """convert a video to h264 format"""
 
     file_was_renamed, video_file_matching_format = rename_video_to_match_video_format(sourcefile)
@@ -318,7 +306,11 @@ def convert_video(sourcefile, targetfile):
 
     try:
         # video_file_matching_format is the possibly renamed source file
-        result = subprocess.run(["ffmpeg", "-i", video_file_matching_format, targetfile])
+        result = subprocess.run(["ffmpeg", "-y", "-i", video_file_matching_format, targetfile],
+                                stdout=PIPE, stderr=PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print("Killing ffmpeg process for", video_file_matching_format)
+        return False, video_file_matching_format
     except (IOError, OSError, PermissionError):
         return False, video_file_matching_format
 
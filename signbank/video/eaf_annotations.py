@@ -0,0 +1,90 @@
+"""The glosses of the annotations of an EAF file, for annotated sentences.
+
+The time slots of the annotations are converted to milliseconds once. The labels of all tiers are looked up
+with one query for the dataset. The annotations of the left hand that overlap with those of the right hand
+are found with one sweep over the sorted start and end times, instead of comparing each pair.
+"""
+
+from signbank.dictionary.models import Dataset, AnnotationIdglossTranslation
+
+
+def tier_annotations(eaf, tier_name):
+    """The [label, start, end] of the annotations of the tier, with the times in ms"""
+    return [[annotation[2], int(eaf.timeslots[annotation[0]]), int(eaf.timeslots[annotation[1]])]
+            for annotation in eaf.tiers[tier_name][0].values()]
+
+
+def covered_points(points, intervals):
+    """The points that lie in one of the closed (start, end) intervals.
+    A point is covered if the largest end of the intervals that start at or before it is not before it"""
+    intervals = sorted(intervals)
+    covered = set()
+    reach = None
+    next_interval = 0
+    for point in sorted(set(points)):
+        while next_interval < len(intervals) and intervals[next_interval][0] <= point:
+            end = intervals[next_interval][1]
+            reach = end if reach is None else max(reach, end)
+            next_interval += 1
+        if reach is not None and reach >= point:
+            covered.add(point)
+    return covered
+
+
+def non_overlapping_annotations(annotations_1, annotations_2):
+    """The [label, start, end] annotations of annotations_2 that neither start nor end within an annotation of
+    annotations_1, in their original order"""
+    covered = covered_points([time for label, start, end in annotations_2 for time in (start, end)],
+                             [(start, end) for label, start, end in annotations_1])
+    return [annotation for annotation in annotations_2 if annotation[1] not in covered and annotation[2] not in covered]
+
+
+def gloss_ids_of_labels(dataset, labels, languages=None):
+    """Map the labels that are an annotation of a gloss of the dataset to the id of that gloss, with one query.
+    With languages, only the annotations in those languages are used. The first annotation with the label is used"""
+    translations = AnnotationIdglossTranslation.objects.filter(gloss__lemma__dataset=dataset, text__in=set(labels))
+    if languages is not None:
+        translations = translations.filter(language__in=languages)
+    gloss_ids = dict()
+    for text, gloss_id in translations.order_by('-id').values_list('text', 'gloss_id'):
+        gloss_ids[text] = gloss_id
+    return gloss_ids
+
+
+def get_glosses_from_eaf(eaf, dataset_acronym):
+    """The [label, start, end] annotations of the glosses of the dataset sorted by their start,
+    the labels that are not found and the sentence in the default language of the dataset"""
+    glosses, labels_not_found, sentences = [], [], []
+    sentence_dict = {}
+    dataset = Dataset.objects.select_related('default_language').get(acronym=dataset_acronym)
+
+    # check whether to use 'Signbank ID glossen' or 'Glosses R' and 'Glosses L' tiers
+    if 'Signbank ID glossen' in eaf.tiers:
+        annotations = tier_annotations(eaf, 'Signbank ID glossen')
+    else:
+        # the glosses of the left hand are added if they don't overlap with the right hand
+        right_hand = tier_annotations(eaf, 'Glosses R')
+        annotations = right_hand + non_overlapping_annotations(right_hand, tier_annotations(eaf, 'Glosses L'))
+
+    gloss_ids = gloss_ids_of_labels(dataset, [label for label, start, end in annotations])
+    for annotation in annotations:
+        if annotation[0] in gloss_ids:
+            glosses.append(annotation)
+        else:
+            labels_not_found.append(annotation[0])
+
+    # Sort the list of glosses by the "start" value
+    glosses = sorted(glosses, key=lambda x: x[1])
+
+    if 'Sentences' in eaf.tiers:
+        for annotation in eaf.tiers['Sentences'][0].values():
+            sentences.append(annotation[2])
+    elif 'Nederlands' in eaf.tiers:
+        for annotation in eaf.tiers['Nederlands'][0].values():
+            sentences.append(annotation[2])
+
+    dataset_language = dataset.default_language.language_code_3char
+    for sentence in sentences:
+        sentence_dict[dataset_language] = sentence
+
+    return glosses, labels_not_found, sentence_dict
@@ -0,0 +1,167 @@
+"""The inventory of the files in the gloss video and gloss image folders.
+
+The folders are walked with os.scandir and the result is compared with the MediaFile objects of the previous scan:
+new files are added, files with another size or modification time are updated and files that are gone are removed.
+A checksum is only computed again for files that changed. The scan_media_inventory command runs a scan,
+the dataset checks and the admin query the MediaFile objects instead of the disk.
+The files that Signbank writes, moves or removes itself are brought in line right away by sync_media_files,
+so the inventory does not have to wait for the next scan.
+"""
+
+import grp
+import os
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from signbank.settings.server_specific import WRITABLE_FOLDER, GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY
+from signbank.tools import get_checksum_for_path
+from signbank.video.models import GlossVideo, MediaFile
+
+INVENTORY_BATCH_SIZE = 1000
+
+
+def scan_folder(folder):
+    """Map the paths of the files in the folder and its subfolders, relative to WRITABLE_FOLDER, to their stat"""
+    files = dict()
+    folders = [folder]
+    while folders:
+        try:
+            entries = os.scandir(os.path.join(WRITABLE_FOLDER, folders.pop()))
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                relative_path = os.path.relpath(entry.path, WRITABLE_FOLDER)
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(relative_path)
+                elif entry.is_file():
+                    files[relative_path] = entry.stat()
+    return files
+
+
+def group_name(gid, group_names):
+    if gid not in group_names:
+        try:
+            group_names[gid] = grp.getgrgid(gid).gr_name
+        except KeyError:
+            group_names[gid] = str(gid)
+    return group_names[gid]
+
+
+def update_media_file(media_file, file_stat, group_names, checksums, scanned):
+    changed = media_file.size != file_stat.st_size or media_file.mtime != file_stat.st_mtime
+    media_file.size = file_stat.st_size
+    media_file.mtime = file_stat.st_mtime
+    media_file.ctime = file_stat.st_ctime
+    media_file.mode = file_stat.st_mode
+    media_file.group = group_name(file_stat.st_gid, group_names)
+    if checksums and (changed or not media_file.checksum):
+        media_file.checksum = get_checksum_for_path(os.path.join(WRITABLE_FOLDER, media_file.path)) or ''
+    elif changed:
+        media_file.checksum = ''
+    media_file.scanned = scanned
+    return media_file
+
+
+def scan_media_inventory(folders=(GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY), checksums=False):
+    """Bring the MediaFile objects of the folders in line with the disk, returns the number of
+    added, updated and removed files. With checksums the checksums of new and changed files are computed"""
+    scanned = timezone.now()
+    files_on_disk = dict()
+    for folder in folders:
+        files_on_disk.update(scan_folder(folder))
+    group_names = dict()
+    added, updated, removed_ids = [], [], []
+    known_paths = set()
+    for folder in folders:
+        for media_file in MediaFile.objects.filter(path__startswith=folder + '/').iterator():
+            known_paths.add(media_file.path)
+            file_stat = files_on_disk.get(media_file.path)
+            if file_stat is None:
+                removed_ids.append(media_file.id)
+            elif (media_file.size != file_stat.st_size or media_file.mtime != file_stat.st_mtime
+                  or media_file.ctime != file_stat.st_ctime or (checksums and not media_file.checksum)):
+                updated.append(update_media_file(media_file, file_stat, group_names, checksums, scanned))
+    for path, file_stat in files_on_disk.items():
+        if path not in known_paths:
+            added.append(update_media_file(MediaFile(path=path, size=-1, mtime=-1), file_stat,
+                                           group_names, checksums, scanned))
+    with transaction.atomic():
+        for start in range(0, len(removed_ids), INVENTORY_BATCH_SIZE):
+            MediaFile.objects.filter(id__in=removed_ids[start:start + INVENTORY_BATCH_SIZE]).delete()
+        MediaFile.objects.bulk_update(updated, ['size', 'mtime', 'ctime', 'mode', 'group', 'checksum', 'scanned'],
+                                      batch_size=INVENTORY_BATCH_SIZE)
+        MediaFile.objects.bulk_create(added, batch_size=INVENTORY_BATCH_SIZE)
+        update_media_links()
+    return len(added), len(updated), len(removed_ids)
+
+
+def sync_media_files(paths):
+    """Bring the MediaFile objects of the paths in line with the disk, for files that were written, moved or removed.
+    Paths outside the gloss video and gloss image folders are ignored"""
+    folders = tuple(folder + '/' for folder in (GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY))
+    paths = set(str(path) for path in paths if path and str(path).startswith(folders))
+    if not paths:
+        return
+    scanned = timezone.now()
+    known_files = dict((media_file.path, media_file) for media_file in MediaFile.objects.filter(path__in=paths))
+    linked_paths = set(GlossVideo.objects.filter(videofile__in=paths).values_list('videofile', flat=True))
+    group_names = dict()
+    added, updated, removed_ids = [], [], []
+    for path in paths:
+        media_file = known_files.get(path)
+        try:
+            file_stat = os.stat(os.path.join(WRITABLE_FOLDER, path))
+        except OSError:
+            if media_file is not None:
+                removed_ids.append(media_file.id)
+            continue
+        if media_file is None:
+            media_file = MediaFile(path=path, size=-1, mtime=-1)
+            added.append(media_file)
+        else:
+            updated.append(media_file)
+        update_media_file(media_file, file_stat, group_names, False, scanned)
+        media_file.linked = path in linked_paths
+    with transaction.atomic():
+        MediaFile.objects.filter(id__in=removed_ids).delete()
+        MediaFile.objects.bulk_update(updated, ['size', 'mtime', 'ctime', 'mode', 'group', 'checksum', 'linked',
+                                                'scanned'])
+        # another process may have added the same file
+        MediaFile.objects.bulk_create(added, ignore_conflicts=True)
+
+
+def update_media_links():
+    """Mark the media files that are the video file of a gloss video"""
+    linked_paths = set(GlossVideo.objects.exclude(videofile='').values_list('videofile', flat=True))
+    inventory_links = dict(MediaFile.objects.values_list('path', 'linked'))
+    now_linked = [path for path, linked in inventory_links.items() if not linked and path in linked_paths]
+    now_unlinked = [path for path, linked in inventory_links.items() if linked and path not in linked_paths]
+    for paths, linked in [(now_linked, True), (now_unlinked, False)]:
+        for start in range(0, len(paths), INVENTORY_BATCH_SIZE):
+            MediaFile.objects.filter(path__in=paths[start:start + INVENTORY_BATCH_SIZE]).update(linked=linked)
+
+
+def media_files_of_dataset(dataset, folder=GLOSS_VIDEO_DIRECTORY):
+    return MediaFile.objects.filter(path__startswith=os.path.join(folder, dataset.acronym) + '/')
+
+
+def dataset_media_summary(dataset):
+    """The number and total size of the video files of the dataset in the inventory, the number of those
+    that are not linked to a gloss video and when they were scanned"""
+    video_files = media_files_of_dataset(dataset)
+    summary = video_files.aggregate(number_of_files=Count('id'), total_size=Sum('size'), last_scanned=Max('scanned'))
+    summary['number_of_unlinked_files'] = video_files.filter(linked=False).count()
+    return summary
+
+
+def media_file_paths(paths):
+    """The paths of the set of paths that are in the inventory"""
+    found = set()
+    paths = list(paths)
+    for start in range(0, len(paths), INVENTORY_BATCH_SIZE):
+        found.update(MediaFile.objects.filter(path__in=paths[start:start + INVENTORY_BATCH_SIZE]).values_list(
+            'path', flat=True))
+    return found
@@ -0,0 +1,153 @@
+"""Video processing jobs.
+
+Converting an uploaded gloss video to mp4 and making its images runs ffmpeg for a while,
+so it is done by a small pool of worker threads instead of inside the request.
+The jobs are stored as VideoProcessingJob objects, so the upload page can poll their status
+and jobs that were left when the server stopped can be run with the run_video_jobs command.
+A job is not queued again for a file that already has a queued or running job of the same kind.
+"""
+
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from signbank.settings.server_specific import VIDEO_PROCESSING_WORKERS
+from signbank.dictionary.models import record_package_change
+from signbank.tools import generate_still_image
+from signbank.video.convertvideo import extract_frame
+from signbank.video.inventory import sync_media_files
+from signbank.video.models import GlossVideo, VideoProcessingJob
+
+_executor = None
+_executor_lock = threading.Lock()
+# the jobs of a gloss video are not run at the same time, a conversion renames the file
+_glossvideo_locks = defaultdict(threading.Lock)
+
+
+def video_job_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=VIDEO_PROCESSING_WORKERS, thread_name_prefix='video-job')
+        return _executor
+
+
+def enqueue_video_job(kind, glossvideo):
+    """Queue a job for the gloss video, or return the queued or running job of this kind for the same file"""
+    videofile = str(glossvideo.videofile)
+    job = VideoProcessingJob.objects.filter(kind=kind, glossvideo_id=glossvideo.id, videofile=videofile,
+                                            status__in=[VideoProcessingJob.QUEUED, VideoProcessingJob.RUNNING]).first()
+    if job is not None:
+        return job
+    job = VideoProcessingJob.objects.create(kind=kind, glossvideo_id=glossvideo.id, videofile=videofile)
+    # the worker can only find the job after the transaction of the request is committed
+    transaction.on_commit(lambda: video_job_executor().submit(run_video_job_in_worker, job.id))
+    return job
+
+
+def enqueue_video_jobs(kind, glossvideos):
+    """Queue a job of the kind for each of the gloss videos that has no queued or running one for the same file,
+    with one query and one insert. Returns the number of new jobs"""
+    glossvideo_files = dict((glossvideo.id, str(glossvideo.videofile)) for glossvideo in glossvideos)
+    waiting = set(VideoProcessingJob.objects.filter(
+        kind=kind, glossvideo_id__in=glossvideo_files.keys(),
+        status__in=[VideoProcessingJob.QUEUED, VideoProcessingJob.RUNNING]).values_list('glossvideo_id', 'videofile'))
+    jobs = VideoProcessingJob.objects.bulk_create([
+        VideoProcessingJob(kind=kind, glossvideo_id=glossvideo_id, videofile=videofile)
+        for glossvideo_id, videofile in glossvideo_files.items() if (glossvideo_id, videofile) not in waiting])
+    job_ids = [job.id for job in jobs]
+    transaction.on_commit(lambda: [video_job_executor().submit(run_video_job_in_worker, job_id) for job_id in job_ids])
+    return len(job_ids)
+
+
+def run_video_job_in_worker(job_id):
+    try:
+        run_video_job(job_id)
+    finally:
+        # the worker thread has its own database connection
+        connection.close()
+
+
+def specific_glossvideo(glossvideo):
+    """The NME or perspective video object of a gloss video, they store converted files in other places"""
+    if hasattr(glossvideo, 'glossvideonme'):
+        return glossvideo.glossvideonme
+    if hasattr(glossvideo, 'glossvideoperspective'):
+        return glossvideo.glossvideoperspective
+    return glossvideo
+
+
+def convert_to_mp4(glossvideo):
+    old_name = glossvideo.videofile.name
+    glossvideo.ensure_mp4()
+    if glossvideo.videofile.name == old_name:
+        return ''
+    glossvideo.update_file_state()
+    # save would queue the conversion again
+    GlossVideo.objects.filter(id=glossvideo.id).update(videofile=glossvideo.videofile.name,
+                                                       file_present=glossvideo.file_present,
+                                                       file_size=glossvideo.file_size)
+    sync_media_files([old_name, glossvideo.videofile.name])
+    record_package_change(glossvideo.gloss_id)
+    return glossvideo.videofile.name
+
+
+def extract_poster_frame(glossvideo):
+    if not os.path.exists(glossvideo.videofile.path):
+        raise FileNotFoundError(glossvideo.videofile.name)
+    poster_path = glossvideo.poster_path_on_disk()
+    if not os.path.exists(poster_path):
+        extract_frame(glossvideo.videofile.path, poster_path)
+    return ''
+
+
+def make_still_image(glossvideo):
+    generate_still_image(glossvideo)
+    return ''
+
+
+VIDEO_JOB_FUNCTIONS = {
+    VideoProcessingJob.CONVERT_TO_MP4: convert_to_mp4,
+    VideoProcessingJob.EXTRACT_FRAME: extract_poster_frame,
+    VideoProcessingJob.STILL_IMAGE: make_still_image,
+}
+
+
+def run_video_job(job_id):
+    """Run a queued job, returns the job or None if it was taken by another worker"""
+    claimed = VideoProcessingJob.objects.filter(id=job_id, status=VideoProcessingJob.QUEUED).update(
+        status=VideoProcessingJob.RUNNING, started=timezone.now())
+    if not claimed:
+        return None
+    job = VideoProcessingJob.objects.get(id=job_id)
+    with _glossvideo_locks[job.glossvideo_id]:
+        try:
+            # the gloss video is read again, an earlier job may have changed its file
+            glossvideo = specific_glossvideo(GlossVideo.objects.get(id=job.glossvideo_id))
+            job.message = VIDEO_JOB_FUNCTIONS[job.kind](glossvideo)
+            job.status = VideoProcessingJob.DONE
+        except Exception as e:
+            # a failed job must not stay running
+            job.message = repr(e)
+            job.status = VideoProcessingJob.FAILED
+    job.finished = timezone.now()
+    job.save(update_fields=['status', 'message', 'finished'])
+    return job
+
+
+def run_queued_video_jobs():
+    """Run the queued jobs in this process, returns the number of jobs that were run"""
+    number_of_jobs = 0
+    for job_id in VideoProcessingJob.objects.filter(status=VideoProcessingJob.QUEUED).values_list('id', flat=True):
+        if run_video_job(job_id) is not None:
+            number_of_jobs += 1
+    return number_of_jobs
+
+
+def video_job_status(job):
+    return {'id': job.id, 'kind': job.kind, 'status': job.status, 'finished': job.is_finished(),
+            'message': job.message if job.status == VideoProcessingJob.FAILED else ''}
@@ -1,63 +1,47 @@
-"""Make missing (thumbnail) images for existing videos"""
+"""Make missing (thumbnail) images and small videos for existing videos"""
+
+from django.core.management.base import BaseCommand
+from django.core.exceptions import ObjectDoesNotExist
+from signbank.dictionary.models import Dataset
+from signbank.video.media_pipeline import find_missing_media, make_missing_media
 
-from django.core.management.base import BaseCommand  
-from django.conf import settings
-from signbank.video.models import GlossVideo
-from signbank.video.convertvideo import extract_frame, run_ffmpeg, get_middle_timecode
-import os
 
 class Command(BaseCommand):
-     
-    help = 'Create missing PNG images for all videos'
-
-    def splitext_recurse(self, path):
-        """In case of multiple extentions, find the base name"""
-        base, ext = os.path.splitext(path)
-        if ext == '':
-            return base
-        else:
-            return self.splitext_recurse(base)
 
-    def handle(self, *args, **options):
-        
-        images_created = []
-        for vid in GlossVideo.objects.all():
+    help = 'Create missing PNG images for all videos, and with --small-videos the missing small videos. ' \
+           'A run that was stopped can be started again, it continues with the files that are still missing.'
 
-            video_path = vid.videofile.path
+    def add_arguments(self, parser):
+        parser.add_argument('dataset_acronym', nargs="*", type=str)
+        parser.add_argument('--small-videos', action='store_true', help='Also create the missing small videos')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='The number of ffmpeg processes, by default the number of processors')
 
-            # if the videofile for this gloss exists
-            if not os.path.exists(video_path):
-                continue
-                
-            # Make the expected image path
-            image_path = self.splitext_recurse(video_path) + ".png"
-            image_path = str(image_path.replace(settings.GLOSS_VIDEO_DIRECTORY, settings.GLOSS_IMAGE_DIRECTORY, 1))
-
-            # Check if it does not have an image
-            if not os.path.exists(image_path):
-                
-                # If a folder for the image does not exist yet, add one
-                image_dir = os.path.dirname(image_path)
-                if not os.path.isdir(image_dir):
-                    os.makedirs(image_dir)
+    def print_progress(self, task, error):
+        if error:
+            print("Error in creating the images for the following video: ", task, error)
+        else:
+            print("Created:", task)
 
+    def handle(self, *args, **options):
+        if options['dataset_acronym']:
+            datasets = []
+            for dataset_acronym in options['dataset_acronym']:
                 try:
-                    # make the missing image from the middle frame of the video
-                    ss = get_middle_timecode(video_path)
-                    run_ffmpeg(video_path, image_path, options=["-r", "1", "-f", "mjpeg", "-ss", ss])
-                    images_created.append(os.path.basename(image_path))
-                except:
-                    print("Error in creating an image for the following video: ", os.path.basename(video_path))
-
-        # Feedback about which images were created
-        if len(images_created) == 0:
-            print("No new images were added")
+                    datasets.append(Dataset.objects.get(acronym=dataset_acronym))
+                except ObjectDoesNotExist as e:
+                    print("Dataset '{}' not found.".format(dataset_acronym), e)
         else:
-            print("The following images were added: ")
-            for im in images_created:
-                print(im)
-        
+            datasets = Dataset.objects.all()
 
-    
-
-    
\ No newline at end of file
+        for dataset in datasets:
+            tasks = find_missing_media(dataset, posters=True, small_videos=options['small_videos'])
+            if not tasks:
+                print("No new images were needed for", dataset.acronym)
+                continue
+            print("Videos to process for {}:".format(dataset.acronym), len(tasks))
+            report = make_missing_media(tasks, workers=options['workers'], progress=self.print_progress)
+            videos_per_second = report['videos'] / report['seconds'] if report['seconds'] else 0
+            print("Images created: {posters}, small videos created: {small_videos}, failed: {failed}".format(**report))
+            print("Processed {} videos in {:.1f} seconds ({:.2f} videos per second)".format(
+                report['videos'], report['seconds'], videos_per_second))
@@ -0,0 +1,31 @@
+"""Bring the stored file_present and file_size of the gloss videos in line with the files on disk"""
+
+from django.core.management.base import BaseCommand
+from django.core.exceptions import ObjectDoesNotExist
+from signbank.dictionary.models import Dataset
+from signbank.video.models import GlossVideo, reconcile_glossvideo_file_states
+
+
+class Command(BaseCommand):
+
+    help = 'Update which gloss video files are present on disk, for files that were added, moved or removed ' \
+           'outside of Signbank. This is intended to be run as a cron job.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset_acronym', nargs="*", type=str)
+
+    def handle(self, *args, **options):
+        if not options['dataset_acronym']:
+            number_of_updates = reconcile_glossvideo_file_states()
+            print("Gloss videos updated:", number_of_updates)
+            return
+
+        for dataset_acronym in options['dataset_acronym']:
+            try:
+                dataset = Dataset.objects.get(acronym=dataset_acronym)
+            except ObjectDoesNotExist as e:
+                print("Dataset '{}' not found.".format(dataset_acronym), e)
+                continue
+            glossvideos = GlossVideo.objects.filter(gloss__lemma__dataset=dataset)
+            number_of_updates = reconcile_glossvideo_file_states(glossvideos)
+            print("Gloss videos updated for {}:".format(dataset_acronym), number_of_updates)
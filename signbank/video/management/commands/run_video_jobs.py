@@ -0,0 +1,23 @@
+"""Run the video processing jobs that are still queued, for instance after the server was restarted"""
+
+from django.core.management.base import BaseCommand
+from signbank.video.models import VideoProcessingJob
+from signbank.video.jobs import run_queued_video_jobs
+
+
+class Command(BaseCommand):
+
+    help = 'Run the queued video conversion and image jobs in this process. ' \
+           'With --requeue-running, jobs that were running when the server stopped are run again.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requeue-running', action='store_true',
+                            help='Queue the jobs that are marked as running again')
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            number_of_requeued = VideoProcessingJob.objects.filter(status=VideoProcessingJob.RUNNING).update(
+                status=VideoProcessingJob.QUEUED, started=None)
+            print("Running video jobs queued again:", number_of_requeued)
+        number_of_jobs = run_queued_video_jobs()
+        print("Video jobs run:", number_of_jobs)
@@ -0,0 +1,25 @@
+"""Finish or undo the gloss video moves that were interrupted"""
+
+from django.core.management.base import BaseCommand
+from signbank.video.relocation import resume_relocations, unfinished_relocation_journals
+
+
+class Command(BaseCommand):
+
+    help = 'Complete the gloss video moves whose journal is left after the server stopped, ' \
+           'or with --rollback move their files back to where they were.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rollback', action='store_true', help='Move the files back instead')
+        parser.add_argument('--list', action='store_true', help='Only show the journals that are left')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            for journal_path in unfinished_relocation_journals():
+                print(journal_path)
+            return
+        number_of_journals = resume_relocations(rollback=options['rollback'])
+        if options['rollback']:
+            print("Video moves rolled back:", number_of_journals)
+        else:
+            print("Video moves completed:", number_of_journals)
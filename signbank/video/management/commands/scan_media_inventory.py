@@ -0,0 +1,18 @@
+"""Update the media inventory of the gloss video and gloss image folders"""
+
+from django.core.management.base import BaseCommand
+from signbank.video.inventory import scan_media_inventory
+
+
+class Command(BaseCommand):
+
+    help = 'Scan the gloss video and gloss image folders and update the media inventory with the files that were ' \
+           'added, changed or removed since the previous scan. This is intended to be run as a cron job.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checksums', action='store_true',
+                            help='Compute the checksums of the new and changed files')
+
+    def handle(self, *args, **options):
+        added, updated, removed = scan_media_inventory(checksums=options['checksums'])
+        print("Media files added: {}, updated: {}, removed: {}".format(added, updated, removed))
@@ -0,0 +1,150 @@
+"""Make the missing posters and small videos of the gloss videos of a dataset.
+
+The video and image folders of the dataset are walked once to find which files exist.
+For each gloss video that misses its poster or small video, one ffmpeg process decodes the video
+and writes both: the middle frame as the poster and a scaled down copy as the small video.
+The videos are processed by a pool of processes, at most a few more are queued than there are workers.
+The files are written under a temporary name and moved into place when ffmpeg is done,
+so a run that was stopped can be started again and only makes what is still missing.
+"""
+
+import fractions
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import ffmpeg
+
+from signbank.settings.server_specific import WRITABLE_FOLDER, GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY, FFMPEG_PROGRAM
+from signbank.settings.base import FFMPEG_OPTIONS, FFMPEG_TIMEOUT
+from signbank.video.models import GlossVideo, add_small_appendix
+
+PARTIAL_APPENDIX = '.partial'
+
+
+class MediaTask:
+    """The files to make for one gloss video, poster_path or small_video_path is None if it exists"""
+
+    def __init__(self, glossvideo_id, video_path, poster_path, small_video_path):
+        self.glossvideo_id = glossvideo_id
+        self.video_path = video_path
+        self.poster_path = poster_path
+        self.small_video_path = small_video_path
+
+    def __str__(self):
+        return os.path.basename(self.video_path)
+
+
+def files_in_folder(folder):
+    """The paths of all files in the folder and its subfolders"""
+    paths = set()
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            paths.add(os.path.join(dirpath, filename))
+    return paths
+
+
+def find_missing_media(dataset, posters=True, small_videos=True, overwrite=False):
+    """The tasks for the current gloss videos of the dataset that miss a poster or a small video,
+    with overwrite the files are made for all gloss videos that exist on disk"""
+    existing_files = files_in_folder(os.path.join(WRITABLE_FOLDER, GLOSS_VIDEO_DIRECTORY, dataset.acronym))
+    existing_files |= files_in_folder(os.path.join(WRITABLE_FOLDER, GLOSS_IMAGE_DIRECTORY, dataset.acronym))
+    glossvideos = GlossVideo.objects.filter(gloss__lemma__dataset=dataset, version=0,
+                                            glossvideonme=None, glossvideoperspective=None).exclude(videofile='')
+    tasks = []
+    for glossvideo in glossvideos.order_by('id'):
+        video_path = glossvideo.videofile.path
+        if video_path not in existing_files:
+            continue
+        poster_path = glossvideo.poster_path_on_disk() if posters else None
+        if poster_path in existing_files and not overwrite:
+            poster_path = None
+        small_video_path = add_small_appendix(video_path) if small_videos else None
+        if small_video_path in existing_files and not overwrite:
+            small_video_path = None
+        if poster_path or small_video_path:
+            tasks.append(MediaTask(glossvideo.id, video_path, poster_path, small_video_path))
+    return tasks
+
+
+def partial_path(path):
+    # the extension is kept, ffmpeg chooses the output format from it
+    base, ext = os.path.splitext(path)
+    return base + PARTIAL_APPENDIX + ext
+
+
+def middle_frame_number(video_path):
+    probe = ffmpeg.probe(video_path)
+    video_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
+    if video_stream is None:
+        return 0
+    if 'nb_frames' in video_stream:
+        return int(video_stream['nb_frames']) // 2
+    return int(float(video_stream.get('duration', 0)) * float(fractions.Fraction(video_stream['r_frame_rate']))) // 2
+
+
+def make_media(video_path, poster_path, small_video_path):
+    """Make the poster and small video of a video with one ffmpeg process, returns an error message or ''"""
+    command = [FFMPEG_PROGRAM, '-y', '-i', video_path]
+    outputs = []
+    if poster_path:
+        command += ['-map', '0:v:0', '-vf', 'select=eq(n\\,%d)' % middle_frame_number(video_path),
+                    '-frames:v', '1', partial_path(poster_path)]
+        outputs.append(poster_path)
+    if small_video_path:
+        command += ['-map', '0:v:0', '-vf', 'fps=15,scale=-2:180'] + FFMPEG_OPTIONS + [partial_path(small_video_path)]
+        outputs.append(small_video_path)
+    for path in outputs:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 timeout=FFMPEG_TIMEOUT * len(outputs))
+    except subprocess.TimeoutExpired:
+        process = None
+    if process is None or process.returncode != 0:
+        for path in outputs:
+            if os.path.exists(partial_path(path)):
+                os.remove(partial_path(path))
+        return 'ffmpeg timed out' if process is None else process.stderr.decode('utf-8', 'replace')[-500:]
+    for path in outputs:
+        os.replace(partial_path(path), path)
+    return ''
+
+
+def make_missing_media(tasks, workers=None, progress=None):
+    """Run the tasks in a pool of processes, progress is called with each task and its error message.
+    Returns a report of the number of videos, posters and small videos that were made and the time it took"""
+    workers = workers or os.cpu_count() or 1
+    report = {'videos': 0, 'posters': 0, 'small_videos': 0, 'failed': 0, 'seconds': 0.0}
+    start_time = time.time()
+    tasks = iter(tasks)
+    running = dict()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # keep the queue of the pool short, a dataset can have many videos
+            while len(running) < 2 * workers:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                future = executor.submit(make_media, task.video_path, task.poster_path, task.small_video_path)
+                running[future] = task
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = running.pop(future)
+                try:
+                    error = future.result()
+                except Exception as e:
+                    error = repr(e)
+                if error:
+                    report['failed'] += 1
+                else:
+                    report['videos'] += 1
+                    report['posters'] += 1 if task.poster_path else 0
+                    report['small_videos'] += 1 if task.small_video_path else 0
+                if progress:
+                    progress(task, error)
+    report['seconds'] = time.time() - start_time
+    return report
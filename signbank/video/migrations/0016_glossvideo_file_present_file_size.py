@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 18:20
+
+import os
+
+from django.db import migrations, models
+
+from signbank.settings.server_specific import WRITABLE_FOLDER
+
+
+def set_file_states(apps, schema_editor):
+    GlossVideo = apps.get_model('video', 'GlossVideo')
+    changed_glossvideos = []
+    for glossvideo in GlossVideo.objects.only('id', 'videofile').iterator(chunk_size=1000):
+        if not glossvideo.videofile:
+            continue
+        try:
+            glossvideo.file_size = os.path.getsize(os.path.join(WRITABLE_FOLDER, glossvideo.videofile.name))
+        except OSError:
+            continue
+        glossvideo.file_present = True
+        changed_glossvideos.append(glossvideo)
+    GlossVideo.objects.bulk_update(changed_glossvideos, ['file_present', 'file_size'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0015_alter_glossvideonme_perspective'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='glossvideo',
+            name='file_present',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='glossvideo',
+            name='file_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(set_file_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0016_glossvideo_file_present_file_size'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VideoProcessingJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('convert', 'Convert to mp4'), ('frame', 'Extract poster frame'), ('still', 'Generate still image')], max_length=20)),
+                ('videofile', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=20)),
+                ('message', models.TextField(blank=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('glossvideo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='processing_jobs', to='video.glossvideo')),
+            ],
+            options={
+                'ordering': ['created', 'id'],
+            },
+        ),
+    ]
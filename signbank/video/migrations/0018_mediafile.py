@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0017_videoprocessingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField()),
+                ('mtime', models.FloatField()),
+                ('ctime', models.FloatField()),
+                ('mode', models.IntegerField()),
+                ('group', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('checksum', models.CharField(blank=True, max_length=32)),
+                ('linked', models.BooleanField(db_index=True, default=False)),
+                ('scanned', models.DateTimeField()),
+            ],
+        ),
+    ]
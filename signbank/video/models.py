@@ -11,7 +11,7 @@ import shutil
 import ffmpeg
 import subprocess
 
-from django.db import models
+from django.db import models, transaction
 from django.db.models.fields.files import FieldFile
 from django.dispatch import receiver
 from django.forms.utils import ValidationError
@@ -24,15 +24,17 @@ from django.utils.translation import gettext
 from signbank.settings.server_specific import (WRITABLE_FOLDER, DEBUG_VIDEOS,
                                                ESCAPE_UPLOADED_VIDEO_FILE_PATH, EXAMPLESENTENCE_VIDEO_DIRECTORY,
                                                ANNOTATEDSENTENCE_VIDEO_DIRECTORY,
-                                               GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY, FFMPEG_PROGRAM)
-from signbank.settings.base import MEDIA_ROOT, MEDIA_URL
+                                               GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY, FFMPEG_PROGRAM,
+                                               VIDEO_PROCESSING_IN_BACKGROUND)
+from signbank.settings.base import MEDIA_ROOT, MEDIA_URL, FFMPEG_TIMEOUT
 from signbank.video.convertvideo import (extract_frame, convert_video, make_thumbnail_video, generate_image_sequence,
                                          remove_stills, detect_video_file_extension, extension_on_filename)
 from signbank.video.operations import (filename_matches_nme, filename_matches_nme_backup, filename_matches_perspective,
                                        filename_matches_perspective_backup, filename_matches_video,
                                        filename_matches_backup_video, move_file_to_prullenmand)
 from signbank.dictionary.models import (Gloss, Morpheme, Dataset, Language, LemmaIdgloss, LemmaIdglossTranslation,
-                                        ExampleSentence, AnnotatedSentence, AnnotatedSentenceSource)
+                                        ExampleSentence, AnnotatedSentence, AnnotatedSentenceSource,
+                                        record_package_change, loaded_dataset_id, loaded_gloss)
 from signbank.tools import get_two_letter_dir, generate_still_image, get_checksum_for_path
 
 from signbank.video.resize_videos import VideoResizer
@@ -96,6 +98,8 @@ def remove_dangling_video_files(gloss):
             if DEBUG_VIDEOS:
                 print('remove_dangling_video_files: remove the video file that is not pointed to: ', relpath)
             os.remove(video_file_full_path)
+    from signbank.video.inventory import sync_media_files
+    sync_media_files(files_without_glossvideo_object)
     return
 
 
@@ -310,9 +314,39 @@ class GlossVideoStorage(FileSystemStorage):
     def get_valid_name(self, name):
         return name
 
+    def _save(self, name, content):
+        name = super(GlossVideoStorage, self)._save(name, content)
+        update_file_state_of_glossvideos(name)
+        from signbank.video.inventory import sync_media_files
+        sync_media_files([name])
+        return name
+
+    def delete(self, name):
+        super(GlossVideoStorage, self).delete(name)
+        update_file_state_of_glossvideos(name)
+        from signbank.video.inventory import sync_media_files
+        sync_media_files([name])
+
 
 storage = GlossVideoStorage()
 
+
+def video_file_state(name):
+    """Whether the file with this storage name exists and its size"""
+    if not name:
+        return False, None
+    try:
+        return True, os.path.getsize(os.path.join(WRITABLE_FOLDER, name))
+    except OSError:
+        return False, None
+
+
+def update_file_state_of_glossvideos(name):
+    # the gloss videos that refer to a file that was written or deleted by the storage
+    file_present, file_size = video_file_state(name)
+    GlossVideo.objects.filter(videofile=name).exclude(file_present=file_present, file_size=file_size).update(
+        file_present=file_present, file_size=file_size)
+
 # The 'action' choices are used in the GlossVideoHistory class
 ACTION_CHOICES = (('delete', 'delete'),
                   ('upload', 'upload'),
@@ -394,8 +428,9 @@ class GlossVideoHistory(models.Model):
 # * Changes to the lemmaidglosstranslations: process_lemmaidglosstranslation_changes(...)
 
 
-def get_gloss_path_to_video_file_on_disk(gloss):
-    idgloss = gloss.idgloss
+def get_gloss_path_to_video_file_on_disk(gloss, idgloss=None):
+    if idgloss is None:
+        idgloss = gloss.idgloss
     two_letter_dir = get_two_letter_dir(idgloss)
     dataset_dir = gloss.lemma.dataset.acronym
     filename = f'{idgloss}-{gloss.id}.mp4'
@@ -407,7 +442,8 @@ def get_gloss_path_to_video_file_on_disk(gloss):
         return ""
 
 
-def get_video_file_path(instance, original_filename, nmevideo=False, perspective='', offset=0, version=0):
+def get_video_file_path(instance, original_filename, nmevideo=False, perspective='', offset=0, version=0,
+                        idgloss=None):
     """
     Return the full path for storing an uploaded video
     :param instance: A GlossVideo instance
@@ -416,6 +452,7 @@ def get_video_file_path(instance, original_filename, nmevideo=False, perspective
     :param perspective: optional string for either 'left' or 'right'
     :param offset: order in sequence of NME video
     :param version: the version to determine the number of .bak extensions
+    :param idgloss: the idgloss of the gloss, if it is already known
     :return: 
     """
     perspective = '' if perspective in ['', 'center'] else perspective
@@ -427,7 +464,8 @@ def get_video_file_path(instance, original_filename, nmevideo=False, perspective
         if detected_extension:
             ext = detected_extension
 
-    idgloss = instance.gloss.idgloss
+    if idgloss is None:
+        idgloss = instance.gloss.idgloss
     video_folder = os.path.join(GLOSS_VIDEO_DIRECTORY,
                                 instance.gloss.lemma.dataset.acronym,
                                 get_two_letter_dir(idgloss))
@@ -870,20 +908,50 @@ class GlossVideo(models.Model):
     # for this gloss
     version = models.IntegerField("Version", default=0, null=False)
 
+    # whether the video file is on disk and its size, these are kept up to date when the video is saved,
+    # by the storage and by the reconcile_video_files command, so searching on videos does not touch the disk
+    file_present = models.BooleanField(default=False, db_index=True)
+    file_size = models.BigIntegerField(null=True, blank=True)
+
     def __init__(self, *args, **kwargs):
         if 'upload_to' in kwargs:
             self.upload_to = kwargs.pop('upload_to')
         else:
             self.upload_to = get_video_file_path
         super().__init__(*args, **kwargs)
+        # the name in the database, the media inventory is updated for both names when the file is renamed;
+        # a deferred video file is not loaded for this
+        stored_videofile = self.__dict__.get('videofile')
+        self.stored_videofile_name = str(stored_videofile) if stored_videofile else ''
 
     def save(self, *args, **kwargs):
+        convert_later = False
         try:
-            self.ensure_mp4()
+            if VIDEO_PROCESSING_IN_BACKGROUND:
+                # the conversion is done by a video processing job after the video is stored
+                convert_later = self.mp4_conversion_needed()
+            else:
+                self.ensure_mp4()
         except (ValueError, IOError) as e:
             msg = getattr(e, 'message', repr(e))
             raise ValueError(msg)
+        if self.update_file_state() and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = list(kwargs['update_fields']) + ['file_present', 'file_size']
         super(GlossVideo, self).save(*args, **kwargs)
+        from signbank.video.inventory import sync_media_files
+        sync_media_files([self.stored_videofile_name, self.videofile.name if self.videofile else ''])
+        self.stored_videofile_name = self.videofile.name if self.videofile else ''
+        if convert_later:
+            from signbank.video.jobs import enqueue_video_job
+            enqueue_video_job(VideoProcessingJob.CONVERT_TO_MP4, self)
+
+    def update_file_state(self):
+        """Set file_present and file_size from the video file on disk, returns whether they changed"""
+        file_present, file_size = video_file_state(self.videofile.name if self.videofile else '')
+        changed = (file_present, file_size) != (self.file_present, self.file_size)
+        self.file_present = file_present
+        self.file_size = file_size
+        return changed
 
     def process(self):
         """The clean method will try to validate the video
@@ -897,13 +965,14 @@ class GlossVideo(models.Model):
         """Return the path of the poster image for this
         video, if create=True, create the image if needed
         Return None if create=False and the file doesn't exist"""
-        vidpath, _ = os.path.splitext(self.videofile.path)
-        poster_path = vidpath + ".png"
-        # replace vidpath with imagepath!
-        poster_path = str(poster_path.replace(GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY, 1))
+        poster_path = self.poster_path_on_disk()
 
         if not os.path.exists(poster_path):
-            if create:
+            if create and VIDEO_PROCESSING_IN_BACKGROUND:
+                # the image is made by a video processing job
+                from signbank.video.jobs import enqueue_video_job
+                enqueue_video_job(VideoProcessingJob.EXTRACT_FRAME, self)
+            elif create:
                 # need to create the image
                 extract_frame(self.videofile.path, poster_path)
             else:
@@ -911,6 +980,12 @@ class GlossVideo(models.Model):
 
         return poster_path
     
+    def poster_path_on_disk(self):
+        vidpath, _ = os.path.splitext(self.videofile.path)
+        poster_path = vidpath + ".png"
+        # replace vidpath with imagepath!
+        return str(poster_path.replace(GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY, 1))
+
     def poster_file(self):
         vidpath, ext = os.path.splitext(self.videofile.name)
         poster_file = vidpath + ".png"
@@ -918,13 +993,13 @@ class GlossVideo(models.Model):
         poster_file = str(poster_file.replace(GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY, 1))
         return poster_file
 
-    def ensure_mp4(self):
-        """Ensure that the video file is a h264 format
-        video, convert it if necessary"""
+    def mp4_conversion_needed(self):
+        """Whether the video file has to be converted to a h264 format video,
+        raises a ValueError and removes the file if it is not a video file"""
         if not self.videofile or not self.videofile.name or not os.path.exists(self.videofile.path):
-            return
+            return False
         if self.version > 0:
-            return
+            return False
         video_format_extension = detect_video_file_extension(self.videofile.path)
         if not video_format_extension:
             # this is not a video file
@@ -933,12 +1008,20 @@ class GlossVideo(models.Model):
             self.videofile.name = ''
             raise ValueError(gettext('The file is not a video file.'))
         (basename, ext) = os.path.splitext(self.videofile.path)
-        if video_format_extension != '.mp4' or ext != video_format_extension:
-            # the video format does not match the file extension or needs to be converted
-            oldloc = self.videofile.path
-            newloc = basename + ".mp4"
-            okay, result = convert_video(oldloc, newloc)
-            self.videofile.name = get_video_file_path(self, result, nmevideo=False, perspective='', version=self.version)
+        # the video format does not match the file extension or needs to be converted
+        return video_format_extension != '.mp4' or ext != video_format_extension
+
+    def converted_video_file_path(self, converted_file):
+        return get_video_file_path(self, converted_file, nmevideo=False, perspective='', version=self.version)
+
+    def ensure_mp4(self):
+        """Ensure that the video file is a h264 format
+        video, convert it if necessary"""
+        if not self.mp4_conversion_needed():
+            return
+        (basename, ext) = os.path.splitext(self.videofile.path)
+        okay, result = convert_video(self.videofile.path, basename + ".mp4", timeout=FFMPEG_TIMEOUT)
+        self.videofile.name = self.converted_video_file_path(result)
 
     def ch_own_mod_video(self):
         """Change owner and permissions"""
@@ -986,6 +1069,11 @@ class GlossVideo(models.Model):
         #     print(e)
 
     def make_poster_image(self):
+        if VIDEO_PROCESSING_IN_BACKGROUND:
+            # the image is made by a video processing job
+            from signbank.video.jobs import enqueue_video_job
+            enqueue_video_job(VideoProcessingJob.STILL_IMAGE, self)
+            return
         try:
             generate_still_image(self)
         except (OSError, PermissionError, IOError):
@@ -1059,6 +1147,17 @@ class GlossVideo(models.Model):
         """Test if this instance is a Gloss Video Perspective"""
         return hasattr(self, 'glossvideoperspective')
 
+    def relocated_video_file_path(self, idgloss=None):
+        """The name the video file should have for the current gloss, lemma and dataset"""
+        return str(get_video_file_path(self, str(self.videofile), nmevideo=False, perspective='', offset=0,
+                                       version=self.version, idgloss=idgloss))
+
+    def related_file_names(self, name):
+        """The names of the files that move with a video file of this name: the video, its small video and its image"""
+        name_no_extension, _ = os.path.splitext(name)
+        image_name = name_no_extension.replace(GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY, 1) + '.png'
+        return [name, add_small_appendix(name), image_name]
+
     def move_video(self, move_files_on_disk=True):
         """
         Calculates the new path, moves the video file to the new path and updates the videofile field
@@ -1066,41 +1165,8 @@ class GlossVideo(models.Model):
         """
         if not self.videofile or not self.videofile.name or not move_files_on_disk:
             return
-        old_path = str(self.videofile)
-        new_path = str(get_video_file_path(self, old_path, nmevideo=False, perspective='', offset=0, version=self.version))
-        if old_path == new_path:
-            return
-        source = os.path.join(WRITABLE_FOLDER, old_path)
-        destination = os.path.join(WRITABLE_FOLDER, new_path)
-        if os.path.exists(source):
-            destination_dir = os.path.dirname(destination)
-            if not os.path.exists(destination_dir):
-                os.makedirs(destination_dir)
-            if os.path.isdir(destination_dir):
-                shutil.move(source, destination)
-        self.videofile.name = new_path
-        self.save()
-
-        # Small video
-        (source_no_extension, ext) = os.path.splitext(source)
-        source_small = add_small_appendix(source)
-        (destination_no_extension, ext) = os.path.splitext(destination)
-        destination_small = add_small_appendix(destination)
-        if os.path.exists(source_small):
-            shutil.move(source_small, destination_small)
-
-        # Image
-        source_image = source_no_extension.replace(GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY)\
-                       + '.png'
-        if not os.path.exists(source_image):
-            return
-        destination_image = destination_no_extension.replace(GLOSS_VIDEO_DIRECTORY, GLOSS_IMAGE_DIRECTORY)\
-                       + '.png'
-        destination_image_dir = os.path.dirname(destination_image)
-        if not os.path.exists(destination_image_dir):
-            os.makedirs(destination_image_dir)
-        if os.path.isdir(destination_image_dir):
-            shutil.move(source_image, destination_image)
+        from signbank.video.relocation import relocate_videos
+        relocate_videos([self])
 
 
 class GlossVideoDescription(models.Model):
@@ -1162,54 +1228,19 @@ class GlossVideoNME(GlossVideo):
             print('get_video_path GlossVideoNME: ', str(self.videofile))
         return escape_uri_path(self.videofile.name) if self.videofile else ''
 
-    def ensure_mp4(self):
-        """Ensure that the video file is a h264 format
-        video, convert it if necessary"""
-        if not self.videofile or not self.videofile.name or not os.path.exists(self.videofile.path):
-            return
-        if self.version > 0:
-            return
-        video_format_extension = detect_video_file_extension(self.videofile.path)
-        if not video_format_extension:
-            # this is not a video file
-            if os.path.exists(self.videofile.path):
-                os.remove(self.videofile.path)
-            self.videofile.name = ''
-            raise ValueError(gettext('The file is not a video file.'))
-        (basename, ext) = os.path.splitext(self.videofile.path)
-        if video_format_extension != '.mp4' or ext != video_format_extension:
-            oldloc = self.videofile.path
-            newloc = basename + ".mp4"
-            okay, result = convert_video(oldloc, newloc)
-            self.videofile.name = get_video_file_path(self, result,
-                                                      nmevideo=True, perspective=self.perspective, offset=self.offset, version=self.version)
+    def converted_video_file_path(self, converted_file):
+        return get_video_file_path(self, converted_file,
+                                   nmevideo=True, perspective=self.perspective, offset=self.offset, version=self.version)
 
     def save(self, *args, **kwargs):
         super(GlossVideoNME, self).save(*args, **kwargs)
 
-    def move_video(self, move_files_on_disk=True):
-        """
-        Calculates the new path, moves the video file to the new path and updates the videofile field
-        :return:
-        """
-        if not self.videofile or not self.videofile.name or not move_files_on_disk:
-            return
-        old_path = str(self.videofile)
-        new_path = str(get_video_file_path(self, self.videofile.path, nmevideo=True, perspective=self.perspective, offset=self.offset, version=self.version))
-        if old_path == new_path:
-            return
-        source = os.path.join(WRITABLE_FOLDER, old_path)
-        destination = os.path.join(WRITABLE_FOLDER, new_path)
-        if not os.path.exists(source):
-            return
-        destination_dir = os.path.dirname(destination)
-        if not os.path.exists(destination_dir):
-            os.makedirs(destination_dir)
-        if os.path.isdir(destination_dir):
-            shutil.move(source, destination)
+    def relocated_video_file_path(self, idgloss=None):
+        return str(get_video_file_path(self, self.videofile.path, nmevideo=True, perspective=self.perspective,
+                                       offset=self.offset, version=self.version, idgloss=idgloss))
 
-        self.videofile.name = new_path
-        self.save()
+    def related_file_names(self, name):
+        return [name]
 
     def delete_files(self):
         """Delete the files associated with this object"""
@@ -1273,56 +1304,16 @@ class GlossVideoPerspective(GlossVideo):
     def save(self, *args, **kwargs):
         super(GlossVideoPerspective, self).save(*args, **kwargs)
 
-    def ensure_mp4(self):
-        """Ensure that the video file is a h264 format
-        video, convert it if necessary"""
-
-        # convert video to use the right size and iphone/net friendly bitrate
-        # create a temporary copy in the new format
-        # then move it into place
-        if not self.videofile or not self.videofile.name or not os.path.exists(self.videofile.path):
-            return
-        if self.version > 0:
-            return
-        video_format_extension = detect_video_file_extension(str(self.videofile))
-        if not video_format_extension:
-            # this is not a video file
-            if os.path.exists(self.videofile.path):
-                os.remove(self.videofile.path)
-            self.videofile.name = ''
-            raise ValueError(gettext('The file is not a video file.'))
-        (basename, ext) = os.path.splitext(self.videofile.path)
-        if video_format_extension != '.mp4' or ext != video_format_extension:
-            oldloc = self.videofile.path
-            newloc = basename + ".mp4"
-            okay, result = convert_video(oldloc, newloc)
-            self.videofile.name = get_video_file_path(self, result,
-                                                      nmevideo=False, perspective=self.perspective, offset=0, version=self.version)
-
-    def move_video(self, move_files_on_disk=True):
-        """
-        Calculates the new path, moves the video file to the new path and updates the videofile field
-        :return:
-        """
-        if not self.videofile or not self.videofile.name or not move_files_on_disk:
-            return
-        # other code does this too. It's a dubious way to obtain the path
-        old_path = str(self.videofile)
-        new_path = str(get_video_file_path(self, self.videofile.path, nmevideo=False, perspective=self.perspective, version=self.version))
-        if old_path == new_path:
-            return
+    def converted_video_file_path(self, converted_file):
+        return get_video_file_path(self, converted_file,
+                                   nmevideo=False, perspective=self.perspective, offset=0, version=self.version)
 
-        source = os.path.join(WRITABLE_FOLDER, old_path)
-        destination = os.path.join(WRITABLE_FOLDER, new_path)
-        if os.path.exists(source):
-            destination_dir = os.path.dirname(destination)
-            if not os.path.exists(destination_dir):
-                os.makedirs(destination_dir)
-            if os.path.isdir(destination_dir):
-                shutil.move(source, destination)
+    def relocated_video_file_path(self, idgloss=None):
+        return str(get_video_file_path(self, self.videofile.path, nmevideo=False, perspective=self.perspective,
+                                       version=self.version, idgloss=idgloss))
 
-        self.videofile.name = new_path
-        self.save()
+    def related_file_names(self, name):
+        return [name]
 
     def delete_files(self):
         """Delete the files associated with this object"""
@@ -1362,18 +1353,93 @@ class GlossVideoPerspective(GlossVideo):
             self.save(update_fields=['version'])
 
 
-def move_videos_for_filter(filter, move_files_on_disk: bool=False) -> None:
+class VideoProcessingJob(models.Model):
+    """A conversion of a gloss video or the making of its image, done in the background by signbank.video.jobs"""
+
+    CONVERT_TO_MP4 = 'convert'
+    EXTRACT_FRAME = 'frame'
+    STILL_IMAGE = 'still'
+    KIND_CHOICES = ((CONVERT_TO_MP4, 'Convert to mp4'),
+                    (EXTRACT_FRAME, 'Extract poster frame'),
+                    (STILL_IMAGE, 'Generate still image'))
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed'))
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    glossvideo = models.ForeignKey(GlossVideo, on_delete=models.CASCADE, related_name='processing_jobs')
+    # the video file the job was made for, a job is not repeated for the same file while it is queued or running
+    videofile = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    message = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created', 'id']
+
+    def __str__(self):
+        return self.kind + ' ' + self.videofile + ': ' + self.status
+
+    def is_finished(self):
+        return self.status in [VideoProcessingJob.DONE, VideoProcessingJob.FAILED]
+
+
+class MediaFile(models.Model):
+    """A file in the gloss video or gloss image folders, as found by the last scan of signbank.video.inventory
+    or updated when Signbank wrote, moved or removed the file.
+    The dataset checks and the admin read the files from here instead of from the disk"""
+
+    # relative to WRITABLE_FOLDER, as the videofile of a GlossVideo
+    path = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    mtime = models.FloatField()
+    ctime = models.FloatField()
+    mode = models.IntegerField()
+    group = models.CharField(max_length=100, blank=True, db_index=True)
+    # the md5 checksum, empty until it is computed
+    checksum = models.CharField(max_length=32, blank=True)
+    # whether the videofile of a GlossVideo is this file
+    linked = models.BooleanField(default=False, db_index=True)
+    scanned = models.DateTimeField()
+
+    def __str__(self):
+        return self.path
+
+
+def reconcile_glossvideo_file_states(glossvideos=None, batch_size=1000):
+    """Update file_present and file_size of the gloss videos from the disk, for files that were
+    added, moved or removed outside of the storage. Returns the number of gloss videos that were updated"""
+    if glossvideos is None:
+        glossvideos = GlossVideo.objects.all()
+    number_of_updates = 0
+    changed_glossvideos = []
+    for glossvideo in glossvideos.only('id', 'videofile', 'file_present', 'file_size').iterator(chunk_size=batch_size):
+        if glossvideo.update_file_state():
+            changed_glossvideos.append(glossvideo)
+        if len(changed_glossvideos) >= batch_size:
+            GlossVideo.objects.bulk_update(changed_glossvideos, ['file_present', 'file_size'])
+            number_of_updates += len(changed_glossvideos)
+            changed_glossvideos = []
+    GlossVideo.objects.bulk_update(changed_glossvideos, ['file_present', 'file_size'])
+    return number_of_updates + len(changed_glossvideos)
+
+
+def move_videos_for_filter(filter, move_files_on_disk: bool=False, directories=()) -> None:
     """
     Changes GlossVideo.videofile values for a filter dict
     and moves files on disk if move_file_on_disk is True (default is False).
     A filter dict is used in the QuerySet.filter method as **filter
+    All videos are moved together, see signbank.video.relocation
     """
-    for glossvideo in GlossVideo.objects.filter(**filter, glossvideonme=None, glossvideoperspective=None):
-        glossvideo.move_video(move_files_on_disk=move_files_on_disk)
-    for glossvideo_nme in GlossVideoNME.objects.filter(**filter):
-        glossvideo_nme.move_video(move_files_on_disk=move_files_on_disk)
-    for glossvideos_perspective in GlossVideoPerspective.objects.filter(**filter):
-        glossvideos_perspective.move_video(move_files_on_disk=move_files_on_disk)
+    if not move_files_on_disk:
+        return
+    from signbank.video.relocation import relocate_videos
+    relocate_videos(GlossVideo.objects.filter(**filter).exclude(videofile=''), directories=directories)
 
 
 @receiver(models.signals.post_save, sender=Dataset)
@@ -1389,18 +1455,12 @@ def process_dataset_changes(sender, instance, **kwargs):
     # and rename directories.
     dataset = instance
     if dataset._initial['acronym'] and dataset.acronym != dataset._initial['acronym']:
-        move_videos_for_filter({'gloss__lemma__dataset': dataset}, move_files_on_disk=False)
-
-        # Rename dirs
-        glossvideo_path_original = os.path.join(WRITABLE_FOLDER, GLOSS_VIDEO_DIRECTORY, dataset._initial['acronym'])
-        glossvideo_path_new = os.path.join(WRITABLE_FOLDER, GLOSS_VIDEO_DIRECTORY, dataset.acronym)
-        if os.path.exists(glossvideo_path_original):
-            os.rename(glossvideo_path_original, glossvideo_path_new)
-
-        glossimage_path_original = os.path.join(WRITABLE_FOLDER, GLOSS_IMAGE_DIRECTORY, dataset._initial['acronym'])
-        glossimage_path_new = os.path.join(WRITABLE_FOLDER, GLOSS_IMAGE_DIRECTORY, dataset.acronym)
-        if os.path.exists(glossimage_path_original):
-            os.rename(glossimage_path_original, glossimage_path_new)
+        # the dirs are renamed and the names of the videos are updated together
+        directories = [(os.path.join(GLOSS_VIDEO_DIRECTORY, dataset._initial['acronym']),
+                        os.path.join(GLOSS_VIDEO_DIRECTORY, dataset.acronym)),
+                       (os.path.join(GLOSS_IMAGE_DIRECTORY, dataset._initial['acronym']),
+                        os.path.join(GLOSS_IMAGE_DIRECTORY, dataset.acronym))]
+        move_videos_for_filter({'gloss__lemma__dataset': dataset}, move_files_on_disk=True, directories=directories)
 
         # Make sure that _initial reflect the database for the dataset object
         dataset._initial['acronym'] = dataset.acronym
@@ -1451,20 +1511,7 @@ def process_gloss_changes(sender, instance, update_fields=[], **kwargs):
     """
     if not update_fields:
         return
-    gloss = instance
-    glossvideos = GlossVideo.objects.filter(gloss=gloss, glossvideonme=None, glossvideoperspective=None)
-    for glossvideo in glossvideos:
-        if hasattr(instance, 'glossvideonme'):
-            continue
-        if hasattr(instance, 'glossvideoperspective'):
-            continue
-        glossvideo.move_video(move_files_on_disk=True)
-    glossvideos = GlossVideoNME.objects.filter(gloss=gloss)
-    for glossvideo in glossvideos:
-        glossvideo.move_video(move_files_on_disk=True)
-    glossvideos = GlossVideoPerspective.objects.filter(gloss=gloss)
-    for glossvideo in glossvideos:
-        glossvideo.move_video(move_files_on_disk=True)
+    move_videos_for_filter({'gloss': instance}, move_files_on_disk=True)
 
 
 @receiver(models.signals.post_save, sender=GlossVideoNME)
@@ -1522,9 +1569,32 @@ def delete_files(sender, instance, **kwargs):
         print('delete_files pre_delete: ', sender, str(instance))
     if not instance.videofile or not instance.videofile.name:
         return
+    videofile_name = instance.videofile.name
+    # the media inventory is updated when the object is deleted, the file is no longer linked then
+    from signbank.video.inventory import sync_media_files
+    transaction.on_commit(lambda: sync_media_files([videofile_name]))
     if hasattr(instance, 'glossvideonme'):
         status = instance.delete_files()
     elif hasattr(instance, 'glossvideoperspective'):
         status = instance.delete_files()
     else:
         status = instance.delete_files()
+
+
+@receiver(models.signals.post_save, sender=GlossVideo)
+@receiver(models.signals.post_save, sender=GlossVideoNME)
+@receiver(models.signals.post_save, sender=GlossVideoPerspective)
+@receiver(models.signals.post_delete, sender=GlossVideo)
+@receiver(models.signals.post_delete, sender=GlossVideoNME)
+@receiver(models.signals.post_delete, sender=GlossVideoPerspective)
+def record_package_change_of_video(sender, instance, **kwargs):
+    """
+    The cached packages of the dataset of the gloss are patched on the next request
+    :param sender:
+    :param instance:
+    :param kwargs:
+    :return:
+    """
+    if kwargs.get('raw') or not instance.gloss_id:
+        return
+    record_package_change(instance.gloss_id, loaded_dataset_id(loaded_gloss(instance)))
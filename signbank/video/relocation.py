@@ -0,0 +1,204 @@
+"""Move the files of gloss videos to the paths that follow from their gloss, lemma and dataset.
+
+All moves are planned first: for each gloss video the new name and the files to rename,
+the video itself, its small video and its image. The plan is written to a journal file,
+then the files are renamed and the names are stored with one bulk update.
+The journal is removed when the update is committed. When the server stopped before that,
+the run_video_relocations command finishes the moves of the journals that are left, or moves the files back.
+Renaming a file is skipped when it is not at its source, so a plan can be completed or rolled back more than once.
+"""
+
+import json
+import os
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+
+from signbank.settings.server_specific import WRITABLE_FOLDER, VIDEO_RELOCATION_JOURNAL_FOLDER
+from signbank.dictionary.models import LemmaIdglossTranslation, record_package_changes
+from signbank.video.models import GlossVideo
+
+RELOCATION_BATCH_SIZE = 1000
+
+
+def journal_folder():
+    return os.path.join(WRITABLE_FOLDER, VIDEO_RELOCATION_JOURNAL_FOLDER)
+
+
+def idglosses_of_glosses(glosses):
+    """Map the ids of the glosses to their idgloss, as Gloss.idgloss, with one query for the lemma translations"""
+    lemma_ids = set(gloss.lemma_id for gloss in glosses if gloss.lemma_id)
+    translations = dict()
+    for lemma_id, language_id, language_code, text in LemmaIdglossTranslation.objects.filter(
+            lemma_id__in=lemma_ids).order_by('id').values_list('lemma_id', 'language_id',
+                                                               'language__language_code_2char', 'text'):
+        translations.setdefault(lemma_id, []).append((language_id, language_code, text))
+    keywords_language_code = settings.DEFAULT_KEYWORDS_LANGUAGE['language_code_2char']
+    idglosses = dict()
+    for gloss in glosses:
+        idglosses[gloss.id] = str(gloss.id)
+        if not gloss.lemma or not gloss.lemma.dataset or gloss.lemma_id not in translations:
+            continue
+        lemma_translations = translations[gloss.lemma_id]
+        default_language_id = gloss.lemma.dataset.default_language_id
+        for matches in [lambda translation: translation[0] == default_language_id,
+                        lambda translation: translation[1] == keywords_language_code,
+                        lambda translation: True]:
+            found = [translation[2] for translation in lemma_translations if matches(translation)]
+            if found:
+                idglosses[gloss.id] = found[0]
+                break
+    return idglosses
+
+
+def specific_glossvideos(glossvideos):
+    """The gloss videos as NME or perspective videos where they are, with their gloss, lemma and dataset"""
+    from signbank.video.jobs import specific_glossvideo
+    if isinstance(glossvideos, QuerySet):
+        glossvideo_ids = glossvideos.values('id')
+    else:
+        glossvideo_ids = [glossvideo.id for glossvideo in glossvideos]
+    glossvideos = GlossVideo.objects.filter(id__in=glossvideo_ids).select_related(
+        'gloss__lemma__dataset', 'glossvideonme', 'glossvideoperspective')
+    return [specific_glossvideo(glossvideo) for glossvideo in glossvideos.order_by('id')]
+
+
+def rename_prefix(name, directories):
+    for source, destination in directories:
+        if name.startswith(source + '/'):
+            return destination + name[len(source):]
+    return name
+
+
+def plan_video_relocations(glossvideos, directories=()):
+    """The directories to rename and for each gloss video its new name and the files to rename.
+    Directories are pairs of paths relative to the writable folder, they are renamed before the files"""
+    directories = [[source, destination] for source, destination in directories
+                   if os.path.isdir(os.path.join(WRITABLE_FOLDER, source))
+                   and not os.path.exists(os.path.join(WRITABLE_FOLDER, destination))]
+    glossvideos = specific_glossvideos(glossvideos)
+    idglosses = idglosses_of_glosses(set(glossvideo.gloss for glossvideo in glossvideos))
+    moves = []
+    for glossvideo in glossvideos:
+        if not glossvideo.videofile or not glossvideo.videofile.name:
+            continue
+        old_name = glossvideo.videofile.name
+        new_name = glossvideo.relocated_video_file_path(idgloss=idglosses[glossvideo.gloss_id])
+        # the name of the file after the directories are renamed
+        current_name = rename_prefix(old_name, directories)
+        if new_name == old_name and new_name == current_name:
+            continue
+        files = [[source, destination] for source, destination in
+                 zip(glossvideo.related_file_names(current_name), glossvideo.related_file_names(new_name))
+                 if source != destination]
+        moves.append({'glossvideo': glossvideo.id, 'gloss': glossvideo.gloss_id,
+                      'dataset': glossvideo.gloss.lemma.dataset_id if glossvideo.gloss.lemma else None,
+                      'old_name': old_name, 'new_name': new_name, 'files': files})
+    return {'directories': directories, 'moves': moves}
+
+
+def write_journal(plan):
+    os.makedirs(journal_folder(), exist_ok=True)
+    journal_path = os.path.join(journal_folder(), 'relocation-%d-%d.json' % (time.time() * 1000, os.getpid()))
+    temporary_path = journal_path + '.tmp'
+    with open(temporary_path, 'w') as journal_file:
+        json.dump(plan, journal_file)
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+    # the journal is complete or absent
+    os.replace(temporary_path, journal_path)
+    return journal_path
+
+
+def read_journal(journal_path):
+    with open(journal_path) as journal_file:
+        return json.load(journal_file)
+
+
+def unfinished_relocation_journals():
+    if not os.path.isdir(journal_folder()):
+        return []
+    return sorted(os.path.join(journal_folder(), filename) for filename in os.listdir(journal_folder())
+                  if filename.endswith('.json'))
+
+
+def rename_path(source, destination):
+    source = os.path.join(WRITABLE_FOLDER, source)
+    destination = os.path.join(WRITABLE_FOLDER, destination)
+    if not os.path.exists(source):
+        return False
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    os.replace(source, destination)
+    return True
+
+
+def store_video_names(moves, name_key):
+    glossvideos = [GlossVideo(id=move['glossvideo'], videofile=move[name_key]) for move in moves]
+    GlossVideo.objects.bulk_update(glossvideos, ['videofile'], batch_size=RELOCATION_BATCH_SIZE)
+    # the packages are patched for the glosses, as when the gloss videos are saved
+    gloss_datasets = dict((move['gloss'], move['dataset']) for move in moves)
+    record_package_changes([(dataset_id, gloss_id) for gloss_id, dataset_id in gloss_datasets.items()],
+                           batch_size=RELOCATION_BATCH_SIZE)
+
+
+def sync_moved_media_files(plan):
+    """Update the media inventory for the moved directories and files"""
+    from signbank.video.inventory import scan_media_inventory, sync_media_files
+    if plan['directories']:
+        scan_media_inventory(folders=[folder for directory in plan['directories'] for folder in directory])
+    sync_media_files([name for move in plan['moves'] for source_and_destination in move['files']
+                      for name in source_and_destination])
+
+
+def complete_relocation(plan, journal_path):
+    for source, destination in plan['directories']:
+        rename_path(source, destination)
+    for move in plan['moves']:
+        for source, destination in move['files']:
+            rename_path(source, destination)
+    with transaction.atomic():
+        store_video_names(plan['moves'], 'new_name')
+        transaction.on_commit(lambda: os.remove(journal_path) if os.path.exists(journal_path) else None)
+        transaction.on_commit(lambda: sync_moved_media_files(plan))
+
+
+def rollback_relocation(plan, journal_path):
+    for move in reversed(plan['moves']):
+        for source, destination in reversed(move['files']):
+            rename_path(destination, source)
+    for source, destination in reversed(plan['directories']):
+        rename_path(destination, source)
+    with transaction.atomic():
+        store_video_names(plan['moves'], 'old_name')
+        transaction.on_commit(lambda: os.remove(journal_path) if os.path.exists(journal_path) else None)
+        transaction.on_commit(lambda: sync_moved_media_files(plan))
+
+
+def relocate_videos(glossvideos, directories=()):
+    """Move the files of the gloss videos to their new paths and store the new names, returns the number of moves"""
+    plan = plan_video_relocations(glossvideos, directories)
+    if not plan['directories'] and not plan['moves']:
+        return 0
+    complete_relocation(plan, write_journal(plan))
+    if isinstance(glossvideos, QuerySet):
+        return len(plan['moves'])
+    # the objects of the caller get their new names too
+    new_names = dict((move['glossvideo'], move['new_name']) for move in plan['moves'])
+    for glossvideo in glossvideos:
+        if glossvideo.id in new_names:
+            glossvideo.videofile.name = new_names[glossvideo.id]
+    return len(plan['moves'])
+
+
+def resume_relocations(rollback=False):
+    """Complete or roll back the relocations whose journal is left, returns the number of journals"""
+    journal_paths = unfinished_relocation_journals()
+    for journal_path in journal_paths:
+        plan = read_journal(journal_path)
+        if rollback:
+            rollback_relocation(plan, journal_path)
+        else:
+            complete_relocation(plan, journal_path)
+    return len(journal_paths)
@@ -9,5 +9,6 @@ urlpatterns = [
     re_path(r'^delete/(?P<glossid>\d+)$', signbank.video.views.deletevideo),
     re_path(r'^deletesentencevideo/(?P<videoid>\d+)$', signbank.video.views.deletesentencevideo),
     re_path(r'^process_eaffile/', signbank.video.views.process_eaffile, name='process_eaffile'),
-    re_path(r'^create_still_images/', permission_required('dictionary.change_gloss')(signbank.video.views.create_still_images))
+    re_path(r'^create_still_images/', permission_required('dictionary.change_gloss')(signbank.video.views.create_still_images)),
+    re_path(r'^jobs/(?P<glossid>\d+)/$', signbank.video.views.video_jobs_status, name='video_jobs_status')
     ]
\ No newline at end of file
@@ -15,11 +15,13 @@ from django.utils.translation import gettext_lazy as _
 
 from guardian.shortcuts import get_user_perms
 
-from signbank.video.models import GlossVideo, ExampleVideo, GlossVideoHistory, ExampleVideoHistory
+from signbank.video.models import (GlossVideo, ExampleVideo, GlossVideoHistory, ExampleVideoHistory,
+                                   VideoProcessingJob)
 from signbank.video.forms import VideoUploadForObjectForm
+from signbank.video.eaf_annotations import get_glosses_from_eaf
 from signbank.dictionary.models import (Gloss, DeletedGlossOrMedia, ExampleSentence, Morpheme, AnnotatedSentence,
-                                        Dataset, GlossRevision, AnnotationIdglossTranslation)
-from signbank.tools import generate_still_image, get_default_annotationidglosstranslation
+                                        Dataset, GlossRevision)
+from signbank.tools import get_default_annotationidglosstranslation
 
 from pympi.Elan import Eaf
 
@@ -155,79 +157,6 @@ def addvideo(request):
     return redirect(redirect_url)
 
 
-def find_non_overlapping_annotated_glosses(timeslots, annotations_tier_1, annotations_tier_2):
-    non_overlapping_glosses = []
-
-    for annotation_2 in annotations_tier_2:
-        is_overlapping = False
-        for annotation_1 in annotations_tier_1:
-            # timecode to time in ms
-            start_1 = int(timeslots[annotation_1[0]])
-            end_1 = int(timeslots[annotation_1[1]])
-            start_2 = int(timeslots[annotation_2[0]])
-            end_2 = int(timeslots[annotation_2[1]])
-            if (start_2 >= start_1 and start_2 <= end_1) or (end_2 >= start_1 and end_2 <= end_1):
-                is_overlapping = True
-                break
-        if not is_overlapping:
-            non_overlapping_glosses.append(annotation_2)
-
-    return non_overlapping_glosses
-
-
-def get_glosses_from_eaf(eaf, dataset_acronym):
-    glosses, labels_not_found, sentences = [], [], []
-    sentence_dict = {}
-
-    # check whether to use 'Signbank ID glossen' or 'Glosses R' and 'Glosses L' tiers
-    if 'Signbank ID glossen' in eaf.tiers:
-        # Add glosses from this one tier
-        for annotation in eaf.tiers['Signbank ID glossen'][0].values():
-            gloss_label = annotation[2]
-            if AnnotationIdglossTranslation.objects.filter(gloss__lemma__dataset__acronym=dataset_acronym, text__exact=gloss_label).exists():
-                start = int(eaf.timeslots[annotation[0]])
-                end = int(eaf.timeslots[annotation[1]])
-                glosses.append([gloss_label, start, end])
-            else:
-                labels_not_found.append(gloss_label)
-    else:
-        # Add glosses from the right hand
-        for annotation in eaf.tiers['Glosses R'][0].values():
-            gloss_label = annotation[2]
-            if AnnotationIdglossTranslation.objects.filter(gloss__lemma__dataset__acronym=dataset_acronym, text__exact=gloss_label).exists():
-                start = int(eaf.timeslots[annotation[0]])
-                end = int(eaf.timeslots[annotation[1]])
-                glosses.append([gloss_label, start, end])
-            else:
-                labels_not_found.append(gloss_label)
-
-        # Add glosses from the left hand, if they don't overlap with the right hand
-        for annotation in find_non_overlapping_annotated_glosses(eaf.timeslots, eaf.tiers['Glosses R'][0].values(), eaf.tiers['Glosses L'][0].values()):
-            gloss_label = annotation[2]
-            if AnnotationIdglossTranslation.objects.filter(gloss__lemma__dataset__acronym=dataset_acronym, text__exact=gloss_label).exists():
-                start = int(eaf.timeslots[annotation[0]])
-                end = int(eaf.timeslots[annotation[1]])
-                glosses.append([gloss_label, start, end])
-            else:
-                labels_not_found.append(gloss_label)
-
-    # Sort the list of glosses by the "start" value
-    glosses = sorted(glosses, key=lambda x: x[1])
-
-    if 'Sentences' in eaf.tiers:
-        for annotation in eaf.tiers['Sentences'][0].values():
-            sentences.append(annotation[2])
-    elif 'Nederlands' in eaf.tiers:
-        for annotation in eaf.tiers['Nederlands'][0].values():
-            sentences.append(annotation[2])
-    
-    dataset_language = Dataset.objects.get(acronym=dataset_acronym).default_language.language_code_3char
-    for sentence in sentences:
-        sentence_dict[dataset_language] = sentence
-
-    return glosses, labels_not_found, sentence_dict
-
-
 def process_eaffile(request):
 
     if request.method != 'POST':
@@ -323,8 +252,26 @@ def deletevideo(request, glossid):
 
 
 def create_still_images(request):
-    processed_videos = []
-    for video in GlossVideo.objects.filter(glossvideonme=None, glossvideoperspective=None, version=0):
-        generate_still_image(video)
-        processed_videos.append(str(video))
-    return HttpResponse('Processed videos: <br/>' + "<br/>".join(processed_videos))
+    """Queue a still image job for the current gloss videos, the video processing jobs make the images"""
+    from signbank.video.jobs import enqueue_video_jobs
+    queued_videos = []
+    for dataset in Dataset.objects.all():
+        glossvideos = list(GlossVideo.objects.filter(gloss__lemma__dataset=dataset, glossvideonme=None,
+                                                     glossvideoperspective=None, version=0).exclude(videofile=''))
+        enqueue_video_jobs(VideoProcessingJob.STILL_IMAGE, glossvideos)
+        queued_videos += [str(glossvideo) for glossvideo in glossvideos]
+    return HttpResponse('Queued videos: <br/>' + "<br/>".join(queued_videos))
+
+
+@login_required
+def video_jobs_status(request, glossid):
+    """The processing jobs of the videos of the gloss, the upload page polls this until they are finished"""
+    gloss = get_object_or_404(Gloss, pk=glossid, archived=False)
+    jobs = VideoProcessingJob.objects.filter(glossvideo__gloss=gloss, glossvideo__version=0).order_by('-created', '-id')
+    # only the newest job of each kind and video is of interest
+    newest_jobs = dict()
+    for job in jobs[:50]:
+        newest_jobs.setdefault((job.kind, job.glossvideo_id), job)
+    from signbank.video.jobs import video_job_status
+    statuses = [video_job_status(job) for job in newest_jobs.values()]
+    return JsonResponse({'jobs': statuses, 'finished': all(status['finished'] for status in statuses)})
@@ -0,0 +1,245 @@
+"""Import the videos of a zip archive into the glosses of a dataset.
+
+The member list of the archive is checked once, the members named dataset/GLOSSID.mp4 or
+dataset/language/annotation.mp4 are imported. The glosses of all members are looked up before
+the first file is written. Each member is streamed from the archive to a partial file next to the path
+of the gloss video, without extracting it elsewhere first. The gloss videos are stored in batches with bulk
+inserts, and the partial files replace the video files only when the batch is committed, so a failed batch
+leaves the existing videos as they were. The conversion to mp4 and the still images are left to the video
+processing jobs.
+The videos in the import folders are imported the same way by upload_videos_to_glosses.
+"""
+
+import os
+import zipfile
+
+from django.db import connection, models, transaction
+
+from signbank.settings.server_specific import WRITABLE_FOLDER, GLOSS_VIDEO_DIRECTORY, PREFIX_URL, URL
+from signbank.dictionary.models import Gloss, AnnotationIdglossTranslation, record_package_changes
+from signbank.tools import get_two_letter_dir
+from signbank.zip_interface import (check_subfolders_for_unzipping, check_subfolders_for_unzipping_ids,
+                                    write_partial_file, remove_video_file_from_import_videos)
+from signbank.video.inventory import sync_media_files
+from signbank.video.jobs import enqueue_video_jobs
+from signbank.video.models import GlossVideo, GlossVideoHistory, VideoProcessingJob
+from signbank.video.relocation import idglosses_of_glosses
+
+INGESTION_BATCH_SIZE = 100
+
+
+class VideoMember:
+    """A video file to import, the key is the gloss id if there is no language, otherwise the annotation"""
+
+    def __init__(self, path, dataset_acronym, language_code=None):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.key, self.extension = os.path.splitext(self.filename)
+        self.language_code = language_code
+        self.json_key = '/'.join([dataset_acronym] + ([language_code] if language_code else []) + [self.filename])
+
+    def __str__(self):
+        return self.json_key
+
+
+def zip_video_members(dataset, names):
+    """The video members of the names of a zip archive, they have the structure of
+    check_subfolders_for_unzipping_ids or of check_subfolders_for_unzipping"""
+    lang3charcodes = [language.language_code_3char for language in dataset.translation_languages.all()]
+    members = []
+    for name in check_subfolders_for_unzipping_ids(dataset.acronym, names):
+        member = VideoMember(name, dataset.acronym)
+        if member.extension == '.mp4' and member.key.isdigit():
+            members.append(member)
+    for name in check_subfolders_for_unzipping(dataset.acronym, lang3charcodes, names):
+        language_code = os.path.dirname(name).split('/')[-1]
+        member = VideoMember(name, dataset.acronym, language_code)
+        if member.extension == '.mp4' and member.key:
+            members.append(member)
+    return members
+
+
+def import_folder_members(dataset, video_file_paths_with_ids, video_file_paths_with_annotations):
+    members = [VideoMember(path, dataset.acronym) for path in video_file_paths_with_ids]
+    members += [VideoMember(path, dataset.acronym, os.path.basename(os.path.dirname(path)))
+                for path in video_file_paths_with_annotations]
+    return members
+
+
+def target_glosses(dataset, members):
+    """Map the (language code, key) of the members to the gloss of the dataset they are imported into,
+    with one query for the gloss ids and one for the annotations"""
+    glosses = dict()
+    gloss_ids = set(int(member.key) for member in members if not member.language_code and member.key.isdigit())
+    if gloss_ids:
+        for gloss in Gloss.objects.filter(lemma__dataset=dataset, archived=False,
+                                          id__in=gloss_ids).select_related('lemma__dataset'):
+            glosses[(None, str(gloss.id))] = gloss
+    annotations = set((member.language_code, member.key) for member in members if member.language_code)
+    if annotations:
+        same_glosses = dict()
+        translations = AnnotationIdglossTranslation.objects.filter(
+            gloss__lemma__dataset=dataset, gloss__archived=False,
+            language__language_code_3char__in=set(language_code for language_code, text in annotations),
+            text__in=set(text for language_code, text in annotations)).select_related(
+            'gloss__lemma__dataset', 'language')
+        # as filter().first(), the gloss with the lowest id is kept
+        for translation in translations.order_by('-gloss_id'):
+            key = (translation.language.language_code_3char, translation.text)
+            if key in annotations:
+                glosses[key] = same_glosses.setdefault(translation.gloss_id, translation.gloss)
+    return glosses
+
+
+def current_glossvideos(glosses):
+    """Map the ids of the glosses to their displayed gloss video, with one query"""
+    glossvideos = dict()
+    for glossvideo in GlossVideo.objects.filter(gloss__in=glosses, glossvideonme=None, glossvideoperspective=None,
+                                                version=0).order_by('-id'):
+        glossvideos[glossvideo.gloss_id] = glossvideo
+    return glossvideos
+
+
+def gloss_video_name(gloss, idgloss, extension):
+    """The name of the video file of the gloss, as get_gloss_filepath"""
+    return os.path.join(GLOSS_VIDEO_DIRECTORY, gloss.lemma.dataset.acronym, get_two_letter_dir(idgloss),
+                        idgloss + '-' + str(gloss.id) + extension)
+
+
+def put_imported_files_in_place(partial_paths, old_names):
+    """Replace the video files by the partial files of the committed batch, partial_paths maps the names
+    of the video files to their partial file"""
+    for name, partial_path in partial_paths.items():
+        if os.path.exists(partial_path):
+            os.replace(partial_path, os.path.join(WRITABLE_FOLDER, name))
+    sync_media_files(set(partial_paths.keys()) | old_names)
+
+
+def remove_partial_files(partial_paths):
+    for partial_path in partial_paths:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def store_imported_videos(user, imported):
+    """Store the gloss videos of the imported (gloss, name, member, current gloss video or None, partial file),
+    put the partial files in place when they are committed and queue their conversion and still image.
+    Returns the stored gloss videos by gloss id"""
+    changed, new = dict(), dict()
+    partial_paths = dict()
+    for gloss, name, member, glossvideo, partial_path in imported:
+        if glossvideo is not None:
+            changed[gloss.id] = glossvideo
+        elif gloss.id not in new:
+            # a gloss with more than one video in the archive gets one gloss video
+            new[gloss.id] = GlossVideo(gloss=gloss, glossvideonme=None, glossvideoperspective=None, version=0)
+        glossvideo = changed.get(gloss.id) or new[gloss.id]
+        glossvideo.videofile.name = name
+        # the file state is that of the partial file, it is at the name after the commit
+        glossvideo.file_present = True
+        glossvideo.file_size = os.path.getsize(partial_path)
+        partial_paths[name] = partial_path
+    old_names = set(glossvideo.stored_videofile_name for glossvideo in changed.values())
+    glossvideos = list(changed.values()) + list(new.values())
+    try:
+        with transaction.atomic():
+            GlossVideo.objects.bulk_update(list(changed.values()), ['videofile', 'file_present', 'file_size'])
+            if connection.features.can_return_rows_from_bulk_insert:
+                GlossVideo.objects.bulk_create(list(new.values()))
+            else:
+                # the jobs need the ids of the new gloss videos, which this database does not return for a bulk insert
+                # the save method of GlossVideo is skipped, it would look for the file before it is in place
+                for glossvideo in new.values():
+                    models.Model.save(glossvideo)
+            GlossVideoHistory.objects.bulk_create([
+                GlossVideoHistory(action='import', gloss=gloss, actor=user, uploadfile=member.filename,
+                                  goal_location=os.path.join(WRITABLE_FOLDER, name))
+                for gloss, name, member, glossvideo, partial_path in imported])
+            record_package_changes([(gloss.lemma.dataset_id, gloss.id) for gloss in set(entry[0] for entry in imported)])
+            # the files are in place before the jobs that read them are started
+            transaction.on_commit(lambda: put_imported_files_in_place(partial_paths, old_names))
+            enqueue_video_jobs(VideoProcessingJob.CONVERT_TO_MP4, glossvideos)
+            enqueue_video_jobs(VideoProcessingJob.STILL_IMAGE, glossvideos)
+    except Exception:
+        remove_partial_files(partial_paths.values())
+        raise
+    return dict((glossvideo.gloss_id, glossvideo) for glossvideo in glossvideos)
+
+
+def import_result(member, gloss=None, name='', errors=''):
+    return {'path': member.json_key,
+            'videofile': member.filename,
+            'gloss': str(gloss.id) if gloss else '',
+            'Video': URL + PREFIX_URL + '/dictionary/protected_media/' + name if name else '',
+            'importstatus': 'Success' if name else 'Failed',
+            'errors': errors}
+
+
+def import_videos(user, dataset, members, open_member, remove_member=None):
+    """Import the members into the glosses of the dataset, open_member returns a file object of a member.
+    Yields the result of each member once its gloss video is stored"""
+    glosses = target_glosses(dataset, members)
+    glossvideos = current_glossvideos(set(glosses.values()))
+    idglosses = idglosses_of_glosses(set(glosses.values()))
+    imported = []
+    for number, member in enumerate(members, start=1):
+        gloss = glosses.get((member.language_code, member.key))
+        if gloss is None:
+            yield import_result(member, errors='Gloss not found for {key}.'.format(key=member.key))
+        else:
+            name = gloss_video_name(gloss, idglosses[gloss.id], member.extension)
+            try:
+                with open_member(member) as source:
+                    partial_path = write_partial_file(source, os.path.join(WRITABLE_FOLDER, name))
+                imported.append((gloss, name, member, glossvideos.get(gloss.id), partial_path))
+            except (OSError, zipfile.BadZipFile) as e:
+                # an earlier member of the batch with the same name had its partial file overwritten
+                for other_gloss, other_name, other_member, glossvideo, partial_path in imported:
+                    if other_name == name:
+                        yield import_result(other_member, other_gloss, errors=repr(e))
+                imported = [entry for entry in imported if entry[1] != name]
+                yield import_result(member, gloss, errors=repr(e))
+        if remove_member is not None:
+            remove_member(member)
+        if imported and (len(imported) == INGESTION_BATCH_SIZE or number == len(members)):
+            try:
+                glossvideos.update(store_imported_videos(user, imported))
+                results = [import_result(member, gloss, name)
+                           for gloss, name, member, glossvideo, partial_path in imported]
+            except Exception as e:
+                results = [import_result(member, gloss, errors=repr(e))
+                           for gloss, name, member, glossvideo, partial_path in imported]
+            for result in results:
+                yield result
+            imported = []
+
+
+def read_zip_video_members(dataset, zip_path):
+    """The video members of the zip archive or None if it is not a zip archive"""
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            return zip_video_members(dataset, zf.namelist())
+    except (OSError, zipfile.BadZipFile):
+        return None
+
+
+def import_zipped_videos(user, dataset, zip_path, members):
+    """Import the video members of the zip archive into the glosses of the dataset, yields the number of videos,
+    the result of each video and the number that was imported. The archive is removed afterwards"""
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            yield {'videos': len(members)}
+            number_imported = 0
+            for result in import_videos(user, dataset, members, lambda member: zf.open(member.path)):
+                if result['importstatus'] == 'Success':
+                    number_imported += 1
+                yield result
+            yield {'imported': number_imported, 'failed': len(members) - number_imported}
+    finally:
+        remove_video_file_from_import_videos(zip_path)
+
+
+def import_folder_videos(user, dataset, members):
+    """Import the videos of the import folders into the glosses of the dataset, the files are removed"""
+    return import_videos(user, dataset, members, lambda member: open(member.path, 'rb'),
+                         remove_member=lambda member: remove_video_file_from_import_videos(member.path))
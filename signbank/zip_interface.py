@@ -13,6 +13,40 @@ from signbank.tools import get_two_letter_dir
 
 import zipfile
 
+PARTIAL_APPENDIX = '.partial'
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def write_partial_file(source, goal_path):
+    """Copy the open source file next to the goal path, returns the path of the copy.
+    The copy is put in place with os.replace, an incomplete copy is removed"""
+    os.makedirs(os.path.dirname(goal_path), mode=0o775, exist_ok=True)
+    partial_path = goal_path + PARTIAL_APPENDIX
+    try:
+        with open(partial_path, 'wb') as goal_file:
+            shutil.copyfileobj(source, goal_file, COPY_BUFFER_SIZE)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    return partial_path
+
+
+def write_file_in_place(source, goal_path):
+    """Copy the open source file to the goal path, the file at the goal path is replaced when the copy is complete"""
+    partial_path = write_partial_file(source, goal_path)
+    try:
+        os.replace(partial_path, goal_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+
+
+def extract_zip_member(zf, name, goal_path):
+    """Stream the member of the zip archive to the goal path, without extracting it elsewhere first"""
+    with zf.open(name) as source:
+        write_file_in_place(source, goal_path)
+
 
 def import_folder(video_file_path):
     # this removes the WRITABLE_FOLDER from the path, so as not to show to user
@@ -56,10 +90,16 @@ def get_filenames_with_filetype(path_to_zip):
         return files_in_zip_archive
 
 
+def common_folder_prefix(filenames):
+    """The common prefix of the filenames up to a folder, as NGT/ for NGT/1.mp4 and NGT/12.mp4"""
+    commonprefix = os.path.commonprefix(filenames)
+    return commonprefix[:commonprefix.rfind('/') + 1]
+
+
 def check_subfolders_for_unzipping(acronym, lang3charcodes, filenames):
     # the zip file possibly has an outer folder container
     # include both possible structures in the allowed structural paths
-    commonprefix = os.path.commonprefix(filenames)
+    commonprefix = common_folder_prefix(filenames)
     common_prefix_paths = [acronym + '/' + lang3char + '/' for lang3char in lang3charcodes]
     if commonprefix != acronym + '/':
         # if the user has put the zip files inside another folder, e.g., NGT_videos/NGT/nld/
@@ -87,7 +127,7 @@ def check_subfolders_for_unzipping(acronym, lang3charcodes, filenames):
 def check_subfolders_for_unzipping_ids(acronym, filenames):
     # the zip file possibly has an outer folder container
     # include both possible structures in the allowed structural paths
-    commonprefix = os.path.commonprefix(filenames)
+    commonprefix = common_folder_prefix(filenames)
     if commonprefix != acronym + '/':
         # if the user has put the zip files inside another folder, e.g., NGT_videos/NGT/nld/
         subfolders = [commonprefix] + [commonprefix + acronym + '/']
@@ -147,9 +187,8 @@ def unzip_video_files(dataset, zipped_videos_file, destination):
             if acronym != str(dataset.acronym) or lang3code not in lang3charcodes:
                 # path is not correct, ignore
                 continue
-            localfilepath = zf.extract(name, destination)
             new_location = os.path.join(destination, str(dataset.acronym), lang3code, filename)
-            shutil.move(localfilepath, new_location)
+            extract_zip_member(zf, name, new_location)
 
     unzipped_filename = os.path.basename(zipped_videos_file)
     folder_name, extension = os.path.splitext(unzipped_filename)
@@ -169,15 +208,10 @@ def unzip_video_files_ids(dataset, zipped_videos_file, destination):
             # this is a video
             filename = os.path.basename(name)
 
-            # The ZipFile module does not like os.path.join paths
-            # The zip file needs to be unzipped in the same location as itself, then files are moved
-            unzip_location = WRITABLE_FOLDER + destination + 'TEMP'
             new_location = WRITABLE_FOLDER + destination + str(dataset.acronym) + '/' + filename
             try:
-                localfilepath = zf.extract(name, unzip_location)
-
-                shutil.move(localfilepath, new_location)
-            except (OSError, PermissionError):
+                extract_zip_member(zf, name, new_location)
+            except (OSError, PermissionError, zipfile.BadZipFile):
                 print('File system error unzipping')
                 continue
 